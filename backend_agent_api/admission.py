@@ -0,0 +1,164 @@
+"""
+Admission control for agent runs.
+
+Bounds how many agent runs execute at once per process, globally and per user.
+Requests over the limit wait in a short bounded queue; when the queue is full or
+the wait takes too long they are rejected straight away with a Retry-After hint,
+so latency stays bounded during spikes instead of collapsing for everyone.
+"""
+from typing import Any, Dict, Optional
+from collections import Counter, deque
+import asyncio
+import math
+import time
+import os
+
+agent_max_concurrent_runs = int(os.getenv("AGENT_MAX_CONCURRENT_RUNS", "20"))
+agent_max_runs_per_user = int(os.getenv("AGENT_MAX_RUNS_PER_USER", "2"))
+agent_max_queued_runs = int(os.getenv("AGENT_MAX_QUEUED_RUNS", "50"))
+agent_queue_timeout = float(os.getenv("AGENT_QUEUE_TIMEOUT", "10"))
+agent_retry_after_seconds = int(os.getenv("AGENT_RETRY_AFTER_SECONDS", "5"))
+
+class AdmissionRejected(Exception):
+    """Raised when a run can't be admitted. retry_after is in seconds."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+class AdmissionSlot:
+    """A granted run slot. release() is idempotent so every exit path can call it."""
+
+    def __init__(self, controller: "AdmissionController", user_id: str, queue_wait: float):
+        self.controller = controller
+        self.user_id = user_id
+        self.queue_wait = queue_wait
+        self.released = False
+
+    def release(self) -> None:
+        if not self.released:
+            self.released = True
+            self.controller._release(self.user_id)
+
+class AdmissionController:
+    """Global and per-user concurrency caps with a bounded wait queue."""
+
+    def __init__(
+        self,
+        max_concurrent: int = agent_max_concurrent_runs,
+        max_per_user: int = agent_max_runs_per_user,
+        max_queued: int = agent_max_queued_runs,
+        queue_timeout: float = agent_queue_timeout,
+        retry_after: int = agent_retry_after_seconds
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_per_user = max_per_user
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.active = 0
+        self.active_by_user: Counter = Counter()
+        self.waiting = 0
+        self.slot_freed: Optional[asyncio.Condition] = None
+        self.notify_tasks = set()
+        # Recent queue waits in seconds, for percentiles
+        self.recent_waits: deque = deque(maxlen=1000)
+        self.counters = {
+            "admitted": 0,
+            "queued": 0,
+            "rejected_queue_full": 0,
+            "rejected_timeout": 0
+        }
+
+    def _has_capacity(self, user_id: str) -> bool:
+        return self.active < self.max_concurrent and self.active_by_user[user_id] < self.max_per_user
+
+    def _retry_after(self) -> int:
+        # Back off further the more work is already queued ahead
+        backlog = self.waiting / max(self.max_concurrent, 1)
+        return max(1, math.ceil(self.retry_after * (1 + backlog)))
+
+    def _grant(self, user_id: str, queue_wait: float) -> AdmissionSlot:
+        self.active += 1
+        self.active_by_user[user_id] += 1
+        self.counters["admitted"] += 1
+        self.recent_waits.append(queue_wait)
+        return AdmissionSlot(self, user_id, queue_wait)
+
+    async def acquire(self, user_id: str) -> AdmissionSlot:
+        """
+        Wait for a run slot.
+
+        Returns:
+            AdmissionSlot: The granted slot - call release() when the run ends
+
+        Raises:
+            AdmissionRejected: If the wait queue is full or the wait timed out
+        """
+        if self.slot_freed is None:
+            self.slot_freed = asyncio.Condition()
+
+        if self._has_capacity(user_id):
+            return self._grant(user_id, 0.0)
+
+        if self.waiting >= self.max_queued:
+            self.counters["rejected_queue_full"] += 1
+            raise AdmissionRejected("queue_full", self._retry_after())
+
+        self.waiting += 1
+        self.counters["queued"] += 1
+        start = time.monotonic()
+        try:
+            async with self.slot_freed:
+                await asyncio.wait_for(
+                    self.slot_freed.wait_for(lambda: self._has_capacity(user_id)),
+                    timeout=self.queue_timeout
+                )
+                return self._grant(user_id, time.monotonic() - start)
+        except asyncio.TimeoutError:
+            self.counters["rejected_timeout"] += 1
+            self.recent_waits.append(time.monotonic() - start)
+            raise AdmissionRejected("queue_timeout", self._retry_after())
+        finally:
+            self.waiting -= 1
+
+    def _release(self, user_id: str) -> None:
+        self.active -= 1
+        self.active_by_user[user_id] -= 1
+        if self.active_by_user[user_id] <= 0:
+            del self.active_by_user[user_id]
+        if self.slot_freed is None or not self.waiting:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Released by a finalizer outside the event loop - waiters will be woken by the next release
+            return
+        task = loop.create_task(self._notify())
+        self.notify_tasks.add(task)
+        task.add_done_callback(self.notify_tasks.discard)
+
+    async def _notify(self) -> None:
+        async with self.slot_freed:
+            self.slot_freed.notify_all()
+
+    def metrics(self) -> Dict[str, Any]:
+        """Snapshot of slot usage, queue length and queue-wait percentiles."""
+        waits = sorted(self.recent_waits)
+
+        def percentile(p: float) -> Optional[float]:
+            if not waits:
+                return None
+            return round(waits[min(len(waits) - 1, int(p * len(waits)))] * 1000, 1)
+
+        return {
+            **self.counters,
+            "active": self.active,
+            "waiting": self.waiting,
+            "max_concurrent": self.max_concurrent,
+            "max_per_user": self.max_per_user,
+            "queue_wait_p50_ms": percentile(0.50),
+            "queue_wait_p95_ms": percentile(0.95),
+            "queue_wait_p99_ms": percentile(0.99)
+        }
@@ -7,8 +7,12 @@ from dotenv import load_dotenv
 from openai import AsyncOpenAI
 from httpx import AsyncClient
 from supabase import Client
+from contextvars import ContextVar
 from pathlib import Path
-from typing import List
+from typing import List, Optional, Set
+import functools
+import inspect
+import asyncio
 import os
 
 # Check if we're in production
@@ -24,6 +28,9 @@ else:
     load_dotenv()
 
 from prompt import AGENT_SYSTEM_PROMPT
+from tool_cache import ToolCacheScope, make_cache_key
+from retrieval_prefetch import RetrievalPrefetch
+from stage_timing import timed_tool
 from tools import (
     web_search_tool,
     image_analysis_tool,
@@ -31,6 +38,8 @@ from tools import (
     list_documents_tool,
     get_document_content_tool,
     execute_sql_query_tool,
+    list_analytics_datasets_tool,
+    execute_analytics_query_tool,
     execute_safe_code_tool
 )
 
@@ -42,6 +51,16 @@ def get_model():
 
     return OpenAIModel(llm, provider=OpenAIProvider(base_url=base_url, api_key=api_key))
 
+def get_fast_model():
+    # Smaller, faster model for simple queries and title generation - falls back to the main model
+    llm = os.getenv('LLM_FAST_CHOICE')
+    if not llm:
+        return get_model()
+    base_url = os.getenv('LLM_FAST_BASE_URL') or os.getenv('LLM_BASE_URL') or 'https://api.openai.com/v1'
+    api_key = os.getenv('LLM_FAST_API_KEY') or os.getenv('LLM_API_KEY') or 'ollama'
+
+    return OpenAIModel(llm, provider=OpenAIProvider(base_url=base_url, api_key=api_key))
+
 # ========== Pydantic AI Agent ==========
 @dataclass
 class AgentDeps:
@@ -51,6 +70,8 @@ class AgentDeps:
     brave_api_key: str | None
     searxng_base_url: str | None
     memories: str
+    # Retrieval started for the user's message before the run, if prefetching is enabled
+    retrieval_prefetch: Optional[RetrievalPrefetch] = None
 
 # To use the code execution MCP server:
 # First uncomment the line below that defines 'code_execution_server', then also uncomment 'mcp_servers=[code_execution_server]'
@@ -60,6 +81,52 @@ class AgentDeps:
 # Pydantic AI docs for this MCP server: https://ai.pydantic.dev/mcp/run-python/
 # code_execution_server = MCPServerHTTP(url='http://localhost:3001/sse')  
 
+# Tool calls run in their own tasks that pydantic-ai creates from the agent run's context.
+# The API sets this to a fresh set per run so it can cancel in-flight tools with the run.
+active_tool_tasks: ContextVar[Optional[Set[asyncio.Task]]] = ContextVar("active_tool_tasks", default=None)
+
+def cancellable_tool(func):
+    """Register the tool's task in active_tool_tasks while it runs so a cancelled run can cancel it too."""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        tasks = active_tool_tasks.get()
+        task = asyncio.current_task()
+        if tasks is not None and task is not None:
+            tasks.add(task)
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            if tasks is not None:
+                tasks.discard(task)
+    return wrapper
+
+# The API sets this per run to the session's tool cache; tools run uncached when it's unset
+active_tool_cache: ContextVar[Optional[ToolCacheScope]] = ContextVar("active_tool_cache", default=None)
+
+def memoized_tool(*text_args: str):
+    """
+    Reuse the result of an identical earlier call to the tool in the same session.
+
+    Args:
+        text_args: Names of natural-language arguments, matched case- and punctuation-insensitively
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            scope = active_tool_cache.get()
+            if scope is None:
+                return await func(*args, **kwargs)
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            # The first parameter is the run context, which isn't part of the call's identity
+            arguments = dict(list(bound.arguments.items())[1:])
+            key = make_cache_key(func.__name__, arguments, text_args)
+            return await scope.call(key, lambda: func(*args, **kwargs))
+        return wrapper
+    return decorator
+
 agent = Agent(
     get_model(),
     system_prompt=AGENT_SYSTEM_PROMPT,
@@ -74,6 +141,9 @@ def add_memories(ctx: RunContext[str]) -> str:
     return f"\nUser Memories:\n{ctx.deps.memories}"
 
 @agent.tool
+@cancellable_tool
+@timed_tool
+@memoized_tool("query")
 async def web_search(ctx: RunContext[AgentDeps], query: str) -> str:
     """
     Search the web with a specific query and get a summary of the top search results.
@@ -91,6 +161,9 @@ async def web_search(ctx: RunContext[AgentDeps], query: str) -> str:
     return await web_search_tool(query, ctx.deps.http_client, ctx.deps.brave_api_key, ctx.deps.searxng_base_url)    
 
 @agent.tool
+@cancellable_tool
+@timed_tool
+@memoized_tool("user_query")
 async def retrieve_relevant_documents(ctx: RunContext[AgentDeps], user_query: str) -> str:
     """
     Retrieve relevant document chunks based on the query with RAG.
@@ -100,23 +173,33 @@ async def retrieve_relevant_documents(ctx: RunContext[AgentDeps], user_query: st
         user_query: The user's question or query
         
     Returns:
-        A formatted string containing the top 4 most relevant documents chunks
+        A formatted string with the most relevant passages, grouped by document with adjacent chunks merged
     """
     print("Calling retrieve_relevant_documents tool")
+    if ctx.deps.retrieval_prefetch is not None:
+        prefetched = await ctx.deps.retrieval_prefetch.result_for(user_query)
+        if prefetched is not None:
+            return prefetched
     return await retrieve_relevant_documents_tool(ctx.deps.supabase, ctx.deps.embedding_client, user_query)
 
 @agent.tool
+@cancellable_tool
+@timed_tool
+@memoized_tool()
 async def list_documents(ctx: RunContext[AgentDeps]) -> List[str]:
     """
     Retrieve a list of all available documents.
     
     Returns:
-        List[str]: List of documents including their metadata (URL/path, schema if applicable, etc.)
+        List[str]: List of documents including their metadata (URL/path, schema, typed table and column statistics if applicable, etc.)
     """
     print("Calling list_documents tool")
     return await list_documents_tool(ctx.deps.supabase)
 
 @agent.tool
+@cancellable_tool
+@timed_tool
+@memoized_tool()
 async def get_document_content(ctx: RunContext[AgentDeps], document_id: str) -> str:
     """
     Retrieve the full content of a specific document by combining all its chunks.
@@ -132,6 +215,9 @@ async def get_document_content(ctx: RunContext[AgentDeps], document_id: str) ->
     return await get_document_content_tool(ctx.deps.supabase, document_id)
 
 @agent.tool
+@cancellable_tool
+@timed_tool
+@memoized_tool()
 async def execute_sql_query(ctx: RunContext[AgentDeps], sql_query: str) -> str:
     """
     Run a SQL query - use this to query from the document_rows table once you know the file ID you are querying. 
@@ -139,6 +225,13 @@ async def execute_sql_query(ctx: RunContext[AgentDeps], sql_query: str) -> str:
     all the keys from the file schema given in the document_metadata table.
 
     Never use a placeholder file ID. Always use the list_documents tool first to get the file ID.
+    Queries the database expects to be too expensive are rejected with a hint - rewrite the query following it.
+
+    If list_documents shows a typed_table for the file, query that table instead - it has one properly
+    typed column per schema key, so no casting or dataset_id filter is needed
+    (e.g. SELECT region, SUM(revenue) FROM dataset_1a2b3c4d5e6f GROUP BY region).
+    Simple questions like min/max, null counts or the most common values can often be answered
+    straight from the column_stats in list_documents without running a query.
 
     Example query:
 
@@ -166,6 +259,51 @@ async def execute_sql_query(ctx: RunContext[AgentDeps], sql_query: str) -> str:
     return await execute_sql_query_tool(ctx.deps.supabase, sql_query)    
 
 @agent.tool
+@cancellable_tool
+@timed_tool
+@memoized_tool()
+async def list_analytics_datasets(ctx: RunContext[AgentDeps]) -> str:
+    """
+    List the tabular datasets available in the fast analytics store, with their table names,
+    typed columns and row counts. Use this before execute_analytics_query.
+    
+    Returns:
+        str: List of datasets including file ID, table name, title, column types and row count
+    """
+    print("Calling list_analytics_datasets tool")
+    return await list_analytics_datasets_tool()
+
+@agent.tool
+@cancellable_tool
+@timed_tool
+@memoized_tool()
+async def execute_analytics_query(ctx: RunContext[AgentDeps], sql_query: str) -> str:
+    """
+    Run a DuckDB SQL query against the typed analytics tables for spreadsheets and CSV files.
+    Prefer this over execute_sql_query for aggregations over tabular data - columns are already
+    typed, so no casting from jsonb is needed. Get table names from list_analytics_datasets first.
+
+    Example query:
+
+    SELECT region, SUM(revenue) AS total_revenue
+    FROM ds_sales_export_csv_1a2b3c4d
+    GROUP BY region
+    ORDER BY total_revenue DESC;
+    
+    Args:
+        ctx: The context for the agent
+        sql_query: The DuckDB SQL query to execute (must be read-only)
+        
+    Returns:
+        str: The results of the SQL query in JSON format
+    """
+    print(f"Calling execute_analytics_query tool with SQL: {sql_query}")
+    return await execute_analytics_query_tool(sql_query)
+
+@agent.tool
+@cancellable_tool
+@timed_tool
+@memoized_tool("query")
 async def image_analysis(ctx: RunContext[AgentDeps], document_id: str, query: str) -> str:
     """
     Analyzes an image based on the document ID of the image provided.
@@ -188,6 +326,8 @@ async def image_analysis(ctx: RunContext[AgentDeps], document_id: str, query: st
 # Using the MCP server instead for code execution, but you can use this simple version
 # if you don't want to use MCP for whatever reason! Just uncomment the line below:
 @agent.tool
+@cancellable_tool
+@timed_tool
 async def execute_code(ctx: RunContext[AgentDeps], code: str) -> str:
     """
     Executes a given Python code string in a protected environment.
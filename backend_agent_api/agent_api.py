@@ -1,8 +1,8 @@
-from typing import List, Optional, Dict, Any, AsyncIterator, Union, Tuple
-from fastapi import FastAPI, HTTPException, Security, Depends, Request, Form
+from typing import List, Optional, Dict, Any, AsyncIterator, Union, Tuple, Set
+from fastapi import FastAPI, HTTPException, Security, Depends, Request, Form, Query
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, Response, JSONResponse, FileResponse
 from contextlib import asynccontextmanager, nullcontext
 from supabase import create_client, Client
 from datetime import datetime, timezone, timedelta
@@ -12,6 +12,9 @@ from httpx import AsyncClient
 from pathlib import Path
 from mem0 import Memory
 import asyncio
+import weakref
+import uuid
+import binascii
 import base64
 import time
 import json
@@ -31,7 +34,10 @@ from db_utils import (
     store_message,
     convert_history_to_pydantic_format,
     check_rate_limit,
-    store_request
+    build_message_record,
+    store_messages_batch,
+    store_requests_batch,
+    fetch_last_ingest
 )
 
 from pydantic_ai import Agent, BinaryContent
@@ -41,8 +47,58 @@ from pydantic_ai.messages import (
     UserPromptPart, PartDeltaEvent, PartStartEvent, TextPartDelta
 )
 
-from agent import agent, AgentDeps, get_model
+from agent import agent, AgentDeps, get_model, get_fast_model, active_tool_tasks, active_tool_cache
 from clients import get_agent_clients, get_mem0_client_async
+from memory_client import ResilientMemoryClient
+from background_jobs import BackgroundJobQueue, PartialBatchFailure
+from admission import AdmissionController, AdmissionRejected
+from model_router import ModelRouter, routing_context
+from tool_cache import SessionToolCaches
+from retrieval_prefetch import start_prefetch, prefetch_metrics
+from tools import retrieve_relevant_documents_tool
+from blob_store import BlobStore, BlobNotFound, BlobTooLarge, base64_decoded_size
+from attachment_index import AttachmentIndexes, is_image, is_indexable
+from sync_snapshot import (
+    SnapshotCache,
+    etag_matches,
+    sync_snapshot_activities_limit,
+    sync_snapshot_conflicts_limit
+)
+from sync_jobs import (
+    SYNC_TYPES,
+    SyncJobWorker,
+    coordinator_runner,
+    enqueue_sync_request,
+    get_sync_request,
+    sync_coordinator_url
+)
+from sync_events import (
+    SyncEventBroker,
+    StreamTickets,
+    format_sse,
+    sync_events_heartbeat_seconds
+)
+from sync_resolution import (
+    BULK_RESOLUTION_STRATEGIES,
+    bulk_resolve_conflicts,
+    sync_bulk_resolve_max_ids
+)
+from sync_pagination import (
+    MAX_PAGE_SIZE,
+    build_page,
+    decode_cursor,
+    keyset_filter,
+    select_fields
+)
+from stage_timing import (
+    StageTimingMiddleware,
+    timed_stage,
+    record_stage,
+    mark_streaming,
+    request_trace_context,
+    metrics_payload,
+    CONTENT_TYPE_LATEST
+)
 
 # Check if we're in production
 is_production = os.getenv("ENVIRONMENT") == "production"
@@ -63,6 +119,131 @@ http_client = None
 title_agent = None
 mem0_client = None
 tracer = None
+job_queue = None
+model_router = None
+sync_worker = None
+
+# Bounds concurrent agent runs per process, globally and per user
+admission_controller = AdmissionController()
+# Tool results are reused across the runs of a session until their TTL expires
+tool_caches = SessionToolCaches()
+# How often to check whether the RAG pipeline ingested new documents - cached tool results are dropped when it has
+tool_cache_ingest_poll_seconds = float(os.getenv("TOOL_CACHE_INGEST_POLL_SECONDS", "30"))
+ingest_watcher = None
+# Uploaded attachments - requests and stored messages only carry references into it
+blob_store = BlobStore()
+# How often expired blobs and abandoned partial uploads are removed
+blob_gc_interval_seconds = float(os.getenv("BLOB_GC_INTERVAL_SECONDS", "3600"))
+blob_gc_task = None
+# Extracted, embedded attachment text per session - only relevant chunks reach the prompt
+attachment_indexes = AttachmentIndexes()
+
+# How long a new turn waits for the previous turn's queued writes before reading history
+job_queue_flush_timeout = float(os.getenv("JOB_QUEUE_FLUSH_TIMEOUT", "5"))
+
+# How often a stream that has nothing to send checks whether the client went away
+disconnect_poll_interval = float(os.getenv("DISCONNECT_POLL_INTERVAL", "0.5"))
+agent_run_metrics = {"completed": 0, "cancelled": 0}
+
+# Fire-and-forget tasks are kept here so they aren't garbage collected mid-flight
+background_tasks: Set[asyncio.Task] = set()
+
+def track_background_task(task: asyncio.Task) -> asyncio.Task:
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+def cancel_agent_run(agent_task: asyncio.Task, tool_tasks: Set[asyncio.Task]):
+    """Cancel an agent run and any tool calls it still has in flight."""
+    agent_task.cancel()
+    for task in list(tool_tasks):
+        task.cancel()
+
+async def persist_cancelled_run(
+    session_id: str,
+    request_id: str,
+    query: str,
+    partial_response: str,
+    title_task: Optional[asyncio.Task] = None
+):
+    """
+    Store the partial answer of a run cancelled by a client disconnect.
+    
+    The message is marked with "cancelled" and carries message_data for the question
+    and partial answer, so the next turn still sees them in its history.
+    """
+    agent_run_metrics["cancelled"] += 1
+    try:
+        history = [ModelRequest(parts=[UserPromptPart(content=query)])]
+        if partial_response:
+            history.append(ModelResponse(parts=[TextPart(content=partial_response)]))
+        await job_queue.enqueue("store_message", {
+            "record": build_message_record(
+                session_id=session_id,
+                message_type="ai",
+                content=partial_response,
+                message_data=ModelMessagesTypeAdapter.dump_json(history),
+                data={"request_id": request_id, "cancelled": True}
+            )
+        }, key=session_id)
+        
+        # Still name a new conversation so it shows up properly in the sidebar
+        if title_task:
+            title = await title_task
+            await job_queue.enqueue("conversation_title", {"session_id": session_id, "title": title}, key=session_id)
+    except Exception as e:
+        print(f"Error storing cancelled response: {str(e)}")
+
+async def watch_ingests():
+    """Clear the tool caches whenever a RAG pipeline finishes ingesting changed documents."""
+    while True:
+        try:
+            if tool_caches.observe_ingest(await fetch_last_ingest(supabase)):
+                print("RAG pipeline ingested new documents - cleared cached tool results")
+        except Exception as e:
+            print(f"Error checking for new ingests: {str(e)}")
+        await asyncio.sleep(tool_cache_ingest_poll_seconds)
+
+async def collect_blob_garbage():
+    """Periodically delete expired blobs and leftovers of interrupted uploads."""
+    while True:
+        try:
+            deleted = await asyncio.to_thread(blob_store.collect_garbage)
+            if deleted:
+                print(f"Removed {deleted} expired attachment files")
+        except Exception as e:
+            print(f"Error collecting attachment garbage: {str(e)}")
+        await asyncio.sleep(blob_gc_interval_seconds)
+
+# Background job handlers - each receives every payload of its type in the current batch
+async def process_store_message_jobs(payloads: List[Dict[str, Any]]):
+    await store_messages_batch(supabase, [payload["record"] for payload in payloads])
+
+async def process_conversation_title_jobs(payloads: List[Dict[str, Any]]):
+    for payload in payloads:
+        await update_conversation_title(supabase, payload["session_id"], payload["title"])
+
+async def process_store_request_jobs(payloads: List[Dict[str, Any]]):
+    await store_requests_batch(supabase, payloads)
+
+async def process_mem0_add_jobs(payloads: List[Dict[str, Any]]):
+    # Coalesce adds per user so a burst of turns costs one Mem0 extraction each
+    messages_by_user: Dict[str, List[Dict[str, Any]]] = {}
+    indexes_by_user: Dict[str, List[int]] = {}
+    for index, payload in enumerate(payloads):
+        messages_by_user.setdefault(payload["user_id"], []).extend(payload["messages"])
+        indexes_by_user.setdefault(payload["user_id"], []).append(index)
+    if len(messages_by_user) < len(payloads):
+        print(f"Coalesced {len(payloads)} memory updates into {len(messages_by_user)}")
+    # Only retry the users whose add failed - the others already reached Mem0
+    failures: Dict[int, Exception] = {}
+    for user_id, messages in messages_by_user.items():
+        try:
+            await mem0_client.add(messages, user_id=user_id)
+        except Exception as e:
+            failures.update({index: e for index in indexes_by_user[user_id]})
+    if failures:
+        raise PartialBatchFailure(failures)
 
 # Define the lifespan context manager for the application
 @asynccontextmanager
@@ -71,7 +252,7 @@ async def lifespan(app: FastAPI):
     
     Handles initialization and cleanup of resources.
     """
-    global embedding_client, supabase, http_client, title_agent, mem0_client, tracer
+    global embedding_client, supabase, http_client, title_agent, mem0_client, tracer, job_queue, model_router, sync_worker, ingest_watcher, blob_gc_task
 
     # Initialize Langfuse tracer (returns None if not configured)
     tracer = configure_langfuse()    
@@ -79,18 +260,48 @@ async def lifespan(app: FastAPI):
     # Startup: Initialize all clients
     embedding_client, supabase = get_agent_clients()
     http_client = AsyncClient()
-    title_agent = Agent(model=get_model())
-    mem0_client = await get_mem0_client_async()
+    # Titles are short and simple, so they always use the fast tier
+    title_agent = Agent(model=get_fast_model())
+    model_router = ModelRouter(get_model(), get_fast_model() if os.getenv("LLM_FAST_CHOICE") else None)
+    mem0_client = ResilientMemoryClient(await get_mem0_client_async())
+    job_queue = BackgroundJobQueue({
+        "store_message": process_store_message_jobs,
+        "conversation_title": process_conversation_title_jobs,
+        "store_request": process_store_request_jobs,
+        "mem0_add": process_mem0_add_jobs
+    })
+    await job_queue.start()
+    if tool_cache_ingest_poll_seconds > 0:
+        ingest_watcher = asyncio.create_task(watch_ingests())
+    if blob_gc_interval_seconds > 0:
+        blob_gc_task = asyncio.create_task(collect_blob_garbage())
+    # Queued manual syncs run on the sync coordinator, so the worker needs its URL
+    if sync_coordinator_url:
+        sync_worker = SyncJobWorker(supabase, coordinator_runner(http_client))
+        await sync_worker.start()
+    else:
+        print("SYNC_COORDINATOR_URL not set - manual sync requests are queued but not run by this process")
     
     yield  # This is where the app runs
     
     # Shutdown: Clean up resources
+    await sync_event_broker.stop()
+    if ingest_watcher:
+        ingest_watcher.cancel()
+    if blob_gc_task:
+        blob_gc_task.cancel()
+    if sync_worker:
+        await sync_worker.stop()
+    if job_queue:
+        await job_queue.stop()
     if http_client:
         await http_client.aclose()
 
 # Initialize FastAPI app
 app = FastAPI(lifespan=lifespan)
 security = HTTPBearer()        
+# For endpoints that also take the token from a query parameter
+optional_security = HTTPBearer(auto_error=False)
 
 app.add_middleware(
     CORSMiddleware,
@@ -98,7 +309,10 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "ETag"],
 )
+# Per-stage timings for /metrics, tracing and the Server-Timing header
+app.add_middleware(StageTimingMiddleware)
 
 
 async def verify_token(credentials: HTTPAuthorizationCredentials = Security(security)) -> Dict[str, Any]:
@@ -129,13 +343,14 @@ async def verify_token(credentials: HTTPAuthorizationCredentials = Security(secu
         supabase_key = os.getenv("SUPABASE_SERVICE_KEY")
         
         # Make request to Supabase auth API to get user info using the global HTTP client
-        response = await http_client.get(
-            f"{supabase_url}/auth/v1/user",
-            headers={
-                "Authorization": f"Bearer {token}",
-                "apikey": supabase_key
-            }
-        )
+        with timed_stage("auth"):
+            response = await http_client.get(
+                f"{supabase_url}/auth/v1/user",
+                headers={
+                    "Authorization": f"Bearer {token}",
+                    "apikey": supabase_key
+                }
+            )
         
         # Check if the request was successful
         if response.status_code != 200:
@@ -149,11 +364,38 @@ async def verify_token(credentials: HTTPAuthorizationCredentials = Security(secu
         print(f"Authentication error: {str(e)}")
         raise HTTPException(status_code=401, detail=f"Authentication error: {str(e)}")
 
+# Single-use tickets that open an event stream without a bearer token in the URL
+stream_tickets = StreamTickets()
+
+async def verify_stream_token(
+    ticket: Optional[str] = Query(None),
+    credentials: Optional[HTTPAuthorizationCredentials] = Security(optional_security)
+) -> Dict[str, Any]:
+    """
+    Verify the caller of an event stream.
+    
+    Browsers' EventSource can't set headers, so instead of the Authorization header
+    the stream can be opened with a ticket from POST /api/sync/events/ticket.
+    
+    Raises:
+        HTTPException: If neither was sent, or the token or ticket is invalid
+    """
+    if credentials is not None:
+        return await verify_token(credentials)
+    if not ticket:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    user = stream_tickets.redeem(ticket)
+    if user is None:
+        raise HTTPException(status_code=401, detail="Invalid or expired stream ticket")
+    return user
+
 # Request/Response Models
 class FileAttachment(BaseModel):
     fileName: str
-    content: str  # Base64 encoded content
     mimeType: str
+    blob_id: Optional[str] = None  # Reference returned by /api/attachments
+    content: Optional[str] = None  # Base64 encoded content (legacy inline upload)
+    size: Optional[int] = None
 
 class AgentRequest(BaseModel):
     query: str
@@ -187,27 +429,159 @@ async def stream_error_response(error_message: str, session_id: str):
     }
     yield json.dumps(final_data).encode('utf-8') + b'\n'
 
+async def resolve_attachments(user_id: str, files: List[FileAttachment]) -> List[Dict[str, Any]]:
+    """
+    Turn a request's attachments into blob store references.
+
+    Attachments uploaded through /api/attachments are checked to exist for the user;
+    legacy inline base64 attachments are written to the store first, so stored
+    messages never carry file content.
+
+    Args:
+        user_id: The user the attachments belong to
+        files: The request's attachments
+
+    Returns:
+        List[Dict[str, Any]]: fileName, mimeType, blob_id and size for each usable attachment
+    """
+    references = []
+    for file in files:
+        try:
+            if file.blob_id:
+                # The size is taken from the store - the client's value is only checked against it
+                size = blob_store.size(user_id, file.blob_id)
+                if file.size is not None and file.size != size:
+                    raise BlobNotFound(f"Attachment {file.blob_id} is {size} bytes, not {file.size}")
+                stored = {"blob_id": file.blob_id, "size": size}
+            elif file.content:
+                stored = await blob_store.put_bytes(user_id, base64.b64decode(file.content))
+            else:
+                continue
+        except (BlobNotFound, BlobTooLarge, binascii.Error) as e:
+            print(f"Skipping attachment {file.fileName}: {str(e)}")
+            continue
+        references.append({"fileName": file.fileName, "mimeType": file.mimeType, **stored})
+    return references
+
+@app.post("/api/attachments")
+async def upload_attachment(
+    http_request: Request,
+    file_name: str,
+    user: Dict[str, Any] = Depends(verify_token)
+):
+    """
+    Stream an attachment into the blob store.
+
+    The request body is the raw file and its Content-Type header the file's MIME type.
+    The body is written to disk as it arrives, so large files are never held in memory.
+
+    Args:
+        http_request: The incoming request, read as a stream
+        file_name: Original name of the file
+        user: Authenticated user information
+
+    Returns:
+        Dict with the reference to send in AgentRequest.files (fileName, mimeType, blob_id, size)
+    """
+    content_length = http_request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > blob_store.max_bytes:
+        raise HTTPException(status_code=413, detail=f"Attachment exceeds the {blob_store.max_bytes} byte limit")
+
+    try:
+        stored = await blob_store.put_stream(user["id"], http_request.stream())
+    except BlobTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    return {
+        "fileName": file_name,
+        "mimeType": http_request.headers.get("content-type") or "application/octet-stream",
+        **stored
+    }
+
+@app.get("/api/attachments/{blob_id}")
+async def download_attachment(
+    blob_id: str,
+    file_name: Optional[str] = None,
+    mime_type: str = "application/octet-stream",
+    user: Dict[str, Any] = Depends(verify_token)
+):
+    """
+    Download an attachment the user uploaded earlier.
+
+    The store only keeps content, so the name and MIME type to serve it with are taken
+    from the message's attachment reference.
+
+    Args:
+        blob_id: The attachment's blob_id
+        file_name: Name to offer the download under
+        mime_type: Content-Type of the response
+        user: Authenticated user information
+    """
+    try:
+        path = blob_store.path(user["id"], blob_id)
+    except BlobNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return FileResponse(path, media_type=mime_type, filename=file_name)
+
 @app.post("/api/pydantic-agent")
-async def pydantic_agent(request: AgentRequest, user: Dict[str, Any] = Depends(verify_token)):
+async def pydantic_agent(request: AgentRequest, http_request: Request, user: Dict[str, Any] = Depends(verify_token)):
     # Verify that the user ID in the request matches the user ID from the token
     if request.user_id != user.get("id"):
         return StreamingResponse(
             stream_error_response("User ID in request does not match authenticated user", request.session_id),
             media_type='text/plain'
         )
-        
+    
+    # Inline attachments are decoded in memory, so refuse oversized ones before doing any work
+    for file in request.files or []:
+        if file.content and base64_decoded_size(file.content) > blob_store.max_bytes:
+            return StreamingResponse(
+                stream_error_response(f"Attachment {file.fileName} exceeds the {blob_store.max_bytes} byte limit", request.session_id),
+                media_type='text/plain',
+                status_code=413
+            )
+    
+    # Wait briefly for a run slot - shed load with a fast busy response rather than slowing every run down
+    try:
+        with timed_stage("admission"):
+            slot = await admission_controller.acquire(request.user_id)
+    except AdmissionRejected as e:
+        print(f"Rejecting request {request.request_id} ({e.reason}), retry after {e.retry_after}s")
+        return StreamingResponse(
+            stream_error_response(
+                f"The assistant is busy right now. Please try again in {e.retry_after} seconds.",
+                request.session_id
+            ),
+            media_type='text/plain',
+            status_code=503,
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    
+    streaming = False
+    retrieval_prefetch = None
     try:
         # Check rate limit
-        rate_limit_ok = await check_rate_limit(supabase, request.user_id)
+        with timed_stage("rate_limit"):
+            rate_limit_ok = await check_rate_limit(supabase, request.user_id)
         if not rate_limit_ok:
             return StreamingResponse(
                 stream_error_response("Rate limit exceeded. Please try again later.", request.session_id),
                 media_type='text/plain'
             )
         
-        # Start request tracking in parallel
-        request_tracking_task = asyncio.create_task(
-            store_request(supabase, request.request_id, request.user_id, request.query)
+        # Track the request in the background
+        await job_queue.enqueue("store_request", {
+            "request_id": request.request_id,
+            "user_id": request.user_id,
+            "query": request.query,
+            "timestamp": datetime.now(timezone.utc).isoformat()
+        })
+        
+        # Speculatively retrieve documents for the message while the history and memories load
+        retrieval_prefetch = start_prefetch(
+            request.query,
+            lambda query: retrieve_relevant_documents_tool(supabase, embedding_client, query),
+            has_files=bool(request.files)
         )
         
         session_id = request.session_id
@@ -215,49 +589,47 @@ async def pydantic_agent(request: AgentRequest, user: Dict[str, Any] = Depends(v
         conversation_title = None
         
         # Check if session_id is empty, create a new conversation if needed
-        if not session_id:
-            session_id = generate_session_id(request.user_id)
-            # Create a new conversation record
-            conversation_record = await create_conversation(supabase, request.user_id, session_id)
+        with timed_stage("session"):
+            if not session_id:
+                session_id = generate_session_id(request.user_id)
+                # Create a new conversation record
+                conversation_record = await create_conversation(supabase, request.user_id, session_id)
+            else:
+                # Make sure the previous turn's reply has been written so history stays in order
+                await job_queue.wait_for_key(session_id, timeout=job_queue_flush_timeout)
         
-        # Store user's query immediately with any file attachments
+        # Store user's query immediately with references to any file attachments
         file_attachments = None
         if request.files:
-            # Convert Pydantic models to dictionaries for storage
-            file_attachments = [{
-                "fileName": file.fileName,
-                "content": file.content,
-                "mimeType": file.mimeType
-            } for file in request.files]
+            with timed_stage("attachment_refs"):
+                file_attachments = await resolve_attachments(request.user_id, request.files)
             
-        await store_message(
-            supabase=supabase,
-            session_id=session_id,
-            message_type="human",
-            content=request.query,
-            files=file_attachments
-        )
-        
-        # Fetch conversation history from the DB
-        conversation_history = await fetch_conversation_history(supabase, session_id)
+        with timed_stage("store_message"):
+            await store_message(
+                supabase=supabase,
+                session_id=session_id,
+                message_type="human",
+                content=request.query,
+                files=file_attachments
+            )
         
-        # Convert conversation history to Pydantic AI format
-        pydantic_messages = await convert_history_to_pydantic_format(conversation_history)
+        with timed_stage("history"):
+            # Fetch conversation history from the DB
+            conversation_history = await fetch_conversation_history(supabase, session_id)
+            
+            # Convert conversation history to Pydantic AI format
+            pydantic_messages = await convert_history_to_pydantic_format(conversation_history)
         
-        # Retrieve relevant memories with Mem0
-        relevant_memories = {"results": []}
-        try:
-            relevant_memories = await mem0_client.search(query=request.query, user_id=request.user_id, limit=3)
-        except:
-            # Slight hack - retry again with a new connection pool
-            time.sleep(1)
+        # Retrieve relevant memories with Mem0 - returns no memories if Mem0 is slow or unhealthy
+        with timed_stage("memory"):
             relevant_memories = await mem0_client.search(query=request.query, user_id=request.user_id, limit=3)
-
         memories_str = "\n".join(f"- {entry['memory']}" for entry in relevant_memories["results"])
         
-        # Create memory task to run in parallel
-        memory_messages = [{"role": "user", "content": request.query}]
-        memory_task = asyncio.create_task(mem0_client.add(memory_messages, user_id=request.user_id))
+        # Queue the memory update - adds for the same user are coalesced by the worker
+        await job_queue.enqueue("mem0_add", {
+            "user_id": request.user_id,
+            "messages": [{"role": "user", "content": request.query}]
+        })
         
         # Start title generation in parallel if this is a new conversation
         title_task = None
@@ -275,83 +647,189 @@ async def pydantic_agent(request: AgentRequest, user: Dict[str, Any] = Depends(v
                 http_client=http_client,
                 brave_api_key=os.getenv("BRAVE_API_KEY", ""),
                 searxng_base_url=os.getenv("SEARXNG_BASE_URL", ""),
-                memories=memories_str
+                memories=memories_str,
+                retrieval_prefetch=retrieval_prefetch
             )
             
-            # Process any file attachments for the agent
-            binary_contents = []
-            if request.files:
-                for file in request.files:
-                    try:
-                        # Decode the base64 content
-                        binary_data = base64.b64decode(file.content)
-                        # Create a BinaryContent object
-                        fileMimeType = "application/pdf" if file.mimeType == "text/plain" else file.mimeType
-                        binary_content = BinaryContent(
-                            data=binary_data,
-                            media_type=fileMimeType
-                        )
-                        binary_contents.append(binary_content)
-                    except Exception as e:
-                        print(f"Error processing file {file.fileName}: {str(e)}")
+            # Process any file attachments for the agent - documents with extractable text are
+            # indexed for the session so only their relevant chunks are sent, the rest go as-is
+            with timed_stage("attachment_context"):
+                binary_contents = []
+                inline_texts = []
+                if file_attachments:
+                    for file in file_attachments:
+                        try:
+                            # Load the attachment from the blob store
+                            binary_data = await blob_store.get(request.user_id, file["blob_id"])
+                            if attachment_indexes.available and is_indexable(file["mimeType"]):
+                                chunk_count = await attachment_indexes.add(session_id, file, binary_data, embedding_client)
+                                # Nothing to search, e.g. a scanned PDF or an empty file
+                                if not chunk_count and file["mimeType"] == "application/pdf":
+                                    binary_contents.append(BinaryContent(data=binary_data, media_type=file["mimeType"]))
+                                elif not chunk_count:
+                                    inline_texts.append(f"Attached file {file['fileName']} could not be read: no text could be extracted from it.")
+                            elif file["mimeType"].startswith("text/"):
+                                # Without the text pipeline, plain text still goes in as text
+                                inline_texts.append(f"Attached file {file['fileName']}:\n\n{binary_data.decode('utf-8', errors='replace')}")
+                            else:
+                                binary_contents.append(BinaryContent(
+                                    data=binary_data,
+                                    media_type=file["mimeType"]
+                                ))
+                        except Exception as e:
+                            print(f"Error processing file {file['fileName']}: {str(e)}")
+            
+                # Attachments from earlier turns in the session stay searchable
+                attachment_context = None
+                try:
+                    attachment_context = await attachment_indexes.relevant_context(session_id, request.query, embedding_client)
+                except Exception as e:
+                    print(f"Error searching attachments: {str(e)}")
             
-            # Create input for the agent with the query and any binary contents
+            # Create input for the agent with the query, attachment excerpts and any binary contents
             agent_input = [request.query]
+            if attachment_context:
+                agent_input.append(attachment_context)
+            agent_input.extend(inline_texts)
             if binary_contents:
                 agent_input.extend(binary_contents)
             
-            full_response = ""
-            
-            # Use tracer context if available, otherwise use nullcontext
-            span_context = tracer.start_as_current_span("Pydantic-Ai-Trace") if tracer else nullcontext()
-            
-            with span_context as span:
-                if tracer and span:
-                    # Set user and session attributes for Langfuse
-                    span.set_attribute("langfuse.user.id", request.user_id)
-                    span.set_attribute("langfuse.session.id", session_id)
-                    span.set_attribute("input.value", request.query)
-                
-                # Run the agent with the user prompt, binary contents, and the chat history
-                async with agent.iter(agent_input, deps=agent_deps, message_history=pydantic_messages) as run:
-                    async for node in run:
-                        if Agent.is_model_request_node(node):
-                            # A model request node => We can stream tokens from the model's request
-                            async with node.stream(run.ctx) as request_stream:
-                                async for event in request_stream:
-                                    if isinstance(event, PartStartEvent) and event.part.part_kind == 'text':
-                                        yield json.dumps({"text": event.part.content}).encode('utf-8') + b'\n'
-                                        full_response += event.part.content
-                                    elif isinstance(event, PartDeltaEvent) and isinstance(event.delta, TextPartDelta):
-                                        delta = event.delta.content_delta
-                                        yield json.dumps({"text": full_response}).encode('utf-8') + b'\n'
-                                        full_response += delta
-                
-                # Set the output value after completion if tracing
-                if tracer and span:
-                    span.set_attribute("output.value", full_response)
-                    
-            # After streaming is complete, store the full response in the database
-            message_data = run.result.new_messages_json()
-            
-            # Store agent's response
-            await store_message(
-                supabase=supabase,
-                session_id=session_id,
-                message_type="ai",
-                content=full_response,
-                message_data=message_data,
-                data={"request_id": request.request_id}
+            # The agent runs in its own task so a client disconnect can cancel it, and the
+            # tool calls it started, without cancelling the response task itself
+            chunks: asyncio.Queue = asyncio.Queue()
+            run_state = {"full_response": "", "message_data": None}
+            tool_tasks: Set[asyncio.Task] = set()
+            # Simple requests go to the fast model, everything else to the strong one
+            previous_tier, recent_queries = routing_context(conversation_history)
+            tier, model = model_router.route(
+                request.query,
+                has_files=bool(request.files),
+                previous_tier=previous_tier,
+                recent_queries=recent_queries
             )
-            
+
+            async def run_agent():
+                active_tool_tasks.set(tool_tasks)
+                tool_scope = tool_caches.scope(session_id)
+                active_tool_cache.set(tool_scope)
+                try:
+                    # Use tracer context if available, otherwise use nullcontext
+                    span_context = tracer.start_as_current_span("Pydantic-Ai-Trace", context=request_trace_context()) if tracer else nullcontext()
+
+                    with span_context as span:
+                        if tracer and span:
+                            # Set user and session attributes for Langfuse
+                            span.set_attribute("langfuse.user.id", request.user_id)
+                            span.set_attribute("langfuse.session.id", session_id)
+                            span.set_attribute("input.value", request.query)
+                            span.set_attribute("admission.queue_wait_ms", round(slot.queue_wait * 1000, 1))
+                            span.set_attribute("model.tier", tier)
+
+                        run_start = time.monotonic()
+
+                        # Run the agent with the user prompt, binary contents, and the chat history
+                        async with agent.iter(agent_input, deps=agent_deps, message_history=pydantic_messages, model=model) as run:
+                            async for node in run:
+                                if Agent.is_model_request_node(node):
+                                    # A model request node => We can stream tokens from the model's request
+                                    async with node.stream(run.ctx) as request_stream:
+                                        async for event in request_stream:
+                                            if isinstance(event, PartStartEvent) and event.part.part_kind == 'text':
+                                                if "first_token" not in run_state:
+                                                    run_state["first_token"] = time.monotonic() - run_start
+                                                    record_stage("first_token", run_state["first_token"])
+                                                chunks.put_nowait(json.dumps({"text": event.part.content}).encode('utf-8') + b'\n')
+                                                run_state["full_response"] += event.part.content
+                                            elif isinstance(event, PartDeltaEvent) and isinstance(event.delta, TextPartDelta):
+                                                delta = event.delta.content_delta
+                                                chunks.put_nowait(json.dumps({"text": run_state["full_response"]}).encode('utf-8') + b'\n')
+                                                run_state["full_response"] += delta
+
+                        record_stage("agent_run", time.monotonic() - run_start)
+                        run_cost = model_router.record(tier, time.monotonic() - run_start, run.usage())
+
+                        # Set the output value after completion if tracing
+                        if tracer and span:
+                            span.set_attribute("output.value", run_state["full_response"])
+                            span.set_attribute("model.estimated_cost", run_cost)
+                            span.set_attribute("tool_cache.calls", tool_scope.calls)
+                            span.set_attribute("tool_cache.deduplicated", tool_scope.deduplicated)
+
+                    run_state["message_data"] = run.result.new_messages_json()
+                finally:
+                    # The run is over - free its slot and tell the response loop there's nothing more to send
+                    slot.release()
+                    tool_caches.record(tool_scope)
+                    if retrieval_prefetch:
+                        retrieval_prefetch.finish()
+                    chunks.put_nowait(None)
+
+            agent_task = asyncio.create_task(run_agent())
+            next_chunk = None
+            disconnected = True
+            try:
+                while True:
+                    if next_chunk is None:
+                        next_chunk = asyncio.ensure_future(chunks.get())
+                    done, _ = await asyncio.wait({next_chunk}, timeout=disconnect_poll_interval)
+                    if not done:
+                        # Nothing to send yet (e.g. a tool is running) - check the client is still there
+                        if await http_request.is_disconnected():
+                            print(f"Client disconnected, cancelling agent run for request {request.request_id}")
+                            return
+                        continue
+                    chunk = next_chunk.result()
+                    next_chunk = None
+                    if chunk is None:
+                        break
+                    yield chunk
+
+                disconnected = False
+                # Raises if the agent run failed
+                await agent_task
+            finally:
+                # Runs when we stop on a disconnect, or when the server cancels or closes the stream
+                if disconnected:
+                    if next_chunk is not None:
+                        next_chunk.cancel()
+                    cancel_agent_run(agent_task, tool_tasks)
+                    # The run task may be cancelled before it ever started
+                    slot.release()
+                    if retrieval_prefetch:
+                        retrieval_prefetch.finish()
+                    # Persist from a separate task - awaiting here could be cancelled again
+                    track_background_task(asyncio.create_task(persist_cancelled_run(
+                        session_id, request.request_id, request.query, run_state["full_response"], title_task
+                    )))
+
+            agent_run_metrics["completed"] += 1
+            full_response = run_state["full_response"]
+
+            # After streaming is complete, queue the agent's response for storage
+            with timed_stage("final_writes"):
+                await job_queue.enqueue("store_message", {
+                    "record": build_message_record(
+                        session_id=session_id,
+                        message_type="ai",
+                        content=full_response,
+                        message_data=run_state["message_data"],
+                        # Recorded so the next turn of the thread isn't downgraded
+                        data={"request_id": request.request_id, "model_tier": tier}
+                    )
+                }, key=session_id)
+
             # Wait for title generation to complete if it's running
             if title_task:
                 try:
-                    title_result = await title_task
+                    with timed_stage("title_wait"):
+                        title_result = await title_task
                     conversation_title = title_result
-                    # Update the conversation title in the database
-                    await update_conversation_title(supabase, session_id, conversation_title)
-                    
+                    # Update the conversation title in the background
+                    await job_queue.enqueue("conversation_title", {
+                        "session_id": session_id,
+                        "title": conversation_title
+                    }, key=session_id)
+
                     # Send the final title in the last chunk
                     final_data = {
                         "text": full_response,
@@ -364,23 +842,16 @@ async def pydantic_agent(request: AgentRequest, user: Dict[str, Any] = Depends(v
                     print(f"Error processing title: {str(e)}")
             else:
                 yield json.dumps({"text": full_response, "complete": True}).encode('utf-8') + b'\n'
-
-            # Wait for the memory task to complete if needed
-            try:
-                await memory_task
-            except Exception as e:
-                print(f"Error updating memories: {str(e)}")
-                
-            # Wait for request tracking task to complete
-            try:
-                await request_tracking_task
-            except Exception as e:
-                print(f"Error tracking request: {str(e)}")
-            except asyncio.CancelledError:
-                # This is expected if the task was cancelled
-                pass
         
-        return StreamingResponse(stream_response(), media_type='text/plain')
+        response_stream = stream_response()
+        # Most stages run after the headers are sent - they're reported via /metrics and tracing instead
+        mark_streaming()
+        # Free the slot even if the stream is dropped without ever being iterated
+        weakref.finalize(response_stream, slot.release)
+        if retrieval_prefetch:
+            weakref.finalize(response_stream, retrieval_prefetch.finish)
+        streaming = True
+        return StreamingResponse(response_stream, media_type='text/plain')
 
     except Exception as e:
         print(f"Error processing request: {str(e)}")
@@ -398,6 +869,12 @@ async def pydantic_agent(request: AgentRequest, user: Dict[str, Any] = Depends(v
             stream_error_response(f"Error: {str(e)}", request.session_id),
             media_type='text/plain'
         )
+    finally:
+        # Early returns and errors never reach the agent run, so release the slot here
+        if not streaming:
+            slot.release()
+            if retrieval_prefetch:
+                retrieval_prefetch.finish()
 
 
 # ==============================================================================
@@ -446,10 +923,164 @@ class SyncConflictResponse(BaseModel):
     created_at: str
     updated_at: str
 
+class SyncConflictSummary(BaseModel):
+    id: str
+    entity_type: str
+    entity_id: str
+    conflict_fields: List[str]
+    resolution_strategy: str
+    created_at: str
+    updated_at: str
+
+class SyncPageResponse(BaseModel):
+    # Rows hold only the requested fields
+    items: List[Dict[str, Any]]
+    next_cursor: Optional[str] = None
+
+# Columns the list endpoints can project - the conflict list leaves out the data blobs by default
+ACTIVITY_FIELDS = ["id"] + list(SyncActivityResponse.model_fields) + ["sync_attempts"]
+CONFLICT_FIELDS = list(SyncConflictResponse.model_fields)
+CONFLICT_LIST_FIELDS = [field for field in CONFLICT_FIELDS if field not in ("keap_data", "supabase_data")]
+
+class BulkConflictResolutionRequest(BaseModel):
+    resolution_strategy: str  # 'keap_wins' or 'supabase_wins'
+    resolution_notes: Optional[str] = None
+    # Either the conflicts to resolve...
+    conflict_ids: Optional[List[str]] = None
+    # ...or a filter over the pending conflicts
+    entity_type: Optional[str] = None
+    created_after: Optional[str] = None
+    created_before: Optional[str] = None
+
 class ManualSyncRequest(BaseModel):
     keap_account_id: str
     sync_type: Optional[str] = "all"  # 'contacts', 'orders', 'tags', 'subscriptions', 'all'
 
+async def compute_sync_snapshot() -> Dict[str, Any]:
+    """Everything the sync dashboard shows, from one RPC."""
+    # The Supabase client is synchronous, so run the RPC off the event loop
+    response = await asyncio.to_thread(supabase.rpc('get_sync_dashboard_snapshot', {
+        'activities_limit': sync_snapshot_activities_limit,
+        'conflicts_limit': sync_snapshot_conflicts_limit
+    }).execute)
+    data = response.data or {}
+    stats = data.get('statistics') or {}
+    health = data.get('health') or {}
+    return {
+        "generated_at": data.get('generated_at') or datetime.now(timezone.utc).isoformat(),
+        "statistics": SyncStatisticsResponse(
+            total_contacts=stats.get('total_contacts', 0),
+            total_orders=stats.get('total_orders', 0),
+            total_tags=stats.get('total_tags', 0),
+            total_subscriptions=stats.get('total_subscriptions', 0),
+            last_sync_time=stats.get('last_sync_time'),
+            pending_conflicts=stats.get('pending_conflicts', 0),
+            total_sync_operations=stats.get('total_sync_operations', 0),
+            successful_syncs=stats.get('successful_syncs', 0),
+            failed_syncs=stats.get('failed_syncs', 0)
+        ).model_dump(),
+        # Same fields as /api/sync/health - generated_at stands in for last_updated
+        "health": {
+            "total_entities": health.get('total_entities', 0),
+            "successful_syncs": health.get('successful_syncs', 0),
+            "failed_syncs": health.get('failed_syncs', 0),
+            "pending_conflicts": health.get('pending_conflicts', 0),
+            "health_score": float(health.get('health_score', 100.0))
+        },
+        "activities": [SyncActivityResponse(**activity).model_dump() for activity in data.get('activities') or []],
+        "conflicts": [SyncConflictSummary(**conflict).model_dump() for conflict in data.get('conflicts') or []]
+    }
+
+# Shared by every dashboard - computed at most once per TTL and refreshed in the background
+sync_snapshot_cache = SnapshotCache(compute_sync_snapshot)
+
+@app.get("/api/sync/snapshot")
+async def get_sync_snapshot(http_request: Request, user: Dict[str, Any] = Depends(verify_token)):
+    """
+    Get everything the sync dashboard shows in one request.
+    
+    Returns statistics, health metrics, recent activities and pending conflict summaries
+    from a server-side cache. Clients should send the ETag back in If-None-Match and get
+    a 304 while nothing has changed.
+    
+    Returns:
+        JSONResponse: The snapshot, or an empty 304 if the client's copy is current
+    """
+    try:
+        snapshot, etag = await sync_snapshot_cache.get()
+    except Exception as e:
+        print(f"Error getting sync snapshot: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to get sync snapshot: {str(e)}")
+    
+    # no-cache: browsers may keep the snapshot but must revalidate it on every poll
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(http_request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(snapshot, headers=headers)
+
+async def fetch_sync_changes(params: Dict[str, Any]) -> Dict[str, Any]:
+    response = await asyncio.to_thread(supabase.rpc('get_sync_changes', params).execute)
+    return response.data
+
+# One change poller feeds every /api/sync/events subscriber
+sync_event_broker = SyncEventBroker(fetch_sync_changes)
+
+@app.post("/api/sync/events/ticket")
+async def issue_sync_events_ticket(user: Dict[str, Any] = Depends(verify_token)):
+    """
+    Trade the bearer token for a single-use ticket to open /api/sync/events with.
+    
+    Returns:
+        Dict with the ticket and how many seconds it stays valid
+    """
+    return {"ticket": stream_tickets.issue(user), "expires_in": int(stream_tickets.ttl_seconds)}
+
+@app.get("/api/sync/events")
+async def stream_sync_events(http_request: Request, user: Dict[str, Any] = Depends(verify_stream_token)):
+    """
+    Stream live sync activity as server-sent events.
+    
+    Events are sync_status (a sync_status row changed), conflict_created (a new
+    conflict) and health (the health metrics changed - also sent on connect). Nothing
+    is replayed on reconnect, so clients should reload /api/sync/snapshot when the
+    stream (re)opens. EventSource clients authenticate with ?ticket= from
+    /api/sync/events/ticket, fetching a new ticket for every reconnect.
+    
+    Returns:
+        StreamingResponse: A text/event-stream that runs until the client disconnects
+    """
+    queue = sync_event_broker.subscribe()
+
+    async def event_stream():
+        try:
+            # Reconnect after 5 seconds if the connection drops
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=sync_events_heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    if await http_request.is_disconnected():
+                        break
+                    yield ": keep-alive\n\n"
+                    continue
+                if event is None:
+                    # Shutting down, or this client fell too far behind
+                    break
+                yield format_sse(event)
+        finally:
+            sync_event_broker.unsubscribe(queue)
+
+    response_stream = event_stream()
+    # Unsubscribe even if the stream is dropped without ever being iterated
+    weakref.finalize(response_stream, sync_event_broker.unsubscribe, queue)
+    mark_streaming()
+    return StreamingResponse(
+        response_stream,
+        media_type="text/event-stream",
+        # no-transform and X-Accel-Buffering stop proxies from buffering the stream
+        headers={"Cache-Control": "no-cache, no-transform", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/api/sync/statistics", response_model=SyncStatisticsResponse)
 async def get_sync_statistics(user: Dict[str, Any] = Depends(verify_token)):
     """
@@ -526,81 +1157,110 @@ async def get_sync_health_metrics(user: Dict[str, Any] = Depends(verify_token)):
         print(f"Error getting sync health metrics: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to get sync health metrics: {str(e)}")
 
-@app.get("/api/sync/activities", response_model=List[SyncActivityResponse])
+@app.get("/api/sync/activities", response_model=SyncPageResponse)
 async def get_recent_sync_activities(
-    limit: int = 20,
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
     user: Dict[str, Any] = Depends(verify_token)
 ):
     """
-    Get recent sync activities for dashboard.
+    Get recent sync activities for dashboard, newest first.
     
     Args:
-        limit: Number of activities to return (default: 20)
+        limit: Number of activities per page (default: 20)
+        cursor: next_cursor from the previous page, omitted for the first page
+        fields: Comma-separated columns to return (default: all activity fields)
         
     Returns:
-        List[SyncActivityResponse]: Recent sync activities
+        SyncPageResponse: A page of activities and the cursor for the next one
     """
     try:
-        response = supabase.rpc('get_recent_sync_activities', {'limit_param': limit}).execute()
-        
-        if response.data:
-            return [
-                SyncActivityResponse(
-                    entity_type=activity['entity_type'],
-                    entity_id=activity['entity_id'],
-                    keap_id=activity['keap_id'],
-                    last_synced_at=activity['last_synced_at'],
-                    sync_direction=activity['sync_direction'],
-                    conflict_status=activity['conflict_status'],
-                    last_error=activity.get('last_error')
-                )
-                for activity in response.data
-            ]
-        else:
-            return []
+        columns = select_fields(fields, ACTIVITY_FIELDS, default=ACTIVITY_FIELDS, required=("id", "last_synced_at"))
+        position = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        query = supabase.table('sync_status').select(",".join(columns))
+        if position:
+            query = query.or_(keyset_filter('last_synced_at', 'id', position))
+        query = query.order('last_synced_at', desc=True).order('id', desc=True).limit(limit + 1)
+        # The Supabase client is synchronous, so run the query off the event loop
+        response = await asyncio.to_thread(query.execute)
+        return build_page(response.data or [], limit, 'last_synced_at')
     except Exception as e:
         print(f"Error getting sync activities: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to get sync activities: {str(e)}")
 
-@app.get("/api/sync/conflicts", response_model=List[SyncConflictResponse])
-async def get_pending_sync_conflicts(user: Dict[str, Any] = Depends(verify_token)):
+@app.get("/api/sync/conflicts", response_model=SyncPageResponse)
+async def get_pending_sync_conflicts(
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    user: Dict[str, Any] = Depends(verify_token)
+):
     """
-    Get pending sync conflicts that need resolution.
+    Get pending sync conflicts that need resolution, newest first.
+    
+    The keap_data and supabase_data blobs are left out unless asked for in fields -
+    /api/sync/conflicts/{conflict_id} returns a single conflict in full.
     
+    Args:
+        limit: Number of conflicts per page (default: 50)
+        cursor: next_cursor from the previous page, omitted for the first page
+        fields: Comma-separated columns to return (default: everything but the data blobs)
+        
     Returns:
-        List[SyncConflictResponse]: Pending sync conflicts
+        SyncPageResponse: A page of conflicts and the cursor for the next one
     """
     try:
-        response = supabase.table('sync_conflicts') \
-            .select('*') \
-            .is_('resolved_at', 'null') \
-            .order('created_at', desc=True) \
-            .execute()
-        
-        if response.data:
-            return [
-                SyncConflictResponse(
-                    id=conflict['id'],
-                    entity_type=conflict['entity_type'],
-                    entity_id=conflict['entity_id'],
-                    keap_data=conflict['keap_data'],
-                    supabase_data=conflict['supabase_data'],
-                    conflict_fields=conflict['conflict_fields'],
-                    resolution_strategy=conflict['resolution_strategy'],
-                    resolved_at=conflict.get('resolved_at'),
-                    resolved_by=conflict.get('resolved_by'),
-                    resolution_notes=conflict.get('resolution_notes'),
-                    created_at=conflict['created_at'],
-                    updated_at=conflict['updated_at']
-                )
-                for conflict in response.data
-            ]
-        else:
-            return []
+        columns = select_fields(fields, CONFLICT_FIELDS, default=CONFLICT_LIST_FIELDS, required=("id", "created_at"))
+        position = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        query = supabase.table('sync_conflicts') \
+            .select(",".join(columns)) \
+            .is_('resolved_at', 'null')
+        if position:
+            query = query.or_(keyset_filter('created_at', 'id', position))
+        query = query.order('created_at', desc=True).order('id', desc=True).limit(limit + 1)
+        response = await asyncio.to_thread(query.execute)
+        return build_page(response.data or [], limit, 'created_at')
     except Exception as e:
         print(f"Error getting sync conflicts: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to get sync conflicts: {str(e)}")
 
+@app.get("/api/sync/conflicts/{conflict_id}", response_model=SyncConflictResponse)
+async def get_sync_conflict(conflict_id: str, user: Dict[str, Any] = Depends(verify_token)):
+    """
+    Get one sync conflict with its full Keap and Supabase data.
+    
+    Args:
+        conflict_id: UUID of the conflict
+        
+    Returns:
+        SyncConflictResponse: The conflict
+    """
+    try:
+        uuid.UUID(conflict_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Conflict not found")
+    
+    try:
+        response = await asyncio.to_thread(
+            supabase.table('sync_conflicts').select('*').eq('id', conflict_id).limit(1).execute
+        )
+    except Exception as e:
+        print(f"Error getting sync conflict: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to get sync conflict: {str(e)}")
+    
+    if not response.data:
+        raise HTTPException(status_code=404, detail="Conflict not found")
+    return SyncConflictResponse(**response.data[0])
+
 @app.post("/api/sync/conflicts/{conflict_id}/resolve")
 async def resolve_sync_conflict(
     conflict_id: str,
@@ -627,6 +1287,8 @@ async def resolve_sync_conflict(
         }).execute()
         
         if response.data:
+            # Dashboards should see the resolution on their next poll
+            sync_snapshot_cache.invalidate()
             return {"success": True, "message": "Conflict resolved successfully"}
         else:
             raise HTTPException(status_code=400, detail="Failed to resolve conflict")
@@ -635,53 +1297,148 @@ async def resolve_sync_conflict(
         print(f"Error resolving sync conflict: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to resolve conflict: {str(e)}")
 
+@app.post("/api/sync/conflicts/resolve")
+async def bulk_resolve_sync_conflicts(
+    request: BulkConflictResolutionRequest,
+    user: Dict[str, Any] = Depends(verify_token)
+):
+    """
+    Resolve many sync conflicts with one strategy.
+    
+    Takes either conflict_ids or a filter (entity_type, created_after, created_before)
+    over the pending conflicts. Conflicts are resolved in batched transactions, and a
+    conflict that fails doesn't undo the others. Closing the stream stops after the
+    current batch.
+    
+    Args:
+        request: The strategy and the conflicts to resolve
+        user: Authenticated user information
+        
+    Returns:
+        StreamingResponse: One JSON line per batch with resolved, failed and total counts,
+        then a final line with complete=True and the failures
+    """
+    if request.resolution_strategy not in BULK_RESOLUTION_STRATEGIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid resolution strategy. Must be one of: {', '.join(BULK_RESOLUTION_STRATEGIES)}"
+        )
+    filters = {
+        'entity_type': request.entity_type,
+        'created_after': request.created_after,
+        'created_before': request.created_before
+    }
+    has_filter = any(filters.values())
+    if (request.conflict_ids is None) == (not has_filter):
+        raise HTTPException(status_code=400, detail="Pass either conflict_ids or a filter, not both")
+    if request.conflict_ids is not None:
+        if len(request.conflict_ids) > sync_bulk_resolve_max_ids:
+            raise HTTPException(status_code=400, detail=f"At most {sync_bulk_resolve_max_ids} conflict IDs per request")
+        try:
+            # Also drops duplicates, which would fail as already resolved
+            conflict_ids = list(dict.fromkeys(str(uuid.UUID(conflict_id)) for conflict_id in request.conflict_ids))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid conflict ID")
+    else:
+        conflict_ids = None
+
+    print(f"Bulk {request.resolution_strategy} resolution by user {user['id']}: "
+          f"{f'{len(conflict_ids)} conflicts' if conflict_ids is not None else f'filter {filters}'}")
+
+    async def progress_stream():
+        try:
+            async for progress in bulk_resolve_conflicts(
+                supabase,
+                request.resolution_strategy,
+                user['id'],
+                notes=request.resolution_notes,
+                conflict_ids=conflict_ids,
+                filters=filters
+            ):
+                yield json.dumps(progress).encode('utf-8') + b'\n'
+        except Exception as e:
+            print(f"Error resolving sync conflicts: {str(e)}")
+            yield json.dumps({"error": f"Failed to resolve conflicts: {str(e)}", "complete": True}).encode('utf-8') + b'\n'
+        finally:
+            # Dashboards should see the resolutions on their next poll
+            sync_snapshot_cache.invalidate()
+
+    mark_streaming()
+    return StreamingResponse(progress_stream(), media_type='text/plain')
+
 @app.post("/api/sync/trigger")
 async def trigger_manual_sync(
     request: ManualSyncRequest,
     user: Dict[str, Any] = Depends(verify_token)
 ):
     """
-    Trigger a manual sync operation.
+    Queue a manual sync operation.
+    
+    Triggers for an account and sync type that already has a pending request are
+    folded into it, so repeated clicks run one sync. Poll /api/sync/requests/{request_id}
+    for progress.
     
     Args:
         request: Manual sync request parameters
         user: Authenticated user information
         
     Returns:
-        Dict with sync trigger confirmation
+        Dict with the queued request's ID and status
     """
+    sync_type = request.sync_type or "all"
+    if sync_type not in SYNC_TYPES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid sync type. Must be one of: {', '.join(SYNC_TYPES)}"
+        )
+    
     try:
-        # This endpoint would typically communicate with the sync worker
-        # For now, we'll just log the request and return success
-        print(f"Manual sync triggered by user {user['id']}: {request.dict()}")
-        
-        # In a real implementation, this would:
-        # 1. Validate the Keap account ID
-        # 2. Send a message to the sync worker or coordinator
-        # 3. Track the sync request in the database
-        
-        # Store the sync trigger request
-        trigger_data = {
-            "keap_account_id": request.keap_account_id,
-            "sync_type": request.sync_type,
-            "triggered_by": user['id'],
-            "triggered_at": datetime.now(timezone.utc).isoformat(),
-            "status": "pending"
-        }
-        
-        # You would store this in a sync_requests table or send to sync worker
-        print(f"Sync trigger stored: {trigger_data}")
-        
-        return {
-            "success": True,
-            "message": f"Manual sync triggered for {request.sync_type}",
-            "keap_account_id": request.keap_account_id,
-            "sync_type": request.sync_type
-        }
-        
+        sync_request = await enqueue_sync_request(supabase, request.keap_account_id, sync_type, user['id'])
     except Exception as e:
         print(f"Error triggering manual sync: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to trigger manual sync: {str(e)}")
+    
+    coalesced = bool(sync_request.get('coalesced'))
+    print(f"Manual {sync_type} sync for {request.keap_account_id} by user {user['id']}: "
+          f"{'joined ' + sync_request['status'] if coalesced else 'queued'} request {sync_request['id']}")
+    if sync_worker:
+        sync_worker.wake()
+    
+    return {
+        "success": True,
+        "message": f"Manual sync {'already ' + sync_request['status'] if coalesced else 'queued'} for {sync_request['sync_type']}",
+        "request_id": sync_request['id'],
+        "status": sync_request['status'],
+        "coalesced": coalesced,
+        "keap_account_id": request.keap_account_id,
+        "sync_type": sync_request['sync_type']
+    }
+
+@app.get("/api/sync/requests/{request_id}")
+async def get_sync_request_status(request_id: str, user: Dict[str, Any] = Depends(verify_token)):
+    """
+    Get the status of a queued sync request.
+    
+    Args:
+        request_id: ID returned by /api/sync/trigger
+        
+    Returns:
+        Dict with the request's status (pending, running, succeeded or failed), attempts and last error
+    """
+    try:
+        uuid.UUID(request_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Sync request not found")
+    
+    try:
+        sync_request = await get_sync_request(supabase, request_id)
+    except Exception as e:
+        print(f"Error getting sync request: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to get sync request: {str(e)}")
+    
+    if not sync_request:
+        raise HTTPException(status_code=404, detail="Sync request not found")
+    return sync_request
 
 @app.get("/api/sync/status/{entity_type}")
 async def get_sync_status_by_type(
@@ -720,6 +1477,19 @@ async def get_sync_status_by_type(
         print(f"Error getting sync status by type: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to get sync status: {str(e)}")
 
+@app.get("/metrics")
+async def prometheus_metrics():
+    """
+    Prometheus metrics, including per-stage and per-tool latency histograms.
+    
+    Returns:
+        Response: Metrics in the Prometheus text exposition format
+    """
+    payload = metrics_payload()
+    if payload is None:
+        raise HTTPException(status_code=503, detail="prometheus_client is not installed")
+    return Response(content=payload, media_type=CONTENT_TYPE_LATEST)
+
 @app.get("/health")
 async def health_check():
     """
@@ -741,6 +1511,22 @@ async def health_check():
         }
     }
     
+    # Memory problems degrade answers but don't make the service unhealthy
+    if mem0_client is not None:
+        health_status["memory"] = mem0_client.metrics()
+    if job_queue is not None:
+        health_status["jobs"] = job_queue.metrics()
+    health_status["agent_runs"] = agent_run_metrics
+    health_status["admission"] = admission_controller.metrics()
+    if model_router is not None:
+        health_status["model_tiers"] = model_router.metrics()
+    health_status["tool_cache"] = tool_caches.metrics()
+    health_status["retrieval_prefetch"] = prefetch_metrics
+    health_status["attachments"] = attachment_indexes.metrics()
+    health_status["sync_snapshot"] = sync_snapshot_cache.metrics()
+    health_status["sync_jobs"] = sync_worker.metrics() if sync_worker else {"enabled": False}
+    health_status["sync_events"] = sync_event_broker.metrics()
+    
     # If any critical service is not initialized, mark as unhealthy
     if not all(health_status["services"].values()):
         health_status["status"] = "unhealthy"
@@ -0,0 +1,185 @@
+"""
+Per-session scratch index for chat attachments.
+
+Instead of sending every attachment whole to the model, documents are run through
+the RAG pipeline's text extraction and chunking, embedded, and kept in a small
+in-memory index for the session. Each turn only the chunks relevant to the question
+are packed into the prompt, so large uploads no longer blow up prompt size. Only
+formats with a real text extractor are indexed; images and other binary formats
+still go to the model as binary content.
+"""
+from typing import Any, Dict, List, Optional
+from collections import OrderedDict
+from openai import AsyncOpenAI
+from pathlib import Path
+import numpy as np
+import asyncio
+import time
+import sys
+import os
+
+from context_packing import select_chunks, pack_chunks, format_packed_context
+from tools import embedding_model
+
+# The RAG pipeline's common/ package - next to this service in the repo, or mounted into the container
+rag_pipeline_dir = os.getenv("RAG_PIPELINE_DIR") or str(Path(__file__).resolve().parent.parent / "backend_rag_pipeline")
+
+attachment_chunk_size = int(os.getenv("ATTACHMENT_CHUNK_SIZE", "400"))
+# Text beyond this many chunks per attachment isn't indexed
+attachment_max_chunks = int(os.getenv("ATTACHMENT_MAX_CHUNKS", "500"))
+# Approximate tokens of attachment text added to the prompt per turn
+attachment_token_budget = int(os.getenv("ATTACHMENT_TOKEN_BUDGET", "1500"))
+attachment_index_ttl_seconds = float(os.getenv("ATTACHMENT_INDEX_TTL_SECONDS", "3600"))
+attachment_index_max_sessions = int(os.getenv("ATTACHMENT_INDEX_MAX_SESSIONS", "200"))
+
+EMBEDDING_BATCH_SIZE = 100
+
+def _load_text_extraction():
+    """Import extract_text_from_file and chunk_text from the RAG pipeline if it's available."""
+    if rag_pipeline_dir not in sys.path:
+        sys.path.append(rag_pipeline_dir)
+    try:
+        # text_extraction reads no configuration on import, unlike the pipeline's text_processor
+        from common.text_extraction import extract_text_from_file, chunk_text
+        return extract_text_from_file, chunk_text
+    except ImportError as e:
+        print(f"RAG pipeline text extraction not available, attachments are sent inline: {e}")
+        return None, None
+
+extract_text_from_file, chunk_text = _load_text_extraction()
+
+# Formats extract_text_from_file really extracts - anything else would be decoded as garbage
+INDEXABLE_MIME_TYPES = {"application/pdf", "text/csv", "application/json"}
+
+def is_image(mime_type: str) -> bool:
+    return mime_type.startswith("image/")
+
+def is_indexable(mime_type: str) -> bool:
+    return mime_type.startswith("text/") or mime_type.split(";")[0].strip() in INDEXABLE_MIME_TYPES
+
+class SessionAttachmentIndex:
+    """Embedded chunks of the attachments uploaded in one session."""
+
+    def __init__(self):
+        # Blob ID -> number of chunks indexed for it
+        self.indexed_chunks: Dict[str, int] = {}
+        self.chunks: List[Dict[str, Any]] = []
+        self.embeddings: Optional[np.ndarray] = None
+        self.touched_at = time.monotonic()
+
+    def add(self, chunks: List[Dict[str, Any]], embeddings: List[List[float]]) -> None:
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        # Normalize once so a dot product is the cosine similarity
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        self.chunks.extend(chunks)
+        self.embeddings = vectors if self.embeddings is None else np.vstack([self.embeddings, vectors])
+
+    def search(self, query_embedding: List[float], limit: int) -> List[Dict[str, Any]]:
+        """Return the closest chunks as match_documents-style rows with a similarity."""
+        if self.embeddings is None or not self.chunks:
+            return []
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query /= max(float(np.linalg.norm(query)), 1e-12)
+        similarities = self.embeddings @ query
+        top = np.argsort(-similarities)[:limit]
+        return [{**self.chunks[i], "similarity": float(similarities[i])} for i in top]
+
+class AttachmentIndexes:
+    """LRU of per-session attachment indexes with a TTL."""
+
+    def __init__(
+        self,
+        ttl_seconds: float = attachment_index_ttl_seconds,
+        max_sessions: int = attachment_index_max_sessions,
+        token_budget: int = attachment_token_budget
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.token_budget = token_budget
+        self.sessions: "OrderedDict[str, SessionAttachmentIndex]" = OrderedDict()
+
+    @property
+    def available(self) -> bool:
+        return extract_text_from_file is not None and chunk_text is not None
+
+    def _get(self, session_id: str, create: bool = False) -> Optional[SessionAttachmentIndex]:
+        index = self.sessions.get(session_id)
+        if index is not None and time.monotonic() - index.touched_at > self.ttl_seconds:
+            del self.sessions[session_id]
+            index = None
+        if index is None and create:
+            index = self.sessions[session_id] = SessionAttachmentIndex()
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+        if index is not None:
+            index.touched_at = time.monotonic()
+            self.sessions.move_to_end(session_id)
+        return index
+
+    async def add(self, session_id: str, attachment: Dict[str, Any], data: bytes, embedding_client: AsyncOpenAI) -> int:
+        """
+        Extract, chunk and embed an attachment into the session's index.
+
+        Args:
+            session_id: The conversation the attachment belongs to
+            attachment: The blob reference (fileName, mimeType, blob_id)
+            data: The attachment's bytes
+            embedding_client: Client for the embedding model
+
+        Returns:
+            int: Number of chunks the attachment has in the index, 0 if no text could be extracted
+        """
+        index = self._get(session_id, create=True)
+        if attachment["blob_id"] in index.indexed_chunks:
+            return index.indexed_chunks[attachment["blob_id"]]
+
+        # PDF parsing is CPU-bound, keep it off the event loop
+        text = await asyncio.to_thread(extract_text_from_file, data, attachment["mimeType"], attachment["fileName"])
+        texts = chunk_text(text, chunk_size=attachment_chunk_size)[:attachment_max_chunks]
+        texts = [t for t in texts if t.strip()]
+        if not texts:
+            return 0
+
+        embeddings = []
+        for start in range(0, len(texts), EMBEDDING_BATCH_SIZE):
+            response = await embedding_client.embeddings.create(
+                model=embedding_model,
+                input=texts[start:start + EMBEDDING_BATCH_SIZE]
+            )
+            embeddings.extend(item.embedding for item in response.data)
+
+        index.add([{
+            "content": content,
+            "metadata": {
+                "file_id": attachment["blob_id"],
+                "file_title": attachment["fileName"],
+                "file_url": "attachment",
+                "chunk_index": i
+            }
+        } for i, content in enumerate(texts)], embeddings)
+        index.indexed_chunks[attachment["blob_id"]] = len(texts)
+        return len(texts)
+
+    async def relevant_context(self, session_id: str, query: str, embedding_client: AsyncOpenAI, candidates: int = 20) -> Optional[str]:
+        """
+        Pack the session's attachment chunks most relevant to the query.
+
+        Returns:
+            Optional[str]: Text to add to the prompt, or None if the session has no attachments
+        """
+        index = self._get(session_id)
+        if index is None or not index.chunks:
+            return None
+        response = await embedding_client.embeddings.create(model=embedding_model, input=query)
+        rows = index.search(response.data[0].embedding, candidates)
+        selected = select_chunks(rows, token_budget=self.token_budget)
+        if not selected:
+            return None
+        return "Relevant excerpts from the attached files:\n\n" + format_packed_context(pack_chunks(selected))
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "available": self.available,
+            "sessions": len(self.sessions),
+            "chunks": sum(len(index.chunks) for index in self.sessions.values())
+        }
@@ -0,0 +1,369 @@
+"""
+In-process background job queue with durable SQLite spill.
+
+Post-response writes (the AI message, the conversation title, Mem0 adds and
+request tracking) are enqueued here so the stream can finish as soon as the
+answer is sent. Every job is written to a local SQLite file before it is
+queued, so jobs that were pending when the process died are picked up again
+on the next start. Each job type has its own queue and worker, so a slow
+type (Mem0 adds) never holds up another (storing the AI reply). A worker drains
+its queue in batches, hands each batch to the type's handler and retries
+failed jobs with backoff. A batch that fails because of its contents is split
+until the bad jobs are isolated; one that fails because of an outage is
+retried as a whole.
+"""
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from collections import Counter
+import threading
+import asyncio
+import sqlite3
+import httpx
+import json
+import time
+import os
+
+job_queue_db_path = os.getenv("JOB_QUEUE_DB_PATH", "background_jobs.db")
+job_queue_batch_size = int(os.getenv("JOB_QUEUE_BATCH_SIZE", "50"))
+job_queue_max_attempts = int(os.getenv("JOB_QUEUE_MAX_ATTEMPTS", "5"))
+# How long the worker waits for more jobs to arrive before processing a partial batch
+job_queue_batch_wait = float(os.getenv("JOB_QUEUE_BATCH_WAIT", "0.05"))
+
+# Postgres error classes that say nothing about the rows: connection, transaction
+# rollback (deadlocks), insufficient resources and operator intervention
+TRANSIENT_SQLSTATE_CLASSES = ("08", "40", "53", "57")
+
+JobHandler = Callable[[List[Dict[str, Any]]], Awaitable[None]]
+
+class PartialBatchFailure(Exception):
+    """
+    Raised by a handler when only some payloads of its batch failed.
+
+    The other payloads are treated as done, and only the failed ones are retried.
+
+    Args:
+        failures: Index of each failed payload in the batch -> its error
+    """
+
+    def __init__(self, failures: Dict[int, Exception]):
+        super().__init__(f"{len(failures)} payloads failed")
+        self.failures = failures
+
+def is_transient_error(error: BaseException) -> bool:
+    """
+    Whether an error is about the service rather than the jobs sent to it.
+
+    Timeouts, connection errors, HTTP 5xx and Postgres connection/resource errors
+    would fail any batch, so splitting the batch to find a bad job is pointless.
+    """
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError, httpx.TransportError)):
+        return True
+    # postgrest's APIError carries the Postgres SQLSTATE or the HTTP status as its code
+    code = str(getattr(error, "code", "") or "")
+    if len(code) == 3 and code.startswith("5"):
+        return True
+    return len(code) == 5 and code[:2] in TRANSIENT_SQLSTATE_CLASSES
+
+class BackgroundJobQueue:
+    """
+    Batched, retrying job queue backed by SQLite.
+
+    Handlers receive every payload of their job type in the current batch, in
+    enqueue order, so they can turn many small writes into one bulk call or
+    coalesce them (e.g. one Mem0 add per user). A handler that can tell which
+    payloads failed raises PartialBatchFailure; any other error fails the batch.
+    An error may carry a retry_after (seconds) to delay the retry further.
+    """
+
+    def __init__(
+        self,
+        handlers: Dict[str, JobHandler],
+        db_path: str = job_queue_db_path,
+        batch_size: int = job_queue_batch_size,
+        max_attempts: int = job_queue_max_attempts,
+        batch_wait: float = job_queue_batch_wait
+    ):
+        self.handlers = handlers
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.batch_wait = batch_wait
+        self.queues: Dict[str, asyncio.Queue] = {}
+        self.worker_tasks: Dict[str, asyncio.Task] = {}
+        self.retry_tasks = set()
+        self.db: Optional[sqlite3.Connection] = None
+        self.db_lock = threading.Lock()
+        # Outstanding jobs per key (e.g. session ID) so callers can wait for them
+        self.key_counts: Counter = Counter()
+        self.key_changed: Optional[asyncio.Condition] = None
+        self.enqueued_at: Dict[int, float] = {}
+        self.in_flight: Counter = Counter()
+        self.last_job_lag_ms: Optional[float] = None
+        self.counters = {
+            "enqueued": 0,
+            "processed": 0,
+            "batches": 0,
+            "retries": 0,
+            "failed": 0,
+            "split": 0,
+            "recovered": 0
+        }
+
+    # --- SQLite persistence (runs in a worker thread) -----------------------
+
+    def _db_execute(self, sql: str, params: tuple = ()) -> List[tuple]:
+        with self.db_lock:
+            cursor = self.db.execute(sql, params)
+            rows = cursor.fetchall()
+            self.db.commit()
+            return rows
+
+    def _db_insert(self, job_type: str, payload: str, key: Optional[str], created_at: float) -> int:
+        with self.db_lock:
+            cursor = self.db.execute(
+                "INSERT INTO jobs (job_type, payload, job_key, created_at) VALUES (?, ?, ?, ?)",
+                (job_type, payload, key, created_at)
+            )
+            self.db.commit()
+            return cursor.lastrowid
+
+    def _open_db(self) -> None:
+        self.db = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                job_type TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                job_key TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL DEFAULT 'pending',
+                last_error TEXT,
+                created_at REAL NOT NULL
+            )"""
+        )
+        self.db.commit()
+
+    # --- Lifecycle ----------------------------------------------------------
+
+    async def start(self) -> None:
+        """Open the spill file, re-queue jobs left over from a previous run and start the workers."""
+        self.queues = {job_type: asyncio.Queue() for job_type in self.handlers}
+        self.key_changed = asyncio.Condition()
+        await asyncio.to_thread(self._open_db)
+
+        rows = await asyncio.to_thread(
+            self._db_execute,
+            "SELECT id, job_type, payload, job_key, attempts, created_at FROM jobs WHERE status = 'pending' ORDER BY id"
+        )
+        recovered = 0
+        for job_id, job_type, payload, key, attempts, created_at in rows:
+            if job_type not in self.queues:
+                # Left in SQLite until a handler for it is registered again
+                print(f"No handler for pending background job {job_id} of type '{job_type}'")
+                continue
+            self._track(job_id, key, created_at)
+            self.queues[job_type].put_nowait({
+                "id": job_id, "type": job_type, "payload": json.loads(payload),
+                "key": key, "attempts": attempts
+            })
+            recovered += 1
+        if recovered:
+            self.counters["recovered"] += recovered
+            print(f"Recovered {recovered} pending background jobs")
+
+        self.worker_tasks = {
+            job_type: asyncio.create_task(self._worker(job_type)) for job_type in self.queues
+        }
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Give the workers a chance to drain their queues, then stop. Unfinished jobs stay in SQLite."""
+        if not self.worker_tasks:
+            return
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(queue.join() for queue in self.queues.values())),
+                timeout=timeout
+            )
+        except asyncio.TimeoutError:
+            print(f"Stopping with {self.depth} background jobs still pending")
+        tasks = [*self.worker_tasks.values(), *self.retry_tasks]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.worker_tasks = {}
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+    # --- Public API ---------------------------------------------------------
+
+    async def enqueue(self, job_type: str, payload: Dict[str, Any], key: Optional[str] = None) -> int:
+        """
+        Persist a job and queue it for the worker.
+
+        Args:
+            job_type: Name of the registered handler
+            payload: JSON-serializable job data
+            key: Optional ordering key (e.g. a session ID) callers can wait on
+
+        Returns:
+            int: The job ID
+        """
+        if job_type not in self.handlers:
+            raise ValueError(f"No handler registered for job type '{job_type}'")
+        created_at = time.time()
+        job_id = await asyncio.to_thread(self._db_insert, job_type, json.dumps(payload), key, created_at)
+        self._track(job_id, key, created_at)
+        self.counters["enqueued"] += 1
+        self.queues[job_type].put_nowait({"id": job_id, "type": job_type, "payload": payload, "key": key, "attempts": 0})
+        return job_id
+
+    async def wait_for_key(self, key: str, timeout: float = 5.0) -> bool:
+        """
+        Wait until every job enqueued with this key has finished.
+
+        Returns:
+            bool: True if the key is drained, False if the timeout expired first
+        """
+        if self.key_changed is None or not self.key_counts.get(key):
+            return True
+        try:
+            async with self.key_changed:
+                await asyncio.wait_for(
+                    self.key_changed.wait_for(lambda: not self.key_counts.get(key)),
+                    timeout=timeout
+                )
+            return True
+        except asyncio.TimeoutError:
+            print(f"Timed out waiting for background jobs of {key}")
+            return False
+
+    @property
+    def depth(self) -> int:
+        """Jobs waiting, being retried or in flight."""
+        return len(self.enqueued_at)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Snapshot of queue depth, lag and counters."""
+        oldest = min(self.enqueued_at.values()) if self.enqueued_at else None
+        return {
+            **self.counters,
+            "depth": self.depth,
+            "in_flight": sum(self.in_flight.values()),
+            "oldest_pending_seconds": round(time.time() - oldest, 3) if oldest else 0.0,
+            "last_job_lag_ms": self.last_job_lag_ms
+        }
+
+    # --- Worker -------------------------------------------------------------
+
+    def _track(self, job_id: int, key: Optional[str], created_at: float) -> None:
+        self.enqueued_at[job_id] = created_at
+        if key:
+            self.key_counts[key] += 1
+
+    async def _untrack(self, job: Dict[str, Any]) -> None:
+        created_at = self.enqueued_at.pop(job["id"], None)
+        if created_at is not None:
+            self.last_job_lag_ms = round((time.time() - created_at) * 1000, 1)
+        key = job["key"]
+        if key:
+            self.key_counts[key] -= 1
+            if self.key_counts[key] <= 0:
+                del self.key_counts[key]
+            async with self.key_changed:
+                self.key_changed.notify_all()
+
+    async def _next_batch(self, queue: asyncio.Queue) -> List[Dict[str, Any]]:
+        batch = [await queue.get()]
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout=remaining))
+                else:
+                    batch.append(queue.get_nowait())
+            except (asyncio.TimeoutError, asyncio.QueueEmpty):
+                break
+        return batch
+
+    async def _worker(self, job_type: str) -> None:
+        queue = self.queues[job_type]
+        while True:
+            batch = await self._next_batch(queue)
+            self.in_flight[job_type] = len(batch)
+            try:
+                await self._run_jobs(job_type, batch)
+            finally:
+                self.in_flight[job_type] = 0
+                for _ in batch:
+                    queue.task_done()
+
+    async def _run_jobs(self, job_type: str, jobs: List[Dict[str, Any]]) -> None:
+        self.counters["batches"] += 1
+        try:
+            await self.handlers[job_type]([job["payload"] for job in jobs])
+        except PartialBatchFailure as e:
+            failures = {index: error for index, error in e.failures.items() if 0 <= index < len(jobs)}
+            print(f"Background {job_type} batch: {len(failures)} of {len(jobs)} jobs failed")
+            await self._complete([job for index, job in enumerate(jobs) if index not in failures])
+            for index, error in failures.items():
+                await self._retry_or_fail(jobs[index], error)
+            return
+        except Exception as e:
+            if len(jobs) > 1 and not is_transient_error(e):
+                # Split the batch until the jobs at fault are isolated, so they don't take the rest with them
+                print(f"Background {job_type} batch of {len(jobs)} failed ({e}), splitting it")
+                self.counters["split"] += 1
+                middle = len(jobs) // 2
+                await self._run_jobs(job_type, jobs[:middle])
+                await self._run_jobs(job_type, jobs[middle:])
+                return
+            print(f"Background {job_type} batch of {len(jobs)} failed: {e}")
+            for job in jobs:
+                await self._retry_or_fail(job, e)
+            return
+
+        await self._complete(jobs)
+
+    async def _complete(self, jobs: List[Dict[str, Any]]) -> None:
+        if not jobs:
+            return
+        job_ids = [job["id"] for job in jobs]
+        placeholders = ",".join("?" for _ in job_ids)
+        await asyncio.to_thread(self._db_execute, f"DELETE FROM jobs WHERE id IN ({placeholders})", tuple(job_ids))
+        self.counters["processed"] += len(jobs)
+        for job in jobs:
+            await self._untrack(job)
+
+    async def _retry_or_fail(self, job: Dict[str, Any], error: Exception) -> None:
+        job["attempts"] += 1
+        message = str(error) or error.__class__.__name__
+        if job["attempts"] >= self.max_attempts:
+            # Keep the job in SQLite as failed so it can be inspected or replayed by hand
+            await asyncio.to_thread(
+                self._db_execute,
+                "UPDATE jobs SET status = 'failed', attempts = ?, last_error = ? WHERE id = ?",
+                (job["attempts"], message, job["id"])
+            )
+            self.counters["failed"] += 1
+            print(f"Background {job['type']} job {job['id']} failed after {job['attempts']} attempts")
+            await self._untrack(job)
+            return
+
+        await asyncio.to_thread(
+            self._db_execute,
+            "UPDATE jobs SET attempts = ?, last_error = ? WHERE id = ?",
+            (job["attempts"], message, job["id"])
+        )
+        self.counters["retries"] += 1
+        delay = min(0.5 * (2 ** (job["attempts"] - 1)), 30.0)
+        delay = max(delay, getattr(error, "retry_after", None) or 0)
+        task = asyncio.create_task(self._requeue_later(job, delay))
+        self.retry_tasks.add(task)
+        task.add_done_callback(self.retry_tasks.discard)
+
+    async def _requeue_later(self, job: Dict[str, Any], delay: float) -> None:
+        await asyncio.sleep(delay)
+        self.queues[job["type"]].put_nowait(job)
@@ -0,0 +1,295 @@
+"""
+Offline load test for /api/pydantic-agent.
+
+Starts the stub LLM and Supabase from benchmarks.stubs, points the agent API at
+them, and drives concurrent multi-turn chat sessions against it over real HTTP.
+Prints p50/p95/p99 time to first token, end-to-end latency, tokens/sec and the
+error rate as JSON, so a change can be compared against a baseline run.
+
+Usage (from backend_agent_api/):
+    python -m benchmarks.load_test --sessions 50 --concurrency 20 --output results.json
+"""
+from typing import Any, Dict, List, Optional
+import tempfile
+import argparse
+import functools
+import threading
+import asyncio
+import socket
+import math
+import time
+import json
+import uuid
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import httpx
+import uvicorn
+
+from benchmarks.stubs import TOOL_SCRIPTS, create_llm_stub, create_supabase_stub
+
+QUERIES = [
+    "How much does the Pro plan cost?",
+    "What is the refund policy?",
+    "How long are backups kept?",
+    "Does the Enterprise plan support single sign-on?"
+]
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+class ServerThread:
+    """A uvicorn server on its own thread and event loop."""
+
+    def __init__(self, app, port: int):
+        self.port = port
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self, timeout: float = 30.0) -> "ServerThread":
+        self.thread.start()
+        deadline = time.monotonic() + timeout
+        while not self.server.started:
+            if not self.thread.is_alive() or time.monotonic() > deadline:
+                raise RuntimeError(f"Server on port {self.port} failed to start")
+            time.sleep(0.05)
+        return self
+
+    def stop(self) -> None:
+        self.server.should_exit = True
+        self.thread.join(timeout=30)
+
+class NullMemory:
+    """Mem0 stand-in - no stored memories, so no extra LLM calls per turn."""
+
+    async def search(self, query: str, user_id: str, limit: int = 3) -> Dict[str, Any]:
+        return {"results": []}
+
+    async def add(self, messages: List[Dict[str, Any]], user_id: str) -> Dict[str, Any]:
+        return {"results": []}
+
+def load_agent_api(llm_url: str, supabase_url: str, work_dir: str):
+    """
+    Import the agent API configured against the stubs.
+
+    The environment has to be set before the import, since the API reads most of its
+    settings at import time.
+    """
+    os.environ.update({
+        # Keeps the API from loading .env over these settings
+        "ENVIRONMENT": "production",
+        "LLM_BASE_URL": f"{llm_url}/v1",
+        "LLM_API_KEY": "load-test",
+        "LLM_CHOICE": "stub-model",
+        "EMBEDDING_BASE_URL": f"{llm_url}/v1",
+        "EMBEDDING_API_KEY": "load-test",
+        "SUPABASE_URL": supabase_url,
+        "SUPABASE_SERVICE_KEY": "load.test.key",
+        "BLOB_STORE_DIR": os.path.join(work_dir, "blobs")
+    })
+    import agent_api
+
+    # Keep runs offline even if a .env configured tracing or a second model
+    for name in ("LANGFUSE_PUBLIC_KEY", "LANGFUSE_SECRET_KEY", "LLM_FAST_CHOICE"):
+        os.environ.pop(name, None)
+
+    async def get_null_memory():
+        return NullMemory()
+
+    agent_api.get_mem0_client_async = get_null_memory
+    agent_api.BackgroundJobQueue = functools.partial(
+        agent_api.BackgroundJobQueue, db_path=os.path.join(work_dir, "background_jobs.db")
+    )
+    return agent_api
+
+async def run_turn(client: httpx.AsyncClient, user_id: str, session_id: str, query: str) -> Dict[str, Any]:
+    """Send one message and time the streamed reply."""
+    result = {"ok": False, "status": None, "ttft": None, "latency": None, "tokens": 0, "session_id": session_id, "error": None}
+    start = time.monotonic()
+    try:
+        async with client.stream(
+            "POST",
+            "/api/pydantic-agent",
+            headers={"Authorization": f"Bearer {user_id}"},
+            json={"query": query, "user_id": user_id, "request_id": str(uuid.uuid4()), "session_id": session_id}
+        ) as response:
+            result["status"] = response.status_code
+            final = None
+            async for line in response.aiter_lines():
+                if not line.strip():
+                    continue
+                chunk = json.loads(line)
+                if result["ttft"] is None and chunk.get("text"):
+                    result["ttft"] = time.monotonic() - start
+                if chunk.get("complete"):
+                    final = chunk
+        result["latency"] = time.monotonic() - start
+        if response.status_code != 200:
+            result["error"] = f"http_{response.status_code}"
+        elif final is None:
+            result["error"] = "incomplete_stream"
+        elif final.get("error"):
+            result["error"] = "error_response"
+        else:
+            result["ok"] = True
+            result["tokens"] = len(final.get("text", "").split())
+            result["session_id"] = final.get("session_id") or session_id
+    except Exception as e:
+        result["latency"] = time.monotonic() - start
+        result["error"] = type(e).__name__
+    return result
+
+async def run_session(client: httpx.AsyncClient, session_number: int, turns: int) -> List[Dict[str, Any]]:
+    """A multi-turn conversation by its own user - the first turn creates the session."""
+    user_id = f"load-test-user-{session_number}"
+    session_id = ""
+    results = []
+    for turn in range(turns):
+        result = await run_turn(client, user_id, session_id, QUERIES[(session_number + turn) % len(QUERIES)])
+        session_id = result["session_id"]
+        results.append(result)
+    return results
+
+async def drive(base_url: str, sessions: int, turns: int, concurrency: int, timeout: float) -> List[Dict[str, Any]]:
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        async def bounded(session_number: int):
+            async with semaphore:
+                return await run_session(client, session_number, turns)
+
+        per_session = await asyncio.gather(*(bounded(i) for i in range(sessions)))
+    return [result for results in per_session for result in results]
+
+def percentiles(values: List[float], scale: float = 1.0) -> Dict[str, Optional[float]]:
+    """Nearest-rank p50/p95/p99 of the values."""
+    if not values:
+        return {"p50": None, "p95": None, "p99": None}
+    ordered = sorted(values)
+    def rank(pct: float) -> float:
+        index = min(len(ordered), max(1, math.ceil(pct / 100 * len(ordered)))) - 1
+        return round(ordered[index] * scale, 2)
+    return {"p50": rank(50), "p95": rank(95), "p99": rank(99)}
+
+def summarize(results: List[Dict[str, Any]], wall_seconds: float) -> Dict[str, Any]:
+    """Aggregate per-turn results into the report."""
+    succeeded = [r for r in results if r["ok"]]
+    errors: Dict[str, int] = {}
+    for r in results:
+        if not r["ok"]:
+            errors[r["error"]] = errors.get(r["error"], 0) + 1
+    # Streaming rate per reply, from the first token to the end of the stream
+    stream_rates = [
+        r["tokens"] / (r["latency"] - r["ttft"])
+        for r in succeeded if r["ttft"] is not None and r["latency"] > r["ttft"]
+    ]
+    total_tokens = sum(r["tokens"] for r in succeeded)
+    return {
+        "requests": len(results),
+        "succeeded": len(succeeded),
+        "error_rate": round((len(results) - len(succeeded)) / len(results), 4) if results else 0.0,
+        "errors": errors,
+        "ttft_ms": percentiles([r["ttft"] for r in succeeded if r["ttft"] is not None], 1000),
+        "latency_ms": percentiles([r["latency"] for r in succeeded], 1000),
+        "tokens_per_sec": {
+            "per_stream": percentiles(stream_rates),
+            "aggregate": round(total_tokens / wall_seconds, 2) if wall_seconds > 0 else None
+        },
+        "wall_seconds": round(wall_seconds, 2)
+    }
+
+def run_load_test(
+    sessions: int = 20,
+    turns: int = 3,
+    concurrency: int = 10,
+    token_rate: float = 50.0,
+    first_token_latency: float = 0.3,
+    answer_tokens: int = 200,
+    tool_script: str = "retrieve",
+    timeout: float = 120.0
+) -> Dict[str, Any]:
+    """
+    Run the stubs and the agent API, drive the sessions, and return the report.
+
+    Args:
+        sessions: Conversations to run, each by a different user
+        turns: Messages per conversation
+        concurrency: Conversations in flight at once
+        token_rate: Stub model tokens per second per stream
+        first_token_latency: Stub model seconds before each completion starts
+        answer_tokens: Tokens in each stub answer
+        tool_script: Tool the stub model calls before answering (see stubs.TOOL_SCRIPTS)
+        timeout: Per-request timeout in seconds
+
+    Returns:
+        Dict[str, Any]: The configuration and the summarized results
+    """
+    config = {
+        "sessions": sessions,
+        "turns": turns,
+        "concurrency": concurrency,
+        "token_rate": token_rate,
+        "first_token_latency": first_token_latency,
+        "answer_tokens": answer_tokens,
+        "tool_script": tool_script
+    }
+    llm_app = create_llm_stub(token_rate, first_token_latency, answer_tokens, tool_script)
+    llm = ServerThread(llm_app, free_port()).start()
+    supabase = ServerThread(create_supabase_stub(), free_port()).start()
+    api = None
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            agent_api = load_agent_api(llm.url, supabase.url, work_dir)
+            api = ServerThread(agent_api.app, free_port()).start()
+            start = time.monotonic()
+            results = asyncio.run(drive(api.url, sessions, turns, concurrency, timeout))
+            report = summarize(results, time.monotonic() - start)
+            api.stop()
+            api = None
+    finally:
+        if api:
+            api.stop()
+        supabase.stop()
+        llm.stop()
+    return {"config": config, **report, "llm_stub": dict(llm_app.state.stats)}
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(description="Offline load test for /api/pydantic-agent")
+    parser.add_argument("--sessions", type=int, default=20, help="Conversations to run, one user each")
+    parser.add_argument("--turns", type=int, default=3, help="Messages per conversation")
+    parser.add_argument("--concurrency", type=int, default=10, help="Conversations in flight at once")
+    parser.add_argument("--token-rate", type=float, default=50.0, help="Stub model tokens per second per stream")
+    parser.add_argument("--first-token-latency", type=float, default=0.3, help="Stub model seconds before each completion starts")
+    parser.add_argument("--answer-tokens", type=int, default=200, help="Tokens in each stub answer")
+    parser.add_argument("--tool-script", choices=sorted(TOOL_SCRIPTS), default="retrieve", help="Tool the stub model calls before answering")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-request timeout in seconds")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args(argv)
+
+    report = run_load_test(
+        sessions=args.sessions,
+        turns=args.turns,
+        concurrency=args.concurrency,
+        token_rate=args.token_rate,
+        first_token_latency=args.first_token_latency,
+        answer_tokens=args.answer_tokens,
+        tool_script=args.tool_script,
+        timeout=args.timeout
+    )
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    return report
+
+if __name__ == "__main__":
+    main()
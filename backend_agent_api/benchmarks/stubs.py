@@ -0,0 +1,357 @@
+"""
+In-process stand-ins for the agent API's external services, for load testing.
+
+- An OpenAI-compatible LLM that streams a canned answer at a fixed token rate and
+  can follow a tool-call script, plus deterministic embeddings.
+- An in-memory Supabase: the auth user endpoint, PostgREST table reads and writes
+  with the filters the API uses, and the match_documents RPC.
+
+Nothing here talks to the network beyond localhost, so a load test measures the
+API's own overhead rather than provider latency.
+"""
+from typing import Any, Callable, Dict, List, Optional
+from datetime import datetime, timezone
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+import numpy as np
+import itertools
+import asyncio
+import hashlib
+import base64
+import json
+import time
+
+EMBEDDING_DIMENSIONS = 1536
+
+# Tool-call scripts: which tool (if any) the stub model calls before answering
+TOOL_SCRIPTS = {
+    "none": None,
+    "retrieve": "retrieve_relevant_documents"
+}
+
+SAMPLE_DOCUMENTS = [
+    "The Pro plan costs $49 per month and includes priority support and unlimited projects.",
+    "Refunds are available within 30 days of purchase by contacting the support team.",
+    "Data is backed up nightly and retained for 90 days on all paid plans.",
+    "Single sign-on is available on the Enterprise plan through SAML or OIDC providers.",
+    "API requests are limited to 600 per minute per workspace on the Pro plan.",
+    "The mobile app supports offline mode and syncs changes once a connection is available."
+]
+
+def stub_embedding(text: str, dimensions: int = EMBEDDING_DIMENSIONS) -> np.ndarray:
+    """A deterministic unit vector for the text, so equal inputs embed equally."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimensions).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+def _message_text(message: Dict[str, Any]) -> str:
+    content = message.get("content")
+    if isinstance(content, list):
+        return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content or ""
+
+def _needs_tool_call(body: Dict[str, Any], tool_name: Optional[str]) -> bool:
+    """Whether the script calls the tool now - once per user message, and only if the agent offers it."""
+    if not tool_name:
+        return False
+    offered = {tool.get("function", {}).get("name") for tool in body.get("tools") or []}
+    if tool_name not in offered:
+        return False
+    for message in reversed(body.get("messages", [])):
+        if message.get("role") == "tool":
+            return False
+        if message.get("role") == "user":
+            return True
+    return False
+
+def _last_user_text(body: Dict[str, Any]) -> str:
+    for message in reversed(body.get("messages", [])):
+        if message.get("role") == "user":
+            return _message_text(message)
+    return ""
+
+def create_llm_stub(
+    token_rate: float = 50.0,
+    first_token_latency: float = 0.3,
+    answer_tokens: int = 200,
+    tool_script: str = "retrieve"
+) -> FastAPI:
+    """
+    An OpenAI-compatible chat completions and embeddings server.
+
+    Args:
+        token_rate: Tokens streamed per second per completion
+        first_token_latency: Seconds before the first chunk of each completion
+        answer_tokens: Tokens in each answer
+        tool_script: Key of TOOL_SCRIPTS - the tool called before answering
+
+    Returns:
+        FastAPI: The stub app
+    """
+    app = FastAPI()
+    tool_name = TOOL_SCRIPTS[tool_script]
+    completion_ids = itertools.count(1)
+    app.state.stats = {"completions": 0, "tool_calls": 0, "embeddings": 0}
+
+    def chunk(completion_id: str, model: str, delta: Dict[str, Any], finish_reason: Optional[str] = None, usage: Optional[Dict[str, int]] = None) -> bytes:
+        data = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+        }
+        if usage:
+            data["usage"] = usage
+        return f"data: {json.dumps(data)}\n\n".encode("utf-8")
+
+    def usage_for(body: Dict[str, Any], completion_tokens: int) -> Dict[str, int]:
+        prompt_tokens = sum(len(_message_text(m).split()) for m in body.get("messages", []))
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
+        }
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        model = body.get("model", "stub")
+        completion_id = f"chatcmpl-{next(completion_ids)}"
+        call_tool = _needs_tool_call(body, tool_name)
+        app.state.stats["completions"] += 1
+        if call_tool:
+            app.state.stats["tool_calls"] += 1
+
+        if not body.get("stream"):
+            # Non-streaming calls are title generation - short and fast
+            await asyncio.sleep(first_token_latency)
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "Load test conversation"},
+                    "finish_reason": "stop"
+                }],
+                "usage": usage_for(body, 3)
+            }
+
+        async def stream():
+            await asyncio.sleep(first_token_latency)
+            if call_tool:
+                arguments = json.dumps({"user_query": _last_user_text(body)})
+                yield chunk(completion_id, model, {
+                    "role": "assistant",
+                    "tool_calls": [{
+                        "index": 0,
+                        "id": f"call_{completion_id}",
+                        "type": "function",
+                        "function": {"name": tool_name, "arguments": arguments}
+                    }]
+                })
+                yield chunk(completion_id, model, {}, "tool_calls", usage_for(body, 10))
+            else:
+                for i in range(answer_tokens):
+                    delta = {"content": f"token{i} "}
+                    if i == 0:
+                        delta["role"] = "assistant"
+                    yield chunk(completion_id, model, delta)
+                    await asyncio.sleep(1 / token_rate)
+                yield chunk(completion_id, model, {}, "stop", usage_for(body, answer_tokens))
+            yield b"data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        app.state.stats["embeddings"] += len(inputs)
+        dimensions = body.get("dimensions") or EMBEDDING_DIMENSIONS
+        data = []
+        for i, text in enumerate(inputs):
+            vector = stub_embedding(str(text), dimensions)
+            # The OpenAI SDK asks for base64 unless the caller picks a format
+            if body.get("encoding_format") == "base64":
+                embedding = base64.b64encode(vector.tobytes()).decode("ascii")
+            else:
+                embedding = vector.tolist()
+            data.append({"object": "embedding", "index": i, "embedding": embedding})
+        tokens = sum(len(str(text).split()) for text in inputs)
+        return {
+            "object": "list",
+            "data": data,
+            "model": body.get("model", "stub"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens}
+        }
+
+    return app
+
+def _comparable(value: Any) -> Any:
+    """Parse timestamps so they compare like Postgres would, whatever their string format."""
+    if isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            return value
+        return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+    return value
+
+def _matches(row: Dict[str, Any], column: str, expression: str) -> bool:
+    """Evaluate one PostgREST filter (e.g. eq.abc, gte.2025-01-01, is.null) against a row."""
+    operator, _, operand = expression.partition(".")
+    value = row.get(column)
+    if operator == "is":
+        return {"null": value is None, "true": value is True, "false": value is False}.get(operand, False)
+    if operator == "in":
+        return str(value) in operand.strip("()").split(",")
+    if value is None:
+        return False
+    if operator in ("eq", "neq"):
+        equal = (str(value).lower() if isinstance(value, bool) else str(value)) == operand
+        return equal if operator == "eq" else not equal
+    left, right = _comparable(value), _comparable(operand)
+    if type(left) is not type(right):
+        left, right = str(value), operand
+    return {
+        "gt": left > right,
+        "gte": left >= right,
+        "lt": left < right,
+        "lte": left <= right
+    }.get(operator, False)
+
+# Query parameters that aren't column filters
+RESERVED_PARAMS = {"select", "order", "limit", "offset", "on_conflict", "columns"}
+
+class InMemoryDatabase:
+    """Tables as lists of rows, with generated ids and timestamps like the real schema."""
+
+    def __init__(self):
+        self.tables: Dict[str, List[Dict[str, Any]]] = {}
+        self.ids = itertools.count(1)
+
+    def rows(self, table: str) -> List[Dict[str, Any]]:
+        return self.tables.setdefault(table, [])
+
+    def filtered(self, table: str, params) -> List[Dict[str, Any]]:
+        filters = [(column, expression) for column, expression in params.multi_items() if column not in RESERVED_PARAMS]
+        return [row for row in self.rows(table) if all(_matches(row, c, e) for c, e in filters)]
+
+    def insert(self, table: str, record: Dict[str, Any]) -> Dict[str, Any]:
+        now = datetime.now(timezone.utc).isoformat()
+        row = {"id": next(self.ids), "created_at": now, **record}
+        self.rows(table).append(row)
+        return row
+
+def _select(rows: List[Dict[str, Any]], select: Optional[str]) -> List[Dict[str, Any]]:
+    if not select or select == "*":
+        return rows
+    columns = [column.strip() for column in select.split(",")]
+    return [{column: row.get(column) for column in columns} for row in rows]
+
+def _sort_key(value: Any):
+    # Nulls sort last, like Postgres does for ascending order
+    return (1, "") if value is None else (0, _comparable(value))
+
+def _order(rows: List[Dict[str, Any]], order: Optional[str]) -> List[Dict[str, Any]]:
+    # Apply the last sort key first so earlier keys take precedence
+    for term in reversed((order or "").split(",")):
+        if not term:
+            continue
+        column, *modifiers = term.split(".")
+        rows = sorted(rows, key=lambda row: _sort_key(row.get(column)), reverse="desc" in modifiers)
+    return rows
+
+def create_supabase_stub(rpc_handlers: Optional[Dict[str, Callable[[Dict[str, Any]], Any]]] = None) -> FastAPI:
+    """
+    An in-memory Supabase with the auth and PostgREST endpoints the agent API calls.
+
+    The bearer token is the user ID, so a load test can act as any number of users.
+
+    Args:
+        rpc_handlers: Extra RPC functions by name, taking the call's parameters
+
+    Returns:
+        FastAPI: The stub app, with its InMemoryDatabase at app.state.db
+    """
+    app = FastAPI()
+    db = InMemoryDatabase()
+    app.state.db = db
+
+    def match_documents(params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        count = min(int(params.get("match_count", 10)), len(SAMPLE_DOCUMENTS))
+        return [{
+            "id": i + 1,
+            "content": content,
+            "metadata": {"file_id": f"doc-{i}", "file_title": f"Document {i}", "file_url": f"https://example.com/doc-{i}", "chunk_index": 0},
+            "similarity": round(0.9 - i * 0.05, 3)
+        } for i, content in enumerate(SAMPLE_DOCUMENTS[:count])]
+
+    rpcs = {"match_documents": match_documents, **(rpc_handlers or {})}
+
+    @app.get("/auth/v1/user")
+    async def auth_user(request: Request):
+        token = request.headers.get("authorization", "").removeprefix("Bearer ").strip()
+        if not token:
+            return JSONResponse({"message": "Missing token"}, status_code=401)
+        return {"id": token, "aud": "authenticated", "email": f"{token}@loadtest.local"}
+
+    @app.post("/rest/v1/rpc/{name}")
+    async def rpc(name: str, request: Request):
+        if name not in rpcs:
+            return JSONResponse({"code": "PGRST202", "message": f"Could not find the function public.{name}"}, status_code=404)
+        body = await request.body()
+        return rpcs[name](json.loads(body) if body else {})
+
+    @app.get("/rest/v1/{table}")
+    async def select(table: str, request: Request):
+        params = request.query_params
+        rows = _order(db.filtered(table, params), params.get("order"))
+        total = len(rows)
+        offset = int(params.get("offset", 0))
+        rows = rows[offset:]
+        if "limit" in params:
+            rows = rows[:int(params["limit"])]
+        headers = {}
+        if "count=" in request.headers.get("prefer", ""):
+            end = offset + len(rows) - 1
+            headers["content-range"] = f"{offset}-{end}/{total}" if rows else f"*/{total}"
+        return JSONResponse(_select(rows, params.get("select")), headers=headers)
+
+    @app.post("/rest/v1/{table}")
+    async def insert(table: str, request: Request):
+        body = await request.json()
+        records = body if isinstance(body, list) else [body]
+        prefer = request.headers.get("prefer", "")
+        rows = []
+        for record in records:
+            if "merge-duplicates" in prefer:
+                keys = (request.query_params.get("on_conflict") or "id").split(",")
+                existing = next((row for row in db.rows(table) if all(row.get(k) == record.get(k) for k in keys)), None)
+                if existing is not None:
+                    existing.update(record)
+                    rows.append(existing)
+                    continue
+            rows.append(db.insert(table, record))
+        if "return=minimal" in prefer:
+            return Response(status_code=201)
+        return JSONResponse(rows, status_code=201)
+
+    @app.patch("/rest/v1/{table}")
+    async def update(table: str, request: Request):
+        changes = await request.json()
+        rows = db.filtered(table, request.query_params)
+        for row in rows:
+            row.update(changes)
+        return rows
+
+    @app.delete("/rest/v1/{table}")
+    async def delete(table: str, request: Request):
+        rows = db.filtered(table, request.query_params)
+        db.tables[table] = [row for row in db.rows(table) if row not in rows]
+        return rows
+
+    return app
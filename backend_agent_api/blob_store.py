@@ -0,0 +1,184 @@
+"""
+Content-addressed storage for chat attachments.
+
+Attachments are uploaded once, streamed to disk while being hashed, and stored
+under their SHA-256 digest. Agent requests and stored messages then carry only a
+small reference (blob_id, file name, MIME type, size) instead of base64 content.
+Blobs are namespaced per user, so a digest is only usable by the user who uploaded it.
+Nothing tracks which messages reference a blob, so blobs that haven't been uploaded or
+read for the retention period are removed instead.
+"""
+from typing import Any, AsyncIterator, Dict
+from pathlib import Path
+import tempfile
+import hashlib
+import asyncio
+import time
+import re
+import os
+
+blob_store_dir = os.getenv("BLOB_STORE_DIR", "blob_store")
+# Largest attachment accepted, in bytes
+max_upload_bytes = int(os.getenv("MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+# Blobs not uploaded or read for this many days are deleted - 0 keeps them forever
+blob_retention_days = float(os.getenv("BLOB_RETENTION_DAYS", "0"))
+# Uploads interrupted by a crash leave .part files behind - they're removed after this long
+PARTIAL_UPLOAD_MAX_AGE_SECONDS = 3600
+
+BLOB_ID_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+def base64_decoded_size(content: str) -> int:
+    """Size of base64 content once decoded, worked out without decoding it."""
+    content = content.strip()
+    return len(content) * 3 // 4 - (len(content) - len(content.rstrip("=")))
+
+class BlobTooLarge(Exception):
+    """Raised when an upload exceeds the size cap."""
+
+class BlobNotFound(Exception):
+    """Raised when a blob reference doesn't resolve for the user."""
+
+class BlobStore:
+    """Per-user, content-addressed blobs on the local filesystem."""
+
+    def __init__(self, root_dir: str = blob_store_dir, max_bytes: int = max_upload_bytes, retention_days: float = blob_retention_days):
+        self.root = Path(root_dir)
+        self.max_bytes = max_bytes
+        self.retention_seconds = retention_days * 86400
+
+    def _user_dir(self, user_id: str) -> Path:
+        # Hash the user ID so it's always a safe directory name
+        return self.root / hashlib.sha256(user_id.encode("utf-8")).hexdigest()[:32]
+
+    def _blob_path(self, user_id: str, blob_id: str) -> Path:
+        if not BLOB_ID_PATTERN.match(blob_id or ""):
+            raise BlobNotFound(f"Invalid blob reference: {blob_id}")
+        return self._user_dir(user_id) / blob_id[:2] / blob_id
+
+    async def put_stream(self, user_id: str, chunks: AsyncIterator[bytes]) -> Dict[str, Any]:
+        """
+        Stream an upload to the store, hashing it on the way.
+
+        Args:
+            user_id: Owner of the blob
+            chunks: The upload body
+
+        Returns:
+            Dict[str, Any]: blob_id (SHA-256 hex digest) and size in bytes
+
+        Raises:
+            BlobTooLarge: If the upload exceeds the size cap - nothing is stored
+        """
+        user_dir = self._user_dir(user_id)
+        await asyncio.to_thread(user_dir.mkdir, parents=True, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        temp = await asyncio.to_thread(tempfile.NamedTemporaryFile, dir=user_dir, suffix=".part", delete=False)
+        try:
+            async for chunk in chunks:
+                if not chunk:
+                    continue
+                size += len(chunk)
+                if size > self.max_bytes:
+                    raise BlobTooLarge(f"Attachment exceeds the {self.max_bytes} byte limit")
+                digest.update(chunk)
+                await asyncio.to_thread(temp.write, chunk)
+            await asyncio.to_thread(temp.close)
+
+            blob_id = digest.hexdigest()
+            path = self._blob_path(user_id, blob_id)
+            await asyncio.to_thread(self._commit, Path(temp.name), path)
+            return {"blob_id": blob_id, "size": size}
+        finally:
+            if not temp.closed:
+                temp.close()
+            if os.path.exists(temp.name):
+                os.unlink(temp.name)
+
+    @staticmethod
+    def _commit(temp_path: Path, path: Path) -> None:
+        try:
+            # Same content already stored - keep the existing copy, but count it as used
+            os.utime(path)
+            return
+        except FileNotFoundError:
+            pass
+        path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(temp_path, path)
+
+    async def put_bytes(self, user_id: str, data: bytes) -> Dict[str, Any]:
+        """Store an in-memory attachment, e.g. one sent inline as base64."""
+        async def single_chunk():
+            yield data
+        return await self.put_stream(user_id, single_chunk())
+
+    def path(self, user_id: str, blob_id: str) -> Path:
+        """
+        Locate a blob on disk and mark it as used, e.g. to serve it as a download.
+
+        Raises:
+            BlobNotFound: If the reference is malformed or the user has no such blob
+        """
+        path = self._blob_path(user_id, blob_id)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            raise BlobNotFound(f"Attachment not found: {blob_id}")
+        return path
+
+    async def get(self, user_id: str, blob_id: str) -> bytes:
+        """
+        Read a blob.
+
+        Raises:
+            BlobNotFound: If the reference is malformed or the user has no such blob
+        """
+        path = self.path(user_id, blob_id)
+        try:
+            return await asyncio.to_thread(path.read_bytes)
+        except FileNotFoundError:
+            raise BlobNotFound(f"Attachment not found: {blob_id}")
+
+    def size(self, user_id: str, blob_id: str) -> int:
+        """
+        Size of a stored blob in bytes.
+
+        Raises:
+            BlobNotFound: If the reference is malformed or the user has no such blob
+        """
+        try:
+            return self._blob_path(user_id, blob_id).stat().st_size
+        except FileNotFoundError:
+            raise BlobNotFound(f"Attachment not found: {blob_id}")
+
+    def exists(self, user_id: str, blob_id: str) -> bool:
+        try:
+            return self._blob_path(user_id, blob_id).exists()
+        except BlobNotFound:
+            return False
+
+    def collect_garbage(self) -> int:
+        """
+        Delete blobs unused for the retention period and leftovers of interrupted uploads.
+
+        Returns:
+            int: Number of files deleted
+        """
+        now = time.time()
+        deleted = 0
+        for path in self.root.glob("*/**/*"):
+            try:
+                if not path.is_file():
+                    continue
+                age = now - path.stat().st_mtime
+                if path.suffix == ".part":
+                    expired = age > PARTIAL_UPLOAD_MAX_AGE_SECONDS
+                else:
+                    expired = self.retention_seconds > 0 and age > self.retention_seconds
+                if expired:
+                    path.unlink()
+                    deleted += 1
+            except FileNotFoundError:
+                # Removed concurrently, e.g. a .part file whose upload just finished
+                continue
+        return deleted
@@ -0,0 +1,160 @@
+"""
+Packing of retrieved document chunks into the agent's context.
+
+Vector search returns many small fixed-size chunks, often several from the same
+file, some next to each other and some (near-)duplicates. Rather than pasting the
+top few verbatim, we fetch a larger candidate set and:
+1. drop near-duplicate chunks,
+2. pick a relevant but diverse subset with maximal marginal relevance (MMR) until
+   a token budget is filled,
+3. group the picks by file and merge chunks with adjacent chunk_index values into
+   one passage, so each file's header appears once.
+"""
+from typing import Any, Dict, FrozenSet, List, Optional
+import re
+import os
+
+# How many chunks to fetch from vector search before packing
+retrieval_candidate_count = int(os.getenv("RETRIEVAL_CANDIDATE_COUNT", "20"))
+# Approximate tokens of chunk text to put in the context
+retrieval_token_budget = int(os.getenv("RETRIEVAL_TOKEN_BUDGET", "1200"))
+# 1.0 ranks by relevance only, lower values favour chunks unlike those already picked
+retrieval_mmr_lambda = float(os.getenv("RETRIEVAL_MMR_LAMBDA", "0.7"))
+# Chunks at least this similar (word shingle Jaccard) to a better match are dropped
+retrieval_dedup_threshold = float(os.getenv("RETRIEVAL_DEDUP_THRESHOLD", "0.8"))
+# Characters consecutive chunks share - must match the RAG pipeline's default_chunk_overlap
+retrieval_chunk_overlap = int(os.getenv("RETRIEVAL_CHUNK_OVERLAP", "0"))
+
+WORD_PATTERN = re.compile(r"\w+")
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count - about four characters per token for English text."""
+    return max(1, len(text) // 4)
+
+def shingles(text: str, size: int = 3) -> FrozenSet[str]:
+    """Word n-grams of the text, used to compare chunks without embeddings."""
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) < size:
+        return frozenset([" ".join(words)]) if words else frozenset()
+    return frozenset(" ".join(words[i:i + size]) for i in range(len(words) - size + 1))
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+def merge_adjacent(first: str, second: str, overlap: int = retrieval_chunk_overlap) -> str:
+    """
+    Join consecutive chunks, dropping the text repeated by the chunker's overlap.
+
+    Only the known overlap is removed - guessing it from whatever the chunks happen to
+    share would also eat text that merely repeats at the boundary ("the the", "1. 1.").
+    Chunks that don't share it are joined with a space.
+    """
+    if overlap > 0 and len(first) >= overlap and len(second) >= overlap and first.endswith(second[:overlap]):
+        return first + second[overlap:]
+    return first + " " + second
+
+def select_chunks(
+    candidates: List[Dict[str, Any]],
+    token_budget: int = retrieval_token_budget,
+    mmr_lambda: float = retrieval_mmr_lambda,
+    dedup_threshold: float = retrieval_dedup_threshold
+) -> List[Dict[str, Any]]:
+    """
+    Pick chunks from the candidates with MMR until the token budget is filled.
+
+    Args:
+        candidates: match_documents rows (content, metadata, similarity)
+        token_budget: Approximate tokens of chunk text to select
+        mmr_lambda: Trade-off between relevance (1.0) and diversity (0.0)
+        dedup_threshold: Similarity above which a chunk counts as a duplicate
+
+    Returns:
+        List[Dict[str, Any]]: The selected rows in the order they were picked
+    """
+    # Best matches first, so duplicates keep the better-ranked copy
+    ranked = sorted(candidates, key=lambda row: row.get("similarity") or 0.0, reverse=True)
+    pool = []
+    for row in ranked:
+        content = (row.get("content") or "").strip()
+        if not content:
+            continue
+        row_shingles = shingles(content)
+        if any(jaccard(row_shingles, kept["shingles"]) >= dedup_threshold for kept in pool):
+            continue
+        pool.append({"row": row, "shingles": row_shingles, "tokens": estimate_tokens(content)})
+
+    selected = []
+    used_tokens = 0
+    while pool:
+        def mmr_score(item):
+            redundancy = max((jaccard(item["shingles"], picked["shingles"]) for picked in selected), default=0.0)
+            return mmr_lambda * (item["row"].get("similarity") or 0.0) - (1 - mmr_lambda) * redundancy
+
+        best = max(pool, key=mmr_score)
+        pool.remove(best)
+        # Always take the top match, then only what still fits
+        if selected and used_tokens + best["tokens"] > token_budget:
+            continue
+        selected.append(best)
+        used_tokens += best["tokens"]
+
+    return [item["row"] for item in selected]
+
+def pack_chunks(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Group selected chunks by file and merge runs of adjacent chunk_index values.
+
+    Returns:
+        List[Dict[str, Any]]: One entry per file, best file first, with its
+        file_id, title, url and passages in document order
+    """
+    files: Dict[str, Dict[str, Any]] = {}
+    for rank, row in enumerate(rows):
+        metadata = row.get("metadata") or {}
+        file_id = metadata.get("file_id", "unknown")
+        entry = files.setdefault(file_id, {
+            "file_id": file_id,
+            "title": metadata.get("file_title", "unknown"),
+            "url": metadata.get("file_url", "unknown"),
+            "rank": rank,
+            "chunks": []
+        })
+        entry["chunks"].append((metadata.get("chunk_index"), row["content"]))
+
+    packed = []
+    for entry in sorted(files.values(), key=lambda e: e["rank"]):
+        # Chunks without an index can't be merged - keep them in rank order after the rest
+        indexed = sorted((c for c in entry["chunks"] if c[0] is not None), key=lambda c: c[0])
+        unindexed = [c for c in entry["chunks"] if c[0] is None]
+
+        passages = []
+        previous_index: Optional[int] = None
+        for index, content in indexed:
+            if passages and previous_index is not None and index == previous_index + 1:
+                passages[-1] = merge_adjacent(passages[-1], content)
+            else:
+                passages.append(content)
+            previous_index = index
+        passages.extend(content for _, content in unindexed)
+
+        packed.append({
+            "file_id": entry["file_id"],
+            "title": entry["title"],
+            "url": entry["url"],
+            "passages": [passage.strip() for passage in passages]
+        })
+    return packed
+
+def format_packed_context(packed: List[Dict[str, Any]]) -> str:
+    """Render packed files with one header each and their passages separated by [...]."""
+    sections = []
+    for entry in packed:
+        header = (
+            f"# Document ID: {entry['file_id']}\n"
+            f"# Document Title: {entry['title']}\n"
+            f"# Document URL: {entry['url']}"
+        )
+        sections.append(header + "\n\n" + "\n\n[...]\n\n".join(entry["passages"]))
+    return "\n\n---\n\n".join(sections)
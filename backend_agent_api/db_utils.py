@@ -13,6 +13,7 @@ from pydantic_ai.messages import ModelMessage, ModelMessagesTypeAdapter
 import random
 import string
 import json
+import uuid
 
 
 async def fetch_conversation_history(supabase: Client, session_id: str, limit: int = 10) -> List[Dict[str, Any]]:
@@ -125,7 +126,7 @@ async def store_message(
     content: str, 
     message_data: Optional[bytes] = None, 
     data: Optional[Dict] = None,
-    files: Optional[List[Dict[str, str]]] = None
+    files: Optional[List[Dict[str, Any]]] = None
 ):
     """Store a message in the Supabase messages table.
     
@@ -136,7 +137,31 @@ async def store_message(
         content: The message content
         message_data: Optional binary data associated with the message
         data: Optional additional data for the message
-        files: Optional list of file attachments with fileName, content, and mimeType
+        files: Optional list of file attachment references with fileName, mimeType, blob_id and size
+    """
+    try:
+        insert_data = build_message_record(session_id, message_type, content, message_data, data, files)
+        supabase.table("messages").insert(insert_data).execute()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to store message: {str(e)}")
+
+
+def build_message_record(
+    session_id: str, 
+    message_type: str, 
+    content: str, 
+    message_data: Optional[bytes] = None, 
+    data: Optional[Dict] = None,
+    files: Optional[List[Dict[str, Any]]] = None
+) -> Dict[str, Any]:
+    """Build the messages table row for a message.
+    
+    The row is JSON-serializable, so it can also be queued and inserted later
+    with store_messages_batch. It carries a client-generated idempotency_key, so
+    a replayed job writes the message only once.
+    
+    Returns:
+        Dict[str, Any]: The row to insert into the messages table
     """
     message_obj = {
         "type": message_type,
@@ -149,19 +174,33 @@ async def store_message(
     if files:
         message_obj["files"] = files
 
-    try:
-        insert_data = {
-            "session_id": session_id,
-            "message": message_obj
-        }
-        
-        # Add message_data if provided
-        if message_data:
-            insert_data["message_data"] = message_data.decode('utf-8')
-        
-        supabase.table("messages").insert(insert_data).execute()
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to store message: {str(e)}")
+    insert_data = {
+        "session_id": session_id,
+        "message": message_obj,
+        "idempotency_key": str(uuid.uuid4())
+    }
+    
+    # Add message_data if provided
+    if message_data:
+        insert_data["message_data"] = message_data.decode('utf-8')
+    
+    return insert_data
+
+
+async def store_messages_batch(supabase: Client, records: List[Dict[str, Any]]):
+    """Insert several rows built with build_message_record in a single call.
+    
+    Jobs are delivered at least once, so rows whose idempotency_key is already
+    stored are skipped instead of duplicating the message.
+    
+    Args:
+        supabase: Supabase client
+        records: Message rows, inserted in order
+    """
+    if records:
+        supabase.table("messages").upsert(
+            records, on_conflict="idempotency_key", ignore_duplicates=True
+        ).execute()
 
 
 
@@ -241,3 +280,40 @@ async def store_request(supabase: Client, request_id: str, user_id: str, query:
     except Exception as e:
         print(f"Error storing request: {str(e)}")
 
+
+async def store_requests_batch(supabase: Client, requests: List[Dict[str, Any]]):
+    """
+    Insert several requests into the requests table in a single call.
+    
+    Requests already stored by an earlier delivery of the same job are skipped.
+    
+    Args:
+        supabase: Supabase client
+        requests: Dicts with request_id, user_id, query and timestamp (ISO format)
+    """
+    if requests:
+        supabase.table("requests").upsert([{
+            "id": request["request_id"],
+            "user_id": request["user_id"],
+            "user_query": request["query"],
+            "timestamp": request["timestamp"]
+        } for request in requests], on_conflict="id", ignore_duplicates=True).execute()
+
+
+async def fetch_last_ingest(supabase: Client) -> Optional[str]:
+    """
+    Get the time of the latest ingest by any RAG pipeline.
+    
+    Args:
+        supabase: Supabase client
+        
+    Returns:
+        Optional[str]: The ISO timestamp, or None if no pipeline has ingested anything yet
+    """
+    response = supabase.table("rag_pipeline_state") \
+        .select("last_ingest") \
+        .not_.is_("last_ingest", "null") \
+        .order("last_ingest", desc=True) \
+        .limit(1) \
+        .execute()
+    return response.data[0]["last_ingest"] if response.data else None
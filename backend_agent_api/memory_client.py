@@ -0,0 +1,370 @@
+"""
+Resilient access to Mem0 for the agent API.
+
+Wraps the AsyncMemory client with a per-call timeout budget, async retries with
+backoff and a circuit breaker, so a Mem0 (or pgvector) outage degrades answers
+to "no memories" instead of stalling every stream. Search results are cached per
+user and invalidated whenever a memory write for that user completes.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+from collections import OrderedDict
+import asyncio
+import random
+import time
+import os
+
+# Total time a memory search may take, including retries, before we answer without memories
+mem0_search_timeout = float(os.getenv("MEM0_SEARCH_TIMEOUT", "3"))
+# Memory writes run in the background so they get a more generous budget
+mem0_add_timeout = float(os.getenv("MEM0_ADD_TIMEOUT", "30"))
+mem0_max_retries = int(os.getenv("MEM0_MAX_RETRIES", "2"))
+# Consecutive failures before the circuit opens, and how long it stays open
+mem0_breaker_threshold = int(os.getenv("MEM0_BREAKER_THRESHOLD", "3"))
+mem0_breaker_reset_seconds = float(os.getenv("MEM0_BREAKER_RESET_SECONDS", "30"))
+
+# Per-user search cache - a TTL of 0 disables it
+mem0_cache_ttl_seconds = float(os.getenv("MEM0_CACHE_TTL_SECONDS", "300"))
+mem0_cache_max_users = int(os.getenv("MEM0_CACHE_MAX_USERS", "1000"))
+mem0_cache_max_queries = int(os.getenv("MEM0_CACHE_MAX_QUERIES", "32"))
+# Follow-up turns this short ("and why?") reuse the user's last memory search
+mem0_followup_max_words = int(os.getenv("MEM0_FOLLOWUP_MAX_WORDS", "4"))
+
+class MemoryUnavailableError(Exception):
+    """Raised by add() when the circuit is open, with how long until the next trial."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Mem0 circuit is open, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+def empty_memories() -> Dict[str, Any]:
+    """A fresh "no memories" result, so callers can't mutate a shared one."""
+    return {"results": []}
+
+def normalize_query(query: str) -> str:
+    """Lowercase and collapse whitespace so trivially different queries share a cache entry."""
+    return " ".join(query.lower().split())
+
+class UserMemoryCache:
+    """
+    Per-user cache of recent Mem0 search results.
+
+    Besides exact (query, limit) hits it keeps two shortcuts per user:
+    - memory_set: when a search returns fewer results than its limit, Mem0 returned
+      every memory the user has, so any search with at least that limit can be
+      answered from it without a vector search.
+    - last: the most recent result, reused for short follow-up turns.
+
+    Each user has a generation that invalidate() advances, so a search that started
+    before a memory write finished can't repopulate the cache with stale data.
+    Generations come from one increasing clock and only the most recently
+    invalidated max_users are kept; a user without one reads the highest evicted
+    value, so a user's generation never goes backwards.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = mem0_cache_ttl_seconds,
+        max_users: int = mem0_cache_max_users,
+        max_queries: int = mem0_cache_max_queries,
+        followup_max_words: int = mem0_followup_max_words
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_users = max_users
+        self.max_queries = max_queries
+        self.followup_max_words = followup_max_words
+        self.users: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.generations: "OrderedDict[str, int]" = OrderedDict()
+        self.generation_clock = 0
+        self.evicted_generation = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0
+
+    def generation(self, user_id: str) -> int:
+        return self.generations.get(user_id, self.evicted_generation)
+
+    def _fresh(self, stored: Optional[Tuple[float, Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+        if stored is None or time.monotonic() - stored[0] > self.ttl_seconds:
+            return None
+        return stored[1]
+
+    def get(self, user_id: str, query: str, limit: int) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """
+        Look up a cached search result.
+
+        Returns:
+            Tuple of the cached result (or None) and which shortcut produced it
+            ("query", "memory_set" or "followup")
+        """
+        if not self.enabled or user_id not in self.users:
+            return None, None
+        entry = self.users[user_id]
+        self.users.move_to_end(user_id)
+        normalized = normalize_query(query)
+
+        result = self._fresh(entry["queries"].get((normalized, limit)))
+        if result is not None:
+            return result, "query"
+
+        memory_set = self._fresh(entry["memory_set"])
+        if memory_set is not None and len(memory_set.get("results", [])) <= limit:
+            return memory_set, "memory_set"
+
+        if len(normalized.split()) <= self.followup_max_words:
+            result = self._fresh(entry["last"])
+            if result is not None:
+                return result, "followup"
+
+        return None, None
+
+    def put(self, user_id: str, query: str, limit: int, result: Dict[str, Any], generation: int) -> None:
+        """Store a search result unless the user's memories changed since the search started."""
+        if not self.enabled or generation != self.generation(user_id):
+            return
+        entry = self.users.get(user_id)
+        if entry is None:
+            entry = {"queries": OrderedDict(), "memory_set": None, "last": None}
+            self.users[user_id] = entry
+            if len(self.users) > self.max_users:
+                self.users.popitem(last=False)
+        self.users.move_to_end(user_id)
+
+        key = (normalize_query(query), limit)
+        stored = (time.monotonic(), result)
+        entry["queries"][key] = stored
+        entry["queries"].move_to_end(key)
+        if len(entry["queries"]) > self.max_queries:
+            entry["queries"].popitem(last=False)
+        if len(result.get("results", [])) < limit:
+            entry["memory_set"] = stored
+        entry["last"] = stored
+
+    def invalidate(self, user_id: str) -> None:
+        """Drop everything cached for a user after their memories changed."""
+        self.generation_clock += 1
+        self.generations[user_id] = self.generation_clock
+        self.generations.move_to_end(user_id)
+        if len(self.generations) > self.max_users:
+            _, evicted = self.generations.popitem(last=False)
+            self.evicted_generation = max(self.evicted_generation, evicted)
+        self.users.pop(user_id, None)
+
+class CircuitBreaker:
+    """
+    Minimal circuit breaker.
+
+    closed: calls go through. After `failure_threshold` consecutive failures the
+    circuit opens and calls are skipped for `reset_seconds`. Then it goes
+    half-open and lets a single trial call through - success closes it again,
+    failure re-opens it.
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def allow_request(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        if self.trial_in_flight or self.consecutive_failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self.trial_in_flight = False
+
+    def seconds_until_trial(self) -> float:
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.reset_seconds - (time.monotonic() - self.opened_at))
+
+    def release_trial(self) -> None:
+        """Free the half-open trial slot when a call ends without an outcome (e.g. cancelled)."""
+        self.trial_in_flight = False
+
+class ResilientMemoryClient:
+    """
+    Mem0 wrapper that never blocks the event loop and never raises from search.
+
+    add() raises when the write fails or is skipped, so the background job queue
+    that runs it can retry it later instead of losing the memory.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        search_timeout: float = mem0_search_timeout,
+        add_timeout: float = mem0_add_timeout,
+        max_retries: int = mem0_max_retries,
+        breaker: Optional[CircuitBreaker] = None,
+        cache: Optional[UserMemoryCache] = None
+    ):
+        self.client = client
+        self.search_timeout = search_timeout
+        self.add_timeout = add_timeout
+        self.max_retries = max_retries
+        self.breaker = breaker or CircuitBreaker(mem0_breaker_threshold, mem0_breaker_reset_seconds)
+        self.cache = cache or UserMemoryCache()
+        self.counters = {
+            "cache_hits": 0,
+            "cache_misses": 0,
+            "search_calls": 0,
+            "search_failures": 0,
+            "search_timeouts": 0,
+            "search_skipped": 0,
+            "add_calls": 0,
+            "add_failures": 0,
+            "add_skipped": 0,
+            "retries": 0,
+            "circuit_opened": 0
+        }
+        self.last_search_latency_ms: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    async def _call_with_retries(self, operation: str, make_call, timeout: float) -> Any:
+        """
+        Run a Mem0 call, retrying with jittered backoff until it succeeds or the budget runs out.
+
+        Raises the last error (or asyncio.TimeoutError) once the budget is spent.
+        """
+        deadline = time.monotonic() + timeout
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                return await asyncio.wait_for(make_call(), timeout=max(remaining, 0.001))
+            except asyncio.TimeoutError:
+                # The whole budget is gone, no point retrying
+                raise
+            except Exception as e:
+                attempt += 1
+                backoff = min(0.25 * (2 ** (attempt - 1)), 2.0) * (0.5 + random.random() / 2)
+                if attempt > self.max_retries or time.monotonic() + backoff >= deadline:
+                    raise
+                print(f"Mem0 {operation} failed ({e}), retrying in {backoff:.2f}s")
+                self.counters["retries"] += 1
+                await asyncio.sleep(backoff)
+
+    def _record_failure(self, error: Exception) -> None:
+        was_open = self.breaker.state != "closed"
+        self.breaker.record_failure()
+        self.last_error = str(error) or error.__class__.__name__
+        if not was_open and self.breaker.state == "open":
+            self.counters["circuit_opened"] += 1
+            print(f"Mem0 circuit opened after {self.breaker.consecutive_failures} consecutive failures")
+
+    async def search(self, query: str, user_id: str, limit: int = 3) -> Dict[str, Any]:
+        """
+        Search a user's memories.
+
+        Returns:
+            Dict[str, Any]: The Mem0 search result, or {"results": []} if Mem0 is
+            unhealthy, timed out or failed
+        """
+        # Cached memories are still served while the circuit is open
+        cached, hit_type = self.cache.get(user_id, query, limit)
+        if cached is not None:
+            self.counters["cache_hits"] += 1
+            print(f"Mem0 search served from cache ({hit_type})")
+            return cached
+        if self.cache.enabled:
+            self.counters["cache_misses"] += 1
+
+        if not self.breaker.allow_request():
+            self.counters["search_skipped"] += 1
+            return empty_memories()
+
+        self.counters["search_calls"] += 1
+        generation = self.cache.generation(user_id)
+        start = time.monotonic()
+        try:
+            result = await self._call_with_retries(
+                "search",
+                lambda: self.client.search(query=query, user_id=user_id, limit=limit),
+                self.search_timeout
+            )
+            self.breaker.record_success()
+            self.cache.put(user_id, query, limit, result, generation)
+            return result
+        except asyncio.TimeoutError as e:
+            self.counters["search_timeouts"] += 1
+            self._record_failure(e)
+            print(f"Mem0 search timed out after {self.search_timeout}s, continuing without memories")
+        except Exception as e:
+            self.counters["search_failures"] += 1
+            self._record_failure(e)
+            print(f"Mem0 search failed, continuing without memories: {e}")
+        finally:
+            # A cancelled search records neither outcome, so the circuit would never close
+            self.breaker.release_trial()
+            self.last_search_latency_ms = round((time.monotonic() - start) * 1000, 1)
+        return empty_memories()
+
+    async def add(self, messages: List[Dict[str, Any]], user_id: str) -> Any:
+        """
+        Add messages to a user's memories.
+
+        The user's cached searches are invalidated once the write finishes, even if
+        it failed part way, since Mem0 may already have changed some memories.
+
+        Returns:
+            Any: The Mem0 add result
+
+        Raises:
+            MemoryUnavailableError: The circuit is open, so the write was skipped
+            Exception: The last error (or asyncio.TimeoutError) once retries are spent
+        """
+        if not self.breaker.allow_request():
+            self.counters["add_skipped"] += 1
+            raise MemoryUnavailableError(self.breaker.seconds_until_trial())
+
+        self.counters["add_calls"] += 1
+        try:
+            result = await self._call_with_retries(
+                "add",
+                lambda: self.client.add(messages, user_id=user_id),
+                self.add_timeout
+            )
+            self.breaker.record_success()
+            return result
+        except Exception as e:
+            self.counters["add_failures"] += 1
+            self._record_failure(e)
+            print(f"Error updating memories: {e}")
+            raise
+        finally:
+            self.breaker.release_trial()
+            self.cache.invalidate(user_id)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Snapshot of the wrapper's counters and circuit state."""
+        return {
+            **self.counters,
+            "circuit_state": self.breaker.state,
+            "consecutive_failures": self.breaker.consecutive_failures,
+            "last_search_latency_ms": self.last_search_latency_ms,
+            "last_error": self.last_error,
+            "cached_users": len(self.cache.users)
+        }
@@ -0,0 +1,191 @@
+"""
+Tiered model routing for agent runs.
+
+A cheap local classifier sends simple requests (greetings, short lookups, FAQ-style
+questions) to a fast model and everything else to the strong model, and keeps
+per-tier latency, token and cost figures. A thread that has gone to the strong
+model stays there, so short follow-ups ("and for last quarter?") aren't downgraded.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+from collections import deque
+import re
+import os
+
+# Prices per million tokens, used to estimate per-tier cost (0 = not tracked)
+llm_input_cost_per_mtok = float(os.getenv("LLM_INPUT_COST_PER_MTOK", "0"))
+llm_output_cost_per_mtok = float(os.getenv("LLM_OUTPUT_COST_PER_MTOK", "0"))
+llm_fast_input_cost_per_mtok = float(os.getenv("LLM_FAST_INPUT_COST_PER_MTOK", "0"))
+llm_fast_output_cost_per_mtok = float(os.getenv("LLM_FAST_OUTPUT_COST_PER_MTOK", "0"))
+# Queries longer than this always go to the strong model
+fast_tier_max_words = int(os.getenv("FAST_TIER_MAX_WORDS", "25"))
+# Earlier user messages in the thread checked for complex requests
+routing_history_queries = int(os.getenv("ROUTING_HISTORY_QUERIES", "3"))
+
+FAST = "fast"
+STRONG = "strong"
+
+GREETING_PATTERN = re.compile(
+    r"^(hi|hello|hey|yo|thanks|thank you|thx|good (morning|afternoon|evening)|bye|goodbye|ok|okay|cool|great)\b",
+    re.IGNORECASE
+)
+# Lookups the fast model answers well, usually with a single tool call
+SIMPLE_PATTERN = re.compile(
+    r"\b(price|prices|pricing|cost|plan|plans|hours|open|contact|email|phone|address|refund|shipping|"
+    r"return policy|faq|what is|who is|where is|when is|how do i|how can i)\b",
+    re.IGNORECASE
+)
+# Anything that needs multi-step reasoning, analysis or heavy tool use
+COMPLEX_PATTERN = re.compile(
+    r"\b(analy[sz]e|analysis|compare|comparison|calculate|average|total|sum|trend|forecast|sql|query|"
+    r"report|summari[sz]e|breakdown|explain why|why does|step by step|code|script|debug|chart|table|"
+    r"spreadsheet|document|file|pdf|image|strategy|plan out|research|pros and cons)\b",
+    re.IGNORECASE
+)
+
+def classify_query(
+    query: str,
+    has_files: bool = False,
+    previous_tier: Optional[str] = None,
+    recent_queries: Optional[List[str]] = None
+) -> Tuple[str, str]:
+    """
+    Pick a model tier for a request with simple heuristics.
+
+    Args:
+        query: The user's message
+        has_files: Whether the request carries file attachments
+        previous_tier: The tier that answered the previous turn of the thread, if known
+        recent_queries: The user's earlier messages in the thread, oldest first
+
+    Returns:
+        Tuple[str, str]: The tier ("fast" or "strong") and the reason it was chosen
+    """
+    text = query.strip()
+    words = len(text.split())
+
+    if has_files:
+        return STRONG, "attachments"
+    if COMPLEX_PATTERN.search(text):
+        return STRONG, "complex_keywords"
+    # Never downgrade mid-thread - a short follow-up inherits the thread's complexity
+    if previous_tier == STRONG:
+        return STRONG, "thread_follow_up"
+    if any(COMPLEX_PATTERN.search(earlier) for earlier in recent_queries or []):
+        return STRONG, "complex_thread"
+    if words > fast_tier_max_words or text.count("?") > 1:
+        return STRONG, "long_or_multi_part"
+    if GREETING_PATTERN.match(text):
+        return FAST, "greeting"
+    if SIMPLE_PATTERN.search(text):
+        return FAST, "simple_lookup"
+    if words <= 8:
+        return FAST, "short"
+    return STRONG, "default"
+
+def routing_context(conversation_history: List[Dict[str, Any]]) -> Tuple[Optional[str], List[str]]:
+    """
+    Pull what routing needs from a session's stored messages.
+
+    Args:
+        conversation_history: Message rows in chronological order, ending with the
+            current user message
+
+    Returns:
+        Tuple[Optional[str], List[str]]: The tier recorded on the latest AI reply, and
+        up to ROUTING_HISTORY_QUERIES earlier user messages
+    """
+    previous_tier = None
+    queries = []
+    for row in conversation_history:
+        message = row.get("message") or {}
+        if message.get("type") == "ai":
+            previous_tier = (message.get("data") or {}).get("model_tier", previous_tier)
+        elif message.get("type") == "human":
+            queries.append(message.get("content") or "")
+    # The last user message is the one being routed
+    earlier = queries[:-1][-routing_history_queries:] if routing_history_queries > 0 else []
+    return previous_tier, earlier
+
+class TierStats:
+    """Latency, token and cost totals for one model tier."""
+
+    def __init__(self, input_cost_per_mtok: float, output_cost_per_mtok: float):
+        self.input_cost_per_mtok = input_cost_per_mtok
+        self.output_cost_per_mtok = output_cost_per_mtok
+        self.runs = 0
+        self.request_tokens = 0
+        self.response_tokens = 0
+        self.cost = 0.0
+        self.latencies: deque = deque(maxlen=1000)
+
+    def record(self, latency_seconds: float, request_tokens: int, response_tokens: int) -> float:
+        cost = (request_tokens * self.input_cost_per_mtok + response_tokens * self.output_cost_per_mtok) / 1_000_000
+        self.runs += 1
+        self.request_tokens += request_tokens
+        self.response_tokens += response_tokens
+        self.cost += cost
+        self.latencies.append(latency_seconds)
+        return cost
+
+    def snapshot(self) -> Dict[str, Any]:
+        latencies = sorted(self.latencies)
+
+        def percentile(p: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 1)
+
+        return {
+            "runs": self.runs,
+            "request_tokens": self.request_tokens,
+            "response_tokens": self.response_tokens,
+            "estimated_cost": round(self.cost, 6),
+            "latency_p50_ms": percentile(0.50),
+            "latency_p95_ms": percentile(0.95)
+        }
+
+class ModelRouter:
+    """Chooses the model for each agent run and tracks per-tier usage."""
+
+    def __init__(self, strong_model: Any, fast_model: Optional[Any] = None):
+        self.models = {STRONG: strong_model, FAST: fast_model or strong_model}
+        # Without a separate fast model every request goes to the strong tier
+        self.enabled = fast_model is not None
+        self.stats = {
+            STRONG: TierStats(llm_input_cost_per_mtok, llm_output_cost_per_mtok),
+            FAST: TierStats(llm_fast_input_cost_per_mtok, llm_fast_output_cost_per_mtok)
+        }
+
+    def route(
+        self,
+        query: str,
+        has_files: bool = False,
+        previous_tier: Optional[str] = None,
+        recent_queries: Optional[List[str]] = None
+    ) -> Tuple[str, Any]:
+        """
+        Returns:
+            Tuple[str, Any]: The tier name and the model to run the agent with
+        """
+        if not self.enabled:
+            return STRONG, self.models[STRONG]
+        tier, reason = classify_query(query, has_files, previous_tier, recent_queries)
+        print(f"Routing query to the {tier} model ({reason})")
+        return tier, self.models[tier]
+
+    def record(self, tier: str, latency_seconds: float, usage: Any) -> float:
+        """
+        Record a finished run.
+
+        Args:
+            tier: The tier the run used
+            latency_seconds: Wall time of the run
+            usage: The run's pydantic-ai Usage
+
+        Returns:
+            float: The estimated cost of the run
+        """
+        return self.stats[tier].record(latency_seconds, usage.request_tokens or 0, usage.response_tokens or 0)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {"routing_enabled": self.enabled, **{tier: stats.snapshot() for tier, stats in self.stats.items()}}
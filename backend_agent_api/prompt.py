@@ -11,7 +11,7 @@ Tool Instructions:
 
 - Document Retrieval Strategy:
 For general information queries: Use RAG first. Then analyze individual documents if RAG is insufficient.
-For numerical analysis or data queries: Use SQL on tabular data
+For numerical analysis or data queries: Use SQL on tabular data - the analytics store (list_analytics_datasets, execute_analytics_query) when the dataset is there, otherwise execute_sql_query
 
 - Knowledge Boundaries: Explicitly acknowledge when you cannot find an answer in the available resources.
 
@@ -0,0 +1,96 @@
+"""
+Speculative document retrieval for agent runs.
+
+Most questions end in a retrieve_relevant_documents call, but the model only asks
+for it after its first round trip. A prefetch starts embedding the user's message
+and running match_documents while the conversation history loads, and the tool
+reuses the result when the model's query is close enough to the user's message.
+"""
+from typing import Awaitable, Callable, FrozenSet, Optional
+import asyncio
+import re
+import os
+
+# Off by default - a prefetch costs an embedding and an RPC even when the model never retrieves
+retrieval_prefetch_enabled = os.getenv("RETRIEVAL_PREFETCH_ENABLED", "false").lower() == "true"
+# Share of the shorter query's keywords the other must contain for the prefetch to be reused
+retrieval_prefetch_match_threshold = float(os.getenv("RETRIEVAL_PREFETCH_MATCH_THRESHOLD", "0.6"))
+
+STOPWORDS = frozenset("""
+a an and are as at be but by can could do does for from had has have how i if in is it its me my
+of on or our please should so tell than that the their them there these they this to us was we
+what when where which who why will with would you your
+""".split())
+
+WORD_PATTERN = re.compile(r"\w+")
+
+prefetch_metrics = {"started": 0, "used": 0, "unused": 0}
+
+def query_keywords(query: str) -> FrozenSet[str]:
+    """Lowercased words of the query without stopwords."""
+    return frozenset(word for word in WORD_PATTERN.findall(query.lower()) if word not in STOPWORDS)
+
+def queries_match(first: str, second: str, threshold: float = retrieval_prefetch_match_threshold) -> bool:
+    """
+    Whether two queries are close enough to share retrieval results.
+
+    Uses the overlap coefficient of their keywords, so a model query that keeps the
+    key terms of the user's message ("pro plan cost" for "How much does the pro plan
+    cost?") matches.
+    """
+    first_words, second_words = query_keywords(first), query_keywords(second)
+    if not first_words or not second_words:
+        return first.strip().lower() == second.strip().lower()
+    return len(first_words & second_words) / min(len(first_words), len(second_words)) >= threshold
+
+class RetrievalPrefetch:
+    """A retrieval started ahead of the agent run for the user's message."""
+
+    def __init__(self, query: str, retrieve: Callable[[str], Awaitable[str]]):
+        self.query = query
+        self.used = False
+        self.finished = False
+        self.task: asyncio.Task = asyncio.create_task(retrieve(query))
+        prefetch_metrics["started"] += 1
+
+    async def result_for(self, query: str) -> Optional[str]:
+        """
+        The prefetched result if it can stand in for a retrieval of query.
+
+        Returns:
+            Optional[str]: The formatted documents, or None if the tool should retrieve itself
+        """
+        if not queries_match(self.query, query):
+            return None
+        try:
+            # Shield so a cancelled tool call doesn't cancel the prefetch for a later call
+            result = await asyncio.shield(self.task)
+        except Exception as e:
+            print(f"Retrieval prefetch failed: {e}")
+            return None
+        # Tools report failures as text - retry those for real
+        if not isinstance(result, str) or result.startswith("Error"):
+            return None
+        if not self.used:
+            self.used = True
+            prefetch_metrics["used"] += 1
+        return result
+
+    def finish(self) -> None:
+        """Cancel the prefetch if it's still running and count it if the run never used it. Idempotent."""
+        if self.finished:
+            return
+        self.finished = True
+        if not self.task.done():
+            self.task.cancel()
+        elif not self.task.cancelled():
+            # Retrieve any exception so asyncio doesn't log it as unhandled
+            self.task.exception()
+        if not self.used:
+            prefetch_metrics["unused"] += 1
+
+def start_prefetch(query: str, retrieve: Callable[[str], Awaitable[str]], has_files: bool = False) -> Optional[RetrievalPrefetch]:
+    """Start a prefetch for the query if prefetching is enabled and it's worth it."""
+    if not retrieval_prefetch_enabled or has_files or not query_keywords(query):
+        return None
+    return RetrievalPrefetch(query, retrieve)
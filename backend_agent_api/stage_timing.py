@@ -0,0 +1,176 @@
+"""
+Per-stage latency timing for the agent API.
+
+Each HTTP request gets a StageTimer (set by StageTimingMiddleware) that the
+endpoint and the agent tools record stages into. Every stage is:
+- observed in a Prometheus histogram, served from /metrics,
+- exported as an OpenTelemetry span nested under one span for the request,
+- listed in a Server-Timing header on non-streaming responses.
+"""
+from typing import Any, Dict, Iterator, Optional
+from contextvars import ContextVar
+from contextlib import contextmanager
+from opentelemetry import trace
+import functools
+import time
+
+try:
+    from prometheus_client import Histogram, generate_latest, CONTENT_TYPE_LATEST
+except ImportError:
+    Histogram = None
+    generate_latest = None
+    CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+if Histogram is not None:
+    STAGE_SECONDS = Histogram(
+        "agent_api_stage_seconds",
+        "Time spent in each stage of an API request",
+        ["endpoint", "stage"],
+        buckets=LATENCY_BUCKETS
+    )
+    TOOL_SECONDS = Histogram(
+        "agent_api_tool_seconds",
+        "Time spent in each agent tool call",
+        ["tool", "outcome"],
+        buckets=LATENCY_BUCKETS
+    )
+else:
+    STAGE_SECONDS = None
+    TOOL_SECONDS = None
+
+tracer = trace.get_tracer("agent_api")
+
+class StageTimer:
+    """Stage durations for one request, plus the request's root span."""
+
+    def __init__(self, name: str, scope: Optional[Dict[str, Any]] = None):
+        self.scope = scope or {}
+        self.timings: Dict[str, float] = {}
+        # Streaming responses send their headers before most stages have run
+        self.streaming = False
+        self.start = time.monotonic()
+        self.span = tracer.start_span(name)
+
+    @property
+    def endpoint(self) -> str:
+        # The route template, not the raw path, so IDs don't blow up label cardinality
+        return getattr(self.scope.get("route"), "path", "unmatched")
+
+    def context(self):
+        """OpenTelemetry context with the request span as parent."""
+        return trace.set_span_in_context(self.span)
+
+    def record(self, stage: str, seconds: float) -> None:
+        # A stage can run more than once (e.g. several tool calls) - report the total
+        self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+        if STAGE_SECONDS is not None:
+            STAGE_SECONDS.labels(endpoint=self.endpoint, stage=stage).observe(seconds)
+
+    @contextmanager
+    def stage(self, name: str, **attributes: Any) -> Iterator[Any]:
+        """Time a block as a stage and trace it as a child span of the request."""
+        start = time.monotonic()
+        with tracer.start_as_current_span(name, context=self.context(), attributes=attributes or None) as span:
+            try:
+                yield span
+            finally:
+                self.record(name, time.monotonic() - start)
+
+    def server_timing_header(self) -> str:
+        entries = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in self.timings.items()]
+        entries.append(f"total;dur={(time.monotonic() - self.start) * 1000:.1f}")
+        return ", ".join(entries)
+
+    def finish(self, status_code: Optional[int] = None) -> None:
+        self.record("total", time.monotonic() - self.start)
+        if status_code is not None:
+            self.span.set_attribute("http.status_code", status_code)
+        self.span.end()
+
+current_timer: ContextVar[Optional[StageTimer]] = ContextVar("current_timer", default=None)
+
+@contextmanager
+def timed_stage(name: str, **attributes: Any) -> Iterator[Any]:
+    """Time a stage of the current request - a no-op outside a request."""
+    timer = current_timer.get()
+    if timer is None:
+        yield None
+        return
+    with timer.stage(name, **attributes) as span:
+        yield span
+
+def record_stage(name: str, seconds: float) -> None:
+    """Record a stage measured elsewhere, like the time to the first model token."""
+    timer = current_timer.get()
+    if timer is not None:
+        timer.record(name, seconds)
+
+def request_trace_context():
+    """OpenTelemetry context of the current request's span, or None outside a request."""
+    timer = current_timer.get()
+    return timer.context() if timer is not None else None
+
+def mark_streaming() -> None:
+    """Tell the middleware the current response streams, so it skips the Server-Timing header."""
+    timer = current_timer.get()
+    if timer is not None:
+        timer.streaming = True
+
+def timed_tool(func):
+    """Time an agent tool call, as a histogram and a span under the current request."""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        start = time.monotonic()
+        outcome = "error"
+        try:
+            with timed_stage(f"tool.{func.__name__}"):
+                result = await func(*args, **kwargs)
+            # Tools report most failures as text rather than raising
+            outcome = "error" if isinstance(result, str) and result.startswith("Error") else "ok"
+            return result
+        finally:
+            if TOOL_SECONDS is not None:
+                TOOL_SECONDS.labels(tool=func.__name__, outcome=outcome).observe(time.monotonic() - start)
+    return wrapper
+
+def metrics_payload() -> Optional[bytes]:
+    """Prometheus exposition of all metrics, or None if prometheus_client isn't installed."""
+    return generate_latest() if generate_latest is not None else None
+
+class StageTimingMiddleware:
+    """
+    ASGI middleware that gives each HTTP request a StageTimer.
+
+    Written as plain ASGI rather than BaseHTTPMiddleware so streaming responses and
+    client disconnect detection keep working.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timer = StageTimer(f"{scope['method']} {scope['path']}", scope)
+        token = current_timer.set(timer)
+        status = {"code": None}
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                timer.span.update_name(f"{scope['method']} {timer.endpoint}")
+                status["code"] = message["status"]
+                if not timer.streaming:
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"server-timing", timer.server_timing_header().encode("latin-1"))
+                    ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            timer.finish(status["code"])
+            current_timer.reset(token)
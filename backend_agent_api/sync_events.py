@@ -0,0 +1,265 @@
+"""
+Live sync events for the /api/sync/events server-sent events stream.
+
+One poller per process follows the sync tables with a change cursor: every poll
+interval it calls the get_sync_changes RPC with the newest sync_status.updated_at
+and sync_conflicts.created_at it has seen, and publishes what came back to every
+subscriber's queue. The poller only runs while someone is subscribed, and the
+database sees one query per interval however many dashboards are open.
+
+Each poll re-reads a short lookback window behind the newest timestamp, because a
+transaction can commit after a later one with an earlier timestamp. Rows already
+published are skipped by (id, timestamp), so a change is published once. A poll
+that fills a page continues from the last row's (timestamp, id) position instead,
+so a bulk sync that stamps thousands of rows at once is paged through in full.
+
+The health counts scan both tables, so a poll only asks for them when the previous
+poll saw changes, or every health interval to catch conflicts resolved elsewhere.
+"""
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from datetime import datetime, timedelta
+import asyncio
+import secrets
+import time
+import json
+import os
+
+# How often the shared poller asks the database for changes while anyone is subscribed
+sync_events_poll_interval = float(os.getenv("SYNC_EVENTS_POLL_INTERVAL", "2"))
+# How far behind the newest timestamp each poll looks for late-committing rows
+sync_events_lookback_seconds = float(os.getenv("SYNC_EVENTS_LOOKBACK_SECONDS", "5"))
+# Events buffered per subscriber - a client that falls further behind is disconnected
+sync_events_queue_size = int(os.getenv("SYNC_EVENTS_QUEUE_SIZE", "1000"))
+# Comment line sent when nothing happened, so proxies keep the connection open
+sync_events_heartbeat_seconds = float(os.getenv("SYNC_EVENTS_HEARTBEAT_SECONDS", "15"))
+# Rows of each table returned per poll
+sync_events_max_rows = int(os.getenv("SYNC_EVENTS_MAX_ROWS", "500"))
+# Longest a poll goes without recounting health while no rows change
+sync_events_health_interval = float(os.getenv("SYNC_EVENTS_HEALTH_INTERVAL", "30"))
+# How long a ticket from /api/sync/events/ticket can be used to open the stream
+sync_events_ticket_ttl_seconds = float(os.getenv("SYNC_EVENTS_TICKET_TTL_SECONDS", "30"))
+
+# Takes the get_sync_changes RPC parameters and returns its result
+ChangeFetcher = Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+def format_sse(event: Dict[str, Any]) -> str:
+    """Encode a published event in the text/event-stream format."""
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event['data'], default=str)}\n\n"
+
+class ChangeCursor:
+    """Where the next poll of one table starts reading."""
+
+    def __init__(self):
+        # Newest timestamp seen - None until the first poll sets the starting point
+        self.high_water: Optional[datetime] = None
+        # (timestamp, id) of the last row read, while the previous page was full
+        self.position: Optional[Tuple[str, str]] = None
+        # (id, timestamp) of rows published within the lookback window
+        self.published: Dict[Tuple[str, str], datetime] = {}
+
+    def start(self, lookback: timedelta) -> Tuple[Optional[str], Optional[str]]:
+        """The (since, after_id) to read from."""
+        if self.high_water is None:
+            return None, None
+        if self.position is not None:
+            return self.position
+        return (self.high_water - lookback).isoformat(), None
+
+    def advance(self, rows: List[Dict[str, Any]], timestamp_key: str, page_size: int, now: datetime, lookback: timedelta) -> None:
+        if self.high_water is None:
+            self.high_water = now
+        for row in rows:
+            self.high_water = max(self.high_water, datetime.fromisoformat(row[timestamp_key]))
+        self.position = (rows[-1][timestamp_key], str(rows[-1]["id"])) if len(rows) >= page_size else None
+        # Forget published rows behind this table's lookback window, so no query returns them again
+        horizon = self.high_water - lookback
+        self.published = {key: at for key, at in self.published.items() if at >= horizon}
+
+class SyncEventBroker:
+    """Polls the sync tables on behalf of every subscriber and fans the changes out."""
+
+    def __init__(
+        self,
+        fetch_changes: ChangeFetcher,
+        poll_interval: float = sync_events_poll_interval,
+        lookback_seconds: float = sync_events_lookback_seconds,
+        queue_size: int = sync_events_queue_size,
+        max_rows: int = sync_events_max_rows,
+        health_interval: float = sync_events_health_interval
+    ):
+        self.fetch_changes = fetch_changes
+        self.poll_interval = poll_interval
+        self.lookback = timedelta(seconds=lookback_seconds)
+        self.queue_size = queue_size
+        self.max_rows = max_rows
+        self.health_interval = health_interval
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.poll_task: Optional[asyncio.Task] = None
+        self.status_cursor = ChangeCursor()
+        self.conflicts_cursor = ChangeCursor()
+        self.health: Optional[Dict[str, Any]] = None
+        # Whether the next poll should recount health, and when it last did
+        self.health_due = True
+        self.health_checked_at = 0.0
+        self.event_id = 0
+        self.counters = {"polls": 0, "poll_errors": 0, "events": 0, "subscribers_dropped": 0}
+
+    def subscribe(self) -> asyncio.Queue:
+        """
+        Start receiving events. The latest health is queued right away if known.
+
+        Returns:
+            asyncio.Queue: Events as dicts with id, event and data - None means the stream is over
+        """
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        if self.health is not None:
+            queue.put_nowait(self._event("health", self.health))
+        self.subscribers.add(queue)
+        if self.poll_task is None or self.poll_task.done():
+            self.poll_task = asyncio.create_task(self._poll())
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        """Stop delivering to a queue. Polling stops with the last subscriber."""
+        self.subscribers.discard(queue)
+        if not self.subscribers and self.poll_task is not None:
+            self.poll_task.cancel()
+            self.poll_task = None
+            self._reset_cursors()
+
+    def _reset_cursors(self) -> None:
+        # Changes while nobody watches aren't replayed - the next subscriber starts from now
+        self.status_cursor = ChangeCursor()
+        self.conflicts_cursor = ChangeCursor()
+        self.health_due = True
+
+    async def stop(self) -> None:
+        """Stop polling and end every subscriber's stream."""
+        task, self.poll_task = self.poll_task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        for queue in list(self.subscribers):
+            self._close(queue)
+        self.subscribers.clear()
+
+    async def _poll(self) -> None:
+        # Subscribers dropped for lagging can leave nobody to poll for
+        while self.subscribers:
+            more = False
+            try:
+                more = await self.poll_once()
+            except Exception as e:
+                self.counters["poll_errors"] += 1
+                print(f"Error polling sync changes: {str(e)}")
+            # Keep reading while a burst fills whole pages
+            if not more:
+                await asyncio.sleep(self.poll_interval)
+        self._reset_cursors()
+
+    async def poll_once(self) -> bool:
+        """
+        Fetch changes after the cursors and publish them.
+
+        Returns:
+            bool: Whether a page came back full, so more changes are waiting
+        """
+        status_since, status_after_id = self.status_cursor.start(self.lookback)
+        conflicts_since, conflicts_after_id = self.conflicts_cursor.start(self.lookback)
+        include_health = self.health_due or time.monotonic() - self.health_checked_at >= self.health_interval
+        changes = await self.fetch_changes({
+            'status_since': status_since,
+            'status_after_id': status_after_id,
+            'conflicts_since': conflicts_since,
+            'conflicts_after_id': conflicts_after_id,
+            'max_rows': self.max_rows,
+            'include_health': include_health
+        })
+        self.counters["polls"] += 1
+
+        now = datetime.fromisoformat(changes["now"])
+        status_changes = changes.get("status_changes") or []
+        new_conflicts = changes.get("new_conflicts") or []
+        self._publish_rows("sync_status", status_changes, "updated_at", self.status_cursor)
+        self._publish_rows("conflict_created", new_conflicts, "created_at", self.conflicts_cursor)
+        self.status_cursor.advance(status_changes, "updated_at", self.max_rows, now, self.lookback)
+        self.conflicts_cursor.advance(new_conflicts, "created_at", self.max_rows, now, self.lookback)
+
+        # Changed rows may have moved the counts - recount on the next poll
+        if include_health:
+            self.health_checked_at = time.monotonic()
+        self.health_due = bool(status_changes or new_conflicts)
+
+        health = changes.get("health")
+        if health is not None and health != self.health:
+            self.health = health
+            self._publish(self._event("health", health))
+        return self.status_cursor.position is not None or self.conflicts_cursor.position is not None
+
+    def _publish_rows(self, event: str, rows: List[Dict[str, Any]], timestamp_key: str, cursor: ChangeCursor) -> None:
+        """Publish the rows that weren't published before."""
+        for row in rows:
+            key = (str(row["id"]), row[timestamp_key])
+            if key in cursor.published:
+                continue
+            cursor.published[key] = datetime.fromisoformat(row[timestamp_key])
+            self._publish(self._event(event, row))
+
+    def _event(self, event: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        self.event_id += 1
+        return {"id": self.event_id, "event": event, "data": data}
+
+    def _publish(self, event: Dict[str, Any]) -> None:
+        self.counters["events"] += 1
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Better to drop a lagging client, which reconnects and reloads the
+                # snapshot, than to let it silently miss events or buffer without bound
+                self.counters["subscribers_dropped"] += 1
+                self.subscribers.discard(queue)
+                self._close(queue)
+
+    def _close(self, queue: asyncio.Queue) -> None:
+        # Make room for the end-of-stream marker
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "subscribers": len(self.subscribers),
+            "polling": self.poll_task is not None and not self.poll_task.done(),
+            "health": self.health
+        }
+
+class StreamTickets:
+    """
+    Short-lived, single-use tickets for opening the event stream.
+
+    EventSource can't send an Authorization header, and a bearer token in the URL ends
+    up in proxy and server access logs. Instead the client trades its token for a
+    ticket with an authenticated POST and opens the stream with that. Tickets are held
+    in this process, so the stream has to be opened on the instance that issued it.
+    """
+
+    def __init__(self, ttl_seconds: float = sync_events_ticket_ttl_seconds):
+        self.ttl_seconds = ttl_seconds
+        self.tickets: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+
+    def issue(self, user: Dict[str, Any]) -> str:
+        """Create a ticket that authenticates as the user once, within the TTL."""
+        now = time.monotonic()
+        self.tickets = {ticket: entry for ticket, entry in self.tickets.items() if entry[0] > now}
+        ticket = secrets.token_urlsafe(32)
+        self.tickets[ticket] = (now + self.ttl_seconds, user)
+        return ticket
+
+    def redeem(self, ticket: str) -> Optional[Dict[str, Any]]:
+        """The ticket's user, or None if it is unknown, expired or already used."""
+        entry = self.tickets.pop(ticket, None)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        return entry[1]
@@ -0,0 +1,253 @@
+"""
+Manual sync job queue.
+
+/api/sync/trigger queues a request in the sync_requests table through the
+enqueue_sync_request RPC, which folds duplicate triggers for the same Keap
+account and sync type into the request that is already pending or running. A
+worker in the API process claims pending requests with claim_sync_requests
+(which enforces per-type concurrency limits across every worker) and runs each
+one by triggering it on the sync coordinator and polling the trigger's status
+until the sync has finished, so a request stays 'running' for as long as the
+sync really runs. Outcomes are recorded with finish_sync_request, which retries
+failures up to a limit with exponential backoff.
+"""
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+from supabase import Client
+from httpx import AsyncClient, HTTPError, HTTPStatusError
+import asyncio
+import socket
+import uuid
+import os
+
+SYNC_TYPES = ("contacts", "orders", "tags", "subscriptions", "all")
+
+# Base URL of the sync coordinator worker - the job worker only runs when it's set
+sync_coordinator_url = os.getenv("SYNC_COORDINATOR_URL", "").rstrip("/")
+sync_coordinator_token = os.getenv("SYNC_COORDINATOR_AUTH_TOKEN", "")
+# Concurrent runs per sync type across all workers, e.g. "contacts=2,orders=2"
+sync_type_concurrency = os.getenv("SYNC_TYPE_CONCURRENCY", "all=1,contacts=2,orders=2,tags=1,subscriptions=1")
+sync_default_concurrency = int(os.getenv("SYNC_DEFAULT_CONCURRENCY", "1"))
+sync_worker_poll_interval = float(os.getenv("SYNC_WORKER_POLL_INTERVAL", "5"))
+sync_job_max_attempts = int(os.getenv("SYNC_JOB_MAX_ATTEMPTS", "3"))
+# A failed request is retried after the base delay, doubling per attempt up to the max
+sync_job_retry_base_seconds = int(os.getenv("SYNC_JOB_RETRY_BASE_SECONDS", "30"))
+sync_job_retry_max_seconds = int(os.getenv("SYNC_JOB_RETRY_MAX_SECONDS", "900"))
+sync_job_timeout = float(os.getenv("SYNC_JOB_TIMEOUT", "900"))
+# How often a running sync's status is checked on the coordinator, and the timeout of each call
+sync_coordinator_poll_interval = float(os.getenv("SYNC_COORDINATOR_POLL_INTERVAL", "10"))
+sync_coordinator_request_timeout = float(os.getenv("SYNC_COORDINATOR_REQUEST_TIMEOUT", "30"))
+# Running requests older than this are assumed abandoned by a dead worker and requeued
+sync_job_stale_seconds = int(os.getenv("SYNC_JOB_STALE_SECONDS", "3600"))
+
+SyncRunner = Callable[[Dict[str, Any]], Awaitable[None]]
+
+def parse_concurrency_limits(spec: str) -> Dict[str, int]:
+    """
+    Parse "type=limit" pairs, e.g. "contacts=2,orders=1".
+
+    Raises:
+        ValueError: For an unknown sync type or a limit below 1
+    """
+    limits = {}
+    for pair in spec.split(","):
+        if not pair.strip():
+            continue
+        sync_type, _, limit = pair.partition("=")
+        sync_type = sync_type.strip()
+        if sync_type not in SYNC_TYPES:
+            raise ValueError(f"Unknown sync type in concurrency limits: {sync_type}")
+        limits[sync_type] = int(limit)
+        if limits[sync_type] < 1:
+            raise ValueError(f"Concurrency limit for {sync_type} must be at least 1")
+    return limits
+
+async def enqueue_sync_request(supabase: Client, keap_account_id: str, sync_type: str, triggered_by: Optional[str]) -> Dict[str, Any]:
+    """
+    Queue a sync, or fold it into the pending or running request for the same account and type.
+
+    Returns:
+        Dict[str, Any]: The sync_requests row, plus coalesced=True if it was already pending or running
+    """
+    response = await asyncio.to_thread(supabase.rpc('enqueue_sync_request', {
+        'keap_account_id_param': keap_account_id,
+        'sync_type_param': sync_type,
+        'triggered_by_param': triggered_by
+    }).execute)
+    return response.data
+
+async def get_sync_request(supabase: Client, request_id: str) -> Optional[Dict[str, Any]]:
+    response = await asyncio.to_thread(
+        supabase.table('sync_requests').select('*').eq('id', request_id).limit(1).execute
+    )
+    return response.data[0] if response.data else None
+
+def coordinator_runner(
+    http_client: AsyncClient,
+    base_url: str = sync_coordinator_url,
+    token: str = sync_coordinator_token,
+    poll_interval: float = sync_coordinator_poll_interval,
+    request_timeout: float = sync_coordinator_request_timeout
+) -> SyncRunner:
+    """
+    A runner that starts the sync on the coordinator's per-account endpoint and waits for it.
+
+    The coordinator only records the trigger and answers right away, so the runner
+    polls the trigger's status until the coordinator has completed or failed the sync.
+
+    Raises:
+        RuntimeError: If the coordinator reports the sync failed or doesn't return a trigger ID
+    """
+    async def run(request: Dict[str, Any]) -> None:
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        account_url = f"{base_url}/keap/{request['keap_account_id']}"
+        response = await http_client.post(
+            f"{account_url}/sync/trigger",
+            json={"keapAccountId": request["keap_account_id"], "syncType": request["sync_type"]},
+            headers=headers,
+            timeout=request_timeout
+        )
+        response.raise_for_status()
+        trigger_id = response.json().get("triggerId")
+        if not trigger_id:
+            raise RuntimeError("Sync coordinator did not return a trigger ID to follow")
+
+        while True:
+            await asyncio.sleep(poll_interval)
+            try:
+                response = await http_client.get(
+                    f"{account_url}/sync/status",
+                    params={"triggerId": trigger_id},
+                    headers=headers,
+                    timeout=request_timeout
+                )
+                response.raise_for_status()
+            except HTTPError as e:
+                # The sync keeps running on the coordinator - only an unknown trigger is final
+                if isinstance(e, HTTPStatusError) and e.response.status_code == 404:
+                    raise
+                print(f"Error checking status of sync trigger {trigger_id}: {str(e)}")
+                continue
+            status = response.json()
+            if status["status"] == "completed":
+                return
+            if status["status"] == "failed":
+                raise RuntimeError(status.get("error") or "Sync failed on the coordinator")
+    return run
+
+class SyncJobWorker:
+    """Claims and runs queued sync requests until stopped."""
+
+    def __init__(
+        self,
+        supabase: Client,
+        run: SyncRunner,
+        type_limits: Optional[Dict[str, int]] = None,
+        default_limit: int = sync_default_concurrency,
+        poll_interval: float = sync_worker_poll_interval,
+        max_attempts: int = sync_job_max_attempts,
+        job_timeout: float = sync_job_timeout,
+        stale_seconds: int = sync_job_stale_seconds,
+        retry_base_seconds: int = sync_job_retry_base_seconds,
+        retry_max_seconds: int = sync_job_retry_max_seconds
+    ):
+        self.supabase = supabase
+        self.run = run
+        self.type_limits = type_limits if type_limits is not None else parse_concurrency_limits(sync_type_concurrency)
+        self.default_limit = default_limit
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.job_timeout = job_timeout
+        self.stale_seconds = stale_seconds
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.worker_id = f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+        self.poll_task: Optional[asyncio.Task] = None
+        self.run_tasks: Set[asyncio.Task] = set()
+        self.wakeup: Optional[asyncio.Event] = None
+        self.counters = {"claimed": 0, "succeeded": 0, "failed": 0, "poll_errors": 0}
+
+    async def start(self) -> None:
+        self.wakeup = asyncio.Event()
+        self.poll_task = asyncio.create_task(self._poll())
+
+    async def stop(self) -> None:
+        """Stop claiming work. Interrupted runs are requeued once they go stale."""
+        for task in [self.poll_task, *self.run_tasks]:
+            if task is not None:
+                task.cancel()
+        await asyncio.gather(*[t for t in [self.poll_task, *self.run_tasks] if t is not None], return_exceptions=True)
+        self.poll_task = None
+
+    def wake(self) -> None:
+        """Claim right away rather than at the next poll, e.g. after a trigger."""
+        if self.wakeup is not None:
+            self.wakeup.set()
+
+    async def claim(self) -> int:
+        """Claim what the concurrency limits allow and start running it. Returns the number claimed."""
+        response = await asyncio.to_thread(self.supabase.rpc('claim_sync_requests', {
+            'worker_id_param': self.worker_id,
+            'type_limits': self.type_limits,
+            'default_limit': self.default_limit,
+            'stale_after_seconds': self.stale_seconds
+        }).execute)
+        claimed = response.data or []
+        for request in claimed:
+            task = asyncio.create_task(self._run(request))
+            self.run_tasks.add(task)
+            task.add_done_callback(self._run_finished)
+        self.counters["claimed"] += len(claimed)
+        return len(claimed)
+
+    def _run_finished(self, task: asyncio.Task) -> None:
+        self.run_tasks.discard(task)
+        # A finished run frees a concurrency slot - look for more work
+        self.wake()
+
+    async def _poll(self) -> None:
+        while True:
+            try:
+                await self.claim()
+            except Exception as e:
+                self.counters["poll_errors"] += 1
+                print(f"Error claiming sync requests: {str(e)}")
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+
+    async def _run(self, request: Dict[str, Any]) -> None:
+        print(f"Running {request['sync_type']} sync for Keap account {request['keap_account_id']} (request {request['id']})")
+        error = None
+        try:
+            await asyncio.wait_for(self.run(request), timeout=self.job_timeout)
+        except asyncio.TimeoutError:
+            error = f"Sync timed out after {self.job_timeout}s"
+        except Exception as e:
+            error = str(e) or type(e).__name__
+
+        if error:
+            self.counters["failed"] += 1
+            print(f"Sync request {request['id']} failed: {error}")
+        else:
+            self.counters["succeeded"] += 1
+        try:
+            await asyncio.to_thread(self.supabase.rpc('finish_sync_request', {
+                'request_id_param': request['id'],
+                'succeeded': error is None,
+                'error_param': error,
+                'max_attempts': self.max_attempts,
+                'retry_base_seconds': self.retry_base_seconds,
+                'retry_max_seconds': self.retry_max_seconds
+            }).execute)
+        except Exception as e:
+            # The request stays 'running' and is requeued once it goes stale
+            print(f"Error recording outcome of sync request {request['id']}: {str(e)}")
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "running": len(self.run_tasks),
+            "type_limits": self.type_limits
+        }
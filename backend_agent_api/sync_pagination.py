@@ -0,0 +1,94 @@
+"""
+Keyset pagination and field projection for the sync monitoring list endpoints.
+
+Lists are ordered newest first by a timestamp column with the row id as a tie
+breaker. A page's cursor is the (timestamp, id) of its last row, and the next page
+is every row that sorts after it. Unlike OFFSET this costs the same for any page
+and doesn't skip or repeat rows while new conflicts are being written.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import base64
+import json
+
+# Largest page a client can ask for
+MAX_PAGE_SIZE = 200
+
+def encode_cursor(sort_value: Any, row_id: Any) -> str:
+    """An opaque, URL-safe cursor for the position after a row."""
+    payload = json.dumps([sort_value, row_id], separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """
+    The (sort value, id) position a cursor points after.
+
+    Raises:
+        ValueError: If the cursor wasn't produced by encode_cursor
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(sort_value, str) or not isinstance(row_id, str):
+        raise ValueError("Invalid cursor")
+    return sort_value, row_id
+
+def _quote(value: str) -> str:
+    # Timestamps contain '.' and ':', which PostgREST's logic trees reserve
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+def keyset_filter(sort_column: str, id_column: str, position: Tuple[str, str]) -> str:
+    """
+    PostgREST or= filter for the rows after position in descending (sort_column, id_column) order.
+
+    Returns:
+        str: The filter for the query builder's or_()
+    """
+    sort_value, row_id = position
+    return (
+        f"{sort_column}.lt.{_quote(sort_value)},"
+        f"and({sort_column}.eq.{_quote(sort_value)},{id_column}.lt.{_quote(row_id)})"
+    )
+
+def select_fields(
+    requested: Optional[str],
+    allowed: Sequence[str],
+    default: Sequence[str],
+    required: Iterable[str] = ()
+) -> List[str]:
+    """
+    The columns to select for a comma-separated fields parameter.
+
+    Args:
+        requested: The client's fields parameter, or None for the default projection
+        allowed: Columns the client may ask for
+        default: Columns returned when the client doesn't ask
+        required: Columns always returned, e.g. those the cursor is built from
+
+    Returns:
+        List[str]: Columns in request order, required ones first
+
+    Raises:
+        ValueError: If an unknown field is requested
+    """
+    fields = default if requested is None else [f.strip() for f in requested.split(",") if f.strip()]
+    unknown = [f for f in fields if f not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(allowed)}")
+    columns = list(required)
+    columns.extend(f for f in fields if f not in columns)
+    return columns
+
+def build_page(rows: List[Dict[str, Any]], limit: int, sort_column: str, id_column: str = "id") -> Dict[str, Any]:
+    """
+    A page of results from rows fetched with limit + 1.
+
+    The extra row only tells us there's a next page - it isn't returned.
+    """
+    items = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit and items:
+        last = items[-1]
+        next_cursor = encode_cursor(last[sort_column], last[id_column])
+    return {"items": items, "next_cursor": next_cursor}
@@ -0,0 +1,130 @@
+"""
+Bulk sync conflict resolution.
+
+Conflicts are picked by a list of IDs or by a filter over the pending conflicts,
+and resolved in batches with the resolve_sync_conflicts_batch RPC. Each batch is
+one transaction in which every conflict is resolved under its own savepoint, so
+a conflict that fails is reported without undoing the rest of its batch. A
+progress update is yielded after every batch.
+"""
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from supabase import Client
+import asyncio
+import os
+
+from sync_pagination import keyset_filter
+
+# Strategies that can be applied without looking at each conflict
+BULK_RESOLUTION_STRATEGIES = ("keap_wins", "supabase_wins")
+
+# Conflicts resolved per RPC call, i.e. per transaction
+sync_bulk_resolve_batch_size = int(os.getenv("SYNC_BULK_RESOLVE_BATCH_SIZE", "100"))
+# Most conflict IDs one request may list
+sync_bulk_resolve_max_ids = int(os.getenv("SYNC_BULK_RESOLVE_MAX_IDS", "10000"))
+# Failures listed in the final progress update - the count covers all of them
+MAX_REPORTED_FAILURES = 100
+
+def _filtered(query, filters: Dict[str, Optional[str]]):
+    """Limit a sync_conflicts query to pending conflicts matching the filters."""
+    query = query.is_('resolved_at', 'null')
+    if filters.get('entity_type'):
+        query = query.eq('entity_type', filters['entity_type'])
+    if filters.get('created_after'):
+        query = query.gte('created_at', filters['created_after'])
+    if filters.get('created_before'):
+        query = query.lt('created_at', filters['created_before'])
+    return query
+
+async def count_pending_conflicts(supabase: Client, filters: Dict[str, Optional[str]]) -> int:
+    query = _filtered(supabase.table('sync_conflicts').select('id', count='exact'), filters).limit(1)
+    response = await asyncio.to_thread(query.execute)
+    return response.count or 0
+
+async def pending_conflict_ids(
+    supabase: Client,
+    filters: Dict[str, Optional[str]],
+    limit: int,
+    after: Optional[Tuple[str, str]] = None
+) -> List[Dict[str, Any]]:
+    """
+    The next pending conflicts matching the filters, newest first.
+
+    Conflicts that fail to resolve stay pending, so batches are walked with a
+    (created_at, id) keyset position instead of re-reading the first page.
+    """
+    query = _filtered(supabase.table('sync_conflicts').select('id,created_at'), filters)
+    if after is not None:
+        query = query.or_(keyset_filter('created_at', 'id', after))
+    query = query.order('created_at', desc=True).order('id', desc=True).limit(limit)
+    response = await asyncio.to_thread(query.execute)
+    return response.data or []
+
+async def resolve_conflict_batch(
+    supabase: Client,
+    conflict_ids: List[str],
+    strategy: str,
+    resolved_by: Optional[str],
+    notes: Optional[str]
+) -> Dict[str, Any]:
+    """
+    Resolve conflicts in one transaction.
+
+    Returns:
+        Dict[str, Any]: resolved - the resolved IDs, failed - {id, error} for the rest
+    """
+    response = await asyncio.to_thread(supabase.rpc('resolve_sync_conflicts_batch', {
+        'conflict_ids': conflict_ids,
+        'resolution_strategy_param': strategy,
+        'resolved_by_param': resolved_by,
+        'resolution_notes_param': notes
+    }).execute)
+    return response.data or {"resolved": [], "failed": []}
+
+async def bulk_resolve_conflicts(
+    supabase: Client,
+    strategy: str,
+    resolved_by: Optional[str],
+    notes: Optional[str] = None,
+    conflict_ids: Optional[List[str]] = None,
+    filters: Optional[Dict[str, Optional[str]]] = None,
+    batch_size: int = sync_bulk_resolve_batch_size
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Resolve the listed conflicts, or every pending conflict matching the filters.
+
+    Yields:
+        Dict[str, Any]: Progress after each batch (resolved, failed, total), then a
+        final update with complete=True and the first failures
+    """
+    progress = {"resolved": 0, "failed": 0, "total": 0, "batches": 0}
+    failures: List[Dict[str, Any]] = []
+
+    def record(result: Dict[str, Any]) -> Dict[str, Any]:
+        progress["resolved"] += len(result.get("resolved") or [])
+        progress["failed"] += len(result.get("failed") or [])
+        progress["batches"] += 1
+        # Conflicts written after the count can still match the filter
+        progress["total"] = max(progress["total"], progress["resolved"] + progress["failed"])
+        failures.extend((result.get("failed") or [])[:MAX_REPORTED_FAILURES - len(failures)])
+        return dict(progress)
+
+    if conflict_ids is not None:
+        progress["total"] = len(conflict_ids)
+        for start in range(0, len(conflict_ids), batch_size):
+            batch = conflict_ids[start:start + batch_size]
+            yield record(await resolve_conflict_batch(supabase, batch, strategy, resolved_by, notes))
+    else:
+        filters = filters or {}
+        progress["total"] = await count_pending_conflicts(supabase, filters)
+        after = None
+        while True:
+            rows = await pending_conflict_ids(supabase, filters, batch_size, after)
+            if not rows:
+                break
+            after = (rows[-1]["created_at"], str(rows[-1]["id"]))
+            batch = [str(row["id"]) for row in rows]
+            yield record(await resolve_conflict_batch(supabase, batch, strategy, resolved_by, notes))
+            if len(rows) < batch_size:
+                break
+
+    yield {**progress, "complete": True, "failures": failures}
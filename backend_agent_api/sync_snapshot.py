@@ -0,0 +1,126 @@
+"""
+Server-side cache for the sync dashboard snapshot.
+
+Every open dashboard polls the same data, so the snapshot is computed at most once
+per TTL no matter how many clients ask. Once the TTL passes, callers still get
+the cached snapshot immediately while one background task refreshes it. Only a
+snapshot older than the stale limit makes a caller wait. Each snapshot carries an
+ETag, so a dashboard whose data hasn't changed gets a bodyless 304.
+"""
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+import hashlib
+import asyncio
+import json
+import time
+import os
+
+# Snapshots younger than this are served without touching the database
+sync_snapshot_ttl_seconds = float(os.getenv("SYNC_SNAPSHOT_TTL_SECONDS", "10"))
+# Snapshots up to this old are served while a refresh runs in the background
+sync_snapshot_max_stale_seconds = float(os.getenv("SYNC_SNAPSHOT_MAX_STALE_SECONDS", "60"))
+# Rows of each list included in the snapshot
+sync_snapshot_activities_limit = int(os.getenv("SYNC_SNAPSHOT_ACTIVITIES_LIMIT", "20"))
+sync_snapshot_conflicts_limit = int(os.getenv("SYNC_SNAPSHOT_CONFLICTS_LIMIT", "50"))
+
+# Keys that change on every computation without the data changing
+VOLATILE_KEYS = ("generated_at",)
+
+def snapshot_etag(snapshot: Dict[str, Any]) -> str:
+    """A strong ETag over the snapshot's data, ignoring when it was generated."""
+    stable = {key: value for key, value in snapshot.items() if key not in VOLATILE_KEYS}
+    digest = hashlib.sha256(json.dumps(stable, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+    return f'"{digest[:32]}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header covers the ETag (weak comparison, as RFC 9110 asks for)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+class SnapshotCache:
+    """A single cached value with a TTL, background refresh and one computation at a time."""
+
+    def __init__(
+        self,
+        compute: Callable[[], Awaitable[Dict[str, Any]]],
+        ttl_seconds: float = sync_snapshot_ttl_seconds,
+        max_stale_seconds: float = sync_snapshot_max_stale_seconds
+    ):
+        self.compute = compute
+        self.ttl_seconds = ttl_seconds
+        self.max_stale_seconds = max(max_stale_seconds, ttl_seconds)
+        self.value: Optional[Dict[str, Any]] = None
+        self.etag: Optional[str] = None
+        self.computed_at = 0.0
+        self.refresh_task: Optional[asyncio.Task] = None
+        # Bumped by invalidate, so a refresh that started before it doesn't store old data
+        self.generation = 0
+        self.counters = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "refresh_failures": 0}
+
+    async def _refresh(self) -> None:
+        generation = self.generation
+        try:
+            value = await self.compute()
+        except Exception:
+            self.counters["refresh_failures"] += 1
+            raise
+        if generation != self.generation:
+            return
+        self.value = value
+        self.etag = snapshot_etag(value)
+        self.computed_at = time.monotonic()
+        self.counters["refreshes"] += 1
+
+    def _start_refresh(self) -> asyncio.Task:
+        # Concurrent callers share one in-flight computation
+        if self.refresh_task is None or self.refresh_task.done():
+            self.refresh_task = asyncio.create_task(self._refresh())
+            self.refresh_task.add_done_callback(self._log_refresh_failure)
+        return self.refresh_task
+
+    @staticmethod
+    def _log_refresh_failure(task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Error refreshing sync snapshot: {task.exception()}")
+
+    async def get(self) -> Tuple[Dict[str, Any], str]:
+        """
+        The current snapshot and its ETag.
+
+        Returns:
+            Tuple[Dict[str, Any], str]: The snapshot and its quoted ETag
+
+        Raises:
+            Exception: Whatever compute raised, if there's no usable cached snapshot
+        """
+        age = time.monotonic() - self.computed_at
+        if self.value is not None and age < self.ttl_seconds:
+            self.counters["hits"] += 1
+        elif self.value is not None and age < self.max_stale_seconds:
+            # Serve what we have - a failed background refresh just leaves it in place
+            self.counters["stale_hits"] += 1
+            self._start_refresh()
+        else:
+            self.counters["misses"] += 1
+            # An invalidate during the refresh drops its result - compute again until one lands
+            while True:
+                # Shield so a caller that disconnects doesn't cancel the refresh for everyone else
+                await asyncio.shield(self._start_refresh())
+                if self.value is not None:
+                    break
+        return self.value, self.etag
+
+    def invalidate(self) -> None:
+        """Make the next get recompute, e.g. after resolving a conflict."""
+        self.generation += 1
+        self.computed_at = 0.0
+        self.value = None
+        self.refresh_task = None
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "age_seconds": round(time.monotonic() - self.computed_at, 1) if self.value is not None else None
+        }
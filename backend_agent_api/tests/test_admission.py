@@ -0,0 +1,76 @@
+import pytest
+import asyncio
+
+# Import the classes to test
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from admission import AdmissionController, AdmissionRejected
+
+
+class TestAdmissionController:
+    @pytest.mark.asyncio
+    async def test_admits_within_limits(self):
+        controller = AdmissionController(max_concurrent=2, max_per_user=2)
+
+        slot1 = await controller.acquire("user1")
+        slot2 = await controller.acquire("user2")
+
+        assert controller.metrics()["active"] == 2
+        slot1.release()
+        slot2.release()
+        # Releasing twice is harmless
+        slot1.release()
+        assert controller.metrics()["active"] == 0
+        assert controller.metrics()["admitted"] == 2
+
+    @pytest.mark.asyncio
+    async def test_waits_for_a_free_slot(self):
+        controller = AdmissionController(max_concurrent=1, max_per_user=1, queue_timeout=2)
+        first = await controller.acquire("user1")
+
+        waiter = asyncio.create_task(controller.acquire("user2"))
+        await asyncio.sleep(0.05)
+        assert controller.metrics()["waiting"] == 1
+
+        first.release()
+        second = await asyncio.wait_for(waiter, timeout=1)
+
+        assert second.queue_wait > 0
+        metrics = controller.metrics()
+        assert metrics["queued"] == 1
+        assert metrics["queue_wait_p99_ms"] > 0
+        second.release()
+
+    @pytest.mark.asyncio
+    async def test_per_user_cap(self):
+        controller = AdmissionController(max_concurrent=10, max_per_user=1, queue_timeout=0.05)
+        slot = await controller.acquire("user1")
+
+        # Other users are unaffected
+        other = await controller.acquire("user2")
+
+        with pytest.raises(AdmissionRejected) as exc_info:
+            await controller.acquire("user1")
+        assert exc_info.value.reason == "queue_timeout"
+        assert controller.metrics()["rejected_timeout"] == 1
+        slot.release()
+        other.release()
+
+    @pytest.mark.asyncio
+    async def test_rejects_when_queue_is_full(self):
+        controller = AdmissionController(max_concurrent=1, max_per_user=1, max_queued=1, queue_timeout=2, retry_after=5)
+        slot = await controller.acquire("user1")
+        waiter = asyncio.create_task(controller.acquire("user2"))
+        await asyncio.sleep(0.05)
+
+        with pytest.raises(AdmissionRejected) as exc_info:
+            await controller.acquire("user3")
+
+        assert exc_info.value.reason == "queue_full"
+        # One run queued per slot doubles the suggested back-off
+        assert exc_info.value.retry_after == 10
+        assert controller.metrics()["rejected_queue_full"] == 1
+
+        slot.release()
+        (await waiter).release()
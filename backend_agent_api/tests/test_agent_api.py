@@ -0,0 +1,401 @@
+import pytest
+import asyncio
+import json
+from unittest.mock import AsyncMock, MagicMock, patch
+
+# Import the modules to test
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pydantic_ai.models.function import FunctionModel, DeltaToolCall
+import agent as agent_module
+import agent_api
+from admission import AdmissionController
+from model_router import ModelRouter
+from blob_store import BlobStore
+
+
+@pytest.fixture
+def api_state():
+    """Patch the API's global clients and return the mocked job queue."""
+    job_queue = MagicMock()
+    job_queue.enqueue = AsyncMock()
+    job_queue.wait_for_key = AsyncMock(return_value=True)
+    mem0_client = MagicMock()
+    mem0_client.search = AsyncMock(return_value={"results": []})
+    with patch.object(agent_api, 'job_queue', job_queue), \
+         patch.object(agent_api, 'mem0_client', mem0_client), \
+         patch.object(agent_api, 'supabase', MagicMock()), \
+         patch.object(agent_api, 'check_rate_limit', AsyncMock(return_value=True)), \
+         patch.object(agent_api, 'store_message', AsyncMock()), \
+         patch.object(agent_api, 'fetch_conversation_history', AsyncMock(return_value=[])), \
+         patch.object(agent_api, 'disconnect_poll_interval', 0.01), \
+         patch.object(agent_api, 'admission_controller', AdmissionController(max_concurrent=1, max_per_user=1, queue_timeout=0.05)), \
+         patch.object(agent_api, 'model_router', ModelRouter(strong_model=None)), \
+         patch.dict(agent_api.agent_run_metrics, {"completed": 0, "cancelled": 0}):
+        yield job_queue
+
+
+def make_http_request(disconnected):
+    http_request = MagicMock()
+    http_request.is_disconnected = AsyncMock(side_effect=lambda: disconnected["value"])
+    return http_request
+
+
+class TestClientDisconnect:
+    @pytest.mark.asyncio
+    async def test_disconnect_cancels_run_and_tools(self, api_state):
+        tool_cancelled = asyncio.Event()
+
+        async def slow_list_documents(ctx):
+            try:
+                await asyncio.sleep(30)
+            except asyncio.CancelledError:
+                tool_cancelled.set()
+                raise
+
+        async def stream_model(messages, info):
+            yield "partial answer"
+            yield {0: DeltaToolCall(name='list_documents', json_args='{}')}
+
+        tool = agent_module.agent._function_tools['list_documents']
+        disconnected = {"value": False}
+        request = agent_api.AgentRequest(query="hi", user_id="user1", request_id="req1", session_id="user1~abc")
+
+        with patch.object(tool, 'function', agent_module.cancellable_tool(slow_list_documents)), \
+             agent_module.agent.override(model=FunctionModel(stream_function=stream_model)):
+            response = await agent_api.pydantic_agent(request, make_http_request(disconnected), user={"id": "user1"})
+            stream = response.body_iterator
+
+            assert await stream.__anext__() == b'{"text": "partial answer"}\n'
+            disconnected["value"] = True
+            with pytest.raises(StopAsyncIteration):
+                await stream.__anext__()
+
+            await asyncio.wait_for(tool_cancelled.wait(), timeout=2)
+            await asyncio.sleep(0.05)
+
+        assert agent_api.agent_run_metrics == {"completed": 0, "cancelled": 1}
+        assert agent_api.admission_controller.metrics()["active"] == 0
+        job_type, payload = api_state.enqueue.call_args.args
+        assert job_type == "store_message"
+        assert payload["record"]["message"] == {
+            "type": "ai",
+            "content": "partial answer",
+            "data": {"request_id": "req1", "cancelled": True}
+        }
+        assert payload["record"]["message_data"]
+
+    @pytest.mark.asyncio
+    async def test_completed_run_is_stored(self, api_state):
+        async def stream_model(messages, info):
+            yield "hello"
+
+        request = agent_api.AgentRequest(query="hi", user_id="user1", request_id="req1", session_id="user1~abc")
+
+        with agent_module.agent.override(model=FunctionModel(stream_function=stream_model)):
+            response = await agent_api.pydantic_agent(request, make_http_request({"value": False}), user={"id": "user1"})
+            chunks = [chunk async for chunk in response.body_iterator]
+
+        assert chunks[-1] == b'{"text": "hello", "complete": true}\n'
+        assert agent_api.agent_run_metrics == {"completed": 1, "cancelled": 0}
+        assert agent_api.model_router.metrics()["strong"]["runs"] == 1
+        assert agent_api.admission_controller.metrics()["active"] == 0
+        job_type, payload = api_state.enqueue.call_args.args
+        assert job_type == "store_message"
+        assert payload["record"]["message"]["data"] == {"request_id": "req1", "model_tier": "strong"}
+
+
+class TestAdmission:
+    @pytest.mark.asyncio
+    async def test_busy_response_when_no_slot_is_free(self, api_state):
+        slot = await agent_api.admission_controller.acquire("user1")
+        request = agent_api.AgentRequest(query="hi", user_id="user1", request_id="req1", session_id="user1~abc")
+
+        response = await agent_api.pydantic_agent(request, make_http_request({"value": False}), user={"id": "user1"})
+        chunks = [chunk async for chunk in response.body_iterator]
+
+        assert response.status_code == 503
+        assert int(response.headers["Retry-After"]) >= 1
+        assert b"busy" in chunks[0]
+        slot.release()
+
+    @pytest.mark.asyncio
+    async def test_slot_released_on_early_return(self, api_state):
+        request = agent_api.AgentRequest(query="hi", user_id="user1", request_id="req1", session_id="user1~abc")
+
+        with patch.object(agent_api, 'check_rate_limit', AsyncMock(return_value=False)):
+            await agent_api.pydantic_agent(request, make_http_request({"value": False}), user={"id": "user1"})
+
+        assert agent_api.admission_controller.metrics()["active"] == 0
+
+
+
+class TestAttachments:
+    @pytest.mark.asyncio
+    async def test_inline_attachments_are_stored_as_references(self, tmp_path):
+        files = [
+            agent_api.FileAttachment(fileName="notes.txt", mimeType="text/plain", content="aGVsbG8="),
+            agent_api.FileAttachment(fileName="missing.pdf", mimeType="application/pdf", blob_id="0" * 64)
+        ]
+
+        with patch.object(agent_api, 'blob_store', BlobStore(root_dir=str(tmp_path))):
+            references = await agent_api.resolve_attachments("user1", files)
+            assert await agent_api.blob_store.get("user1", references[0]["blob_id"]) == b"hello"
+
+        assert len(references) == 1
+        assert references[0]["fileName"] == "notes.txt"
+        assert references[0]["size"] == 5
+        assert "content" not in references[0]
+
+    @pytest.mark.asyncio
+    async def test_uploaded_size_comes_from_the_store(self, tmp_path):
+        with patch.object(agent_api, 'blob_store', BlobStore(root_dir=str(tmp_path))):
+            stored = await agent_api.blob_store.put_bytes("user1", b"hello")
+            references = await agent_api.resolve_attachments("user1", [
+                agent_api.FileAttachment(fileName="a.txt", mimeType="text/plain", blob_id=stored["blob_id"]),
+                agent_api.FileAttachment(fileName="b.txt", mimeType="text/plain", blob_id=stored["blob_id"], size=1)
+            ])
+
+        assert [(reference["fileName"], reference["size"]) for reference in references] == [("a.txt", 5)]
+
+    @pytest.mark.asyncio
+    async def test_oversized_inline_attachment_is_rejected(self, tmp_path):
+        request = agent_api.AgentRequest(
+            query="hi", user_id="user1", request_id="req1", session_id="user1~abc",
+            files=[agent_api.FileAttachment(fileName="big.bin", mimeType="application/octet-stream", content="QUJD" * 10)]
+        )
+
+        with patch.object(agent_api, 'blob_store', BlobStore(root_dir=str(tmp_path), max_bytes=20)):
+            response = await agent_api.pydantic_agent(request, make_http_request({"value": False}), user={"id": "user1"})
+
+        assert response.status_code == 413
+        assert agent_api.admission_controller.metrics()["active"] == 0
+
+
+class TestSyncSnapshot:
+    @pytest.fixture
+    def snapshot_rpc(self):
+        supabase = MagicMock()
+        supabase.rpc.return_value.execute.return_value = MagicMock(data={
+            "generated_at": "2025-01-01T00:00:00+00:00",
+            "statistics": {"total_contacts": 3, "pending_conflicts": 1},
+            "health": {"total_entities": 2, "successful_syncs": 1, "failed_syncs": 1, "pending_conflicts": 1, "health_score": 50.0},
+            "activities": [{
+                "entity_type": "contact", "entity_id": "1", "keap_id": "1", "last_synced_at": "2025-01-01T00:00:00",
+                "sync_direction": "keap_to_supabase", "conflict_status": "pending", "last_error": None
+            }],
+            "conflicts": [{
+                "id": "c1", "entity_type": "contact", "entity_id": "1", "conflict_fields": ["email"],
+                "resolution_strategy": "manual", "created_at": "2025-01-01T00:00:00", "updated_at": "2025-01-01T00:00:00"
+            }]
+        })
+        cache = agent_api.SnapshotCache(agent_api.compute_sync_snapshot, ttl_seconds=60)
+        with patch.object(agent_api, 'supabase', supabase), patch.object(agent_api, 'sync_snapshot_cache', cache):
+            yield supabase
+
+    @pytest.mark.asyncio
+    async def test_snapshot_is_one_cached_rpc_with_etag(self, snapshot_rpc):
+        http_request = MagicMock(headers={})
+
+        first = await agent_api.get_sync_snapshot(http_request, user={"id": "user1"})
+        await agent_api.get_sync_snapshot(http_request, user={"id": "user1"})
+
+        assert snapshot_rpc.rpc.call_count == 1
+        assert snapshot_rpc.rpc.call_args[0][0] == "get_sync_dashboard_snapshot"
+        body = json.loads(first.body)
+        assert body["statistics"]["total_contacts"] == 3
+        assert body["statistics"]["total_orders"] == 0
+        assert body["conflicts"][0]["conflict_fields"] == ["email"]
+        assert first.headers["etag"]
+
+    @pytest.mark.asyncio
+    async def test_matching_if_none_match_gets_304(self, snapshot_rpc):
+        first = await agent_api.get_sync_snapshot(MagicMock(headers={}), user={"id": "user1"})
+
+        response = await agent_api.get_sync_snapshot(
+            MagicMock(headers={"if-none-match": first.headers["etag"]}), user={"id": "user1"}
+        )
+
+        assert response.status_code == 304
+        assert response.body == b""
+
+
+class FakeQuery:
+    """Records a Supabase query builder chain and returns fixed rows."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = []
+
+    def __getattr__(self, name):
+        def method(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return self
+        return method
+
+    def execute(self):
+        return MagicMock(data=self.rows)
+
+
+class TestSyncConflictPages:
+    conflicts = [{"id": f"id-{i}", "created_at": f"2025-01-0{9 - i}T00:00:00", "entity_type": "contact"} for i in range(3)]
+
+    @pytest.mark.asyncio
+    async def test_list_omits_blobs_and_returns_cursor(self):
+        query = FakeQuery(self.conflicts)
+        supabase = MagicMock()
+        supabase.table.return_value = query
+
+        with patch.object(agent_api, 'supabase', supabase):
+            page = await agent_api.get_pending_sync_conflicts(limit=2, cursor=None, fields=None, user={"id": "user1"})
+
+        columns = query.calls[0][1][0].split(",")
+        assert columns[:2] == ["id", "created_at"]
+        assert "keap_data" not in columns and "supabase_data" not in columns
+        assert ("limit", (3,), {}) in query.calls
+        assert len(page["items"]) == 2
+        assert page["next_cursor"]
+
+    @pytest.mark.asyncio
+    async def test_cursor_adds_keyset_filter(self):
+        query = FakeQuery([])
+        supabase = MagicMock()
+        supabase.table.return_value = query
+        cursor = agent_api.build_page(self.conflicts, 1, "created_at")["next_cursor"]
+
+        with patch.object(agent_api, 'supabase', supabase):
+            page = await agent_api.get_pending_sync_conflicts(limit=1, cursor=cursor, fields="keap_data", user={"id": "user1"})
+
+        filters = [args[0] for name, args, _ in query.calls if name == "or_"]
+        assert filters == ['created_at.lt."2025-01-09T00:00:00",and(created_at.eq."2025-01-09T00:00:00",id.lt."id-0")']
+        assert query.calls[0][1][0] == "id,created_at,keap_data"
+        assert page == {"items": [], "next_cursor": None}
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("cursor,fields", [("garbage", None), (None, "password")])
+    async def test_bad_cursor_or_field_is_400(self, cursor, fields):
+        with pytest.raises(agent_api.HTTPException) as error:
+            await agent_api.get_pending_sync_conflicts(limit=10, cursor=cursor, fields=fields, user={"id": "user1"})
+        assert error.value.status_code == 400
+
+    @pytest.mark.asyncio
+    async def test_detail_returns_full_conflict_or_404(self):
+        conflict = {
+            "id": "8f3c0a9e-1c2d-4b5e-9f00-000000000001", "entity_type": "contact", "entity_id": "1",
+            "keap_data": {"email": "a@x.com"}, "supabase_data": {"email": "b@x.com"}, "conflict_fields": ["email"],
+            "resolution_strategy": "manual", "created_at": "2025-01-01T00:00:00", "updated_at": "2025-01-01T00:00:00"
+        }
+        supabase = MagicMock()
+        supabase.table.return_value = FakeQuery([conflict])
+
+        with patch.object(agent_api, 'supabase', supabase):
+            result = await agent_api.get_sync_conflict(conflict["id"], user={"id": "user1"})
+            with pytest.raises(agent_api.HTTPException) as error:
+                await agent_api.get_sync_conflict("not-a-uuid", user={"id": "user1"})
+
+        assert result.keap_data == {"email": "a@x.com"}
+        assert error.value.status_code == 404
+
+
+class TestSyncTrigger:
+    @pytest.mark.asyncio
+    async def test_trigger_queues_and_wakes_worker(self):
+        worker = MagicMock()
+        enqueue = AsyncMock(return_value={"id": "r1", "status": "pending", "sync_type": "contacts", "coalesced": True})
+
+        with patch.object(agent_api, 'enqueue_sync_request', enqueue), patch.object(agent_api, 'sync_worker', worker):
+            result = await agent_api.trigger_manual_sync(
+                agent_api.ManualSyncRequest(keap_account_id="acct1", sync_type="contacts"), user={"id": "user1"}
+            )
+
+        enqueue.assert_awaited_once_with(agent_api.supabase, "acct1", "contacts", "user1")
+        worker.wake.assert_called_once()
+        assert result["request_id"] == "r1"
+        assert result["coalesced"] is True
+
+    @pytest.mark.asyncio
+    async def test_unknown_sync_type_is_400(self):
+        with pytest.raises(agent_api.HTTPException) as error:
+            await agent_api.trigger_manual_sync(
+                agent_api.ManualSyncRequest(keap_account_id="acct1", sync_type="widgets"), user={"id": "user1"}
+            )
+        assert error.value.status_code == 400
+
+
+class TestSyncEvents:
+    @pytest.mark.asyncio
+    async def test_stream_sends_events_and_unsubscribes(self):
+        async def fetch(params):
+            return {"now": "2025-01-01T10:00:00", "status_changes": [], "new_conflicts": [], "health": {"health_score": 100}}
+
+        broker = agent_api.SyncEventBroker(fetch, poll_interval=60)
+        http_request = make_http_request({"value": False})
+
+        with patch.object(agent_api, 'sync_event_broker', broker):
+            response = await agent_api.stream_sync_events(http_request, user={"id": "user1"})
+            stream = response.body_iterator
+            assert await stream.__anext__() == "retry: 5000\n\n"
+            assert (await stream.__anext__()).startswith("id: 1\nevent: health\n")
+            assert broker.metrics()["subscribers"] == 1
+            await stream.aclose()
+
+        assert response.media_type == "text/event-stream"
+        assert broker.metrics()["subscribers"] == 0
+
+    @pytest.mark.asyncio
+    async def test_stream_ticket_is_single_use(self):
+        with patch.object(agent_api, 'stream_tickets', agent_api.StreamTickets(ttl_seconds=30)):
+            issued = await agent_api.issue_sync_events_ticket(user={"id": "user1"})
+            user = await agent_api.verify_stream_token(ticket=issued["ticket"], credentials=None)
+            with pytest.raises(agent_api.HTTPException) as reused:
+                await agent_api.verify_stream_token(ticket=issued["ticket"], credentials=None)
+            with pytest.raises(agent_api.HTTPException) as missing:
+                await agent_api.verify_stream_token(ticket=None, credentials=None)
+
+        assert user == {"id": "user1"}
+        assert issued["expires_in"] == 30
+        assert reused.value.status_code == 401 and missing.value.status_code == 401
+
+    @pytest.mark.asyncio
+    async def test_expired_stream_ticket_is_rejected(self):
+        with patch.object(agent_api, 'stream_tickets', agent_api.StreamTickets(ttl_seconds=0)):
+            ticket = agent_api.stream_tickets.issue({"id": "user1"})
+            with pytest.raises(agent_api.HTTPException):
+                await agent_api.verify_stream_token(ticket=ticket, credentials=None)
+
+
+class TestBulkConflictResolution:
+    @pytest.mark.asyncio
+    async def test_streams_progress_and_invalidates_snapshot(self):
+        supabase = MagicMock()
+        supabase.rpc.return_value.execute.return_value = MagicMock(data={"resolved": ["8f3c0a9e-1c2d-4b5e-9f00-000000000001"], "failed": []})
+        cache = MagicMock()
+        request = agent_api.BulkConflictResolutionRequest(
+            resolution_strategy="keap_wins",
+            conflict_ids=["8f3c0a9e-1c2d-4b5e-9f00-000000000001", "8F3C0A9E-1C2D-4B5E-9F00-000000000001"]
+        )
+
+        with patch.object(agent_api, 'supabase', supabase), patch.object(agent_api, 'sync_snapshot_cache', cache):
+            response = await agent_api.bulk_resolve_sync_conflicts(request, user={"id": "user1"})
+            lines = [json.loads(chunk) async for chunk in response.body_iterator]
+
+        # Duplicate IDs are resolved once
+        assert supabase.rpc.call_args[0][1]["conflict_ids"] == ["8f3c0a9e-1c2d-4b5e-9f00-000000000001"]
+        assert lines[0]["resolved"] == 1
+        assert lines[-1]["complete"] is True and lines[-1]["total"] == 1
+        cache.invalidate.assert_called_once()
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("fields", [
+        {"resolution_strategy": "manual", "conflict_ids": []},
+        {"resolution_strategy": "keap_wins"},
+        {"resolution_strategy": "keap_wins", "conflict_ids": [], "entity_type": "contact"},
+        {"resolution_strategy": "keap_wins", "conflict_ids": ["not-a-uuid"]}
+    ])
+    async def test_invalid_requests_are_400(self, fields):
+        with pytest.raises(agent_api.HTTPException) as error:
+            await agent_api.bulk_resolve_sync_conflicts(
+                agent_api.BulkConflictResolutionRequest(**fields), user={"id": "user1"}
+            )
+        assert error.value.status_code == 400
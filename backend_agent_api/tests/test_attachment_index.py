@@ -0,0 +1,86 @@
+import pytest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+# Import the classes to test
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import attachment_index
+from attachment_index import AttachmentIndexes, is_indexable
+
+TOPICS = ["pricing", "shipping", "refund"]
+
+
+def make_embedding_client():
+    """Embeds text as counts of a few topic words, so similarity follows the topic."""
+    async def create(model, input):
+        texts = [input] if isinstance(input, str) else input
+        return SimpleNamespace(data=[
+            SimpleNamespace(embedding=[text.lower().count(topic) + 0.01 for topic in TOPICS])
+            for text in texts
+        ])
+    client = MagicMock()
+    client.embeddings.create = MagicMock(side_effect=create)
+    return client
+
+
+def make_document():
+    sections = [
+        ("pricing " * 45).ljust(400),
+        ("shipping " * 40).ljust(400),
+        ("refund " * 50).ljust(400)
+    ]
+    return "".join(sections).encode("utf-8")
+
+
+class TestAttachmentIndexes:
+    @pytest.mark.asyncio
+    async def test_only_relevant_chunks_reach_the_prompt(self):
+        indexes = AttachmentIndexes(token_budget=100)
+        client = make_embedding_client()
+        attachment = {"fileName": "policy.txt", "mimeType": "text/plain", "blob_id": "a" * 64}
+
+        assert await indexes.add("s1", attachment, make_document(), client) == 3
+        embedding_calls = client.embeddings.create.call_count
+        # Re-sending the same attachment doesn't index it twice
+        assert await indexes.add("s1", attachment, make_document(), client) == 3
+        assert client.embeddings.create.call_count == embedding_calls
+
+        context = await indexes.relevant_context("s1", "what is the shipping time", client)
+
+        assert "# Document Title: policy.txt" in context
+        assert "shipping" in context
+        assert "pricing" not in context
+        assert await indexes.relevant_context("s2", "shipping", client) is None
+
+    @pytest.mark.asyncio
+    async def test_expired_sessions_are_dropped(self):
+        indexes = AttachmentIndexes(ttl_seconds=0)
+        client = make_embedding_client()
+        await indexes.add("s1", {"fileName": "a.txt", "mimeType": "text/plain", "blob_id": "b" * 64}, b"refund policy", client)
+
+        assert await indexes.relevant_context("s1", "refund", client) is None
+
+    @pytest.mark.asyncio
+    async def test_attachment_without_text_indexes_nothing(self):
+        indexes = AttachmentIndexes()
+        client = make_embedding_client()
+
+        assert await indexes.add("s1", {"fileName": "empty.txt", "mimeType": "text/plain", "blob_id": "c" * 64}, b"  \n", client) == 0
+        assert not client.embeddings.create.called
+
+    def test_only_formats_with_a_text_extractor_are_indexable(self):
+        for mime_type in ["application/pdf", "text/plain", "text/markdown", "text/csv", "application/json"]:
+            assert is_indexable(mime_type)
+        for mime_type in [
+            "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+            "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            "application/zip",
+            "image/png"
+        ]:
+            assert not is_indexable(mime_type)
+
+    def test_unavailable_without_text_processing(self):
+        with patch.object(attachment_index, 'extract_text_from_file', None):
+            assert not AttachmentIndexes().available
@@ -0,0 +1,204 @@
+import pytest
+import asyncio
+import sqlite3
+
+# Import the class to test
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from background_jobs import BackgroundJobQueue, PartialBatchFailure
+
+
+def pending_rows(db_path):
+    with sqlite3.connect(db_path) as db:
+        return db.execute("SELECT job_type, status, attempts FROM jobs ORDER BY id").fetchall()
+
+
+class TestBackgroundJobQueue:
+    @pytest.mark.asyncio
+    async def test_jobs_are_batched_by_type(self, tmp_path):
+        calls = []
+
+        async def handle_messages(payloads):
+            calls.append(("message", payloads))
+
+        async def handle_requests(payloads):
+            calls.append(("request", payloads))
+
+        queue = BackgroundJobQueue(
+            {"message": handle_messages, "request": handle_requests},
+            db_path=str(tmp_path / "jobs.db"), batch_wait=0.05
+        )
+        await queue.start()
+        await queue.enqueue("message", {"n": 1}, key="session1")
+        await queue.enqueue("request", {"n": 2})
+        await queue.enqueue("message", {"n": 3}, key="session1")
+
+        assert await queue.wait_for_key("session1", timeout=2)
+        await queue.stop()
+
+        assert sorted(calls) == [("message", [{"n": 1}, {"n": 3}]), ("request", [{"n": 2}])]
+        assert pending_rows(tmp_path / "jobs.db") == []
+        metrics = queue.metrics()
+        assert metrics["processed"] == 3
+        assert metrics["batches"] == 2
+        assert metrics["depth"] == 0
+
+    @pytest.mark.asyncio
+    async def test_failed_batches_are_retried(self, tmp_path):
+        attempts = []
+
+        async def flaky(payloads):
+            attempts.append(payloads)
+            if len(attempts) == 1:
+                raise Exception("temporary outage")
+
+        queue = BackgroundJobQueue({"flaky": flaky}, db_path=str(tmp_path / "jobs.db"), batch_wait=0)
+        await queue.start()
+        await queue.enqueue("flaky", {"n": 1}, key="k")
+
+        assert await queue.wait_for_key("k", timeout=3)
+        await queue.stop()
+
+        assert len(attempts) == 2
+        assert queue.metrics()["retries"] == 1
+        assert queue.metrics()["processed"] == 1
+
+    @pytest.mark.asyncio
+    async def test_job_fails_after_max_attempts(self, tmp_path):
+        async def broken(payloads):
+            raise Exception("bad payload")
+
+        queue = BackgroundJobQueue(
+            {"broken": broken}, db_path=str(tmp_path / "jobs.db"), max_attempts=1, batch_wait=0
+        )
+        await queue.start()
+        await queue.enqueue("broken", {"n": 1}, key="k")
+
+        assert await queue.wait_for_key("k", timeout=2)
+        await queue.stop()
+
+        assert queue.metrics()["failed"] == 1
+        assert pending_rows(tmp_path / "jobs.db") == [("broken", "failed", 1)]
+
+    @pytest.mark.asyncio
+    async def test_pending_jobs_survive_restart(self, tmp_path):
+        db_path = str(tmp_path / "jobs.db")
+        blocker = asyncio.Event()
+        handled = []
+
+        async def blocked(payloads):
+            await blocker.wait()
+
+        # First process dies (stops) before the job completes
+        queue = BackgroundJobQueue({"write": blocked}, db_path=db_path, batch_wait=0)
+        await queue.start()
+        await queue.enqueue("write", {"n": 1})
+        await queue.stop(timeout=0.1)
+        assert pending_rows(db_path) == [("write", "pending", 0)]
+
+        async def handle(payloads):
+            handled.extend(payloads)
+
+        queue = BackgroundJobQueue({"write": handle}, db_path=db_path, batch_wait=0)
+        await queue.start()
+        await queue.stop(timeout=2)
+
+        assert handled == [{"n": 1}]
+        assert queue.metrics()["recovered"] == 1
+        assert pending_rows(db_path) == []
+
+    @pytest.mark.asyncio
+    async def test_slow_job_type_does_not_block_others(self, tmp_path):
+        blocker = asyncio.Event()
+
+        async def slow_memory(payloads):
+            await blocker.wait()
+
+        async def store(payloads):
+            pass
+
+        queue = BackgroundJobQueue(
+            {"mem0_add": slow_memory, "store_message": store},
+            db_path=str(tmp_path / "jobs.db"), batch_wait=0
+        )
+        await queue.start()
+        await queue.enqueue("mem0_add", {"n": 1})
+        await queue.enqueue("store_message", {"n": 2}, key="session1")
+
+        # The reply is stored while the memory add is still running
+        assert await queue.wait_for_key("session1", timeout=1)
+        blocker.set()
+        await queue.stop()
+
+    @pytest.mark.asyncio
+    async def test_partial_failure_retries_only_failed_payloads(self, tmp_path):
+        calls = []
+
+        async def handle(payloads):
+            calls.append([p["n"] for p in payloads])
+            if len(calls) == 1:
+                raise PartialBatchFailure({1: Exception("mem0 down")})
+
+        queue = BackgroundJobQueue({"mem0_add": handle}, db_path=str(tmp_path / "jobs.db"), batch_wait=0.05)
+        await queue.start()
+        for n in range(3):
+            await queue.enqueue("mem0_add", {"n": n}, key="k")
+
+        assert await queue.wait_for_key("k", timeout=3)
+        await queue.stop()
+
+        assert calls == [[0, 1, 2], [1]]
+        assert queue.metrics()["processed"] == 3
+        assert queue.metrics()["retries"] == 1
+
+    @pytest.mark.asyncio
+    async def test_bad_payload_is_isolated_from_its_batch(self, tmp_path):
+        written = []
+
+        async def insert(payloads):
+            if any(p["n"] == 2 for p in payloads):
+                raise Exception("invalid input syntax for type json")
+            written.extend(p["n"] for p in payloads)
+
+        queue = BackgroundJobQueue(
+            {"store_message": insert}, db_path=str(tmp_path / "jobs.db"), max_attempts=1, batch_wait=0.05
+        )
+        await queue.start()
+        for n in range(5):
+            await queue.enqueue("store_message", {"n": n}, key="k")
+
+        assert await queue.wait_for_key("k", timeout=3)
+        await queue.stop()
+
+        assert sorted(written) == [0, 1, 3, 4]
+        assert queue.metrics()["failed"] == 1
+        assert pending_rows(tmp_path / "jobs.db") == [("store_message", "failed", 1)]
+
+    @pytest.mark.asyncio
+    async def test_outage_is_retried_without_splitting(self, tmp_path):
+        calls = []
+
+        async def insert(payloads):
+            calls.append(len(payloads))
+            if len(calls) == 1:
+                raise ConnectionError("connection refused")
+
+        queue = BackgroundJobQueue({"store_message": insert}, db_path=str(tmp_path / "jobs.db"), batch_wait=0.05)
+        await queue.start()
+        for n in range(4):
+            await queue.enqueue("store_message", {"n": n}, key="k")
+
+        assert await queue.wait_for_key("k", timeout=3)
+        await queue.stop()
+
+        assert calls == [4, 4]
+        assert queue.metrics()["split"] == 0
+
+    @pytest.mark.asyncio
+    async def test_unknown_job_type_is_rejected(self, tmp_path):
+        queue = BackgroundJobQueue({}, db_path=str(tmp_path / "jobs.db"))
+        await queue.start()
+        with pytest.raises(ValueError):
+            await queue.enqueue("missing", {})
+        await queue.stop()
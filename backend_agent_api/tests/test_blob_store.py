@@ -0,0 +1,77 @@
+import pytest
+import hashlib
+import time
+
+# Import the classes to test
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from blob_store import BlobStore, BlobNotFound, BlobTooLarge, base64_decoded_size
+
+
+async def chunked(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+class TestBlobStore:
+    @pytest.mark.asyncio
+    async def test_stream_is_stored_by_content_hash(self, tmp_path):
+        store = BlobStore(root_dir=str(tmp_path), max_bytes=100)
+
+        stored = await store.put_stream("user1", chunked(b"hello ", b"world"))
+
+        assert stored == {"blob_id": hashlib.sha256(b"hello world").hexdigest(), "size": 11}
+        assert await store.get("user1", stored["blob_id"]) == b"hello world"
+        # Uploading the same content again reuses the blob
+        assert await store.put_bytes("user1", b"hello world") == stored
+        assert not list(tmp_path.rglob("*.part"))
+
+    @pytest.mark.asyncio
+    async def test_blobs_are_private_to_their_user(self, tmp_path):
+        store = BlobStore(root_dir=str(tmp_path))
+        stored = await store.put_bytes("user1", b"secret")
+
+        assert store.exists("user1", stored["blob_id"])
+        assert not store.exists("user2", stored["blob_id"])
+        with pytest.raises(BlobNotFound):
+            await store.get("user2", stored["blob_id"])
+
+    @pytest.mark.asyncio
+    async def test_size_cap_stores_nothing(self, tmp_path):
+        store = BlobStore(root_dir=str(tmp_path), max_bytes=10)
+
+        with pytest.raises(BlobTooLarge):
+            await store.put_stream("user1", chunked(b"123456", b"7890ab"))
+
+        assert not [path for path in tmp_path.rglob("*") if path.is_file()]
+
+    @pytest.mark.asyncio
+    async def test_malformed_reference_is_rejected(self, tmp_path):
+        store = BlobStore(root_dir=str(tmp_path))
+
+        with pytest.raises(BlobNotFound):
+            await store.get("user1", "../../etc/passwd")
+
+    @pytest.mark.asyncio
+    async def test_unused_blobs_and_stale_partial_uploads_are_collected(self, tmp_path):
+        store = BlobStore(root_dir=str(tmp_path), retention_days=1)
+        old = await store.put_bytes("user1", b"old")
+        recent = await store.put_bytes("user1", b"recent")
+        partial = store._user_dir("user1") / "upload.part"
+        partial.write_bytes(b"half")
+        two_days_ago = time.time() - 2 * 86400
+        for path in (store._blob_path("user1", old["blob_id"]), store._blob_path("user1", recent["blob_id"]), partial):
+            os.utime(path, (two_days_ago, two_days_ago))
+        # Reading a blob counts as using it
+        await store.get("user1", recent["blob_id"])
+
+        assert store.collect_garbage() == 2
+        assert not store.exists("user1", old["blob_id"])
+        assert store.exists("user1", recent["blob_id"])
+        assert not partial.exists()
+
+    def test_base64_decoded_size(self):
+        assert base64_decoded_size("aGVsbG8=") == 5
+        assert base64_decoded_size("aGVsbG8h") == 6
+        assert base64_decoded_size("") == 0
@@ -0,0 +1,76 @@
+import pytest
+
+# Import the functions to test
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from context_packing import select_chunks, pack_chunks, format_packed_context, merge_adjacent
+
+
+def make_row(file_id, chunk_index, content, similarity):
+    return {
+        "content": content,
+        "metadata": {"file_id": file_id, "file_title": f"Title {file_id}", "file_url": f"https://example.com/{file_id}", "chunk_index": chunk_index},
+        "similarity": similarity
+    }
+
+
+class TestSelectChunks:
+    def test_near_duplicates_are_dropped(self):
+        text = "The refund window is thirty days from the date of delivery for all orders"
+        rows = [
+            make_row("a", 0, text, 0.9),
+            make_row("b", 3, text + ".", 0.8),
+            make_row("c", 1, "Shipping takes five business days within the continental United States", 0.7)
+        ]
+
+        selected = select_chunks(rows, token_budget=1000)
+
+        assert [row["metadata"]["file_id"] for row in selected] == ["a", "c"]
+
+    def test_token_budget_limits_selection(self):
+        rows = [make_row("a", i, f"chunk {i} " + "word " * 80, 0.9 - i * 0.01) for i in range(10)]
+
+        selected = select_chunks(rows, token_budget=250, dedup_threshold=1.1)
+
+        assert 1 <= len(selected) < 10
+        assert sum(len(row["content"]) // 4 for row in selected) <= 250
+
+    def test_mmr_prefers_diverse_results(self):
+        rows = [
+            make_row("a", 0, "pricing for the basic plan is ten dollars per month billed monthly", 0.90),
+            make_row("a", 5, "pricing for the basic plan is ten dollars per month billed yearly", 0.89),
+            make_row("b", 0, "enterprise customers get a dedicated support engineer and an SLA", 0.85)
+        ]
+
+        selected = select_chunks(rows, token_budget=40, mmr_lambda=0.5, dedup_threshold=1.1)
+
+        assert [row["metadata"]["chunk_index"] for row in selected][:2] == [0, 0]
+
+
+class TestPackChunks:
+    def test_adjacent_chunks_are_merged_per_file(self):
+        rows = [
+            make_row("a", 2, "world. More", 0.9),
+            make_row("b", 0, "Other file", 0.8),
+            make_row("a", 1, "Hello", 0.7),
+            make_row("a", 7, "Far away", 0.6)
+        ]
+
+        packed = pack_chunks(rows)
+
+        assert [entry["file_id"] for entry in packed] == ["a", "b"]
+        assert packed[0]["passages"] == ["Hello world. More", "Far away"]
+        context = format_packed_context(packed)
+        assert context.count("# Document ID: a") == 1
+        assert "[...]" in context
+
+    def test_merge_removes_known_overlap(self):
+        assert merge_adjacent("the quick brown", "brown fox", overlap=5) == "the quick brown fox"
+
+    def test_merge_keeps_text_without_known_overlap(self):
+        # Without an overlap a repeated word at the boundary is real text
+        assert merge_adjacent("he said no", "no more", overlap=0) == "he said no no more"
+        # Shared text shorter than the overlap isn't the chunker's overlap either
+        assert merge_adjacent("version 1.1", "1 released", overlap=5) == "version 1.1 1 released"
+        assert merge_adjacent("abc", "def", overlap=0) == "abc def"
@@ -0,0 +1,115 @@
+import pytest
+import json
+from datetime import datetime, timezone, timedelta
+from fastapi.testclient import TestClient
+
+# Import the modules to test
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.stubs import create_llm_stub, create_supabase_stub, stub_embedding
+from benchmarks.load_test import percentiles, summarize
+
+
+class TestPercentiles:
+    def test_nearest_rank(self):
+        values = [float(i) for i in range(1, 101)]
+        assert percentiles(values) == {"p50": 50.0, "p95": 95.0, "p99": 99.0}
+
+    def test_scale_and_empty(self):
+        assert percentiles([0.25], 1000) == {"p50": 250.0, "p95": 250.0, "p99": 250.0}
+        assert percentiles([]) == {"p50": None, "p95": None, "p99": None}
+
+
+def test_summarize_counts_errors_and_rates():
+    results = [
+        {"ok": True, "ttft": 0.1, "latency": 1.1, "tokens": 100, "error": None},
+        {"ok": False, "ttft": None, "latency": 0.05, "tokens": 0, "error": "http_503"}
+    ]
+
+    report = summarize(results, wall_seconds=2.0)
+
+    assert report["requests"] == 2
+    assert report["error_rate"] == 0.5
+    assert report["errors"] == {"http_503": 1}
+    assert report["ttft_ms"]["p50"] == 100.0
+    assert report["tokens_per_sec"]["per_stream"]["p50"] == 100.0
+    assert report["tokens_per_sec"]["aggregate"] == 50.0
+
+
+class TestSupabaseStub:
+    @pytest.fixture
+    def client(self):
+        return TestClient(create_supabase_stub())
+
+    def test_auth_uses_token_as_user_id(self, client):
+        response = client.get("/auth/v1/user", headers={"Authorization": "Bearer user-1"})
+        assert response.json()["id"] == "user-1"
+
+    def test_insert_filter_and_count(self, client):
+        now = datetime.now(timezone.utc)
+        client.post("/rest/v1/requests", json=[
+            {"user_id": "u1", "timestamp": now.isoformat()},
+            {"user_id": "u1", "timestamp": (now - timedelta(minutes=5)).isoformat()},
+            {"user_id": "u2", "timestamp": now.isoformat()}
+        ])
+        # The rate limit check sends a timestamp in a different format than was stored
+        one_minute_ago = (now - timedelta(minutes=1)).strftime('%Y-%m-%d %H:%M:%S')
+
+        response = client.get(
+            "/rest/v1/requests",
+            params={"select": "*", "user_id": "eq.u1", "timestamp": f"gte.{one_minute_ago}"},
+            headers={"Prefer": "count=exact"}
+        )
+
+        assert len(response.json()) == 1
+        assert response.headers["content-range"] == "0-0/1"
+
+    def test_order_limit_and_update(self, client):
+        for i in range(3):
+            client.post("/rest/v1/messages", json={"session_id": "s1", "position": i})
+        client.patch("/rest/v1/messages", params={"position": "eq.0"}, json={"session_id": "s2"})
+
+        response = client.get("/rest/v1/messages", params={"session_id": "eq.s1", "order": "position.desc", "limit": "1"})
+
+        assert [row["position"] for row in response.json()] == [2]
+
+    def test_match_documents_rpc(self, client):
+        rows = client.post("/rest/v1/rpc/match_documents", json={"match_count": 2}).json()
+        assert len(rows) == 2
+        assert rows[0]["similarity"] > rows[1]["similarity"]
+        assert client.post("/rest/v1/rpc/missing", json={}).status_code == 404
+
+
+class TestLlmStub:
+    def stream_events(self, client, body):
+        response = client.post("/v1/chat/completions", json={**body, "stream": True})
+        lines = [line.removeprefix("data: ") for line in response.text.splitlines() if line.startswith("data: ")]
+        assert lines[-1] == "[DONE]"
+        return [json.loads(line) for line in lines[:-1]]
+
+    def test_tool_script_calls_retrieval_once_then_answers(self):
+        client = TestClient(create_llm_stub(token_rate=1000, first_token_latency=0, answer_tokens=3))
+        tools = [{"type": "function", "function": {"name": "retrieve_relevant_documents"}}]
+        messages = [{"role": "user", "content": "pricing?"}]
+
+        events = self.stream_events(client, {"messages": messages, "tools": tools})
+        call = events[0]["choices"][0]["delta"]["tool_calls"][0]
+        assert call["function"]["name"] == "retrieve_relevant_documents"
+        assert json.loads(call["function"]["arguments"]) == {"user_query": "pricing?"}
+
+        messages.append({"role": "tool", "tool_call_id": call["id"], "content": "docs"})
+        events = self.stream_events(client, {"messages": messages, "tools": tools})
+        text = "".join(e["choices"][0]["delta"].get("content", "") for e in events)
+        assert text.split() == ["token0", "token1", "token2"]
+        assert events[-1]["usage"]["completion_tokens"] == 3
+
+    def test_embeddings_are_deterministic_in_both_formats(self):
+        client = TestClient(create_llm_stub())
+
+        floats = client.post("/v1/embeddings", json={"input": ["a", "b"], "model": "m", "encoding_format": "float"}).json()
+        encoded = client.post("/v1/embeddings", json={"input": "a", "model": "m", "encoding_format": "base64"}).json()
+
+        assert len(floats["data"]) == 2
+        assert floats["data"][0]["embedding"] == pytest.approx(stub_embedding("a").tolist())
+        assert isinstance(encoded["data"][0]["embedding"], str)
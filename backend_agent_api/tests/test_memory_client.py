@@ -0,0 +1,230 @@
+import pytest
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+# Import the classes to test
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from memory_client import CircuitBreaker, UserMemoryCache, ResilientMemoryClient, MemoryUnavailableError
+
+
+class TestCircuitBreaker:
+    def test_opens_after_threshold(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_seconds=30)
+        breaker.record_failure()
+        assert breaker.state == "closed"
+        breaker.record_failure()
+        assert breaker.state == "open"
+        assert breaker.allow_request() is False
+
+    def test_half_open_allows_single_trial(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_seconds=30)
+        with patch('memory_client.time.monotonic', return_value=100.0):
+            breaker.record_failure()
+        with patch('memory_client.time.monotonic', return_value=131.0):
+            assert breaker.state == "half_open"
+            assert breaker.allow_request() is True
+            assert breaker.allow_request() is False
+            breaker.record_success()
+            assert breaker.state == "closed"
+
+    def test_failed_trial_reopens(self):
+        breaker = CircuitBreaker(failure_threshold=3, reset_seconds=30)
+        with patch('memory_client.time.monotonic', return_value=100.0):
+            for _ in range(3):
+                breaker.record_failure()
+        with patch('memory_client.time.monotonic', return_value=131.0):
+            assert breaker.allow_request() is True
+            breaker.record_failure()
+            assert breaker.state == "open"
+
+
+class TestUserMemoryCache:
+    def test_exact_query_hit_is_normalized(self):
+        cache = UserMemoryCache(ttl_seconds=60, followup_max_words=0)
+        result = {"results": [{"memory": "a"}, {"memory": "b"}, {"memory": "c"}]}
+        cache.put("user1", "What do I like?", 3, result, cache.generation("user1"))
+
+        assert cache.get("user1", "  what do i   LIKE? ", 3) == (result, "query")
+        assert cache.get("user1", "What do I like?", 5) == (None, None)
+        assert cache.get("user2", "What do I like?", 3) == (None, None)
+
+    def test_small_result_is_full_memory_set(self):
+        cache = UserMemoryCache(ttl_seconds=60, followup_max_words=0)
+        result = {"results": [{"memory": "likes tea"}]}
+        cache.put("user1", "drinks", 3, result, cache.generation("user1"))
+
+        # Fewer results than the limit means the user has no other memories
+        assert cache.get("user1", "a completely different question", 3) == (result, "memory_set")
+
+    def test_short_followup_reuses_last_result(self):
+        cache = UserMemoryCache(ttl_seconds=60, followup_max_words=4)
+        result = {"results": [{"memory": "a"}, {"memory": "b"}, {"memory": "c"}]}
+        cache.put("user1", "plan my trip to Japan", 3, result, cache.generation("user1"))
+
+        assert cache.get("user1", "and what about food?", 3) == (result, "followup")
+        assert cache.get("user1", "what should I pack for a winter trip", 3) == (None, None)
+
+    def test_expired_entries_are_ignored(self):
+        cache = UserMemoryCache(ttl_seconds=60)
+        with patch('memory_client.time.monotonic', return_value=100.0):
+            cache.put("user1", "q", 3, {"results": []}, cache.generation("user1"))
+        with patch('memory_client.time.monotonic', return_value=161.0):
+            assert cache.get("user1", "q", 3) == (None, None)
+
+    def test_generations_are_bounded(self):
+        cache = UserMemoryCache(ttl_seconds=60, max_users=2)
+        generation = cache.generation("user1")
+        cache.invalidate("user1")
+        for i in range(10):
+            cache.invalidate(f"other{i}")
+
+        assert len(cache.generations) == 2
+        # user1's counter was evicted, but an in-flight search from before its write is still rejected
+        cache.put("user1", "q", 3, {"results": []}, generation)
+        assert cache.get("user1", "q", 3) == (None, None)
+
+    def test_invalidate_discards_in_flight_results(self):
+        cache = UserMemoryCache(ttl_seconds=60)
+        generation = cache.generation("user1")
+        cache.invalidate("user1")
+        cache.put("user1", "q", 3, {"results": []}, generation)
+
+        assert cache.get("user1", "q", 3) == (None, None)
+
+
+class TestResilientMemoryClient:
+    @pytest.mark.asyncio
+    async def test_search_success(self):
+        mem0 = AsyncMock()
+        mem0.search.return_value = {"results": [{"memory": "likes tea"}]}
+        client = ResilientMemoryClient(mem0)
+
+        result = await client.search(query="drinks", user_id="user1", limit=3)
+
+        assert result == {"results": [{"memory": "likes tea"}]}
+        mem0.search.assert_awaited_once_with(query="drinks", user_id="user1", limit=3)
+        assert client.metrics()["search_calls"] == 1
+        assert client.metrics()["circuit_state"] == "closed"
+
+    @pytest.mark.asyncio
+    async def test_search_retries_then_succeeds(self):
+        mem0 = AsyncMock()
+        mem0.search.side_effect = [Exception("connection reset"), {"results": []}]
+        client = ResilientMemoryClient(mem0, search_timeout=5, max_retries=2)
+
+        with patch('memory_client.asyncio.sleep', new_callable=AsyncMock) as mock_sleep:
+            result = await client.search(query="q", user_id="user1")
+
+        assert result == {"results": []}
+        assert mem0.search.await_count == 2
+        mock_sleep.assert_awaited_once()
+        assert client.metrics()["retries"] == 1
+        assert client.metrics()["search_failures"] == 0
+
+    @pytest.mark.asyncio
+    async def test_search_timeout_returns_no_memories(self):
+        async def slow_search(**kwargs):
+            await asyncio.sleep(1)
+
+        mem0 = AsyncMock()
+        mem0.search.side_effect = slow_search
+        client = ResilientMemoryClient(mem0, search_timeout=0.05)
+
+        result = await client.search(query="q", user_id="user1")
+
+        assert result == {"results": []}
+        assert client.metrics()["search_timeouts"] == 1
+
+    @pytest.mark.asyncio
+    async def test_open_circuit_skips_mem0(self):
+        mem0 = AsyncMock()
+        mem0.search.side_effect = Exception("pgvector down")
+        client = ResilientMemoryClient(
+            mem0, max_retries=0, breaker=CircuitBreaker(failure_threshold=2, reset_seconds=30)
+        )
+
+        for _ in range(2):
+            assert await client.search(query="q", user_id="user1") == {"results": []}
+        assert await client.search(query="q", user_id="user1") == {"results": []}
+        with pytest.raises(MemoryUnavailableError) as skipped:
+            await client.add([{"role": "user", "content": "hi"}], user_id="user1")
+        assert 0 < skipped.value.retry_after <= 30
+
+        metrics = client.metrics()
+        assert mem0.search.await_count == 2
+        mem0.add.assert_not_awaited()
+        assert metrics["circuit_state"] == "open"
+        assert metrics["circuit_opened"] == 1
+        assert metrics["search_skipped"] == 1
+        assert metrics["add_skipped"] == 1
+        assert metrics["last_error"] == "pgvector down"
+
+    @pytest.mark.asyncio
+    async def test_cancelled_trial_frees_half_open_slot(self):
+        started = asyncio.Event()
+
+        async def hanging_search(**kwargs):
+            started.set()
+            await asyncio.sleep(10)
+
+        mem0 = AsyncMock()
+        mem0.search.side_effect = hanging_search
+        breaker = CircuitBreaker(failure_threshold=1, reset_seconds=30)
+        client = ResilientMemoryClient(mem0, search_timeout=30, breaker=breaker, cache=UserMemoryCache(ttl_seconds=0))
+
+        with patch('memory_client.time.monotonic', return_value=100.0):
+            breaker.record_failure()
+        with patch('memory_client.time.monotonic', return_value=131.0):
+            # The client disconnects while the half-open trial is running
+            task = asyncio.create_task(client.search(query="q", user_id="user1"))
+            await started.wait()
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+            assert breaker.allow_request() is True
+
+    @pytest.mark.asyncio
+    async def test_empty_results_are_not_shared(self):
+        mem0 = AsyncMock()
+        client = ResilientMemoryClient(
+            mem0, breaker=CircuitBreaker(failure_threshold=1, reset_seconds=30), cache=UserMemoryCache(ttl_seconds=0)
+        )
+        client.breaker.record_failure()
+
+        first = await client.search(query="q", user_id="user1")
+        first["results"].append({"memory": "leaked"})
+
+        assert await client.search(query="q", user_id="user1") == {"results": []}
+
+    @pytest.mark.asyncio
+    async def test_add_failure_is_raised_for_retry(self):
+        mem0 = AsyncMock()
+        mem0.add.side_effect = Exception("boom")
+        client = ResilientMemoryClient(mem0, max_retries=0)
+
+        with pytest.raises(Exception, match="boom"):
+            await client.add([{"role": "user", "content": "hi"}], user_id="user1")
+
+        assert client.metrics()["add_failures"] == 1
+
+    @pytest.mark.asyncio
+    async def test_search_is_cached_until_add_completes(self):
+        mem0 = AsyncMock()
+        mem0.search.return_value = {"results": [{"memory": "likes tea"}]}
+        client = ResilientMemoryClient(mem0, cache=UserMemoryCache(ttl_seconds=60))
+
+        await client.search(query="drinks", user_id="user1", limit=3)
+        await client.search(query="drinks", user_id="user1", limit=3)
+        assert mem0.search.await_count == 1
+
+        await client.add([{"role": "user", "content": "I like coffee now"}], user_id="user1")
+        await client.search(query="drinks", user_id="user1", limit=3)
+
+        assert mem0.search.await_count == 2
+        metrics = client.metrics()
+        assert metrics["cache_hits"] == 1
+        assert metrics["cache_misses"] == 2
+
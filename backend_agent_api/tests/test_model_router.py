@@ -0,0 +1,88 @@
+import pytest
+from types import SimpleNamespace
+
+# Import the classes to test
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from model_router import ModelRouter, TierStats, classify_query, routing_context
+
+
+class TestClassifyQuery:
+    @pytest.mark.parametrize("query", [
+        "hi",
+        "Thanks so much!",
+        "What are your prices?",
+        "How do I reset my password?",
+        "Is it raining?"
+    ])
+    def test_simple_queries_use_fast_tier(self, query):
+        tier, _ = classify_query(query)
+        assert tier == "fast"
+
+    @pytest.mark.parametrize("query", [
+        "Analyze the sales trend for last quarter",
+        "Can you summarize this document for me?",
+        "Write a SQL query that finds duplicate contacts",
+        "What is the refund policy? And how long does shipping take?",
+        " ".join(["word"] * 40)
+    ])
+    def test_complex_queries_use_strong_tier(self, query):
+        tier, _ = classify_query(query)
+        assert tier == "strong"
+
+    def test_attachments_use_strong_tier(self):
+        assert classify_query("hi", has_files=True) == ("strong", "attachments")
+
+    def test_follow_up_stays_on_strong_tier(self):
+        assert classify_query("and for last quarter?") == ("fast", "short")
+        assert classify_query("and for last quarter?", previous_tier="strong") == ("strong", "thread_follow_up")
+
+    def test_complex_earlier_query_keeps_thread_strong(self):
+        recent = ["Analyze the sales trend for Q3"]
+        assert classify_query("and for last quarter?", recent_queries=recent) == ("strong", "complex_thread")
+        assert classify_query("what are your hours?", previous_tier="fast") == ("fast", "simple_lookup")
+
+
+class TestRoutingContext:
+    def test_reads_previous_tier_and_earlier_queries(self):
+        history = [
+            {"message": {"type": "human", "content": "Analyze the sales trend"}},
+            {"message": {"type": "ai", "content": "...", "data": {"request_id": "r1", "model_tier": "strong"}}},
+            {"message": {"type": "human", "content": "thanks"}},
+            {"message": {"type": "ai", "content": "..."}},
+            {"message": {"type": "human", "content": "and for last quarter?"}}
+        ]
+
+        # A reply without a recorded tier (e.g. a cancelled run) keeps the last known one
+        assert routing_context(history) == ("strong", ["Analyze the sales trend", "thanks"])
+
+    def test_new_thread_has_no_context(self):
+        assert routing_context([{"message": {"type": "human", "content": "hi"}}]) == (None, [])
+
+
+class TestModelRouter:
+    def test_disabled_without_fast_model(self):
+        router = ModelRouter("strong-model")
+
+        assert not router.enabled
+        assert router.route("hi") == ("strong", "strong-model")
+
+    def test_routes_by_tier(self):
+        router = ModelRouter("strong-model", "fast-model")
+
+        assert router.route("hello there") == ("fast", "fast-model")
+        assert router.route("Compare these two reports") == ("strong", "strong-model")
+
+    def test_records_usage_and_cost(self):
+        router = ModelRouter("strong-model", "fast-model")
+        router.stats["fast"] = TierStats(input_cost_per_mtok=1.0, output_cost_per_mtok=2.0)
+
+        cost = router.record("fast", 0.5, SimpleNamespace(request_tokens=1000, response_tokens=500))
+
+        assert cost == pytest.approx(0.002)
+        metrics = router.metrics()
+        assert metrics["routing_enabled"] is True
+        assert metrics["fast"]["runs"] == 1
+        assert metrics["fast"]["latency_p50_ms"] == 500.0
+        assert metrics["strong"]["runs"] == 0
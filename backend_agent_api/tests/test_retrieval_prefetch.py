@@ -0,0 +1,62 @@
+import pytest
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+# Import the classes to test
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import retrieval_prefetch
+from retrieval_prefetch import RetrievalPrefetch, queries_match, start_prefetch
+import agent as agent_module
+
+
+class TestQueriesMatch:
+    def test_model_rewrite_keeping_key_terms_matches(self):
+        assert queries_match("How much does the pro plan cost?", "pro plan cost")
+
+    def test_different_topic_does_not_match(self):
+        assert not queries_match("How much does the pro plan cost?", "shipping times to Canada")
+
+
+class TestRetrievalPrefetch:
+    @pytest.mark.asyncio
+    async def test_disabled_by_default(self):
+        assert start_prefetch("pro plan cost", AsyncMock()) is None
+
+    @pytest.mark.asyncio
+    async def test_tool_reuses_prefetched_result(self):
+        retrieve = AsyncMock(return_value="prefetched docs")
+        with patch.object(retrieval_prefetch, 'retrieval_prefetch_enabled', True), \
+             patch.dict(retrieval_prefetch.prefetch_metrics, {"started": 0, "used": 0, "unused": 0}):
+            prefetch = start_prefetch("What does the pro plan cost?", retrieve)
+            ctx = MagicMock(deps=MagicMock(retrieval_prefetch=prefetch))
+
+            with patch.object(agent_module, 'retrieve_relevant_documents_tool', AsyncMock(return_value="fresh docs")) as tool:
+                assert await agent_module.retrieve_relevant_documents(ctx, "pro plan pricing cost") == "prefetched docs"
+                assert await agent_module.retrieve_relevant_documents(ctx, "refund policy") == "fresh docs"
+
+            prefetch.finish()
+            prefetch.finish()
+            retrieve.assert_awaited_once_with("What does the pro plan cost?")
+            tool.assert_awaited_once()
+            assert retrieval_prefetch.prefetch_metrics == {"started": 1, "used": 1, "unused": 0}
+
+    @pytest.mark.asyncio
+    async def test_failed_prefetch_falls_back(self):
+        prefetch = RetrievalPrefetch("pro plan cost", AsyncMock(return_value="Error retrieving documents: timeout"))
+        assert await prefetch.result_for("pro plan cost") is None
+
+    @pytest.mark.asyncio
+    async def test_unused_prefetch_is_cancelled(self):
+        async def slow_retrieve(query):
+            await asyncio.sleep(30)
+
+        with patch.dict(retrieval_prefetch.prefetch_metrics, {"started": 0, "used": 0, "unused": 0}):
+            prefetch = RetrievalPrefetch("pro plan cost", slow_retrieve)
+            await asyncio.sleep(0)
+            prefetch.finish()
+            await asyncio.sleep(0)
+
+            assert prefetch.task.cancelled()
+            assert retrieval_prefetch.prefetch_metrics["unused"] == 1
@@ -0,0 +1,80 @@
+import pytest
+import asyncio
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+
+# Import the module to test
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from stage_timing import StageTimingMiddleware, timed_stage, timed_tool, mark_streaming, metrics_payload, current_timer
+
+
+def make_app():
+    app = FastAPI()
+    app.add_middleware(StageTimingMiddleware)
+
+    @app.get("/items/{item_id}")
+    async def get_item(item_id: str):
+        with timed_stage("db"):
+            await asyncio.sleep(0.01)
+        return {"id": item_id}
+
+    @app.get("/stream")
+    async def stream():
+        async def body():
+            with timed_stage("generate"):
+                yield b"chunk"
+        mark_streaming()
+        return StreamingResponse(body(), media_type="text/plain")
+
+    return app
+
+
+async def request(app, path):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        return await client.get(path)
+
+
+class TestStageTimingMiddleware:
+    @pytest.mark.asyncio
+    async def test_non_streaming_response_has_server_timing(self):
+        response = await request(make_app(), "/items/42")
+
+        timing = response.headers["server-timing"]
+        stages = dict(entry.split(";dur=") for entry in timing.split(", "))
+        assert set(stages) == {"db", "total"}
+        assert float(stages["db"]) >= 10
+
+    @pytest.mark.asyncio
+    async def test_streaming_response_has_no_server_timing(self):
+        response = await request(make_app(), "/stream")
+
+        assert response.text == "chunk"
+        assert "server-timing" not in response.headers
+
+    @pytest.mark.asyncio
+    async def test_stages_are_exported_with_route_template(self):
+        await request(make_app(), "/items/abc")
+
+        payload = metrics_payload()
+        if payload is None:
+            pytest.skip("prometheus_client not installed")
+        text = payload.decode()
+        assert 'agent_api_stage_seconds_count{endpoint="/items/{item_id}",stage="db"}' in text
+        assert "/items/abc" not in text
+
+
+class TestTimedTool:
+    @pytest.mark.asyncio
+    async def test_tool_outside_a_request_still_runs(self):
+        @timed_tool
+        async def lookup(ctx, query: str) -> str:
+            return f"result for {query}"
+
+        assert current_timer.get() is None
+        assert await lookup(None, "x") == "result for x"
+        payload = metrics_payload()
+        if payload is not None:
+            assert 'agent_api_tool_seconds_count{outcome="ok",tool="lookup"}' in payload.decode()
@@ -0,0 +1,167 @@
+import pytest
+import asyncio
+
+# Import the modules to test
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sync_events import SyncEventBroker, format_sse
+
+HEALTH = {"total_entities": 2, "successful_syncs": 1, "failed_syncs": 1, "pending_conflicts": 0, "health_score": 50.0}
+
+
+def status_row(id, updated_at):
+    return {"id": id, "entity_type": "contact", "entity_id": id, "updated_at": updated_at}
+
+
+class FakeChanges:
+    """Stands in for the get_sync_changes RPC, returning queued results in order."""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.calls = []
+
+    async def __call__(self, params):
+        self.calls.append(params)
+        result = self.results.pop(0)
+        return {"status_changes": [], "new_conflicts": [], "health": HEALTH, **result}
+
+
+def drain(queue):
+    events = []
+    while not queue.empty():
+        events.append(queue.get_nowait())
+    return events
+
+
+class TestSyncEventBroker:
+    @pytest.mark.asyncio
+    async def test_first_poll_starts_from_now(self):
+        fetch = FakeChanges({"now": "2025-01-01T10:00:00"}, {"now": "2025-01-01T10:00:02"})
+        broker = SyncEventBroker(fetch, lookback_seconds=5, max_rows=10)
+        queue = asyncio.Queue()
+        broker.subscribers.add(queue)
+
+        await broker.poll_once()
+        await broker.poll_once()
+
+        assert fetch.calls[0]["status_since"] is None and fetch.calls[0]["conflicts_since"] is None
+        assert fetch.calls[1]["status_since"] == "2025-01-01T09:59:55"
+        assert fetch.calls[1]["status_after_id"] is None
+        # Health is published once, not on every poll
+        assert [event["event"] for event in drain(queue)] == ["health"]
+
+    @pytest.mark.asyncio
+    async def test_rows_in_lookback_window_are_published_once(self):
+        late = status_row("s2", "2025-01-01T10:00:00.500000")
+        fetch = FakeChanges(
+            {"now": "2025-01-01T10:00:00"},
+            {"now": "2025-01-01T10:00:02", "status_changes": [status_row("s1", "2025-01-01T10:00:01")],
+             "new_conflicts": [{"id": "c1", "created_at": "2025-01-01T10:00:01"}]},
+            # s2 committed late with an earlier timestamp - the lookback finds it
+            {"now": "2025-01-01T10:00:04", "status_changes": [late, status_row("s1", "2025-01-01T10:00:01")]}
+        )
+        broker = SyncEventBroker(fetch, lookback_seconds=5, max_rows=10)
+        queue = asyncio.Queue()
+        broker.subscribers.add(queue)
+
+        for _ in range(3):
+            await broker.poll_once()
+
+        events = [(event["event"], event["data"]["id"]) for event in drain(queue) if event["event"] != "health"]
+        assert events == [("sync_status", "s1"), ("conflict_created", "c1"), ("sync_status", "s2")]
+
+    @pytest.mark.asyncio
+    async def test_published_rows_are_pruned_per_table(self):
+        # No conflicts ever arrive, so that table's cursor stays at the first poll's time
+        fetch = FakeChanges(
+            {"now": "2025-01-01T10:00:00"},
+            {"now": "2025-01-01T10:00:02", "status_changes": [status_row("s1", "2025-01-01T10:00:01")]},
+            {"now": "2025-01-01T10:01:02", "status_changes": [status_row("s2", "2025-01-01T10:01:01")]}
+        )
+        broker = SyncEventBroker(fetch, lookback_seconds=5, max_rows=10)
+        broker.subscribers.add(asyncio.Queue())
+
+        for _ in range(3):
+            await broker.poll_once()
+
+        assert list(broker.status_cursor.published) == [("s2", "2025-01-01T10:01:01")]
+        assert broker.conflicts_cursor.published == {}
+
+    @pytest.mark.asyncio
+    async def test_health_is_only_counted_after_changes_or_the_interval(self):
+        fetch = FakeChanges(
+            {"now": "2025-01-01T10:00:00"},
+            {"now": "2025-01-01T10:00:02"},
+            {"now": "2025-01-01T10:00:04", "status_changes": [status_row("s1", "2025-01-01T10:00:03")]},
+            {"now": "2025-01-01T10:00:06"},
+            {"now": "2025-01-01T10:00:08"}
+        )
+        broker = SyncEventBroker(fetch, lookback_seconds=5, max_rows=10, health_interval=60)
+        broker.subscribers.add(asyncio.Queue())
+
+        for _ in range(5):
+            await broker.poll_once()
+
+        assert [call["include_health"] for call in fetch.calls] == [True, False, False, True, False]
+
+    @pytest.mark.asyncio
+    async def test_full_page_continues_from_last_row(self):
+        fetch = FakeChanges(
+            {"now": "2025-01-01T10:00:00"},
+            {"now": "2025-01-01T10:00:02", "status_changes": [
+                status_row("a", "2025-01-01T10:00:01"), status_row("b", "2025-01-01T10:00:01")
+            ]},
+            {"now": "2025-01-01T10:00:02", "status_changes": [status_row("c", "2025-01-01T10:00:01")]}
+        )
+        broker = SyncEventBroker(fetch, lookback_seconds=5, max_rows=2)
+        broker.subscribers.add(asyncio.Queue())
+
+        await broker.poll_once()
+        more = await broker.poll_once()
+        assert more is True
+        assert await broker.poll_once() is False
+
+        assert fetch.calls[2]["status_since"] == "2025-01-01T10:00:01"
+        assert fetch.calls[2]["status_after_id"] == "b"
+
+    @pytest.mark.asyncio
+    async def test_one_poller_for_all_subscribers(self):
+        polls = []
+
+        async def fetch(params):
+            polls.append(params)
+            return {"now": "2025-01-01T10:00:00", "health": HEALTH}
+
+        broker = SyncEventBroker(fetch, poll_interval=60)
+        first, second = broker.subscribe(), broker.subscribe()
+        await asyncio.sleep(0.01)
+
+        assert len(polls) == 1
+        assert first.get_nowait()["event"] == "health" and second.get_nowait()["event"] == "health"
+        # A late subscriber gets the current health straight away
+        late = broker.subscribe()
+        assert late.get_nowait()["data"] == HEALTH
+
+        for queue in (first, second, late):
+            broker.unsubscribe(queue)
+        assert broker.metrics()["polling"] is False
+
+    @pytest.mark.asyncio
+    async def test_lagging_subscriber_is_dropped(self):
+        fetch = FakeChanges({"now": "2025-01-01T10:00:00"})
+        broker = SyncEventBroker(fetch, queue_size=1)
+        queue = asyncio.Queue(maxsize=1)
+        queue.put_nowait({"id": 0, "event": "health", "data": {}})
+        broker.subscribers.add(queue)
+
+        await broker.poll_once()
+
+        assert queue.get_nowait() is None
+        assert broker.metrics()["subscribers_dropped"] == 1
+        assert broker.metrics()["subscribers"] == 0
+
+
+def test_format_sse():
+    event = {"id": 3, "event": "health", "data": {"health_score": 99.5}}
+    assert format_sse(event) == 'id: 3\nevent: health\ndata: {"health_score": 99.5}\n\n'
@@ -0,0 +1,153 @@
+import pytest
+import asyncio
+import httpx
+import json
+from unittest.mock import AsyncMock, MagicMock
+
+# Import the modules to test
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sync_jobs import SyncJobWorker, parse_concurrency_limits, coordinator_runner
+
+
+def make_supabase(claimed):
+    """A Supabase mock whose claim RPC hands out the given requests once."""
+    calls = []
+    batches = [claimed]
+
+    def rpc(name, params):
+        calls.append((name, params))
+        data = (batches.pop() if batches else []) if name == "claim_sync_requests" else {}
+        return MagicMock(execute=MagicMock(return_value=MagicMock(data=data)))
+
+    supabase = MagicMock()
+    supabase.rpc.side_effect = rpc
+    return supabase, calls
+
+
+class TestParseConcurrencyLimits:
+    def test_parses_pairs(self):
+        assert parse_concurrency_limits("contacts=2, orders=1,") == {"contacts": 2, "orders": 1}
+
+    @pytest.mark.parametrize("spec", ["widgets=1", "contacts=0"])
+    def test_rejects_bad_limits(self, spec):
+        with pytest.raises(ValueError):
+            parse_concurrency_limits(spec)
+
+
+class TestSyncJobWorker:
+    @pytest.mark.asyncio
+    async def test_claims_with_limits_and_records_outcomes(self):
+        requests = [
+            {"id": "r1", "keap_account_id": "a1", "sync_type": "contacts"},
+            {"id": "r2", "keap_account_id": "a1", "sync_type": "orders"}
+        ]
+        supabase, calls = make_supabase(requests)
+
+        async def run(request):
+            if request["id"] == "r2":
+                raise RuntimeError("Keap rate limited")
+
+        worker = SyncJobWorker(supabase, run, type_limits={"contacts": 2})
+        assert await worker.claim() == 2
+        await asyncio.gather(*worker.run_tasks)
+
+        claim_params = calls[0][1]
+        assert claim_params["type_limits"] == {"contacts": 2}
+        finishes = {params["request_id_param"]: params for name, params in calls if name == "finish_sync_request"}
+        assert finishes["r1"]["succeeded"] is True
+        assert finishes["r2"]["succeeded"] is False
+        assert finishes["r2"]["error_param"] == "Keap rate limited"
+        assert worker.metrics()["succeeded"] == 1 and worker.metrics()["failed"] == 1
+
+    @pytest.mark.asyncio
+    async def test_timeout_counts_as_failure(self):
+        supabase, calls = make_supabase([{"id": "r1", "keap_account_id": "a1", "sync_type": "tags"}])
+
+        async def run(request):
+            await asyncio.sleep(10)
+
+        worker = SyncJobWorker(supabase, run, type_limits={}, job_timeout=0.01)
+        await worker.claim()
+        await asyncio.gather(*worker.run_tasks)
+
+        finish = [params for name, params in calls if name == "finish_sync_request"][0]
+        assert finish["succeeded"] is False
+        assert "timed out" in finish["error_param"]
+        assert (finish["retry_base_seconds"], finish["retry_max_seconds"]) == (worker.retry_base_seconds, worker.retry_max_seconds)
+
+    @pytest.mark.asyncio
+    async def test_wake_claims_before_the_poll_interval(self):
+        supabase, calls = make_supabase([])
+        worker = SyncJobWorker(supabase, AsyncMock(), type_limits={}, poll_interval=60)
+
+        await worker.start()
+        await asyncio.sleep(0.05)
+        worker.wake()
+        await asyncio.sleep(0.05)
+        await worker.stop()
+
+        assert [name for name, _ in calls].count("claim_sync_requests") == 2
+
+
+def make_coordinator(statuses):
+    """An HTTP client for a coordinator that accepts a trigger and reports the given statuses in turn."""
+    requests = []
+
+    def handle(request):
+        requests.append(request)
+        if request.url.path.endswith("/sync/trigger"):
+            return httpx.Response(200, json={"success": True, "message": "Sync triggered", "triggerId": "t1"})
+        return httpx.Response(200, json={"triggerId": "t1", **statuses.pop(0)})
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handle)), requests
+
+
+@pytest.mark.asyncio
+async def test_coordinator_runner_posts_to_account_endpoint():
+    http_client, requests = make_coordinator([{"status": "completed"}])
+
+    run = coordinator_runner(http_client, base_url="https://coordinator.example", token="secret", poll_interval=0)
+    await run({"keap_account_id": "a1", "sync_type": "orders"})
+
+    trigger, status = requests
+    assert str(trigger.url) == "https://coordinator.example/keap/a1/sync/trigger"
+    assert json.loads(trigger.content) == {"keapAccountId": "a1", "syncType": "orders"}
+    assert trigger.headers["Authorization"] == "Bearer secret"
+    assert str(status.url) == "https://coordinator.example/keap/a1/sync/status?triggerId=t1"
+
+
+@pytest.mark.asyncio
+async def test_request_stays_running_until_the_coordinator_finishes():
+    supabase, calls = make_supabase([{"id": "r1", "keap_account_id": "a1", "sync_type": "contacts"}])
+    # The trigger call returns right away while the sync is still going
+    http_client, requests = make_coordinator([{"status": "pending"}, {"status": "pending"}, {"status": "completed"}])
+    worker = SyncJobWorker(supabase, coordinator_runner(http_client, base_url="https://coordinator.example", poll_interval=0.02), type_limits={})
+
+    await worker.claim()
+    await asyncio.sleep(0.03)
+
+    assert len(requests) >= 2
+    assert worker.metrics()["running"] == 1
+    assert "finish_sync_request" not in [name for name, _ in calls]
+
+    await asyncio.gather(*worker.run_tasks)
+
+    finish = [params for name, params in calls if name == "finish_sync_request"][0]
+    assert finish["succeeded"] is True
+    assert len(requests) == 4
+
+
+@pytest.mark.asyncio
+async def test_sync_failed_on_the_coordinator_fails_the_request():
+    supabase, calls = make_supabase([{"id": "r1", "keap_account_id": "a1", "sync_type": "tags"}])
+    http_client, _ = make_coordinator([{"status": "failed", "error": "Keap token expired"}])
+    worker = SyncJobWorker(supabase, coordinator_runner(http_client, base_url="https://coordinator.example", poll_interval=0), type_limits={})
+
+    await worker.claim()
+    await asyncio.gather(*worker.run_tasks)
+
+    finish = [params for name, params in calls if name == "finish_sync_request"][0]
+    assert finish["succeeded"] is False
+    assert finish["error_param"] == "Keap token expired"
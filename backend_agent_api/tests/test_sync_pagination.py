@@ -0,0 +1,58 @@
+import pytest
+
+# Import the modules to test
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sync_pagination import encode_cursor, decode_cursor, keyset_filter, select_fields, build_page
+
+
+class TestCursor:
+    def test_round_trip(self):
+        cursor = encode_cursor("2025-01-01T10:00:00.123456", "8f3c0a9e-1c2d-4b5e-9f00-000000000001")
+
+        assert "=" not in cursor
+        assert decode_cursor(cursor) == ("2025-01-01T10:00:00.123456", "8f3c0a9e-1c2d-4b5e-9f00-000000000001")
+
+    @pytest.mark.parametrize("cursor", ["not-a-cursor", encode_cursor(1, 2)[:-2], ""])
+    def test_invalid_cursor_raises(self, cursor):
+        with pytest.raises(ValueError):
+            decode_cursor(cursor)
+
+
+def test_keyset_filter_quotes_values():
+    assert keyset_filter("created_at", "id", ("2025-01-01T10:00:00.5", "abc")) == (
+        'created_at.lt."2025-01-01T10:00:00.5",and(created_at.eq."2025-01-01T10:00:00.5",id.lt."abc")'
+    )
+
+
+class TestSelectFields:
+    allowed = ["id", "created_at", "entity_type", "keap_data"]
+
+    def test_default_projection_with_required_columns_first(self):
+        columns = select_fields(None, self.allowed, default=["entity_type"], required=("id", "created_at"))
+        assert columns == ["id", "created_at", "entity_type"]
+
+    def test_requested_fields_without_duplicates(self):
+        columns = select_fields("keap_data, id", self.allowed, default=[], required=("id",))
+        assert columns == ["id", "keap_data"]
+
+    def test_unknown_field_raises(self):
+        with pytest.raises(ValueError, match="secret"):
+            select_fields("id,secret", self.allowed, default=[])
+
+
+class TestBuildPage:
+    rows = [{"id": str(i), "created_at": f"2025-01-0{9 - i}"} for i in range(3)]
+
+    def test_extra_row_means_next_page(self):
+        page = build_page(self.rows, 2, "created_at")
+
+        assert [row["id"] for row in page["items"]] == ["0", "1"]
+        assert decode_cursor(page["next_cursor"]) == ("2025-01-08", "1")
+
+    def test_last_page_has_no_cursor(self):
+        page = build_page(self.rows, 3, "created_at")
+
+        assert len(page["items"]) == 3
+        assert page["next_cursor"] is None
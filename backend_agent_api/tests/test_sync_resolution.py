@@ -0,0 +1,89 @@
+import pytest
+from unittest.mock import MagicMock
+
+# Import the modules to test
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sync_resolution import bulk_resolve_conflicts
+
+
+class FakeQuery:
+    """Records a Supabase query builder chain and returns the next queued page."""
+
+    def __init__(self, pages, count=0):
+        self.pages = pages
+        self.count = count
+        self.calls = []
+
+    def __getattr__(self, name):
+        def method(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return self
+        return method
+
+    def execute(self):
+        return MagicMock(data=self.pages.pop(0) if self.pages else [], count=self.count)
+
+
+def make_supabase(query=None, fail_ids=()):
+    """A Supabase mock whose batch RPC resolves every ID except fail_ids."""
+    batches = []
+
+    def rpc(name, params):
+        batches.append(params)
+        ids = params["conflict_ids"]
+        data = {
+            "resolved": [i for i in ids if i not in fail_ids],
+            "failed": [{"id": i, "error": "Conflict not found or already resolved"} for i in ids if i in fail_ids]
+        }
+        return MagicMock(execute=MagicMock(return_value=MagicMock(data=data)))
+
+    supabase = MagicMock()
+    supabase.rpc.side_effect = rpc
+    supabase.table.return_value = query
+    return supabase, batches
+
+
+async def collect(updates):
+    return [update async for update in updates]
+
+
+@pytest.mark.asyncio
+async def test_ids_are_resolved_in_batches_with_progress():
+    supabase, batches = make_supabase(fail_ids={"c3"})
+
+    updates = await collect(bulk_resolve_conflicts(
+        supabase, "keap_wins", "user1", conflict_ids=["c1", "c2", "c3", "c4", "c5"], batch_size=2
+    ))
+
+    assert [params["conflict_ids"] for params in batches] == [["c1", "c2"], ["c3", "c4"], ["c5"]]
+    assert batches[0]["resolution_strategy_param"] == "keap_wins"
+    assert batches[0]["resolved_by_param"] == "user1"
+    assert [(u["resolved"], u["failed"]) for u in updates[:-1]] == [(2, 0), (3, 1), (4, 1)]
+    final = updates[-1]
+    assert final["complete"] is True and final["total"] == 5
+    assert final["failures"] == [{"id": "c3", "error": "Conflict not found or already resolved"}]
+
+
+@pytest.mark.asyncio
+async def test_filter_walks_pending_conflicts_by_keyset():
+    pages = [
+        [],  # The count query
+        [{"id": "c1", "created_at": "2025-01-03T00:00:00"}, {"id": "c2", "created_at": "2025-01-02T00:00:00"}],
+        [{"id": "c3", "created_at": "2025-01-01T00:00:00"}]
+    ]
+    query = FakeQuery(pages, count=3)
+    # c2 stays pending, so re-reading the first page would loop forever
+    supabase, batches = make_supabase(query, fail_ids={"c2"})
+
+    updates = await collect(bulk_resolve_conflicts(
+        supabase, "supabase_wins", "user1", filters={"entity_type": "contact"}, batch_size=2
+    ))
+
+    assert [params["conflict_ids"] for params in batches] == [["c1", "c2"], ["c3"]]
+    assert ("eq", ("entity_type", "contact"), {}) in query.calls
+    assert ("is_", ("resolved_at", "null"), {}) in query.calls
+    keyset = [args[0] for name, args, _ in query.calls if name == "or_"]
+    assert keyset == ['created_at.lt."2025-01-02T00:00:00",and(created_at.eq."2025-01-02T00:00:00",id.lt."c2")']
+    assert updates[-1]["resolved"] == 2 and updates[-1]["failed"] == 1 and updates[-1]["total"] == 3
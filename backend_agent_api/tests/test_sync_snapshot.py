@@ -0,0 +1,130 @@
+import pytest
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+# Import the modules to test
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sync_snapshot import SnapshotCache, snapshot_etag, etag_matches
+
+
+def test_etag_ignores_generation_time():
+    first = snapshot_etag({"generated_at": "2025-01-01T00:00:00", "statistics": {"total_contacts": 1}})
+    second = snapshot_etag({"generated_at": "2025-01-01T00:00:10", "statistics": {"total_contacts": 1}})
+    changed = snapshot_etag({"generated_at": "2025-01-01T00:00:10", "statistics": {"total_contacts": 2}})
+
+    assert first == second
+    assert first != changed
+    assert first.startswith('"') and first.endswith('"')
+
+
+def test_etag_matches_lists_weak_tags_and_wildcard():
+    assert etag_matches('"abc"', '"abc"')
+    assert etag_matches('"x", W/"abc"', '"abc"')
+    assert etag_matches('*', '"abc"')
+    assert not etag_matches('"x"', '"abc"')
+    assert not etag_matches(None, '"abc"')
+
+
+class TestSnapshotCache:
+    @pytest.mark.asyncio
+    async def test_serves_cached_value_within_ttl(self):
+        compute = AsyncMock(return_value={"value": 1})
+        cache = SnapshotCache(compute, ttl_seconds=60, max_stale_seconds=120)
+
+        first = await cache.get()
+        second = await cache.get()
+
+        assert first == second
+        assert compute.await_count == 1
+        assert cache.metrics()["hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_concurrent_misses_share_one_computation(self):
+        started = asyncio.Event()
+        release = asyncio.Event()
+
+        async def compute():
+            started.set()
+            await release.wait()
+            return {"value": 1}
+
+        cache = SnapshotCache(compute, ttl_seconds=60)
+        callers = [asyncio.create_task(cache.get()) for _ in range(5)]
+        await started.wait()
+        release.set()
+        results = await asyncio.gather(*callers)
+
+        assert all(result == results[0] for result in results)
+        assert cache.metrics()["refreshes"] == 1
+
+    @pytest.mark.asyncio
+    async def test_stale_value_is_served_while_refreshing(self):
+        values = iter([{"value": 1}, {"value": 2}])
+        cache = SnapshotCache(AsyncMock(side_effect=lambda: next(values)), ttl_seconds=10, max_stale_seconds=60)
+
+        with patch("sync_snapshot.time.monotonic", return_value=1000.0):
+            await cache.get()
+        with patch("sync_snapshot.time.monotonic", return_value=1015.0):
+            stale, _ = await cache.get()
+            await cache.refresh_task
+            fresh, _ = await cache.get()
+
+        assert stale == {"value": 1}
+        assert fresh == {"value": 2}
+        assert cache.metrics()["stale_hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_failed_background_refresh_keeps_stale_value(self):
+        compute = AsyncMock(side_effect=[{"value": 1}, RuntimeError("db down")])
+        cache = SnapshotCache(compute, ttl_seconds=10, max_stale_seconds=60)
+
+        with patch("sync_snapshot.time.monotonic", return_value=1000.0):
+            await cache.get()
+        with patch("sync_snapshot.time.monotonic", return_value=1015.0):
+            await cache.get()
+            await asyncio.gather(cache.refresh_task, return_exceptions=True)
+            value, _ = await cache.get()
+
+        assert value == {"value": 1}
+        assert cache.metrics()["refresh_failures"] == 1
+
+    @pytest.mark.asyncio
+    async def test_miss_without_cached_value_raises(self):
+        cache = SnapshotCache(AsyncMock(side_effect=RuntimeError("db down")))
+
+        with pytest.raises(RuntimeError):
+            await cache.get()
+
+    @pytest.mark.asyncio
+    async def test_invalidate_forces_recompute(self):
+        values = iter([{"value": 1}, {"value": 2}])
+        cache = SnapshotCache(AsyncMock(side_effect=lambda: next(values)), ttl_seconds=60)
+
+        await cache.get()
+        cache.invalidate()
+        value, _ = await cache.get()
+
+        assert value == {"value": 2}
+
+    @pytest.mark.asyncio
+    async def test_invalidate_during_refresh_recomputes(self):
+        values = iter([{"value": 1}, {"value": 2}])
+        started = asyncio.Event()
+        release = asyncio.Event()
+
+        async def compute():
+            started.set()
+            await release.wait()
+            return next(values)
+
+        cache = SnapshotCache(compute, ttl_seconds=60)
+        waiting = asyncio.create_task(cache.get())
+        await started.wait()
+        cache.invalidate()
+        release.set()
+        value, etag = await waiting
+
+        assert value == {"value": 2}
+        assert etag is not None
@@ -0,0 +1,163 @@
+import pytest
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+# Import the classes to test
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tool_cache import SessionToolCaches, ToolCallCache, make_cache_key
+import agent as agent_module
+
+
+class TestMakeCacheKey:
+    def test_text_args_are_normalized(self):
+        first = make_cache_key("retrieve", {"user_query": "What is our  refund policy?"}, ["user_query"])
+        second = make_cache_key("retrieve", {"user_query": " what is our refund policy "}, ["user_query"])
+        assert first == second
+
+    def test_other_args_keep_case(self):
+        first = make_cache_key("sql", {"sql_query": "SELECT * FROM t WHERE name = 'Bob'"})
+        second = make_cache_key("sql", {"sql_query": "select * from t where name = 'bob'"})
+        assert first != second
+        assert first == make_cache_key("sql", {"sql_query": "SELECT * FROM t WHERE name = 'Bob'  "})
+
+
+class TestToolCallCache:
+    @pytest.mark.asyncio
+    async def test_repeat_call_is_served_from_cache(self):
+        cache = ToolCallCache(ttl_seconds=60, max_entries=10)
+        call = AsyncMock(return_value="docs")
+
+        assert await cache.get_or_call(("list",), call) == ("docs", False)
+        assert await cache.get_or_call(("list",), call) == ("docs", True)
+        assert call.await_count == 1
+
+    @pytest.mark.asyncio
+    async def test_parallel_calls_share_one_execution(self):
+        cache = ToolCallCache(ttl_seconds=60, max_entries=10)
+        calls = 0
+
+        async def slow_call():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return "result"
+
+        results = await asyncio.gather(cache.get_or_call(("k",), slow_call), cache.get_or_call(("k",), slow_call))
+
+        assert calls == 1
+        assert sorted(deduplicated for _, deduplicated in results) == [False, True]
+
+    @pytest.mark.asyncio
+    async def test_cancelled_caller_does_not_cancel_other_waiters(self):
+        cache = ToolCallCache(ttl_seconds=60, max_entries=10)
+        calls = 0
+
+        async def slow_call():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return "result"
+
+        owner = asyncio.create_task(cache.get_or_call(("k",), slow_call))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(cache.get_or_call(("k",), slow_call))
+        await asyncio.sleep(0.01)
+        owner.cancel()
+
+        assert await waiter == ("result", True)
+        assert calls == 1
+        assert await cache.get_or_call(("k",), slow_call) == ("result", True)
+
+    @pytest.mark.asyncio
+    async def test_call_is_cancelled_when_every_caller_is_gone(self):
+        cache = ToolCallCache(ttl_seconds=60, max_entries=10)
+        started = asyncio.Event()
+        cancelled = asyncio.Event()
+
+        async def slow_call():
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        caller = asyncio.create_task(cache.get_or_call(("k",), slow_call))
+        await started.wait()
+        caller.cancel()
+        await asyncio.wait_for(cancelled.wait(), timeout=1)
+
+        assert cache.in_flight == {}
+        call = AsyncMock(return_value="fresh")
+        assert await cache.get_or_call(("k",), call) == ("fresh", False)
+
+    @pytest.mark.asyncio
+    async def test_clear_drops_results_and_calls_started_before_it(self):
+        cache = ToolCallCache(ttl_seconds=60, max_entries=10)
+        await cache.get_or_call(("done",), AsyncMock(return_value="old"))
+
+        async def slow_call():
+            await asyncio.sleep(0.02)
+            return "stale"
+
+        running = asyncio.create_task(cache.get_or_call(("running",), slow_call))
+        await asyncio.sleep(0)
+        cache.clear()
+        assert await running == ("stale", False)
+
+        call = AsyncMock(return_value="new")
+        assert await cache.get_or_call(("done",), call) == ("new", False)
+        assert await cache.get_or_call(("running",), call) == ("new", False)
+
+    @pytest.mark.asyncio
+    async def test_errors_and_expired_entries_are_not_reused(self):
+        cache = ToolCallCache(ttl_seconds=60, max_entries=10)
+        failing = AsyncMock(return_value="Error retrieving documents: timeout")
+        await cache.get_or_call(("k",), failing)
+        await cache.get_or_call(("k",), failing)
+        assert failing.await_count == 2
+
+        expiring = ToolCallCache(ttl_seconds=0.01, max_entries=10)
+        call = AsyncMock(return_value="docs")
+        await expiring.get_or_call(("k",), call)
+        await asyncio.sleep(0.02)
+        await expiring.get_or_call(("k",), call)
+        assert call.await_count == 2
+
+
+class TestMemoizedTool:
+    @pytest.mark.asyncio
+    async def test_tool_calls_are_deduplicated_per_session(self):
+        caches = SessionToolCaches(ttl_seconds=60)
+        retrieve = AsyncMock(return_value="chunks")
+
+        async def run_tool(session_id, query):
+            agent_module.active_tool_cache.set(caches.scope(session_id))
+            result = await agent_module.retrieve_relevant_documents(MagicMock(deps=MagicMock(retrieval_prefetch=None)), query)
+            return result, agent_module.active_tool_cache.get()
+
+        with patch.object(agent_module, 'retrieve_relevant_documents_tool', retrieve):
+            _, first = await asyncio.create_task(run_tool("s1", "Refund policy?"))
+            _, second = await asyncio.create_task(run_tool("s1", "refund policy"))
+            _, other = await asyncio.create_task(run_tool("s2", "refund policy"))
+
+        assert retrieve.await_count == 2
+        assert (first.deduplicated, second.deduplicated, other.deduplicated) == (0, 1, 0)
+
+
+class TestSessionToolCaches:
+    @pytest.mark.asyncio
+    async def test_new_ingest_clears_every_session(self):
+        caches = SessionToolCaches(ttl_seconds=60)
+        call = AsyncMock(return_value="chunks")
+        await caches.scope("s1").call(("retrieve",), call)
+
+        assert caches.observe_ingest("2026-01-01T00:00:00") is True
+        assert caches.observe_ingest("2026-01-01T00:00:00") is False
+        assert caches.observe_ingest(None) is False
+        await caches.scope("s1").call(("retrieve",), call)
+
+        assert call.await_count == 2
+        assert caches.metrics()["invalidations"] == 1
@@ -43,6 +43,10 @@ with patch.dict(os.environ, {
                 list_documents_tool,
                 get_document_content_tool,
                 image_analysis_tool,
+                execute_sql_query_tool,
+                summarize_query_plan,
+                list_analytics_datasets_tool,
+                execute_analytics_query_tool,
                 execute_safe_code_tool
             )
 
@@ -331,16 +335,16 @@ class TestDocumentTools:
             'match_documents',
             {
                 'query_embedding': [0.1, 0.2, 0.3],
-                'match_count': 4
+                'match_count': 20
             }
         )
         
         # Verify the result contains document information
         assert "Document ID: doc1" in result
-        assert "Document Tilte: Document 1" in result
+        assert "Document Title: Document 1" in result
         assert "Document content 1" in result
         assert "Document ID: doc2" in result
-        assert "Document Tilte: Document 2" in result
+        assert "Document Title: Document 2" in result
         assert "Document content 2" in result
 
     @pytest.mark.asyncio
@@ -409,7 +413,7 @@ class TestDocumentTools:
         
         # Verify Supabase query was called correctly
         mock_supabase.from_.assert_called_once_with('document_metadata')
-        mock_from.select.assert_called_once_with('id, title, schema, url')
+        mock_from.select.assert_called_once_with('id, title, schema, url, typed_table, column_stats')
         
         # Verify the result contains document information
         assert str(mock_execute.data) == result
@@ -514,6 +518,161 @@ class TestDocumentTools:
         assert "Error retrieving document content: Test exception" in result
 
 
+class TestExecuteSqlQueryTool:
+    def _plan(self, total_cost, plan_rows, child_rows=None):
+        plan = {"Node Type": "Aggregate", "Total Cost": total_cost, "Plan Rows": plan_rows}
+        if child_rows is not None:
+            plan["Plans"] = [{
+                "Node Type": "Seq Scan",
+                "Relation Name": "document_rows",
+                "Total Cost": total_cost,
+                "Plan Rows": child_rows
+            }]
+        return [{"Plan": plan}]
+
+    def test_summarize_query_plan(self):
+        summary = summarize_query_plan(self._plan(1234.5, 1, child_rows=5000))
+
+        assert summary == {
+            "total_cost": 1234.5,
+            "plan_rows": 5000,
+            "max_node_rows": 5000,
+            "seq_scans": ["document_rows"]
+        }
+
+    @pytest.mark.asyncio
+    async def test_execute_sql_query_within_limits(self):
+        mock_supabase = MagicMock()
+        explain_result = MagicMock()
+        explain_result.data = self._plan(10.0, 1, child_rows=100)
+        query_result = MagicMock()
+        query_result.data = [{"avg": 42}]
+        mock_supabase.rpc.return_value.execute.side_effect = [explain_result, query_result]
+
+        sql = "SELECT AVG((row_data->>'revenue')::numeric) FROM document_rows WHERE dataset_id = '123'"
+        result = await execute_sql_query_tool(mock_supabase, sql)
+
+        mock_supabase.rpc.assert_has_calls([
+            call('explain_custom_sql', {"sql_query": sql}),
+            call('execute_custom_sql', {"sql_query": sql})
+        ], any_order=True)
+        assert json.loads(result) == [{"avg": 42}]
+
+    @pytest.mark.asyncio
+    async def test_execute_sql_query_rejected_by_cost(self):
+        mock_supabase = MagicMock()
+        explain_result = MagicMock()
+        explain_result.data = self._plan(5e9, 1, child_rows=1e10)
+        mock_supabase.rpc.return_value.execute.return_value = explain_result
+
+        result = await execute_sql_query_tool(mock_supabase, "SELECT COUNT(*) FROM document_rows a, document_rows b")
+
+        # Only the EXPLAIN ran, the query itself was never executed
+        mock_supabase.rpc.assert_called_once_with(
+            'explain_custom_sql',
+            {"sql_query": "SELECT COUNT(*) FROM document_rows a, document_rows b"}
+        )
+        rejection = json.loads(result)
+        assert rejection["estimated_cost"] == 5e9
+        assert rejection["estimated_rows"] == 1e10
+        assert "hint" in rejection
+
+    @pytest.mark.asyncio
+    async def test_execute_sql_query_plan_error(self):
+        mock_supabase = MagicMock()
+        explain_result = MagicMock()
+        explain_result.data = {"error": "column \"foo\" does not exist", "detail": "42703"}
+        mock_supabase.rpc.return_value.execute.return_value = explain_result
+
+        result = await execute_sql_query_tool(mock_supabase, "SELECT foo FROM document_rows")
+
+        assert result == 'SQL Error: column "foo" does not exist'
+        mock_supabase.rpc.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_execute_sql_query_write_operation_blocked(self):
+        mock_supabase = MagicMock()
+
+        result = await execute_sql_query_tool(mock_supabase, "DELETE FROM document_rows")
+
+        assert "Write operation 'DELETE' detected" in result
+        mock_supabase.rpc.assert_not_called()
+
+
+class TestAnalyticsQueryTools:
+    @pytest.fixture
+    def analytics_store(self, tmp_path):
+        duckdb = pytest.importorskip("duckdb")
+        parquet_path = tmp_path / "ds_sales_1234.parquet"
+        duckdb.sql(
+            "SELECT * FROM (VALUES ('West', 10.5), ('East', 4.0), ('West', 2.5)) t(region, revenue)"
+        ).write_parquet(str(parquet_path))
+        catalog = {
+            "file123": {
+                "table_name": "ds_sales_1234",
+                "title": "Sales",
+                "parquet_file": parquet_path.name,
+                "columns": {"region": "VARCHAR", "revenue": "DOUBLE"},
+                "row_count": 3
+            }
+        }
+        (tmp_path / "catalog.json").write_text(json.dumps(catalog))
+        with patch('tools.analytics_store_dir', str(tmp_path)):
+            yield tmp_path
+
+    @pytest.mark.asyncio
+    async def test_list_analytics_datasets(self, analytics_store):
+        result = await list_analytics_datasets_tool()
+
+        assert "ds_sales_1234" in result
+        assert "file123" in result
+        assert "'revenue': 'DOUBLE'" in result
+
+    @pytest.mark.asyncio
+    async def test_execute_analytics_query_success(self, analytics_store):
+        result = await execute_analytics_query_tool(
+            "SELECT region, SUM(revenue) AS total FROM ds_sales_1234 GROUP BY region ORDER BY region"
+        )
+
+        assert json.loads(result) == [
+            {"region": "East", "total": 4.0},
+            {"region": "West", "total": 13.0}
+        ]
+
+    @pytest.mark.asyncio
+    async def test_execute_analytics_query_blocks_copy(self, analytics_store):
+        result = await execute_analytics_query_tool("COPY ds_sales_1234 TO 'out.csv'")
+
+        assert result == "Error: Write operation 'COPY' detected. Only read-only queries are allowed."
+
+    @pytest.mark.asyncio
+    async def test_execute_analytics_query_allows_keywords_in_literals(self, analytics_store):
+        result = await execute_analytics_query_tool(
+            "SELECT region AS \"set\", 'Export' AS kind FROM ds_sales_1234 WHERE region <> 'Load' AND region <> 'it''s INSERT' ORDER BY region LIMIT 1"
+        )
+
+        assert json.loads(result) == [{"set": "East", "kind": "Export"}]
+
+    @pytest.mark.asyncio
+    async def test_execute_analytics_query_lockdown_refuses_set(self, analytics_store):
+        result = await execute_analytics_query_tool("SET threads = 1")
+
+        assert result.startswith("Error executing analytics query:")
+
+    @pytest.mark.asyncio
+    async def test_execute_analytics_query_blocks_files_outside_store(self, analytics_store):
+        result = await execute_analytics_query_tool("SELECT * FROM read_csv('/etc/passwd')")
+
+        assert result.startswith("Error executing analytics query:")
+
+    @pytest.mark.asyncio
+    async def test_execute_analytics_query_not_configured(self):
+        with patch('tools.analytics_store_dir', ''):
+            result = await execute_analytics_query_tool("SELECT 1")
+
+        assert "not configured" in result
+
+
 class TestImageAnalysisTool:
     @pytest.mark.asyncio
     @patch('tools.OpenAIModel')
@@ -0,0 +1,216 @@
+"""
+Memoization of agent tool calls.
+
+Within a run the model often repeats a tool call with (nearly) the same arguments -
+the same retrieval query reworded by a space or a question mark, or list_documents
+several times. Each repeat pays for another embedding call and RPC, so tool results
+are cached per session with a TTL, keyed by the tool name and its normalized
+arguments. Identical calls made in parallel within a run share a single execution.
+"""
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Optional, Tuple
+from collections import OrderedDict
+import functools
+import asyncio
+import string
+import time
+import os
+
+# How long a tool result can be reused within a session - a TTL of 0 disables the cache
+tool_cache_ttl_seconds = float(os.getenv("TOOL_CACHE_TTL_SECONDS", "300"))
+tool_cache_max_sessions = int(os.getenv("TOOL_CACHE_MAX_SESSIONS", "1000"))
+tool_cache_max_entries = int(os.getenv("TOOL_CACHE_MAX_ENTRIES", "64"))
+
+# Tools report failures as text rather than raising - those results are never cached
+ERROR_PREFIX = "Error"
+
+def normalize_text_arg(value: str) -> str:
+    """Casefold, collapse whitespace and drop trailing punctuation from a natural-language argument."""
+    return " ".join(value.casefold().split()).rstrip(string.punctuation + " ")
+
+def make_cache_key(tool_name: str, arguments: Dict[str, Any], text_args: Iterable[str] = ()) -> Tuple[Hashable, ...]:
+    """
+    Build a cache key from a tool call.
+
+    Args:
+        tool_name: Name of the tool
+        arguments: The call's arguments by name (without the run context)
+        text_args: Arguments holding natural language, normalized loosely. Other string
+            arguments (SQL, code, IDs) only have surrounding whitespace stripped, since
+            case and inner spacing can change their meaning.
+
+    Returns:
+        Tuple: A hashable key
+    """
+    text_args = set(text_args)
+    parts = []
+    for name in sorted(arguments):
+        value = arguments[name]
+        if isinstance(value, str):
+            value = normalize_text_arg(value) if name in text_args else value.strip()
+        elif not isinstance(value, Hashable):
+            value = repr(value)
+        parts.append((name, value))
+    return (tool_name, *parts)
+
+class ToolCallCache:
+    """Tool results for one session, plus the calls currently in flight."""
+
+    def __init__(self, ttl_seconds: float = tool_cache_ttl_seconds, max_entries: int = tool_cache_max_entries):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[Tuple, Tuple[float, Any]]" = OrderedDict()
+        # key -> [shared task, number of callers awaiting it]
+        self.in_flight: Dict[Tuple, list] = {}
+        # Bumped by clear() so calls started before it don't store their results
+        self.generation = 0
+
+    def _lookup(self, key: Tuple) -> Tuple[bool, Any]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return False, None
+        expires_at, result = entry
+        if expires_at <= time.monotonic():
+            del self.entries[key]
+            return False, None
+        self.entries.move_to_end(key)
+        return True, result
+
+    def _store(self, key: Tuple, result: Any) -> None:
+        if self.ttl_seconds <= 0 or (isinstance(result, str) and result.startswith(ERROR_PREFIX)):
+            return
+        self.entries[key] = (time.monotonic() + self.ttl_seconds, result)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def _finish(self, key: Tuple, generation: int, task: asyncio.Task) -> None:
+        pending = self.in_flight.get(key)
+        if pending is not None and pending[0] is task:
+            del self.in_flight[key]
+        if task.cancelled():
+            return
+        if task.exception() is None:
+            if generation == self.generation:
+                self._store(key, task.result())
+
+    def clear(self) -> None:
+        """Drop every cached result. Calls still running finish but aren't cached."""
+        self.entries.clear()
+        self.in_flight.clear()
+        self.generation += 1
+
+    async def get_or_call(self, key: Tuple, call: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Return the cached result for key, wait for an identical call already running,
+        or make the call.
+
+        The call runs as its own task shared by every caller waiting on it, so one
+        caller being cancelled (its run disconnected) doesn't cancel the others. The
+        task is only cancelled once the last caller waiting on it has gone.
+
+        Returns:
+            Tuple[Any, bool]: The result and whether it was deduplicated
+        """
+        found, result = self._lookup(key)
+        if found:
+            return result, True
+
+        pending = self.in_flight.get(key)
+        deduplicated = pending is not None
+        if pending is None:
+            task = asyncio.ensure_future(call())
+            pending = [task, 0]
+            self.in_flight[key] = pending
+            # Also retrieves the exception, so asyncio doesn't log it when nobody waits
+            task.add_done_callback(functools.partial(self._finish, key, self.generation))
+        task = pending[0]
+        pending[1] += 1
+        try:
+            return await asyncio.shield(task), deduplicated
+        finally:
+            pending[1] -= 1
+            if pending[1] == 0 and not task.done():
+                task.cancel()
+                # A cancelled call must not be joined by the next identical call
+                if self.in_flight.get(key) is pending:
+                    del self.in_flight[key]
+
+class ToolCacheScope:
+    """One agent run's handle on its session's tool cache. Counts calls so the run can report them."""
+
+    def __init__(self, cache: ToolCallCache):
+        self.cache = cache
+        self.calls = 0
+        self.deduplicated = 0
+
+    async def call(self, key: Tuple, call: Callable[[], Awaitable[Any]]) -> Any:
+        self.calls += 1
+        result, deduplicated = await self.cache.get_or_call(key, call)
+        if deduplicated:
+            self.deduplicated += 1
+        return result
+
+class SessionToolCaches:
+    """LRU of per-session tool caches, with hit counters for /health."""
+
+    def __init__(
+        self,
+        ttl_seconds: float = tool_cache_ttl_seconds,
+        max_sessions: int = tool_cache_max_sessions,
+        max_entries: int = tool_cache_max_entries
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.max_entries = max_entries
+        self.sessions: "OrderedDict[str, ToolCallCache]" = OrderedDict()
+        self.counters = {"calls": 0, "deduplicated": 0, "invalidations": 0}
+        # The most recent RAG pipeline ingest seen - results from before it may be stale
+        self.last_ingest: Optional[str] = None
+
+    def scope(self, session_id: Optional[str]) -> ToolCacheScope:
+        """Get a scope for a new run in the session, creating the session's cache if needed."""
+        cache = self.sessions.get(session_id) if session_id else None
+        if cache is None:
+            cache = ToolCallCache(self.ttl_seconds, self.max_entries)
+            if session_id:
+                self.sessions[session_id] = cache
+                while len(self.sessions) > self.max_sessions:
+                    self.sessions.popitem(last=False)
+        else:
+            self.sessions.move_to_end(session_id)
+        return ToolCacheScope(cache)
+
+    def record(self, scope: ToolCacheScope) -> None:
+        """Add a finished run's counts to the totals."""
+        self.counters["calls"] += scope.calls
+        self.counters["deduplicated"] += scope.deduplicated
+
+    def clear(self) -> None:
+        """Drop the cached results of every session."""
+        for cache in self.sessions.values():
+            cache.clear()
+        self.counters["invalidations"] += 1
+
+    def observe_ingest(self, last_ingest: Optional[str]) -> bool:
+        """
+        Clear the caches when the RAG pipeline reports an ingest not seen before.
+
+        Args:
+            last_ingest: Time of the pipeline's latest ingest, or None if it hasn't ingested anything
+
+        Returns:
+            bool: Whether the caches were cleared
+        """
+        if last_ingest is None or last_ingest == self.last_ingest:
+            return False
+        self.last_ingest = last_ingest
+        self.clear()
+        return True
+
+    def metrics(self) -> Dict[str, Any]:
+        calls = self.counters["calls"]
+        return {
+            **self.counters,
+            "sessions": len(self.sessions),
+            "dedup_rate": round(self.counters["deduplicated"] / calls, 3) if calls else 0.0
+        }
@@ -7,14 +7,31 @@ from typing import Dict, Any, List, Optional
 from openai import AsyncOpenAI
 from httpx import AsyncClient
 from supabase import Client
+from decimal import Decimal
+from context_packing import retrieval_candidate_count, select_chunks, pack_chunks, format_packed_context
+import asyncio
 import base64
 import json
 import sys
 import os
 import re
 
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
 embedding_model = os.getenv('EMBEDDING_MODEL_CHOICE') or 'text-embedding-3-small'
 
+# Planner estimates above these limits get the query rejected before it runs
+sql_max_plan_cost = float(os.getenv('SQL_MAX_PLAN_COST') or 100000)
+sql_max_plan_rows = float(os.getenv('SQL_MAX_PLAN_ROWS') or 1000000)
+
+# Local Parquet + DuckDB store written by the RAG pipeline (shared volume)
+analytics_store_dir = os.getenv('ANALYTICS_STORE_DIR') or ''
+analytics_query_timeout = float(os.getenv('ANALYTICS_QUERY_TIMEOUT') or 30)
+analytics_max_rows = 500
+
 async def brave_web_search(query: str, http_client: AsyncClient, brave_api_key: str) -> str:
     """
     Helper function for web_search_tool - searches the web with the Brave API
@@ -123,38 +140,28 @@ async def retrieve_relevant_documents_tool(supabase: Client, embedding_client: A
     This is called by the retrieve_relevant_documents tool for the agent.
     
     Returns:
-        List[str]: List of relevant document chunks with metadata
+        str: The most relevant passages, grouped by document
     """    
     try:
         # Get the embedding for the query
         query_embedding = await get_embedding(user_query, embedding_client)
         
-        # Query Supabase for relevant documents
-        result = supabase.rpc(
+        # Fetch a wider candidate set than we'll use, then pack the best of it.
+        # The Supabase client is synchronous, so run the RPC off the event loop.
+        result = await asyncio.to_thread(supabase.rpc(
             'match_documents',
             {
                 'query_embedding': query_embedding,
-                'match_count': 4
+                'match_count': retrieval_candidate_count
             }
-        ).execute()
+        ).execute)
         
         if not result.data:
             return "No relevant documents found."
             
-        # Format the results
-        formatted_chunks = []
-        for doc in result.data:
-            chunk_text = f"""
-# Document ID: {doc['metadata'].get('file_id', 'unknown')}      
-# Document Tilte: {doc['metadata'].get('file_title', 'unknown')}
-# Document URL: {doc['metadata'].get('file_url', 'unknown')}
-
-{doc['content']}
-"""
-            formatted_chunks.append(chunk_text)
-            
-        # Join all chunks with a separator
-        return "\n\n---\n\n".join(formatted_chunks)
+        # Deduplicate, pick diverse chunks within the token budget and merge neighbours per file
+        selected = select_chunks(result.data)
+        return format_packed_context(pack_chunks(selected))
         
     except Exception as e:
         print(f"Error retrieving documents: {e}")
@@ -166,12 +173,12 @@ async def list_documents_tool(supabase: Client) -> List[str]:
     This is called by the list_documents tool for the agent.
     
     Returns:
-        List[str]: List of documents including their metadata (URL/path, schema if applicable, etc.)
+        List[str]: List of documents including their metadata (URL/path, schema, typed table and column statistics if applicable, etc.)
     """
     try:
         # Query Supabase for unique documents
         result = supabase.from_('document_metadata') \
-            .select('id, title, schema, url') \
+            .select('id, title, schema, url, typed_table, column_stats') \
             .execute()
             
         return str(result.data)
@@ -214,6 +221,125 @@ async def get_document_content_tool(supabase: Client, document_id: str) -> str:
         print(f"Error retrieving document content: {e}")
         return f"Error retrieving document content: {str(e)}"     
 
+def summarize_query_plan(plan: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Pull the numbers we care about out of an EXPLAIN (FORMAT JSON) plan.
+
+    The plan is of the query wrapped in jsonb_agg, as execute_custom_sql runs it,
+    so the rows the query returns are the input rows of the top aggregate.
+
+    Args:
+        plan: The JSON plan returned by Postgres (a list with a single {"Plan": {...}} entry)
+
+    Returns:
+        Dict[str, Any]: Total cost, rows returned, the largest row estimate of any
+        plan node (catches exploding joins that are aggregated away) and the
+        relations read with sequential scans
+    """
+    root = plan[0]['Plan']
+    query = (root.get('Plans') or [root])[0]
+    max_node_rows = 0
+    seq_scans = []
+
+    # Walk the plan tree iteratively
+    nodes = [root]
+    while nodes:
+        node = nodes.pop()
+        max_node_rows = max(max_node_rows, node.get('Plan Rows', 0))
+        if node.get('Node Type') == 'Seq Scan' and node.get('Relation Name'):
+            seq_scans.append(node['Relation Name'])
+        nodes.extend(node.get('Plans', []))
+
+    return {
+        "total_cost": root.get('Total Cost', 0),
+        "plan_rows": query.get('Plan Rows', 0),
+        "max_node_rows": max_node_rows,
+        "seq_scans": sorted(set(seq_scans))
+    }
+
+async def check_sql_query_cost(supabase: Client, sql_query: str) -> Optional[str]:
+    """
+    Admission control for agent-generated SQL. Runs EXPLAIN (FORMAT JSON) through the
+    explain_custom_sql RPC and rejects queries whose planner estimates are over the
+    SQL_MAX_PLAN_COST / SQL_MAX_PLAN_ROWS limits.
+
+    Args:
+        supabase: The Supabase client
+        sql_query: The read-only SQL query the agent wants to run
+
+    Returns:
+        Optional[str]: None if the query may run, otherwise the message to hand back to the agent
+    """
+    try:
+        result = supabase.rpc(
+            'explain_custom_sql',
+            {"sql_query": sql_query}
+        ).execute()
+    except Exception as e:
+        # Don't block the agent if the planner check itself is unavailable
+        print(f"Error explaining SQL query, skipping cost check: {e}")
+        return None
+
+    # Planning errors (syntax, unknown columns) would fail the real query too
+    if isinstance(result.data, dict) and 'error' in result.data:
+        return f"SQL Error: {result.data['error']}"
+
+    if not result.data:
+        return None
+
+    estimate = summarize_query_plan(result.data)
+    print(
+        f"SQL plan estimate: cost={estimate['total_cost']} rows={estimate['plan_rows']} "
+        f"max_node_rows={estimate['max_node_rows']} seq_scans={estimate['seq_scans']}"
+    )
+
+    if estimate['total_cost'] <= sql_max_plan_cost and estimate['max_node_rows'] <= sql_max_plan_rows:
+        return None
+
+    print(f"SQL query rejected by cost limits (max cost {sql_max_plan_cost}, max rows {sql_max_plan_rows})")
+    return json.dumps({
+        "error": "Query rejected: the estimated cost is too high to run",
+        "estimated_cost": estimate['total_cost'],
+        "estimated_rows": estimate['max_node_rows'],
+        "max_cost": sql_max_plan_cost,
+        "max_rows": sql_max_plan_rows,
+        "hint": (
+            "Rewrite the query to do less work: always filter on dataset_id, never join "
+            "document_rows to itself without a join condition, aggregate with GROUP BY "
+            "instead of returning raw rows, and add a LIMIT when listing rows."
+        )
+    }, indent=2)
+
+# String literals ('it''s', E'..', $$..$$) and quoted identifiers ("set")
+SQL_QUOTED_PATTERN = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|\$\$.*?\$\$", re.DOTALL)
+
+def detect_write_operation(sql_query: str, extra_operations: List[str] = None) -> Optional[str]:
+    """
+    Find the first write operation keyword in a SQL query.
+
+    Args:
+        sql_query: The SQL query to check
+        extra_operations: Additional keywords to block on top of the standard write operations
+
+    Returns:
+        Optional[str]: The offending keyword, or None if the query looks read-only
+    """
+    write_operations = ['INSERT', 'UPDATE', 'DELETE', 'DROP', 'CREATE', 'ALTER', 'TRUNCATE', 'GRANT', 'REVOKE']
+    write_operations += extra_operations or []
+
+    # Keywords inside string literals and quoted identifiers are data, e.g. WHERE status = 'Export'
+    code_only = SQL_QUOTED_PATTERN.sub(" ", sql_query)
+
+    # Convert query to uppercase for case-insensitive comparison
+    upper_query = code_only.upper()
+
+    # Check if any write operations are in the query
+    for op in write_operations:
+        pattern = r'\b' + op + r'\b'
+        if re.search(pattern, upper_query):
+            return op
+    return None
+
 async def execute_sql_query_tool(supabase: Client, sql_query: str) -> str:
     """
     Run a SQL query - use this to query from the document_rows table once you know the file ID you are querying. 
@@ -245,16 +371,14 @@ async def execute_sql_query_tool(supabase: Client, sql_query: str) -> str:
     try:
         # Validate that the query is read-only by checking for write operations
         sql_query = sql_query.strip()
-        write_operations = ['INSERT', 'UPDATE', 'DELETE', 'DROP', 'CREATE', 'ALTER', 'TRUNCATE', 'GRANT', 'REVOKE']
-        
-        # Convert query to uppercase for case-insensitive comparison
-        upper_query = sql_query.upper()
+        op = detect_write_operation(sql_query)
+        if op:
+            return f"Error: Write operation '{op}' detected. Only read-only queries are allowed."
         
-        # Check if any write operations are in the query
-        for op in write_operations:
-            pattern = r'\b' + op + r'\b'
-            if re.search(pattern, upper_query):
-                return f"Error: Write operation '{op}' detected. Only read-only queries are allowed."
+        # Reject queries the planner expects to be too expensive before running them
+        rejection = await check_sql_query_cost(supabase, sql_query)
+        if rejection:
+            return rejection
         
         # Execute the query using the RPC function
         result = supabase.rpc(
@@ -272,6 +396,128 @@ async def execute_sql_query_tool(supabase: Client, sql_query: str) -> str:
     except Exception as e:
         return f"Error executing SQL query: {str(e)}"
 
+def load_analytics_catalog() -> Dict[str, Any]:
+    """
+    Load the analytics store catalog (file_id -> dataset entry) written by the RAG pipeline.
+
+    Returns:
+        Dict[str, Any]: The catalog, empty if the store is not configured or has no datasets yet
+    """
+    if not analytics_store_dir:
+        return {}
+    catalog_path = os.path.join(analytics_store_dir, 'catalog.json')
+    if not os.path.exists(catalog_path):
+        return {}
+    with open(catalog_path, 'r') as f:
+        return json.load(f)
+
+async def list_analytics_datasets_tool() -> str:
+    """
+    List the datasets available in the local analytics store with their typed columns.
+    This is called by the list_analytics_datasets tool for the agent.
+
+    Returns:
+        str: List of datasets with file ID, table name, title, column types and row count
+    """
+    if duckdb is None or not analytics_store_dir:
+        return "The analytics store is not configured. Use execute_sql_query on document_rows instead."
+
+    try:
+        catalog = load_analytics_catalog()
+        datasets = [
+            {
+                "file_id": file_id,
+                "table_name": entry["table_name"],
+                "title": entry["title"],
+                "columns": entry["columns"],
+                "row_count": entry["row_count"]
+            }
+            for file_id, entry in catalog.items()
+        ]
+        return str(datasets)
+    except Exception as e:
+        print(f"Error listing analytics datasets: {e}")
+        return str([])
+
+def _run_analytics_query(con, sql_query: str, catalog: Dict[str, Any]) -> tuple:
+    """
+    Run a query against the analytics store on the given DuckDB connection (blocking).
+    Only the datasets referenced in the query get a view, and the connection is locked
+    down to reading files inside the store directory before the agent's SQL runs.
+    """
+    store_dir = os.path.abspath(analytics_store_dir)
+
+    def quote(value: str) -> str:
+        return "'" + value.replace("'", "''") + "'"
+
+    try:
+        con.execute(f"SET allowed_directories=[{quote(store_dir + os.sep)}]")
+        con.execute("SET enable_external_access=false")
+        con.execute("SET lock_configuration=true")
+
+        lower_query = sql_query.lower()
+        for entry in catalog.values():
+            if entry["table_name"] in lower_query:
+                parquet_path = os.path.join(store_dir, entry["parquet_file"])
+                con.execute(f'CREATE VIEW "{entry["table_name"]}" AS SELECT * FROM read_parquet({quote(parquet_path)})')
+
+        cursor = con.execute(sql_query)
+        columns = [description[0] for description in cursor.description]
+        rows = cursor.fetchmany(analytics_max_rows + 1)
+        return columns, rows
+    finally:
+        # Closed here rather than by the caller so a timed-out query is never closed mid-run
+        con.close()
+
+async def execute_analytics_query_tool(sql_query: str) -> str:
+    """
+    Run a read-only DuckDB SQL query against the typed tables in the local analytics store.
+    This is called by the execute_analytics_query tool for the agent.
+
+    Example query:
+
+    SELECT region, SUM(revenue) AS total_revenue
+    FROM ds_sales_export_csv_1a2b3c4d
+    GROUP BY region
+    ORDER BY total_revenue DESC;
+
+    Args:
+        sql_query: The SQL query to execute (must be read-only)
+
+    Returns:
+        str: The results of the SQL query in JSON format
+    """
+    if duckdb is None or not analytics_store_dir:
+        return "The analytics store is not configured. Use execute_sql_query on document_rows instead."
+
+    sql_query = sql_query.strip()
+    # SET, LOAD and INSTALL are refused by the connection lockdown in _run_analytics_query
+    op = detect_write_operation(sql_query, ['COPY', 'ATTACH', 'DETACH', 'EXPORT', 'IMPORT', 'PRAGMA'])
+    if op:
+        return f"Error: Write operation '{op}' detected. Only read-only queries are allowed."
+
+    con = duckdb.connect()
+    try:
+        catalog = load_analytics_catalog()
+        columns, rows = await asyncio.wait_for(
+            asyncio.to_thread(_run_analytics_query, con, sql_query, catalog),
+            timeout=analytics_query_timeout
+        )
+
+        records = [dict(zip(columns, row)) for row in rows[:analytics_max_rows]]
+        # DECIMAL sums come back as Decimal - keep them numeric, stringify dates and the rest
+        result = json.dumps(records, indent=2, default=lambda v: float(v) if isinstance(v, Decimal) else str(v))
+        if len(rows) > analytics_max_rows:
+            result = f"Showing the first {analytics_max_rows} rows - aggregate or add a LIMIT to see less.\n{result}"
+        return result
+
+    except asyncio.TimeoutError:
+        # Stop the query running in the worker thread
+        con.interrupt()
+        return f"Error: Analytics query exceeded the {analytics_query_timeout:.0f}s time limit. Aggregate more or filter the data."
+    except Exception as e:
+        return f"Error executing analytics query: {str(e)}"
+
 async def image_analysis_tool(supabase: Client, document_id: str, query: str) -> str:
     try:
         # Environment variables for the vision model
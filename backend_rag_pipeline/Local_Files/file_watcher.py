@@ -127,15 +127,19 @@ class LocalFileWatcher:
             else:
                 print(f"Failed to save last check time to config")
     
-    def save_state(self) -> None:
+    def save_state(self, ingested: bool = False) -> None:
         """
         Save complete state (last_check_time + known_files) to database or config file.
+        
+        Args:
+            ingested: Whether this check added, changed or deleted documents
         """
         if self.state_manager:
             # Save complete state to database
             success = self.state_manager.save_state(
                 last_check_time=self.last_check_time,
-                known_files=self.known_files
+                known_files=self.known_files,
+                ingested=ingested
             )
             if success:
                 print(f"Saved complete state to database: {len(self.known_files)} known files")
@@ -410,7 +414,7 @@ class LocalFileWatcher:
             stats['duration'] = time.time() - start_time
             
             # Save complete state (last_check_time + known_files)
-            self.save_state()
+            self.save_state(ingested=bool(stats['files_processed'] or stats['files_deleted']))
             
             return stats
             
@@ -0,0 +1,212 @@
+"""
+Local columnar store for tabular files (Parquet files queried with DuckDB).
+
+Every tabular file ingested by the RAG pipeline is also written to
+ANALYTICS_STORE_DIR as a typed Parquet file, and a catalog.json manifest maps
+each file ID to its table name and inferred column types. The agent API mounts
+the same directory and runs analytical SQL against it with DuckDB.
+"""
+from typing import Callable, Dict, Any, Iterator, Optional
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+import threading
+import tempfile
+import hashlib
+import json
+import os
+import re
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+CATALOG_FILE = "catalog.json"
+CATALOG_LOCK_FILE = ".catalog.lock"
+
+# flock only excludes other processes, so threads in this one also take this lock
+_catalog_thread_lock = threading.Lock()
+
+def get_store_dir() -> Optional[Path]:
+    """
+    Get the analytics store directory, or None if the store is disabled.
+
+    The store is enabled when ANALYTICS_STORE_DIR is set and DuckDB is installed.
+    """
+    store_dir = os.getenv("ANALYTICS_STORE_DIR")
+    if not store_dir or duckdb is None:
+        return None
+    return Path(store_dir)
+
+def dataset_table_name(file_id: str) -> str:
+    """
+    Build a stable SQL-safe table name for a file ID.
+
+    Args:
+        file_id: The Google Drive file ID or local file path
+
+    Returns:
+        str: A lowercase identifier like ds_sales_export_csv_1a2b3c4d
+    """
+    readable = re.sub(r'[^a-z0-9]+', '_', os.path.basename(file_id).lower()).strip('_')[:40]
+    # The hash keeps names unique when two files sanitize to the same string
+    digest = hashlib.sha1(file_id.encode('utf-8')).hexdigest()[:8]
+    return f"ds_{readable}_{digest}" if readable else f"ds_{digest}"
+
+def _sql_string(value: str) -> str:
+    """Quote a value as a SQL string literal."""
+    return "'" + value.replace("'", "''") + "'"
+
+def load_catalog(store_dir: Path) -> Dict[str, Any]:
+    """Load the catalog manifest (file_id -> dataset entry) from the store directory."""
+    catalog_path = store_dir / CATALOG_FILE
+    if not catalog_path.exists():
+        return {}
+    try:
+        with open(catalog_path, 'r') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"Error loading analytics catalog: {e}")
+        return {}
+
+def _save_catalog(store_dir: Path, catalog: Dict[str, Any]) -> None:
+    """Atomically replace the catalog manifest so readers never see a partial file."""
+    fd, tmp_path = tempfile.mkstemp(dir=store_dir, prefix=f".{CATALOG_FILE}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(catalog, f, indent=2)
+        os.replace(tmp_path, store_dir / CATALOG_FILE)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+@contextmanager
+def _catalog_lock(store_dir: Path) -> Iterator[None]:
+    """Hold the catalog lock, shared by every process writing to the store."""
+    with _catalog_thread_lock:
+        with open(store_dir / CATALOG_LOCK_FILE, 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+def update_catalog(store_dir: Path, update: Callable[[Dict[str, Any]], Any]) -> Any:
+    """
+    Read, modify and write the catalog under the catalog lock.
+
+    Concurrent ingests would otherwise each read the same catalog and the last
+    one to write would drop the others' entries.
+
+    Args:
+        store_dir: The analytics store directory
+        update: Changes the catalog in place; its return value is passed back
+
+    Returns:
+        Any: What update returned
+    """
+    with _catalog_lock(store_dir):
+        catalog = load_catalog(store_dir)
+        before = dict(catalog)
+        result = update(catalog)
+        if catalog != before:
+            _save_catalog(store_dir, catalog)
+        return result
+
+def write_dataset_to_store(file_id: str, file_title: str, file_content: bytes) -> Optional[Dict[str, Any]]:
+    """
+    Write a CSV file to the analytics store as Parquet with inferred column types.
+
+    Args:
+        file_id: The Google Drive file ID or local file path
+        file_title: The title of the file
+        file_content: The binary content of the CSV file
+
+    Returns:
+        Optional[Dict[str, Any]]: The catalog entry for the dataset, or None if the
+        store is disabled or the file could not be converted
+    """
+    store_dir = get_store_dir()
+    if store_dir is None or not file_content.strip():
+        return None
+
+    csv_path = None
+    try:
+        store_dir.mkdir(parents=True, exist_ok=True)
+        table_name = dataset_table_name(file_id)
+        parquet_path = store_dir / f"{table_name}.parquet"
+        tmp_parquet_path = store_dir / f".{table_name}.parquet.tmp"
+
+        # DuckDB's CSV sniffer needs a file to read from
+        with tempfile.NamedTemporaryFile(delete=False, suffix='.csv') as temp_file:
+            temp_file.write(file_content)
+            csv_path = temp_file.name
+
+        con = duckdb.connect()
+        try:
+            source = f"read_csv({_sql_string(csv_path)}, header = true, sample_size = -1)"
+            con.execute(f"COPY (SELECT * FROM {source}) TO {_sql_string(str(tmp_parquet_path))} (FORMAT PARQUET)")
+            columns = con.execute(
+                f"DESCRIBE SELECT * FROM read_parquet({_sql_string(str(tmp_parquet_path))})"
+            ).fetchall()
+            row_count = con.execute(
+                f"SELECT COUNT(*) FROM read_parquet({_sql_string(str(tmp_parquet_path))})"
+            ).fetchone()[0]
+        finally:
+            con.close()
+
+        # Swap the new file in atomically so running queries keep a consistent view
+        os.replace(tmp_parquet_path, parquet_path)
+
+        entry = {
+            "table_name": table_name,
+            "title": file_title,
+            "parquet_file": parquet_path.name,
+            "columns": {name: column_type for name, column_type, *_ in columns},
+            "row_count": row_count,
+            "updated_at": datetime.now(timezone.utc).isoformat()
+        }
+
+        update_catalog(store_dir, lambda catalog: catalog.__setitem__(file_id, entry))
+
+        print(f"Wrote {row_count} rows for file '{file_title}' to analytics table {table_name}")
+        return entry
+    except Exception as e:
+        print(f"Error writing dataset to analytics store: {e}")
+        return None
+    finally:
+        if csv_path and os.path.exists(csv_path):
+            os.remove(csv_path)
+
+def delete_dataset_from_store(file_id: str) -> None:
+    """
+    Remove a dataset's Parquet file and catalog entry from the analytics store.
+
+    Args:
+        file_id: The Google Drive file ID or local file path
+    """
+    store_dir = get_store_dir()
+    if store_dir is None or not store_dir.exists():
+        return
+
+    try:
+        entry = update_catalog(store_dir, lambda catalog: catalog.pop(file_id, None))
+        if entry is None:
+            return
+
+        # Drop the catalog entry first so no reader is pointed at a missing file
+        parquet_path = store_dir / entry["parquet_file"]
+        if parquet_path.exists():
+            parquet_path.unlink()
+        print(f"Deleted analytics table {entry['table_name']} for file ID: {file_id}")
+    except Exception as e:
+        print(f"Error deleting dataset from analytics store: {e}")
@@ -11,7 +11,11 @@ import sys
 from pathlib import Path
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-from text_processor import chunk_text, create_embeddings, is_tabular_file, extract_schema_from_csv, extract_rows_from_csv
+from text_processor import (
+    chunk_text, create_embeddings, is_tabular_file, extract_schema_from_csv, extract_rows_from_csv,
+    infer_column_types, compute_column_statistics
+)
+from analytics_store import write_dataset_to_store, delete_dataset_from_store
 
 # Check if we're in production
 is_production = os.getenv("ENVIRONMENT") == "production"
@@ -55,6 +59,15 @@ def delete_document_by_file_id(file_id: str) -> None:
             print(f"Deleted metadata for file ID: {file_id}")
         except Exception as e:
             print(f"Error deleting document metadata: {e}")
+
+        # Drop the typed per-dataset table
+        try:
+            supabase.rpc("drop_dataset_table", {"dataset_id_param": file_id}).execute()
+        except Exception as e:
+            print(f"Error dropping typed dataset table: {e}")
+
+        # Delete the typed copy in the local analytics store
+        delete_dataset_from_store(file_id)
             
     except Exception as e:
         print(f"Error deleting documents: {e}")
@@ -160,6 +173,49 @@ def insert_document_rows(file_id: str, rows: List[Dict[str, Any]]) -> None:
     except Exception as e:
         print(f"Error inserting document rows: {e}")
 
+def refresh_dataset_profile(file_id: str, rows: List[Dict[str, Any]], categorical_limit: int = 1000) -> Optional[str]:
+    """
+    Infer column types and statistics for a tabular file, store them in document_metadata
+    and rebuild the typed per-dataset table over document_rows.
+    
+    Args:
+        file_id: The Google Drive file ID (references document_metadata.id)
+        rows: List of row data as dictionaries
+        categorical_limit: Text columns with at most this many distinct values get an index
+        
+    Returns:
+        Optional[str]: The name of the typed table, or None if it could not be built
+    """
+    try:
+        column_stats = compute_column_statistics(rows, infer_column_types(rows))
+        # Statistics check every row and downgrade columns the sample mistyped
+        column_types = {column: stats["type"] for column, stats in column_stats.items()}
+        
+        supabase.table("document_metadata").update({
+            "column_types": column_types,
+            "column_stats": column_stats
+        }).eq("id", file_id).execute()
+        
+        # Index typed columns (range filters) and low-cardinality text columns (group by / equality)
+        columns = [
+            {
+                "name": column,
+                "type": column_type,
+                "index": column_type != 'text' or column_stats[column]["distinct_count"] <= categorical_limit
+            }
+            for column, column_type in column_types.items()
+        ]
+        
+        response = supabase.rpc("refresh_dataset_table", {
+            "dataset_id_param": file_id,
+            "columns_param": columns
+        }).execute()
+        print(f"Refreshed typed table {response.data} for file ID: {file_id}")
+        return response.data
+    except Exception as e:
+        print(f"Error refreshing dataset profile: {e}")
+        return None
+
 def process_file_for_rag(file_content: bytes, text: str, file_id: str, file_url: str, 
                         file_title: str, mime_type: str = None, config: Dict[str, Any] = None) -> None:
     """
@@ -198,6 +254,11 @@ def process_file_for_rag(file_content: bytes, text: str, file_id: str, file_url:
             rows = extract_rows_from_csv(file_content)
             if rows:
                 insert_document_rows(file_id, rows)
+                # Infer column types and statistics and build the typed table
+                refresh_dataset_profile(file_id, rows)
+
+            # Also write a typed columnar copy for fast analytical queries
+            write_dataset_to_store(file_id, file_title, file_content)
 
         # Get text processing settings from config
         text_processing = config.get('text_processing', {})
@@ -94,13 +94,16 @@ class StateManager:
             }
     
     def save_state(self, last_check_time: Optional[datetime] = None, 
-                   known_files: Optional[Dict[str, str]] = None) -> bool:
+                   known_files: Optional[Dict[str, str]] = None,
+                   ingested: bool = False) -> bool:
         """
         Save pipeline state to database.
         
         Args:
             last_check_time: Last check timestamp (will be converted to UTC)
             known_files: Dictionary of file_id -> timestamp mappings
+            ingested: Whether this run added, changed or deleted documents. Sets last_ingest,
+                which the agent API watches to drop tool results cached before the ingest.
             
         Returns:
             True if save was successful, False otherwise
@@ -124,6 +127,9 @@ class StateManager:
             if known_files is not None:
                 data['known_files'] = known_files
             
+            if ingested:
+                data['last_ingest'] = data['last_run']
+            
             # Check if record exists
             state = self.load_state()
             
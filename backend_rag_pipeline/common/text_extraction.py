@@ -0,0 +1,97 @@
+"""
+Text extraction and chunking for documents.
+
+Kept apart from text_processor, which loads .env and creates an embedding client when
+it is imported, so other services (the agent API's attachment index) can import these
+functions without picking up the pipeline's configuration.
+"""
+import os
+import tempfile
+from typing import List, Dict, Any
+import pypdf
+
+def chunk_text(text: str, chunk_size: int = 400, overlap: int = 0) -> List[str]:
+    """
+    Split text into chunks of specified size with optional overlap.
+    
+    Args:
+        text: The text to chunk
+        chunk_size: Size of each chunk in characters
+        overlap: Number of overlapping characters between chunks
+        
+    Returns:
+        List of text chunks
+    """
+    if not text:
+        return []
+    
+    # Clean the text
+    text = text.replace('\r', '')
+    
+    # Split text into chunks
+    chunks = []
+    for i in range(0, len(text), chunk_size - overlap):
+        chunk = text[i:i + chunk_size]
+        if chunk:  # Only add non-empty chunks
+            chunks.append(chunk)
+    
+    return chunks
+
+def extract_text_from_pdf(file_content: bytes) -> str:
+    """
+    Extract text from a PDF file.
+    
+    Args:
+        file_content: Binary content of the PDF file
+        
+    Returns:
+        Extracted text from the PDF
+    """
+    # Create a temporary file to store the PDF content
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
+        temp_file.write(file_content)
+        temp_file_path = temp_file.name
+    
+    try:
+        # Open the PDF file
+        with open(temp_file_path, 'rb') as file:
+            pdf_reader = pypdf.PdfReader(file)
+            text = ""
+            
+            # Extract text from each page
+            for page in pdf_reader.pages:
+                page_text = page.extract_text()
+                if page_text:
+                    text += page_text + "\n\n"
+        
+        return text
+    finally:
+        # Clean up the temporary file
+        if os.path.exists(temp_file_path):
+            os.remove(temp_file_path)
+
+def extract_text_from_file(file_content: bytes, mime_type: str, file_name: str, config: Dict[str, Any] = None) -> str:
+    """
+    Extract text from a file based on its MIME type.
+    
+    Args:
+        file_content: Binary content of the file
+        mime_type: MIME type of the file
+        config: Configuration dictionary with supported_mime_types
+        
+    Returns:
+        Extracted text from the file
+    """
+    supported_mime_types = []
+    if config and 'supported_mime_types' in config:
+        supported_mime_types = config['supported_mime_types']
+    
+    if 'application/pdf' in mime_type:
+        return extract_text_from_pdf(file_content)
+    elif mime_type.startswith('image'):
+        return file_name
+    elif config and any(mime_type.startswith(t) for t in supported_mime_types):
+        return file_content.decode('utf-8', errors='replace')
+    else:
+        # For unsupported file types, just try to extract the text
+        return file_content.decode('utf-8', errors='replace')
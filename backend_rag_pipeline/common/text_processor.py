@@ -1,13 +1,19 @@
 import os
 import io
+import re
 import csv
-import tempfile
-from typing import List, Dict, Any
-import pypdf
+import sys
+from collections import Counter
+from datetime import date, datetime
+from typing import List, Dict, Any, Optional
 from openai import OpenAI
 from dotenv import load_dotenv
 from pathlib import Path
 
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+# Re-exported - the extraction and chunking code lives in a module that reads no configuration
+from text_extraction import chunk_text, extract_text_from_pdf, extract_text_from_file
+
 # Check if we're in production
 is_production = os.getenv("ENVIRONMENT") == "production"
 
@@ -24,92 +30,6 @@ else:
 api_key = os.getenv("EMBEDDING_API_KEY", "") or "ollama"
 openai_client = OpenAI(api_key=api_key, base_url=os.getenv("EMBEDDING_BASE_URL"))
 
-def chunk_text(text: str, chunk_size: int = 400, overlap: int = 0) -> List[str]:
-    """
-    Split text into chunks of specified size with optional overlap.
-    
-    Args:
-        text: The text to chunk
-        chunk_size: Size of each chunk in characters
-        overlap: Number of overlapping characters between chunks
-        
-    Returns:
-        List of text chunks
-    """
-    if not text:
-        return []
-    
-    # Clean the text
-    text = text.replace('\r', '')
-    
-    # Split text into chunks
-    chunks = []
-    for i in range(0, len(text), chunk_size - overlap):
-        chunk = text[i:i + chunk_size]
-        if chunk:  # Only add non-empty chunks
-            chunks.append(chunk)
-    
-    return chunks
-
-def extract_text_from_pdf(file_content: bytes) -> str:
-    """
-    Extract text from a PDF file.
-    
-    Args:
-        file_content: Binary content of the PDF file
-        
-    Returns:
-        Extracted text from the PDF
-    """
-    # Create a temporary file to store the PDF content
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
-        temp_file.write(file_content)
-        temp_file_path = temp_file.name
-    
-    try:
-        # Open the PDF file
-        with open(temp_file_path, 'rb') as file:
-            pdf_reader = pypdf.PdfReader(file)
-            text = ""
-            
-            # Extract text from each page
-            for page in pdf_reader.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n\n"
-        
-        return text
-    finally:
-        # Clean up the temporary file
-        if os.path.exists(temp_file_path):
-            os.remove(temp_file_path)
-
-def extract_text_from_file(file_content: bytes, mime_type: str, file_name: str, config: Dict[str, Any] = None) -> str:
-    """
-    Extract text from a file based on its MIME type.
-    
-    Args:
-        file_content: Binary content of the file
-        mime_type: MIME type of the file
-        config: Configuration dictionary with supported_mime_types
-        
-    Returns:
-        Extracted text from the file
-    """
-    supported_mime_types = []
-    if config and 'supported_mime_types' in config:
-        supported_mime_types = config['supported_mime_types']
-    
-    if 'application/pdf' in mime_type:
-        return extract_text_from_pdf(file_content)
-    elif mime_type.startswith('image'):
-        return file_name
-    elif config and any(mime_type.startswith(t) for t in supported_mime_types):
-        return file_content.decode('utf-8', errors='replace')
-    else:
-        # For unsupported file types, just try to extract the text
-        return file_content.decode('utf-8', errors='replace')
-
 def create_embeddings(texts: List[str]) -> List[List[float]]:
     """
     Create embeddings for a list of text chunks using OpenAI.
@@ -197,4 +117,148 @@ def extract_rows_from_csv(file_content: bytes) -> List[Dict[str, Any]]:
         return list(csv_reader)
     except Exception as e:
         print(f"Error extracting rows from CSV: {e}")
-        return []    
+        return []
+
+BOOLEAN_VALUES = {'true': True, 't': True, 'yes': True, 'y': True, 'false': False, 'f': False, 'no': False, 'n': False}
+
+def _infer_value_type(value: str) -> str:
+    """Infer the narrowest Postgres type for a single non-empty CSV value."""
+    if re.fullmatch(r'[-+]?\d{1,18}', value):
+        # Keep zero-padded codes (zip codes, SKUs) as text so the padding survives
+        digits = value.lstrip('+-')
+        return 'text' if len(digits) > 1 and digits.startswith('0') else 'bigint'
+    if re.fullmatch(r'[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?', value):
+        return 'numeric'
+    if value.lower() in BOOLEAN_VALUES:
+        return 'boolean'
+    if re.fullmatch(r'\d{4}-\d{2}-\d{2}', value):
+        try:
+            date.fromisoformat(value)
+            return 'date'
+        except ValueError:
+            return 'text'
+    if re.match(r'\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}', value):
+        try:
+            datetime.fromisoformat(value)
+            return 'timestamptz'
+        except ValueError:
+            return 'text'
+    return 'text'
+
+def infer_column_types(rows: List[Dict[str, Any]], sample_size: int = 1000) -> Dict[str, str]:
+    """
+    Infer a Postgres type for each column from a sample of the rows.
+    
+    Args:
+        rows: List of row data as dictionaries (as returned by extract_rows_from_csv)
+        sample_size: Number of rows to sample for inference
+        
+    Returns:
+        Dict[str, str]: Column name -> one of bigint, numeric, boolean, date, timestamptz or text
+    """
+    if not rows:
+        return {}
+    
+    # A column only keeps a type if every sampled value fits it
+    widening = {('bigint', 'numeric'), ('numeric', 'bigint')}
+    column_types: Dict[str, Optional[str]] = {column: None for column in rows[0].keys() if column is not None}
+    
+    for row in rows[:sample_size]:
+        for column in column_types:
+            value = (row.get(column) or '').strip()
+            if not value or column_types[column] == 'text':
+                continue
+            value_type = _infer_value_type(value)
+            current = column_types[column]
+            if current is None or current == value_type:
+                column_types[column] = value_type
+            elif (current, value_type) in widening:
+                column_types[column] = 'numeric'
+            else:
+                column_types[column] = 'text'
+    
+    # Columns with no values in the sample default to text
+    return {column: column_type or 'text' for column, column_type in column_types.items()}
+
+def _convert_value(value: str, column_type: str) -> Any:
+    """Convert a CSV value to a comparable Python value for its inferred type, or None if it doesn't fit."""
+    try:
+        if column_type == 'bigint':
+            return int(value)
+        if column_type == 'numeric':
+            return float(value)
+        if column_type == 'boolean':
+            return BOOLEAN_VALUES.get(value.lower())
+        if column_type in ('date', 'timestamptz'):
+            return value if _infer_value_type(value) == column_type else None
+        return value
+    except ValueError:
+        return None
+
+def _column_statistics(rows: List[Dict[str, Any]], column: str, column_type: str, top_n: int) -> Dict[str, Any]:
+    """Compute the statistics of one column, counting non-empty values that don't fit its type as invalid."""
+    values = []
+    null_count = 0
+    invalid_count = 0
+    for row in rows:
+        raw_value = (row.get(column) or '').strip()
+        if not raw_value:
+            null_count += 1
+            continue
+        value = _convert_value(raw_value, column_type)
+        if value is None:
+            invalid_count += 1
+        else:
+            values.append(value)
+    
+    column_stats: Dict[str, Any] = {
+        "type": column_type,
+        "null_count": null_count,
+        "distinct_count": len(set(values))
+    }
+    if invalid_count:
+        column_stats["invalid_count"] = invalid_count
+    
+    if values and column_type in ('bigint', 'numeric', 'date', 'timestamptz'):
+        column_stats["min"] = min(values)
+        column_stats["max"] = max(values)
+    if values and column_type in ('bigint', 'numeric'):
+        column_stats["mean"] = round(sum(values) / len(values), 4)
+    if values and column_type in ('text', 'boolean'):
+        column_stats["top_values"] = [[value, count] for value, count in Counter(values).most_common(top_n)]
+    
+    return column_stats
+
+def compute_column_statistics(rows: List[Dict[str, Any]], column_types: Dict[str, str], top_n: int = 5) -> Dict[str, Dict[str, Any]]:
+    """
+    Compute per-column statistics for a tabular file.
+    
+    infer_column_types only looks at a sample, so every row is checked against the
+    inferred type here. A column with values that don't fit is downgraded to text
+    (keeping the sampled type in "inferred_type" and the mismatches in "invalid_count")
+    so the typed table never turns real data into NULLs. Callers should take the
+    final column types from the returned "type" fields.
+    
+    Args:
+        rows: List of row data as dictionaries
+        column_types: Column name -> inferred type (from infer_column_types)
+        top_n: Number of most common values to keep for text and boolean columns
+        
+    Returns:
+        Dict[str, Dict[str, Any]]: Column name -> type, null count, distinct count,
+        min/max (and mean for numbers) and the most common values for categorical columns
+    """
+    statistics = {}
+    
+    for column, column_type in column_types.items():
+        column_stats = _column_statistics(rows, column, column_type, top_n)
+        
+        invalid_count = column_stats.get("invalid_count", 0)
+        if invalid_count:
+            column_stats = _column_statistics(rows, column, 'text', top_n)
+            column_stats["inferred_type"] = column_type
+            column_stats["invalid_count"] = invalid_count
+        
+        statistics[column] = column_stats
+    
+    return statistics
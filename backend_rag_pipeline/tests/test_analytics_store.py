@@ -0,0 +1,101 @@
+import pytest
+from unittest.mock import patch
+import os
+import sys
+import threading
+
+duckdb = pytest.importorskip("duckdb")
+
+# Add the parent directory to sys.path to import the modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from common.analytics_store import (
+    dataset_table_name,
+    load_catalog,
+    update_catalog,
+    write_dataset_to_store,
+    delete_dataset_from_store
+)
+
+SALES_CSV = (
+    b"date,region,revenue,units\n"
+    b"2024-01-01,West,10.5,3\n"
+    b"2024-01-02,East,,4\n"
+    b"2024-01-03,West,7.25,1\n"
+)
+
+class TestDatasetTableName:
+    def test_readable_and_stable(self):
+        """Test that table names are SQL-safe, readable and deterministic"""
+        name = dataset_table_name("/data/Sales Export (2024).csv")
+        assert name.startswith("ds_sales_export_2024_csv_")
+        assert name == dataset_table_name("/data/Sales Export (2024).csv")
+
+    def test_unique_for_colliding_names(self):
+        """Test that file IDs that sanitize to the same string still get distinct names"""
+        assert dataset_table_name("/a/sales.csv") != dataset_table_name("/b/sales.csv")
+
+class TestWriteDatasetToStore:
+    def test_disabled_without_store_dir(self):
+        """Test that nothing is written when ANALYTICS_STORE_DIR is not set"""
+        with patch.dict(os.environ, {}, clear=True):
+            assert write_dataset_to_store("file123", "Sales", SALES_CSV) is None
+
+    def test_writes_typed_parquet_and_catalog(self, tmp_path):
+        """Test writing a CSV file produces a typed Parquet file and a catalog entry"""
+        with patch.dict(os.environ, {'ANALYTICS_STORE_DIR': str(tmp_path)}):
+            entry = write_dataset_to_store("file123", "Sales", SALES_CSV)
+
+        assert entry["row_count"] == 3
+        assert entry["columns"] == {
+            "date": "DATE",
+            "region": "VARCHAR",
+            "revenue": "DOUBLE",
+            "units": "BIGINT"
+        }
+        assert load_catalog(tmp_path)["file123"] == entry
+
+        # The Parquet file is queryable with DuckDB
+        parquet_path = str(tmp_path / entry["parquet_file"])
+        total = duckdb.sql(f"SELECT SUM(revenue) FROM read_parquet('{parquet_path}')").fetchone()[0]
+        assert total == 17.75
+
+    def test_empty_content_is_skipped(self, tmp_path):
+        """Test that an empty file is not added to the store"""
+        with patch.dict(os.environ, {'ANALYTICS_STORE_DIR': str(tmp_path)}):
+            entry = write_dataset_to_store("file123", "Empty", b"")
+
+        assert entry is None
+        assert load_catalog(tmp_path) == {}
+
+class TestUpdateCatalog:
+    def test_concurrent_updates_keep_every_entry(self, tmp_path):
+        """Test that concurrent read-modify-writes of the catalog don't lose entries"""
+        def add(i):
+            update_catalog(tmp_path, lambda catalog: catalog.__setitem__(f"file{i}", {"table_name": f"ds_{i}"}))
+
+        threads = [threading.Thread(target=add, args=(i,)) for i in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert sorted(load_catalog(tmp_path)) == sorted(f"file{i}" for i in range(20))
+        assert not list(tmp_path.glob("*.tmp"))
+
+class TestDeleteDatasetFromStore:
+    def test_removes_parquet_and_catalog_entry(self, tmp_path):
+        """Test deleting a dataset removes both its file and its catalog entry"""
+        with patch.dict(os.environ, {'ANALYTICS_STORE_DIR': str(tmp_path)}):
+            entry = write_dataset_to_store("file123", "Sales", SALES_CSV)
+            write_dataset_to_store("file456", "Other", SALES_CSV)
+            delete_dataset_from_store("file123")
+
+        assert not (tmp_path / entry["parquet_file"]).exists()
+        assert list(load_catalog(tmp_path)) == ["file456"]
+
+    def test_unknown_file_is_noop(self, tmp_path):
+        """Test deleting a file that was never stored does nothing"""
+        with patch.dict(os.environ, {'ANALYTICS_STORE_DIR': str(tmp_path)}):
+            delete_dataset_from_store("missing")
+
+        assert not (tmp_path / "catalog.json").exists()
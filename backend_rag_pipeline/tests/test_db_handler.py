@@ -23,6 +23,7 @@ with patch.dict(os.environ, {
             insert_document_chunks,
             insert_or_update_document_metadata,
             insert_document_rows,
+            refresh_dataset_profile,
             process_file_for_rag
         )
 
@@ -274,6 +275,66 @@ class TestInsertDocumentRows:
         captured = capfd.readouterr()
         assert "Error inserting document rows: DB error" in captured.out
 
+class TestRefreshDatasetProfile:
+    @patch('common.db_handler.supabase')
+    def test_stores_stats_and_builds_typed_table(self, mock_supabase):
+        """Test that column types and stats are stored and the typed table is rebuilt"""
+        mock_table = MagicMock()
+        mock_supabase.table.return_value = mock_table
+        mock_supabase.rpc.return_value.execute.return_value.data = "dataset_abc123"
+        
+        rows = [
+            {"region": "West", "revenue": "10.5", "note": "a"},
+            {"region": "East", "revenue": "4", "note": "b"}
+        ]
+        
+        result = refresh_dataset_profile("file123", rows, categorical_limit=1)
+        
+        assert result == "dataset_abc123"
+        
+        # Types and stats are written to document_metadata
+        update_data = mock_table.update.call_args[0][0]
+        assert update_data["column_types"] == {"region": "text", "revenue": "numeric", "note": "text"}
+        assert update_data["column_stats"]["revenue"]["max"] == 10.5
+        mock_table.update.return_value.eq.assert_called_once_with("id", "file123")
+        
+        # Only typed columns and text columns under the categorical limit are indexed
+        mock_supabase.rpc.assert_called_once_with("refresh_dataset_table", {
+            "dataset_id_param": "file123",
+            "columns_param": [
+                {"name": "region", "type": "text", "index": False},
+                {"name": "revenue", "type": "numeric", "index": True},
+                {"name": "note", "type": "text", "index": False}
+            ]
+        })
+    
+    @patch('common.db_handler.supabase')
+    def test_mistyped_column_is_built_as_text(self, mock_supabase):
+        """Test that a column with values past the inference sample that don't fit its type is built as text"""
+        mock_table = MagicMock()
+        mock_supabase.table.return_value = mock_table
+        
+        rows = [{"amount": str(i)} for i in range(1500)] + [{"amount": "n/a"}]
+        
+        refresh_dataset_profile("file123", rows)
+        
+        update_data = mock_table.update.call_args[0][0]
+        assert update_data["column_types"] == {"amount": "text"}
+        assert update_data["column_stats"]["amount"]["invalid_count"] == 1
+        columns = mock_supabase.rpc.call_args[0][1]["columns_param"]
+        assert columns[0]["type"] == "text"
+    
+    @patch('common.db_handler.supabase')
+    def test_error_handling(self, mock_supabase, capfd):
+        """Test that a failing RPC is reported without raising"""
+        mock_supabase.rpc.return_value.execute.side_effect = Exception("RPC error")
+        
+        result = refresh_dataset_profile("file123", [{"a": "1"}])
+        
+        assert result is None
+        captured = capfd.readouterr()
+        assert "Error refreshing dataset profile: RPC error" in captured.out
+
 class TestProcessFileForRag:
     @pytest.fixture
     def setup_mocks(self):
@@ -281,6 +342,8 @@ class TestProcessFileForRag:
         with patch('common.db_handler.delete_document_by_file_id') as mock_delete_document, \
              patch('common.db_handler.insert_or_update_document_metadata') as mock_insert_metadata, \
              patch('common.db_handler.insert_document_rows') as mock_insert_rows, \
+             patch('common.db_handler.refresh_dataset_profile') as mock_refresh_profile, \
+             patch('common.db_handler.write_dataset_to_store') as mock_write_store, \
              patch('common.db_handler.insert_document_chunks') as mock_insert_chunks, \
              patch('common.db_handler.is_tabular_file') as mock_is_tabular, \
              patch('common.db_handler.extract_schema_from_csv') as mock_extract_schema, \
@@ -292,6 +355,8 @@ class TestProcessFileForRag:
                 'delete_document': mock_delete_document,
                 'insert_metadata': mock_insert_metadata,
                 'insert_rows': mock_insert_rows,
+                'refresh_profile': mock_refresh_profile,
+                'write_store': mock_write_store,
                 'insert_chunks': mock_insert_chunks,
                 'is_tabular': mock_is_tabular,
                 'extract_schema': mock_extract_schema,
@@ -329,6 +394,7 @@ class TestProcessFileForRag:
         mocks['insert_metadata'].assert_called_once_with(file_id, file_title, file_url, None)
         mocks['extract_rows'].assert_not_called()
         mocks['insert_rows'].assert_not_called()
+        mocks['refresh_profile'].assert_not_called()
         mocks['chunk_text'].assert_called_once_with(content, chunk_size=400, overlap=0)
         mocks['create_embeddings'].assert_called_once_with(["Chunk 1", "Chunk 2"])
         mocks['insert_chunks'].assert_called_once_with(
@@ -368,6 +434,8 @@ class TestProcessFileForRag:
         mocks['insert_metadata'].assert_called_once_with(file_id, file_title, file_url, ["col1", "col2"])
         mocks['extract_rows'].assert_called_once_with(file_content)
         mocks['insert_rows'].assert_called_once_with(file_id, [{"col1": "val1", "col2": "val2"}])
+        mocks['refresh_profile'].assert_called_once_with(file_id, [{"col1": "val1", "col2": "val2"}])
+        mocks['write_store'].assert_called_once_with(file_id, file_title, file_content)
         mocks['chunk_text'].assert_called_once_with(content, chunk_size=400, overlap=0)
         mocks['create_embeddings'].assert_called_once_with(["Chunk 1", "Chunk 2"])
         mocks['insert_chunks'].assert_called_once_with(
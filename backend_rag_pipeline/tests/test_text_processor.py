@@ -30,7 +30,9 @@ with patch.dict(os.environ, {
             create_embeddings, 
             is_tabular_file, 
             extract_schema_from_csv, 
-            extract_rows_from_csv
+            extract_rows_from_csv,
+            infer_column_types,
+            compute_column_statistics
         )
 
 class TestChunkText:
@@ -104,7 +106,7 @@ class TestExtractTextFromPdf:
         mock_remove.assert_called_once_with('temp.pdf')
 
 class TestExtractTextFromFile:
-    @patch('common.text_processor.extract_text_from_pdf')
+    @patch('text_extraction.extract_text_from_pdf')
     def test_pdf_file(self, mock_extract_pdf):
         """Test extracting text from PDF file"""
         mock_extract_pdf.return_value = "PDF content"
@@ -239,3 +241,91 @@ class TestExtractRowsFromCsv:
         # Check that error was printed
         captured = capfd.readouterr()
         assert "Error extracting rows from CSV" in captured.out
+
+class TestInferColumnTypes:
+    def test_empty_rows(self):
+        """Test inference with no rows returns no columns"""
+        assert infer_column_types([]) == {}
+    
+    def test_basic_types(self):
+        """Test inference of each supported type"""
+        rows = [
+            {"id": "1", "price": "9.99", "active": "yes", "day": "2024-01-01", "seen": "2024-01-01 10:00:00", "name": "A"},
+            {"id": "2", "price": "10", "active": "no", "day": "2024-02-29", "seen": "2024-01-02T11:30:00+00:00", "name": "B"}
+        ]
+        assert infer_column_types(rows) == {
+            "id": "bigint",
+            "price": "numeric",
+            "active": "boolean",
+            "day": "date",
+            "seen": "timestamptz",
+            "name": "text"
+        }
+    
+    def test_empty_values_are_ignored(self):
+        """Test that blank cells don't change the inferred type and all-blank columns are text"""
+        rows = [{"amount": "", "blank": ""}, {"amount": "5", "blank": " "}]
+        assert infer_column_types(rows) == {"amount": "bigint", "blank": "text"}
+    
+    def test_mixed_values_fall_back_to_text(self):
+        """Test that zero-padded codes and mixed columns stay text"""
+        rows = [{"zip": "02134", "mixed": "1"}, {"zip": "90210", "mixed": "n/a"}]
+        assert infer_column_types(rows) == {"zip": "text", "mixed": "text"}
+    
+    def test_sample_size(self):
+        """Test that only the sampled rows drive inference"""
+        rows = [{"value": "1"}, {"value": "abc"}]
+        assert infer_column_types(rows, sample_size=1) == {"value": "bigint"}
+
+class TestComputeColumnStatistics:
+    def test_numeric_and_text_statistics(self):
+        """Test statistics for numeric and categorical columns"""
+        rows = [
+            {"region": "West", "revenue": "10"},
+            {"region": "East", "revenue": ""},
+            {"region": "West", "revenue": "20"}
+        ]
+        stats = compute_column_statistics(rows, {"region": "text", "revenue": "bigint"})
+        
+        assert stats["revenue"] == {
+            "type": "bigint",
+            "null_count": 1,
+            "distinct_count": 2,
+            "min": 10,
+            "max": 20,
+            "mean": 15.0
+        }
+        assert stats["region"] == {
+            "type": "text",
+            "null_count": 0,
+            "distinct_count": 2,
+            "top_values": [["West", 2], ["East", 1]]
+        }
+    
+    def test_values_not_matching_type_downgrade_column_to_text(self):
+        """Test that values outside the sample that don't fit the type downgrade the column instead of becoming nulls"""
+        rows = [{"day": "2024-01-01"}, {"day": ""}, {"day": "soon"}]
+        stats = compute_column_statistics(rows, {"day": "date"})
+        
+        assert stats["day"] == {
+            "type": "text",
+            "null_count": 1,
+            "distinct_count": 2,
+            "top_values": [["2024-01-01", 1], ["soon", 1]],
+            "inferred_type": "date",
+            "invalid_count": 1
+        }
+    
+    def test_mismatch_after_inference_sample_is_detected(self):
+        """Test that a mismatch beyond the inference sample is caught over all rows"""
+        rows = [{"amount": str(i)} for i in range(1500)] + [{"amount": "1,234"}]
+        column_types = infer_column_types(rows)
+        assert column_types == {"amount": "bigint"}
+        
+        stats = compute_column_statistics(rows, column_types)
+        
+        assert stats["amount"]["type"] == "text"
+        assert stats["amount"]["inferred_type"] == "bigint"
+        assert stats["amount"]["invalid_count"] == 1
+        assert stats["amount"]["null_count"] == 0
+
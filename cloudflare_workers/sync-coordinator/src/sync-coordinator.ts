@@ -68,6 +68,8 @@ export class SyncCoordinator implements DurableObject {
           return await this.handleGetToken(request);
         case '/sync/trigger':
           return await this.handleSyncTrigger(request);
+        case '/sync/status':
+          return await this.handleSyncStatus(request);
         case '/webhook/process':
           return await this.handleWebhookProcess(request);
         default:
@@ -144,15 +146,40 @@ export class SyncCoordinator implements DurableObject {
       return new Response('Missing keapAccountId', { status: 400 });
     }
 
-    // Store sync trigger request
-    await this.storage.put(`sync_trigger:${Date.now()}`, {
+    // Store sync trigger request - keys sort by trigger time
+    const triggerId = `${Date.now()}-${crypto.randomUUID()}`;
+    await this.storage.put(`sync_trigger:${triggerId}`, {
       keapAccountId,
       syncType: syncType || 'all',
       status: 'pending',
       triggeredAt: Date.now()
     });
 
-    return Response.json({ success: true, message: 'Sync triggered' });
+    return Response.json({ success: true, message: 'Sync triggered', triggerId });
+  }
+
+  /**
+   * Get the status of a sync trigger, so callers can wait for the sync to finish
+   */
+  private async handleSyncStatus(request: Request): Promise<Response> {
+    const triggerId = new URL(request.url).searchParams.get('triggerId');
+
+    if (!triggerId) {
+      return new Response('Missing triggerId', { status: 400 });
+    }
+
+    const syncTrigger = await this.storage.get(`sync_trigger:${triggerId}`) as
+      { status: string; error?: string; completedAt?: number } | undefined;
+    if (!syncTrigger) {
+      return new Response('Unknown triggerId', { status: 404 });
+    }
+
+    return Response.json({
+      triggerId,
+      status: syncTrigger.status,
+      error: syncTrigger.error || null,
+      completedAt: syncTrigger.completedAt || null
+    });
   }
 
   /**
@@ -330,13 +357,14 @@ export class SyncCoordinator implements DurableObject {
           await this.executeSyncOperation(syncTrigger, keapClient, supabaseClient);
           
           // Mark as completed
-          await this.storage.put(key, { ...syncTrigger, status: 'completed' });
+          await this.storage.put(key, { ...syncTrigger, status: 'completed', completedAt: Date.now() });
         } catch (error) {
           console.error('Sync operation failed:', error);
           await this.storage.put(key, { 
             ...syncTrigger, 
             status: 'failed', 
-            error: error.message 
+            error: error.message,
+            completedAt: Date.now()
           });
         }
       }
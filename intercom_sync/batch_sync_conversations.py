@@ -4,8 +4,8 @@ Sync conversations in manageable batches
 """
 import os
 from dotenv import load_dotenv
-from intercom_client import IntercomClient
 from sync_orchestrator import IntercomSyncOrchestrator
+from fetch_pipeline import list_pages
 from rich.console import Console
 from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn
 
@@ -15,7 +15,6 @@ console = Console()
 def batch_sync_conversations(max_conversations=100):
     """Sync conversations in batches"""
     try:
-        client = IntercomClient()
         orchestrator = IntercomSyncOrchestrator(max_workers=3)
 
         console.print(f"[yellow]Syncing up to {max_conversations} conversations...[/yellow]")
@@ -25,24 +24,7 @@ def batch_sync_conversations(max_conversations=100):
         orchestrator.sync_admins()
         orchestrator.sync_tags()
 
-        # Get conversations to sync
-        conversations_to_sync = []
-        console.print("[yellow]Collecting conversation IDs...[/yellow]")
-
-        count = 0
-        for conv in client.list_all_conversations(batch_size=50):
-            conversations_to_sync.append(conv['id'])
-            count += 1
-            if count >= max_conversations:
-                break
-
-        console.print(f"[green]Found {len(conversations_to_sync)} conversations to sync[/green]")
-
-        if not conversations_to_sync:
-            console.print("[yellow]No conversations to sync[/yellow]")
-            return
-
-        # Sync conversations with progress bar
+        # Conversations are listed, fetched and written as a pipeline
         with Progress(
             SpinnerColumn(),
             TextColumn("[progress.description]{task.description}"),
@@ -53,30 +35,23 @@ def batch_sync_conversations(max_conversations=100):
 
             sync_task = progress.add_task(
                 "[cyan]Syncing conversations...",
-                total=len(conversations_to_sync)
+                total=max_conversations
             )
 
-            success_count = 0
-            error_count = 0
-
-            for conv_id in conversations_to_sync:
-                try:
-                    # Fetch full conversation
-                    full_conv = client.get_conversation_with_parts(conv_id)
-
-                    # Sync it
-                    success = orchestrator.sync_conversation(full_conv)
-
-                    if success:
-                        success_count += 1
-                    else:
-                        error_count += 1
+            counts = orchestrator.sync_fetched_conversations(
+                orchestrator.fetch_conversations(
+                    lambda client: list_pages(client, per_page=50, max_conversations=max_conversations)
+                ),
+                progress=progress,
+                task_id=sync_task
+            )
 
-                except Exception as e:
-                    console.print(f"[red]Error syncing {conv_id}: {e}[/red]")
-                    error_count += 1
+        if not counts['fetched']:
+            console.print("[yellow]No conversations to sync[/yellow]")
+            return
 
-                progress.update(sync_task, advance=1)
+        success_count = counts['synced']
+        error_count = counts['failed']
 
         console.print(f"\n[bold green]Sync completed![/bold green]")
         console.print(f"Successfully synced: {success_count}")
@@ -5,8 +5,8 @@ Runs multiple batches until no more conversations are found
 """
 import os
 from dotenv import load_dotenv
-from intercom_client import IntercomClient
 from sync_orchestrator import IntercomSyncOrchestrator
+from fetch_pipeline import list_pages
 from rich.console import Console
 from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn
 import time
@@ -17,7 +17,6 @@ console = Console()
 def continuous_sync(batch_size=100, max_batches=10):
     """Continuously sync conversations until no more are found"""
     try:
-        client = IntercomClient()
         orchestrator = IntercomSyncOrchestrator(max_workers=5)
 
         console.print(f"[yellow]Starting continuous sync with batch size {batch_size}...[/yellow]")
@@ -34,25 +33,7 @@ def continuous_sync(batch_size=100, max_batches=10):
         for batch_num in range(1, max_batches + 1):
             console.print(f"\n[cyan]═══ Batch {batch_num}/{max_batches} ═══[/cyan]")
 
-            # Get conversations to sync
-            conversations_to_sync = []
-            console.print("[yellow]Collecting conversation IDs...[/yellow]")
-
-            # Skip conversations we've already processed by using a higher starting_after
-            count = 0
-            for conv in client.list_all_conversations(batch_size=batch_size):
-                conversations_to_sync.append(conv['id'])
-                count += 1
-                if count >= batch_size:
-                    break
-
-            if not conversations_to_sync:
-                console.print("[green]✓ No more conversations to sync[/green]")
-                break
-
-            console.print(f"[green]Found {len(conversations_to_sync)} conversations to sync[/green]")
-
-            # Sync conversations with progress bar
+            # Conversations are listed, fetched and written as a pipeline
             with Progress(
                 SpinnerColumn(),
                 TextColumn("[progress.description]{task.description}"),
@@ -63,30 +44,23 @@ def continuous_sync(batch_size=100, max_batches=10):
 
                 sync_task = progress.add_task(
                     f"[cyan]Syncing batch {batch_num}...",
-                    total=len(conversations_to_sync)
+                    total=batch_size
                 )
 
-                batch_success_count = 0
-                batch_error_count = 0
-
-                for conv_id in conversations_to_sync:
-                    try:
-                        # Fetch full conversation
-                        full_conv = client.get_conversation_with_parts(conv_id)
-
-                        # Sync it
-                        success = orchestrator.sync_conversation(full_conv)
-
-                        if success:
-                            batch_success_count += 1
-                        else:
-                            batch_error_count += 1
+                counts = orchestrator.sync_fetched_conversations(
+                    orchestrator.fetch_conversations(
+                        lambda client: list_pages(client, per_page=batch_size, max_conversations=batch_size)
+                    ),
+                    progress=progress,
+                    task_id=sync_task
+                )
 
-                    except Exception as e:
-                        console.print(f"[red]Error syncing {conv_id}: {e}[/red]")
-                        batch_error_count += 1
+            if not counts['fetched']:
+                console.print("[green]✓ No more conversations to sync[/green]")
+                break
 
-                    progress.update(sync_task, advance=1)
+            batch_success_count = counts['synced']
+            batch_error_count = counts['failed']
 
             # Update totals
             total_conversations_synced += batch_success_count
@@ -0,0 +1,242 @@
+"""
+Pipelined conversation fetching shared by the sync paths
+
+Conversation IDs come in pages (from the search or list APIs, or a known list).
+The next page is fetched while the details of the current one are, up to
+FETCH_CONCURRENCY detail requests run at once under the shared rate limiter, and
+finished conversations wait in a bounded queue for the writers. Memory stays
+bounded by the queue and the requests in flight, however many conversations there are.
+"""
+import os
+import asyncio
+import threading
+from typing import Any, AsyncGenerator, AsyncIterator, Callable, Dict, Generator, List, Optional, Tuple
+from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Conversation detail requests in flight at once
+FETCH_CONCURRENCY = int(os.getenv('INTERCOM_FETCH_CONCURRENCY', '20'))
+# Fetched conversations buffered ahead of the writers
+FETCH_QUEUE_SIZE = int(os.getenv('INTERCOM_FETCH_QUEUE_SIZE', '100'))
+
+# (conversation ID, full conversation or None, the error if the fetch failed)
+FetchResult = Tuple[str, Optional[Dict], Optional[Exception]]
+PageSource = Callable[[Any], AsyncIterator[List[str]]]
+
+
+async def search_pages(client, query: Dict, per_page: int = 150) -> AsyncGenerator[List[str], None]:
+    """
+    Pages of conversation IDs from the search API
+
+    Args:
+        client: AsyncIntercomClient
+        query: Search query in Intercom format
+        per_page: Conversations per page (max 150)
+    """
+    pagination = {"per_page": per_page}
+    while True:
+        response = await client.search_conversations(query, pagination)
+        conversations = response.get('conversations', [])
+        if not conversations:
+            break
+        yield [conv['id'] for conv in conversations]
+
+        starting_after = (response.get('pages', {}).get('next') or {}).get('starting_after')
+        if not starting_after:
+            break
+        pagination = {"per_page": per_page, "starting_after": starting_after}
+
+
+async def list_pages(
+    client,
+    updated_after: Optional[datetime] = None,
+    per_page: int = 50,
+    max_conversations: Optional[int] = None
+) -> AsyncGenerator[List[str], None]:
+    """
+    Pages of conversation IDs from the list API
+
+    Args:
+        client: AsyncIntercomClient
+        updated_after: Only get conversations updated after this time
+        per_page: Conversations per page (max 150)
+        max_conversations: Stop after this many conversations
+    """
+    page = []
+    count = 0
+    async for conv in client.list_all_conversations(updated_after=updated_after, batch_size=per_page):
+        page.append(conv['id'])
+        count += 1
+        if len(page) >= per_page:
+            yield page
+            page = []
+        if max_conversations is not None and count >= max_conversations:
+            break
+    if page:
+        yield page
+
+
+async def id_pages(conversation_ids: List[str], per_page: int = 50) -> AsyncGenerator[List[str], None]:
+    """Pages of a known list of conversation IDs"""
+    for start in range(0, len(conversation_ids), per_page):
+        yield conversation_ids[start:start + per_page]
+
+
+async def _prefetched(pages: AsyncIterator[List[str]]) -> AsyncGenerator[List[str], None]:
+    """Fetch the next page in the background while the caller works on the current one"""
+    buffer: asyncio.Queue = asyncio.Queue(maxsize=1)
+    done = object()
+
+    async def fill():
+        try:
+            async for page in pages:
+                await buffer.put(page)
+            await buffer.put(done)
+        except Exception as e:
+            await buffer.put(e)
+
+    filler = asyncio.create_task(fill())
+    try:
+        while True:
+            page = await buffer.get()
+            if page is done:
+                break
+            if isinstance(page, Exception):
+                raise page
+            yield page
+    finally:
+        # Wait for the filler to stop before closing the pages it iterates, so an early
+        # stop leaves neither a pending task nor an unfinished generator behind
+        filler.cancel()
+        await asyncio.gather(filler, return_exceptions=True)
+        if hasattr(pages, 'aclose'):
+            await pages.aclose()
+
+
+async def fetch_conversations(
+    client,
+    pages: AsyncIterator[List[str]],
+    concurrency: int = FETCH_CONCURRENCY,
+    queue_size: int = FETCH_QUEUE_SIZE
+) -> AsyncGenerator[FetchResult, None]:
+    """
+    Fetch the full conversation for every ID in the pages, pipelined
+
+    Args:
+        client: AsyncIntercomClient
+        pages: Pages of conversation IDs, e.g. from search_pages
+        concurrency: Detail requests in flight at once
+        queue_size: Fetched conversations buffered ahead of the caller
+
+    Yields:
+        (conversation ID, conversation, error) in completion order. A conversation
+        that fails to fetch is yielded with its error; a failure listing the pages is raised.
+    """
+    results: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    # Held until a result is queued, so at most concurrency results wait on a full queue
+    slots = asyncio.Semaphore(concurrency)
+    fetches = set()
+    done = object()
+    listing_error: List[Exception] = []
+
+    async def fetch(conversation_id: str):
+        try:
+            try:
+                conversation = await client.get_conversation_with_parts(conversation_id)
+                await results.put((conversation_id, conversation, None))
+            except Exception as e:
+                await results.put((conversation_id, None, e))
+        finally:
+            slots.release()
+
+    async def produce():
+        prefetched = _prefetched(pages)
+        try:
+            async for page in prefetched:
+                for conversation_id in page:
+                    await slots.acquire()
+                    task = asyncio.create_task(fetch(conversation_id))
+                    fetches.add(task)
+                    task.add_done_callback(fetches.discard)
+        except Exception as e:
+            listing_error.append(e)
+        finally:
+            # Also when cancelled while waiting for a slot, with the page generator suspended
+            await prefetched.aclose()
+        await asyncio.gather(*list(fetches))
+        await results.put(done)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            result = await results.get()
+            if result is done:
+                break
+            yield result
+        if listing_error:
+            raise listing_error[0]
+    finally:
+        producer.cancel()
+        for task in list(fetches):
+            task.cancel()
+        await asyncio.gather(producer, *list(fetches), return_exceptions=True)
+
+
+def fetch_conversations_in_thread(
+    make_client: Callable[[], Any],
+    make_pages: PageSource,
+    concurrency: int = FETCH_CONCURRENCY,
+    queue_size: int = FETCH_QUEUE_SIZE
+) -> Generator[FetchResult, None, None]:
+    """
+    Run fetch_conversations on a background event loop for synchronous callers
+
+    Fetching carries on in the background while the caller processes what it was
+    given, until the bounded queue is full.
+
+    Args:
+        make_client: Creates the AsyncIntercomClient (on the background loop)
+        make_pages: Takes the client and returns the pages of conversation IDs
+        concurrency: Detail requests in flight at once
+        queue_size: Fetched conversations buffered ahead of the caller
+
+    Yields:
+        (conversation ID, conversation, error), as fetch_conversations
+    """
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, name="intercom-fetch", daemon=True)
+    thread.start()
+
+    def run(coro):
+        return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+    async def start():
+        client = make_client()
+        return client, fetch_conversations(client, make_pages(client), concurrency, queue_size)
+
+    client = None
+    results = None
+    try:
+        client, results = run(start())
+        while True:
+            try:
+                result = run(results.__anext__())
+            except StopAsyncIteration:
+                break
+            yield result
+    finally:
+        try:
+            if results is not None:
+                run(results.aclose())
+            if client is not None:
+                run(client.aclose())
+        finally:
+            try:
+                # Finalize any async generator still open, e.g. after an error above
+                run(loop.shutdown_asyncgens())
+            finally:
+                loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
@@ -2,16 +2,19 @@
 Intercom API Client for conversation data extraction
 """
 import os
-import time
 import json
 import base64
-from typing import Dict, List, Optional, Any, Generator
+from typing import Dict, List, Optional, Any, Generator, AsyncGenerator
 from datetime import datetime, timezone
 import requests
+import httpx
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 from requests.exceptions import RequestException, HTTPError
 import logging
 
+from rate_limiter import get_rate_limiter
+from fetch_pipeline import fetch_conversations, fetch_conversations_in_thread, search_pages, list_pages
+
 logger = logging.getLogger(__name__)
 
 
@@ -25,6 +28,84 @@ class IntercomAPIError(Exception):
     pass
 
 
+def resolve_access_token(access_token: str = None) -> str:
+    """
+    Get the Intercom access token from the argument or the environment
+
+    Args:
+        access_token: Intercom API access token (Bearer token)
+
+    Returns:
+        The access token, from INTERCOM_ACCESS_TOKEN or base64-encoded INTERCOM if not given
+    """
+    access_token = access_token or os.getenv('INTERCOM_ACCESS_TOKEN')
+    if not access_token:
+        # Try to decode from base64 if stored that way
+        encoded_token = os.getenv('INTERCOM')
+        if encoded_token:
+            try:
+                access_token = base64.b64decode(encoded_token).decode('utf-8')
+            except:
+                access_token = encoded_token
+
+    if not access_token:
+        raise ValueError("Intercom access token not provided")
+    return access_token
+
+
+def build_export_query(
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    include_closed: bool = True
+) -> Optional[Dict]:
+    """
+    Build the conversation search query for a bulk export
+
+    Returns:
+        Search query in Intercom format, or None to export every conversation
+    """
+    query_conditions = []
+
+    if start_date:
+        query_conditions.append({
+            "field": "created_at",
+            "operator": ">",
+            "value": int(start_date.timestamp())
+        })
+
+    if end_date:
+        query_conditions.append({
+            "field": "created_at",
+            "operator": "<",
+            "value": int(end_date.timestamp())
+        })
+
+    if not include_closed:
+        query_conditions.append({
+            "field": "open",
+            "operator": "=",
+            "value": True
+        })
+
+    if not query_conditions:
+        return None
+    return {
+        "operator": "AND",
+        "value": query_conditions
+    } if len(query_conditions) > 1 else query_conditions[0]
+
+
+def warn_if_parts_truncated(conversation: Dict):
+    """Intercom returns at most 500 parts per conversation"""
+    total_count = conversation.get('conversation_parts', {}).get('total_count', 0)
+
+    if total_count > 500:
+        logger.warning(
+            f"Conversation {conversation.get('id')} has {total_count} parts, "
+            f"but API limits to 500. Some messages may be missing."
+        )
+
+
 class IntercomClient:
     """Client for interacting with Intercom API"""
 
@@ -39,18 +120,7 @@ class IntercomClient:
         Args:
             access_token: Intercom API access token (Bearer token)
         """
-        self.access_token = access_token or os.getenv('INTERCOM_ACCESS_TOKEN')
-        if not self.access_token:
-            # Try to decode from base64 if stored that way
-            encoded_token = os.getenv('INTERCOM')
-            if encoded_token:
-                try:
-                    self.access_token = base64.b64decode(encoded_token).decode('utf-8')
-                except:
-                    self.access_token = encoded_token
-
-        if not self.access_token:
-            raise ValueError("Intercom access token not provided")
+        self.access_token = resolve_access_token(access_token)
 
         self.session = requests.Session()
         self.session.headers.update({
@@ -60,27 +130,8 @@ class IntercomClient:
             'Intercom-Version': '2.11'  # Latest stable version
         })
 
-        self.request_count = 0
-        self.last_request_time = time.time()
-
-    def _check_rate_limit(self):
-        """Check and enforce rate limiting"""
-        current_time = time.time()
-        time_diff = current_time - self.last_request_time
-
-        # Reset counter if more than a minute has passed
-        if time_diff > 60:
-            self.request_count = 0
-            self.last_request_time = current_time
-
-        # If we've hit the rate limit, wait
-        if self.request_count >= self.RATE_LIMIT_PER_MINUTE:
-            sleep_time = 60 - time_diff
-            if sleep_time > 0:
-                logger.info(f"Rate limit reached. Sleeping for {sleep_time:.2f} seconds")
-                time.sleep(sleep_time)
-                self.request_count = 0
-                self.last_request_time = time.time()
+        # Shared with every other client using this token, across threads
+        self.rate_limiter = get_rate_limiter(self.access_token, self.RATE_LIMIT_PER_MINUTE)
 
     @retry(
         stop=stop_after_attempt(3),
@@ -106,7 +157,7 @@ class IntercomClient:
         Returns:
             API response as dictionary
         """
-        self._check_rate_limit()
+        self.rate_limiter.acquire()
 
         url = f"{self.BASE_URL}{endpoint}"
 
@@ -119,13 +170,13 @@ class IntercomClient:
                 timeout=30
             )
 
-            self.request_count += 1
+            self.rate_limiter.update_from_headers(response.headers)
 
             # Check for rate limiting
             if response.status_code == 429:
-                retry_after = response.headers.get('X-RateLimit-Reset', 60)
-                logger.warning(f"Rate limited. Retry after {retry_after} seconds")
-                time.sleep(int(retry_after))
+                # The retry waits in the limiter until the window resets
+                logger.warning("Rate limited. Holding requests until the rate limit window resets")
+                self.rate_limiter.rate_limited(response.headers)
                 raise IntercomRateLimitError("Rate limit exceeded")
 
             response.raise_for_status()
@@ -305,17 +356,7 @@ class IntercomClient:
             Conversation with parts
         """
         conversation = self.get_conversation(conversation_id)
-
-        # Intercom limits to 500 parts, check if we need to handle this
-        parts = conversation.get('conversation_parts', {}).get('conversation_parts', [])
-        total_count = conversation.get('conversation_parts', {}).get('total_count', 0)
-
-        if total_count > 500:
-            logger.warning(
-                f"Conversation {conversation_id} has {total_count} parts, "
-                f"but API limits to 500. Some messages may be missing."
-            )
-
+        warn_if_parts_truncated(conversation)
         return conversation
 
     def export_conversations_bulk(
@@ -327,78 +368,319 @@ class IntercomClient:
         """
         Export conversations in bulk with all details
 
+        The next page of results is fetched while the details of the current one
+        are fetched concurrently, see fetch_pipeline.
+
         Args:
             start_date: Start date for export
             end_date: End date for export
             include_closed: Include closed conversations
 
         Yields:
-            Full conversation objects with parts
+            Full conversation objects with parts, in the order they finish fetching
+        """
+        query = build_export_query(start_date, end_date, include_closed)
+
+        def pages(client):
+            # Use search API for more control, or list everything without filters
+            return search_pages(client, query) if query else list_pages(client)
+
+        # Details are fetched concurrently on a background event loop while the caller works
+        for conversation_id, conversation, error in fetch_conversations_in_thread(
+            lambda: AsyncIntercomClient(self.access_token), pages
+        ):
+            if error:
+                raise error
+            yield conversation
+
+
+class AsyncIntercomClient:
+    """
+    Asynchronous client for the Intercom API
+
+    Uses one pooled httpx client with HTTP/2 and keep-alive connections, so a
+    single process can keep many requests in flight. Requests share the token's
+    rate limiter with every other client in the process, sync or async.
+    """
+
+    BASE_URL = "https://api.intercom.io"
+    MAX_RETRIES = 3
+    RATE_LIMIT_PER_MINUTE = 500  # Intercom's rate limit
+    MAX_CONNECTIONS = 100
+
+    def __init__(
+        self,
+        access_token: str = None,
+        max_connections: int = MAX_CONNECTIONS,
+        http2: bool = True
+    ):
+        """
+        Initialize async Intercom client
+
+        Args:
+            access_token: Intercom API access token (Bearer token)
+            max_connections: Most concurrent connections (and so requests in flight over HTTP/1.1)
+            http2: Multiplex requests over HTTP/2 connections
+        """
+        self.access_token = resolve_access_token(access_token)
+        self.rate_limiter = get_rate_limiter(self.access_token, self.RATE_LIMIT_PER_MINUTE)
+
+        self.client = httpx.AsyncClient(
+            base_url=self.BASE_URL,
+            headers={
+                'Authorization': f'Bearer {self.access_token}',
+                'Accept': 'application/json',
+                'Content-Type': 'application/json',
+                'Intercom-Version': '2.11'
+            },
+            http2=http2,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=30
+        )
+
+    async def aclose(self):
+        """Close the pooled connections"""
+        await self.client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, min=4, max=60),
+        retry=retry_if_exception_type((httpx.TransportError, IntercomRateLimitError))
+    )
+    async def _make_request(
+        self,
+        method: str,
+        endpoint: str,
+        params: Dict = None,
+        data: Dict = None
+    ) -> Dict:
         """
-        # Build search query
-        query_conditions = []
+        Make HTTP request to Intercom API with retry logic
+
+        Args:
+            method: HTTP method (GET, POST, etc.)
+            endpoint: API endpoint path
+            params: Query parameters
+            data: Request body data
+
+        Returns:
+            API response as dictionary
+        """
+        await self.rate_limiter.acquire_async()
+
+        response = await self.client.request(method, endpoint, params=params, json=data)
+        self.rate_limiter.update_from_headers(response.headers)
+
+        if response.status_code == 429:
+            # The retry waits in the limiter until the window resets
+            logger.warning("Rate limited. Holding requests until the rate limit window resets")
+            self.rate_limiter.rate_limited(response.headers)
+            raise IntercomRateLimitError("Rate limit exceeded")
+
+        try:
+            response.raise_for_status()
+        except httpx.HTTPStatusError as e:
+            error_msg = f"Intercom API error: {e}"
+            if e.response.text:
+                error_msg += f" - {e.response.text}"
+            logger.error(error_msg)
+            raise IntercomAPIError(error_msg)
+
+        return response.json() if response.text else {}
+
+    async def list_conversations(
+        self,
+        starting_after: Optional[str] = None,
+        per_page: int = 20,
+        **filters
+    ) -> Dict:
+        """
+        List conversations with pagination
+
+        Args:
+            starting_after: Cursor for pagination
+            per_page: Number of items per page (max 150)
+            **filters: Additional filters (e.g., created_at_after, updated_at_after)
+
+        Returns:
+            API response with conversations list
+        """
+        params = {
+            'per_page': min(per_page, 150),
+            **filters
+        }
+
+        if starting_after:
+            params['starting_after'] = starting_after
+
+        return await self._make_request('GET', '/conversations', params=params)
+
+    async def get_conversation(self, conversation_id: str) -> Dict:
+        """
+        Get detailed conversation data including all parts
+
+        Args:
+            conversation_id: Intercom conversation ID
+
+        Returns:
+            Full conversation data
+        """
+        return await self._make_request('GET', f'/conversations/{conversation_id}')
+
+    async def get_conversation_with_parts(self, conversation_id: str) -> Dict:
+        """
+        Get conversation with all message parts
 
-        if start_date:
-            query_conditions.append({
-                "field": "created_at",
+        Args:
+            conversation_id: Intercom conversation ID
+
+        Returns:
+            Conversation with parts
+        """
+        conversation = await self.get_conversation(conversation_id)
+        warn_if_parts_truncated(conversation)
+        return conversation
+
+    async def search_conversations(self, query: Dict, pagination: Optional[Dict] = None) -> Dict:
+        """
+        Search conversations using Intercom's search API
+
+        Args:
+            query: Search query in Intercom format
+            pagination: Optional per_page and starting_after
+
+        Returns:
+            Search results
+        """
+        data = {
+            "query": query
+        }
+        if pagination:
+            data["pagination"] = pagination
+        return await self._make_request('POST', '/conversations/search', data=data)
+
+    async def get_user(self, user_id: str) -> Dict:
+        """
+        Get user/contact details
+
+        Args:
+            user_id: Intercom user/contact ID
+
+        Returns:
+            User data
+        """
+        return await self._make_request('GET', f'/contacts/{user_id}')
+
+    async def get_admin(self, admin_id: str) -> Dict:
+        """
+        Get admin details
+
+        Args:
+            admin_id: Intercom admin ID
+
+        Returns:
+            Admin data
+        """
+        return await self._make_request('GET', f'/admins/{admin_id}')
+
+    async def list_admins(self) -> List[Dict]:
+        """
+        List all admins
+
+        Returns:
+            List of admin objects
+        """
+        response = await self._make_request('GET', '/admins')
+        return response.get('admins', [])
+
+    async def list_tags(self) -> List[Dict]:
+        """
+        List all tags
+
+        Returns:
+            List of tag objects
+        """
+        response = await self._make_request('GET', '/tags')
+        return response.get('data', [])
+
+    async def list_all_conversations(
+        self,
+        updated_after: Optional[datetime] = None,
+        batch_size: int = 50
+    ) -> AsyncGenerator[Dict, None]:
+        """
+        Async generator to iterate through all conversations
+
+        Args:
+            updated_after: Only get conversations updated after this time
+            batch_size: Number of conversations per API call
+
+        Yields:
+            Individual conversation objects
+        """
+        starting_after = None
+        filters = {}
+
+        if updated_after:
+            filters['order'] = 'updated_at'
+            filters['sort'] = 'desc'
+            # Convert to Unix timestamp
+            filters['query'] = {
+                "field": "updated_at",
                 "operator": ">",
-                "value": int(start_date.timestamp())
-            })
-
-        if end_date:
-            query_conditions.append({
-                "field": "created_at",
-                "operator": "<",
-                "value": int(end_date.timestamp())
-            })
-
-        if not include_closed:
-            query_conditions.append({
-                "field": "open",
-                "operator": "=",
-                "value": True
-            })
-
-        # Use search API for more control
-        if query_conditions:
-            query = {
-                "operator": "AND",
-                "value": query_conditions
-            } if len(query_conditions) > 1 else query_conditions[0]
-
-            pagination = {"per_page": 150}
-            starting_after = None
-
-            while True:
-                if starting_after:
-                    pagination["starting_after"] = starting_after
-
-                search_data = {
-                    "query": query,
-                    "pagination": pagination
-                }
-
-                response = self._make_request('POST', '/conversations/search', data=search_data)
-                conversations = response.get('conversations', [])
+                "value": int(updated_after.timestamp())
+            }
 
-                if not conversations:
-                    break
+        while True:
+            response = await self.list_conversations(
+                starting_after=starting_after,
+                per_page=batch_size,
+                **filters
+            )
 
-                for conv in conversations:
-                    # Fetch full conversation details
-                    full_conv = self.get_conversation_with_parts(conv['id'])
-                    yield full_conv
+            conversations = response.get('conversations', [])
 
-                # Check for next page
-                pages = response.get('pages', {})
-                if not pages.get('next'):
-                    break
+            if not conversations:
+                break
 
-                starting_after = pages.get('next', {}).get('starting_after')
-                if not starting_after:
-                    break
-        else:
-            # No filters, get all conversations
-            for conv in self.list_all_conversations():
-                full_conv = self.get_conversation_with_parts(conv['id'])
-                yield full_conv
\ No newline at end of file
+            for conversation in conversations:
+                yield conversation
+
+            # Check for next page
+            starting_after = (response.get('pages', {}).get('next') or {}).get('starting_after')
+            if not starting_after:
+                break
+
+    async def export_conversations_bulk(
+        self,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        include_closed: bool = True
+    ) -> AsyncGenerator[Dict, None]:
+        """
+        Export conversations in bulk with all details
+
+        The next page of results is fetched while the details of the current one
+        are fetched concurrently, see fetch_pipeline.
+
+        Args:
+            start_date: Start date for export
+            end_date: End date for export
+            include_closed: Include closed conversations
+
+        Yields:
+            Full conversation objects with parts, in the order they finish fetching
+        """
+        query = build_export_query(start_date, end_date, include_closed)
+        pages = search_pages(self, query) if query else list_pages(self)
+
+        async for conversation_id, conversation, error in fetch_conversations(self, pages):
+            if error:
+                raise error
+            yield conversation
@@ -0,0 +1,148 @@
+"""
+Token-bucket rate limiting for the Intercom API, shared per access token
+"""
+import time
+import asyncio
+import hashlib
+import threading
+from typing import Dict, Mapping, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Intercom's default per-app limit
+DEFAULT_RATE_LIMIT_PER_MINUTE = 500
+# Intercom spreads the per-minute limit over 10-second windows, so never burst past one window's share
+WINDOW_SECONDS = 10
+# Never trust a reset time further out than this
+MAX_BLOCK_SECONDS = 60
+
+
+class TokenBucketRateLimiter:
+    """
+    Token bucket that paces requests to a per-minute budget.
+
+    Safe to share between threads and event loops: the lock only guards the
+    bucket arithmetic, and callers sleep outside it. Each caller reserves a token
+    (the balance may go negative) and sleeps until the reservation is due, so
+    waiters are released one refill interval apart instead of all at once.
+    """
+
+    def __init__(self, rate_per_minute: int = DEFAULT_RATE_LIMIT_PER_MINUTE):
+        self._lock = threading.Lock()
+        self._set_rate(rate_per_minute)
+        self.tokens = float(self.capacity)
+        # Time the balance was last brought up to date - in the future while blocked
+        self.updated = time.monotonic()
+
+    def _set_rate(self, rate_per_minute: int):
+        self.rate_per_minute = rate_per_minute
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1, rate_per_minute * WINDOW_SECONDS // 60)
+
+    def _refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def _reserve(self) -> float:
+        """Take a token. Returns how many seconds to wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= 1
+            wait = max(0.0, self.updated - now)
+            if self.tokens < 0:
+                wait += -self.tokens / self.rate
+            return wait
+
+    def acquire(self):
+        """Block the calling thread until a request may be sent."""
+        wait = self._reserve()
+        if wait > 0:
+            if wait > 1:
+                logger.info(f"Rate limit reached. Sleeping for {wait:.2f} seconds")
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        """Wait, without blocking the event loop, until a request may be sent."""
+        wait = self._reserve()
+        if wait > 0:
+            if wait > 1:
+                logger.info(f"Rate limit reached. Sleeping for {wait:.2f} seconds")
+            await asyncio.sleep(wait)
+
+    def block_until(self, reset_at: Optional[float] = None, default_seconds: float = WINDOW_SECONDS):
+        """
+        Hold every request until the rate limit window resets.
+
+        Args:
+            reset_at: Unix time the window resets (X-RateLimit-Reset), if known
+            default_seconds: How long to hold when the reset time is unknown
+        """
+        seconds = reset_at - time.time() if reset_at is not None else default_seconds
+        seconds = min(max(seconds, 0.0), MAX_BLOCK_SECONDS)
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens = min(self.tokens, 0.0)
+            self.updated = max(self.updated, now + seconds)
+
+    def rate_limited(self, headers: Mapping[str, str]):
+        """Record a 429 response: hold every request until X-RateLimit-Reset, or for one window."""
+        try:
+            reset_at = float(headers['X-RateLimit-Reset'])
+        except (KeyError, TypeError, ValueError):
+            reset_at = None
+        self.block_until(reset_at)
+
+    def update_from_headers(self, headers: Mapping[str, str]):
+        """
+        Adjust the bucket to what Intercom reports about the current window.
+
+        X-RateLimit-Limit sets the pace, X-RateLimit-Remaining caps the balance,
+        and when nothing remains requests are held until X-RateLimit-Reset.
+        """
+        try:
+            limit = headers.get('X-RateLimit-Limit')
+            remaining = headers.get('X-RateLimit-Remaining')
+            reset = headers.get('X-RateLimit-Reset')
+            limit = int(limit) if limit is not None else None
+            remaining = int(remaining) if remaining is not None else None
+            reset = float(reset) if reset is not None else None
+        except (TypeError, ValueError):
+            return
+
+        if remaining is not None and remaining <= 0:
+            self.block_until(reset)
+            return
+
+        with self._lock:
+            if limit and limit != self.rate_per_minute:
+                logger.info(f"Intercom rate limit is {limit}/min")
+                self._set_rate(limit)
+            self._refill(time.monotonic())
+            if remaining is not None:
+                self.tokens = min(self.tokens, float(remaining))
+
+
+_limiters: Dict[str, TokenBucketRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(access_token: str, rate_per_minute: int = DEFAULT_RATE_LIMIT_PER_MINUTE) -> TokenBucketRateLimiter:
+    """
+    Get the limiter for an access token, shared by every client in this process using it
+
+    Args:
+        access_token: Intercom API access token
+        rate_per_minute: Budget to start from, until Intercom's headers report the real one
+
+    Returns:
+        The token's rate limiter
+    """
+    key = hashlib.sha256(access_token.encode('utf-8')).hexdigest()
+    with _limiters_lock:
+        if key not in _limiters:
+            _limiters[key] = TokenBucketRateLimiter(rate_per_minute)
+        return _limiters[key]
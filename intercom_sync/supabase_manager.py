@@ -3,24 +3,277 @@ Supabase database manager for Intercom data
 """
 import os
 import json
-from typing import Dict, List, Optional, Any
+from typing import Any, Callable, Dict, Iterator, List, Optional
 from datetime import datetime, timezone
 from supabase import create_client, Client
+from postgrest.exceptions import APIError
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Rows sent per bulk write
+UPSERT_BATCH_SIZE = int(os.getenv('SUPABASE_UPSERT_BATCH_SIZE', '500'))
+# IDs per in() filter, which travels in the request URL
+FILTER_BATCH_SIZE = 100
+# SQLSTATE classes a single row can cause: data exceptions and integrity constraint violations
+ROW_ERROR_SQLSTATE_CLASSES = ('22', '23')
+# PostgREST error codes for requests it rejects with a 4xx (bad body, unknown columns)
+ROW_ERROR_POSTGREST_PREFIXES = ('PGRST1', 'PGRST2')
+# 4xx statuses that say nothing about the rows sent
+NON_ROW_CLIENT_STATUSES = (401, 403, 408, 429)
+
+
+def _user_record(user_data: Dict) -> Dict:
+    """Map an Intercom contact to an intercom_users row"""
+    # Extract location data
+    location = user_data.get('location', {}) or {}
+
+    user_record = {
+        'user_id': user_data.get('id'),
+        'type': user_data.get('type', 'contact'),
+        'external_id': user_data.get('external_id'),
+        'email': user_data.get('email'),
+        'phone': user_data.get('phone'),
+        'name': user_data.get('name'),
+        'avatar_url': user_data.get('avatar', {}).get('image_url') if user_data.get('avatar') else None,
+        'pseudonym': user_data.get('pseudonym'),
+        'location_country': location.get('country'),
+        'location_region': location.get('region'),
+        'location_city': location.get('city'),
+        'user_agent_data': user_data.get('user_agent_data'),
+        'custom_attributes': user_data.get('custom_attributes'),
+        'segments': [seg.get('id') for seg in user_data.get('segments', {}).get('segments', [])],
+        'tags': [tag.get('id') for tag in user_data.get('tags', {}).get('tags', [])],
+        'companies': user_data.get('companies', {}).get('companies', []),
+        'social_profiles': user_data.get('social_profiles', {}).get('social_profiles', []),
+        'unsubscribed_from_emails': user_data.get('unsubscribed_from_emails', False),
+        'marked_email_as_spam': user_data.get('marked_email_as_spam', False),
+        'has_hard_bounced': user_data.get('has_hard_bounced', False),
+        'browser': user_data.get('browser'),
+        'browser_version': user_data.get('browser_version'),
+        'browser_language': user_data.get('browser_language'),
+        'os': user_data.get('os'),
+        'synced_at': datetime.now(timezone.utc).isoformat()
+    }
+
+    # Convert timestamps
+    timestamp_fields = [
+        'created_at', 'updated_at', 'signed_up_at', 'last_seen_at',
+        'last_contacted_at', 'last_email_opened_at', 'last_email_clicked_at'
+    ]
+
+    for field in timestamp_fields:
+        if user_data.get(field):
+            user_record[field] = datetime.fromtimestamp(
+                user_data[field],
+                tz=timezone.utc
+            ).isoformat()
+
+    return user_record
+
+
+def _conversation_record(conversation_data: Dict) -> Dict:
+    """Map an Intercom conversation to an intercom_conversations row"""
+    source = conversation_data.get('source', {}) or {}
+    statistics = conversation_data.get('statistics', {}) or {}
+    sla_applied = conversation_data.get('sla_applied', {}) or {}
+    conversation_rating = conversation_data.get('conversation_rating', {}) or {}
+
+    conversation_record = {
+        'conversation_id': conversation_data.get('id'),
+        'type': conversation_data.get('type'),
+        'source_type': source.get('type'),
+        'source_id': source.get('id'),
+        'source_delivered_as': source.get('delivered_as'),
+        'source_subject': source.get('subject'),
+        'source_body': source.get('body'),
+        'source_author_type': source.get('author', {}).get('type') if source.get('author') else None,
+        'source_author_id': source.get('author', {}).get('id') if source.get('author') else None,
+        'source_author_name': source.get('author', {}).get('name') if source.get('author') else None,
+        'source_author_email': source.get('author', {}).get('email') if source.get('author') else None,
+        'source_url': source.get('url'),
+        'source_attachments': source.get('attachments', []),
+        'contacts': [c.get('id') for c in conversation_data.get('contacts', {}).get('contacts', [])],
+        'teammates': [t.get('id') for t in conversation_data.get('teammates', {}).get('teammates', [])],
+        'admin_assignee_id': conversation_data.get('admin_assignee_id'),
+        'team_assignee_id': conversation_data.get('team_assignee_id'),
+        'open': conversation_data.get('open', True),
+        'state': conversation_data.get('state', 'open'),
+        'read': conversation_data.get('read', False),
+        'priority': conversation_data.get('priority'),
+        'sla_applied': sla_applied if sla_applied else None,
+        'statistics': statistics if statistics else None,
+        'conversation_rating': conversation_rating if conversation_rating else None,
+        'tags': [tag.get('id') for tag in conversation_data.get('tags', {}).get('tags', [])],
+        'custom_attributes': conversation_data.get('custom_attributes'),
+        'topics': conversation_data.get('topics'),
+        'ticket_id': conversation_data.get('ticket', {}).get('id') if conversation_data.get('ticket') else None,
+        'linked_objects': conversation_data.get('linked_objects'),
+        'ai_agent_participated': conversation_data.get('ai_agent_participated', False),
+        'ai_agent': conversation_data.get('ai_agent'),
+        'synced_at': datetime.now(timezone.utc).isoformat()
+    }
+
+    # Convert timestamps
+    timestamp_fields = [
+        'created_at', 'updated_at', 'waiting_since', 'snoozed_until',
+        'first_contact_reply_at'
+    ]
+
+    for field in timestamp_fields:
+        if conversation_data.get(field):
+            conversation_record[field] = datetime.fromtimestamp(
+                conversation_data[field],
+                tz=timezone.utc
+            ).isoformat()
+
+    # Handle first contact reply type
+    if conversation_data.get('first_contact_reply'):
+        conversation_record['first_contact_reply_type'] = conversation_data['first_contact_reply'].get('type')
+
+    return conversation_record
+
+
+def _message_records(conversation_id: str, parts: List[Dict]) -> List[Dict]:
+    """Map conversation parts to intercom_messages rows"""
+    messages = []
+
+    for index, part in enumerate(parts):
+        author = part.get('author', {}) or {}
+
+        message_record = {
+            'message_id': part.get('id'),
+            'conversation_id': conversation_id,
+            'part_type': part.get('part_type'),
+            'body': part.get('body'),
+            'author_id': author.get('id'),
+            'author_type': author.get('type'),
+            'author_name': author.get('name'),
+            'author_email': author.get('email'),
+            'attachments': part.get('attachments', []),
+            'external_id': part.get('external_id'),
+            'redacted': part.get('redacted', False),
+            'message_index': index,
+            'assigned_to_id': part.get('assigned_to', {}).get('id') if part.get('assigned_to') else None,
+            'assigned_to_type': part.get('assigned_to', {}).get('type') if part.get('assigned_to') else None,
+            'synced_at': datetime.now(timezone.utc).isoformat()
+        }
+
+        # Convert timestamps
+        timestamp_fields = ['created_at', 'updated_at', 'notified_at']
+        for field in timestamp_fields:
+            if part.get(field):
+                message_record[field] = datetime.fromtimestamp(
+                    part[field],
+                    tz=timezone.utc
+                ).isoformat()
+
+        messages.append(message_record)
+
+    return messages
+
+
+def _tag_links(conversation_id: str, tags: List[Dict]) -> List[Dict]:
+    """Map a conversation's tags to intercom_conversation_tags rows"""
+    links = []
+
+    for tag in tags:
+        link = {
+            'conversation_id': conversation_id,
+            'tag_id': tag.get('id'),
+            'applied_by_id': tag.get('applied_by', {}).get('id') if tag.get('applied_by') else None,
+            'applied_by_type': tag.get('applied_by', {}).get('type') if tag.get('applied_by') else None
+        }
+
+        if tag.get('applied_at'):
+            link['applied_at'] = datetime.fromtimestamp(
+                tag['applied_at'],
+                tz=timezone.utc
+            ).isoformat()
+
+        links.append(link)
+
+    return links
+
+
+def conversation_message_parts(conversation: Dict) -> List[Dict]:
+    """
+    The parts of a conversation to store as messages
+
+    The source message is stored as the first part, as long as the conversation has
+    any other parts.
+
+    Args:
+        conversation: Full conversation data
+
+    Returns:
+        Conversation parts, oldest first
+    """
+    parts = conversation.get('conversation_parts', {}).get('conversation_parts', [])
+    source = conversation.get('source')
+    if parts and source:
+        source_part = {
+            'id': f"{conversation.get('id')}_source",
+            'part_type': 'message',
+            'body': source.get('body'),
+            'author': source.get('author'),
+            'created_at': conversation.get('created_at'),
+            'attachments': source.get('attachments', [])
+        }
+        parts = [source_part] + parts
+    return parts
+
+
+def _chunks(items: List, size: int) -> Iterator[List]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _is_row_error(error: Exception) -> bool:
+    """
+    Whether a bulk write failed because of rows in it, so splitting the batch can find them
+
+    Transport errors and 5xx responses (database down, timeouts) would fail every
+    half of the batch too, so they are not row errors.
+    """
+    if not isinstance(error, APIError):
+        return False
+    code = error.code
+    if isinstance(code, int):
+        # A response without a JSON body carries the HTTP status as its code
+        return 400 <= code < 500 and code not in NON_ROW_CLIENT_STATUSES
+    if not isinstance(code, str):
+        return False
+    if code.startswith(ROW_ERROR_POSTGREST_PREFIXES):
+        return True
+    return len(code) == 5 and code[:2] in ROW_ERROR_SQLSTATE_CLASSES
+
+
+def _uniform_chunks(rows: List[Dict], size: int) -> Iterator[List[Dict]]:
+    """
+    Chunks of rows that all have the same columns
+
+    A bulk write covers every column any of its rows has, so a row that leaves out
+    an optional column would have it written as NULL rather than left alone.
+    """
+    groups: Dict[frozenset, List[Dict]] = {}
+    for row in rows:
+        groups.setdefault(frozenset(row), []).append(row)
+    for group in groups.values():
+        yield from _chunks(group, size)
+
 
 class SupabaseManager:
     """Manager for Supabase database operations"""
 
-    def __init__(self, url: str = None, key: str = None):
+    def __init__(self, url: str = None, key: str = None, batch_size: int = UPSERT_BATCH_SIZE):
         """
         Initialize Supabase client
 
         Args:
             url: Supabase project URL
             key: Supabase service role key
+            batch_size: Most rows sent in one bulk write
         """
         self.url = url or os.getenv('SUPABASE_URL') or os.getenv('NEXT_PUBLIC_SUPABASE_URL')
         self.key = key or os.getenv('SUPABASE_SERVICE_KEY') or os.getenv('SUPABASE_SERVICE_ROLE_KEY')
@@ -29,6 +282,7 @@ class SupabaseManager:
             raise ValueError("Supabase URL and key are required")
 
         self.client: Client = create_client(self.url, self.key)
+        self.batch_size = batch_size
 
     def upsert_admin(self, admin_data: Dict) -> Dict:
         """
@@ -74,49 +328,7 @@ class SupabaseManager:
         Returns:
             Inserted/updated user record
         """
-        # Extract location data
-        location = user_data.get('location', {}) or {}
-
-        user_record = {
-            'user_id': user_data.get('id'),
-            'type': user_data.get('type', 'contact'),
-            'external_id': user_data.get('external_id'),
-            'email': user_data.get('email'),
-            'phone': user_data.get('phone'),
-            'name': user_data.get('name'),
-            'avatar_url': user_data.get('avatar', {}).get('image_url') if user_data.get('avatar') else None,
-            'pseudonym': user_data.get('pseudonym'),
-            'location_country': location.get('country'),
-            'location_region': location.get('region'),
-            'location_city': location.get('city'),
-            'user_agent_data': user_data.get('user_agent_data'),
-            'custom_attributes': user_data.get('custom_attributes'),
-            'segments': [seg.get('id') for seg in user_data.get('segments', {}).get('segments', [])],
-            'tags': [tag.get('id') for tag in user_data.get('tags', {}).get('tags', [])],
-            'companies': user_data.get('companies', {}).get('companies', []),
-            'social_profiles': user_data.get('social_profiles', {}).get('social_profiles', []),
-            'unsubscribed_from_emails': user_data.get('unsubscribed_from_emails', False),
-            'marked_email_as_spam': user_data.get('marked_email_as_spam', False),
-            'has_hard_bounced': user_data.get('has_hard_bounced', False),
-            'browser': user_data.get('browser'),
-            'browser_version': user_data.get('browser_version'),
-            'browser_language': user_data.get('browser_language'),
-            'os': user_data.get('os'),
-            'synced_at': datetime.now(timezone.utc).isoformat()
-        }
-
-        # Convert timestamps
-        timestamp_fields = [
-            'created_at', 'updated_at', 'signed_up_at', 'last_seen_at',
-            'last_contacted_at', 'last_email_opened_at', 'last_email_clicked_at'
-        ]
-
-        for field in timestamp_fields:
-            if user_data.get(field):
-                user_record[field] = datetime.fromtimestamp(
-                    user_data[field],
-                    tz=timezone.utc
-                ).isoformat()
+        user_record = _user_record(user_data)
 
         try:
             result = self.client.table('intercom_users').upsert(
@@ -138,62 +350,7 @@ class SupabaseManager:
         Returns:
             Inserted/updated conversation record
         """
-        source = conversation_data.get('source', {}) or {}
-        statistics = conversation_data.get('statistics', {}) or {}
-        sla_applied = conversation_data.get('sla_applied', {}) or {}
-        conversation_rating = conversation_data.get('conversation_rating', {}) or {}
-
-        conversation_record = {
-            'conversation_id': conversation_data.get('id'),
-            'type': conversation_data.get('type'),
-            'source_type': source.get('type'),
-            'source_id': source.get('id'),
-            'source_delivered_as': source.get('delivered_as'),
-            'source_subject': source.get('subject'),
-            'source_body': source.get('body'),
-            'source_author_type': source.get('author', {}).get('type') if source.get('author') else None,
-            'source_author_id': source.get('author', {}).get('id') if source.get('author') else None,
-            'source_author_name': source.get('author', {}).get('name') if source.get('author') else None,
-            'source_author_email': source.get('author', {}).get('email') if source.get('author') else None,
-            'source_url': source.get('url'),
-            'source_attachments': source.get('attachments', []),
-            'contacts': [c.get('id') for c in conversation_data.get('contacts', {}).get('contacts', [])],
-            'teammates': [t.get('id') for t in conversation_data.get('teammates', {}).get('teammates', [])],
-            'admin_assignee_id': conversation_data.get('admin_assignee_id'),
-            'team_assignee_id': conversation_data.get('team_assignee_id'),
-            'open': conversation_data.get('open', True),
-            'state': conversation_data.get('state', 'open'),
-            'read': conversation_data.get('read', False),
-            'priority': conversation_data.get('priority'),
-            'sla_applied': sla_applied if sla_applied else None,
-            'statistics': statistics if statistics else None,
-            'conversation_rating': conversation_rating if conversation_rating else None,
-            'tags': [tag.get('id') for tag in conversation_data.get('tags', {}).get('tags', [])],
-            'custom_attributes': conversation_data.get('custom_attributes'),
-            'topics': conversation_data.get('topics'),
-            'ticket_id': conversation_data.get('ticket', {}).get('id') if conversation_data.get('ticket') else None,
-            'linked_objects': conversation_data.get('linked_objects'),
-            'ai_agent_participated': conversation_data.get('ai_agent_participated', False),
-            'ai_agent': conversation_data.get('ai_agent'),
-            'synced_at': datetime.now(timezone.utc).isoformat()
-        }
-
-        # Convert timestamps
-        timestamp_fields = [
-            'created_at', 'updated_at', 'waiting_since', 'snoozed_until',
-            'first_contact_reply_at'
-        ]
-
-        for field in timestamp_fields:
-            if conversation_data.get(field):
-                conversation_record[field] = datetime.fromtimestamp(
-                    conversation_data[field],
-                    tz=timezone.utc
-                ).isoformat()
-
-        # Handle first contact reply type
-        if conversation_data.get('first_contact_reply'):
-            conversation_record['first_contact_reply_type'] = conversation_data['first_contact_reply'].get('type')
+        conversation_record = _conversation_record(conversation_data)
 
         try:
             result = self.client.table('intercom_conversations').upsert(
@@ -216,39 +373,7 @@ class SupabaseManager:
         Returns:
             List of inserted/updated message records
         """
-        messages = []
-
-        for index, part in enumerate(parts):
-            author = part.get('author', {}) or {}
-
-            message_record = {
-                'message_id': part.get('id'),
-                'conversation_id': conversation_id,
-                'part_type': part.get('part_type'),
-                'body': part.get('body'),
-                'author_id': author.get('id'),
-                'author_type': author.get('type'),
-                'author_name': author.get('name'),
-                'author_email': author.get('email'),
-                'attachments': part.get('attachments', []),
-                'external_id': part.get('external_id'),
-                'redacted': part.get('redacted', False),
-                'message_index': index,
-                'assigned_to_id': part.get('assigned_to', {}).get('id') if part.get('assigned_to') else None,
-                'assigned_to_type': part.get('assigned_to', {}).get('type') if part.get('assigned_to') else None,
-                'synced_at': datetime.now(timezone.utc).isoformat()
-            }
-
-            # Convert timestamps
-            timestamp_fields = ['created_at', 'updated_at', 'notified_at']
-            for field in timestamp_fields:
-                if part.get(field):
-                    message_record[field] = datetime.fromtimestamp(
-                        part[field],
-                        tz=timezone.utc
-                    ).isoformat()
-
-            messages.append(message_record)
+        messages = _message_records(conversation_id, parts)
 
         if messages:
             try:
@@ -303,23 +428,7 @@ class SupabaseManager:
             conversation_id: Conversation ID
             tags: List of tag data with applied info
         """
-        links = []
-
-        for tag in tags:
-            link = {
-                'conversation_id': conversation_id,
-                'tag_id': tag.get('id'),
-                'applied_by_id': tag.get('applied_by', {}).get('id') if tag.get('applied_by') else None,
-                'applied_by_type': tag.get('applied_by', {}).get('type') if tag.get('applied_by') else None
-            }
-
-            if tag.get('applied_at'):
-                link['applied_at'] = datetime.fromtimestamp(
-                    tag['applied_at'],
-                    tz=timezone.utc
-                ).isoformat()
-
-            links.append(link)
+        links = _tag_links(conversation_id, tags)
 
         if links:
             try:
@@ -334,6 +443,180 @@ class SupabaseManager:
                 logger.error(f"Error linking tags for conversation {conversation_id}: {e}")
                 raise
 
+    def _isolate_failures(
+        self,
+        items: List,
+        call: Callable[[List], Any],
+        key: Callable[[Any], str],
+        failed: Dict[str, str]
+    ) -> List:
+        """
+        Run a bulk call, splitting it in half on row errors until the items at fault are found
+
+        One bad row costs a few extra calls instead of failing every row sent with it.
+        Any other error (transport, 5xx) fails the whole batch after one call rather than
+        being retried once per half.
+
+        Args:
+            items: Items for the call
+            call: Bulk call taking a list of items
+            key: The ID failures are reported under, e.g. the item's conversation
+            failed: Collects {ID: error} for items that fail on their own or with their batch
+
+        Returns:
+            The items that were written
+        """
+        try:
+            return self._bisect_row_errors(items, call, key, failed)
+        except Exception as e:
+            logger.error(f"Bulk write of {len(items)} rows failed: {e}")
+            for item in items:
+                failed.setdefault(key(item), str(e))
+            return []
+
+    def _bisect_row_errors(
+        self,
+        items: List,
+        call: Callable[[List], Any],
+        key: Callable[[Any], str],
+        failed: Dict[str, str]
+    ) -> List:
+        try:
+            call(items)
+            return items
+        except Exception as e:
+            if not _is_row_error(e):
+                raise
+            if len(items) == 1:
+                failed.setdefault(key(items[0]), str(e))
+                return []
+            middle = len(items) // 2
+            return (
+                self._bisect_row_errors(items[:middle], call, key, failed)
+                + self._bisect_row_errors(items[middle:], call, key, failed)
+            )
+
+    def _upsert_rows(
+        self,
+        table: str,
+        rows: List[Dict],
+        on_conflict: str,
+        key: str,
+        failed: Dict[str, str]
+    ) -> List[Dict]:
+        """
+        Upsert rows in bulk writes of at most batch_size rows
+
+        Args:
+            table: Table name
+            rows: Rows to upsert
+            on_conflict: Primary key column
+            key: Column failures are reported under
+            failed: Collects {row[key]: error} for rows that fail
+
+        Returns:
+            The rows that were written
+        """
+        # A bulk upsert can't touch the same row twice, so the last copy wins
+        rows = list({row[on_conflict]: row for row in rows}.values())
+        written = []
+
+        def upsert(chunk: List[Dict]):
+            self.client.table(table).upsert(chunk, on_conflict=on_conflict).execute()
+
+        for chunk in _uniform_chunks(rows, self.batch_size):
+            written.extend(self._isolate_failures(chunk, upsert, lambda row: row[key], failed))
+        return written
+
+    def upsert_users_batch(self, users: List[Dict]) -> Dict[str, Any]:
+        """
+        Insert or update users/contacts in bulk
+
+        Args:
+            users: User data from Intercom
+
+        Returns:
+            synced: IDs of the users written, failed: {user ID: error} for the rest
+        """
+        failed: Dict[str, str] = {}
+        records = []
+        for user in users:
+            try:
+                records.append(_user_record(user))
+            except Exception as e:
+                failed[user.get('id')] = str(e)
+
+        written = self._upsert_rows('intercom_users', records, 'user_id', 'user_id', failed)
+        for user_id, error in failed.items():
+            logger.error(f"Error upserting user {user_id}: {error}")
+
+        return {'synced': [row['user_id'] for row in written], 'failed': failed}
+
+    def upsert_conversations_batch(self, conversations: List[Dict]) -> Dict[str, Any]:
+        """
+        Insert or update conversations with their messages and tag links in bulk
+
+        Conversations, then messages, then tag links are written in a few bulk calls
+        for the whole batch. A conversation whose row, messages or tag links fail is
+        reported in failed and the rest of the batch still goes in. Tag links are
+        replaced, so tags removed in Intercom are unlinked too.
+
+        Args:
+            conversations: Full conversation data from Intercom
+
+        Returns:
+            synced: IDs of the conversations written in full,
+            failed: {conversation ID: error} for the rest,
+            messages: Number of messages written
+        """
+        failed: Dict[str, str] = {}
+        records, messages, links = [], [], []
+
+        for conversation in conversations:
+            conv_id = conversation.get('id')
+            try:
+                records.append(_conversation_record(conversation))
+                messages.extend(_message_records(conv_id, conversation_message_parts(conversation)))
+                links.extend(_tag_links(conv_id, conversation.get('tags', {}).get('tags', [])))
+            except Exception as e:
+                failed[conv_id] = str(e)
+
+        written = self._upsert_rows(
+            'intercom_conversations',
+            [record for record in records if record['conversation_id'] not in failed],
+            'conversation_id', 'conversation_id', failed
+        )
+        conversation_ids = [row['conversation_id'] for row in written]
+
+        # Messages and tags reference their conversation, so only write those of written conversations
+        written_messages = self._upsert_rows(
+            'intercom_messages',
+            [message for message in messages if message['conversation_id'] not in failed],
+            'message_id', 'conversation_id', failed
+        )
+
+        def delete_links(ids: List[str]):
+            self.client.table('intercom_conversation_tags').delete().in_('conversation_id', ids).execute()
+
+        def insert_links(chunk: List[Dict]):
+            self.client.table('intercom_conversation_tags').insert(chunk).execute()
+
+        cleared = []
+        for chunk in _chunks([i for i in conversation_ids if i not in failed], FILTER_BATCH_SIZE):
+            cleared.extend(self._isolate_failures(chunk, delete_links, lambda i: i, failed))
+        cleared = set(cleared)
+        for chunk in _uniform_chunks([link for link in links if link['conversation_id'] in cleared], self.batch_size):
+            self._isolate_failures(chunk, insert_links, lambda link: link['conversation_id'], failed)
+
+        for conv_id, error in failed.items():
+            logger.error(f"Error upserting conversation {conv_id}: {error}")
+
+        return {
+            'synced': [i for i in conversation_ids if i not in failed],
+            'failed': failed,
+            'messages': sum(1 for message in written_messages if message['conversation_id'] not in failed)
+        }
+
     def create_sync_log(self, sync_type: str, metadata: Dict = None) -> Dict:
         """
         Create a new sync log entry
@@ -5,7 +5,7 @@ import os
 import sys
 import json
 import asyncio
-from typing import Dict, List, Optional, Set
+from typing import Dict, Iterable, List, Optional, Set
 from datetime import datetime, timezone, timedelta
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import logging
@@ -13,8 +13,9 @@ from rich.console import Console
 from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn, TimeRemainingColumn
 from rich.logging import RichHandler
 
-from intercom_client import IntercomClient, IntercomAPIError
-from supabase_manager import SupabaseManager
+from intercom_client import IntercomClient, AsyncIntercomClient, IntercomAPIError, build_export_query
+from supabase_manager import SupabaseManager, conversation_message_parts
+from fetch_pipeline import fetch_conversations_in_thread, list_pages, search_pages, FetchResult, PageSource
 
 # Configure rich console and logging
 console = Console()
@@ -163,21 +164,8 @@ class IntercomSyncOrchestrator:
             self.supabase.upsert_conversation(conversation)
 
             # Sync messages (conversation parts)
-            parts = conversation.get('conversation_parts', {}).get('conversation_parts', [])
+            parts = conversation_message_parts(conversation)
             if parts:
-                # Add the source message as the first part
-                source = conversation.get('source')
-                if source:
-                    source_part = {
-                        'id': f"{conv_id}_source",
-                        'part_type': 'message',
-                        'body': source.get('body'),
-                        'author': source.get('author'),
-                        'created_at': conversation.get('created_at'),
-                        'attachments': source.get('attachments', [])
-                    }
-                    parts = [source_part] + parts
-
                 messages = self.supabase.upsert_messages(conv_id, parts)
                 self.stats['messages_synced'] += len(messages)
 
@@ -194,6 +182,50 @@ class IntercomSyncOrchestrator:
             self.stats['errors'].append(f"Conversation {conversation.get('id')}: {str(e)}")
             return False
 
+    def sync_users_batch(self, conversations: List[Dict]) -> int:
+        """
+        Sync the users associated with a batch of conversations
+
+        New contacts are fetched in parallel and written in bulk.
+
+        Args:
+            conversations: List of conversation data
+
+        Returns:
+            Number of users synced
+        """
+        contact_ids = []
+        for conversation in conversations:
+            for contact in conversation.get('contacts', {}).get('contacts', []):
+                # Handle both dict and string ID formats
+                contact_id = contact if isinstance(contact, str) else contact.get('id')
+                if contact_id and contact_id not in self.processed_users and contact_id not in contact_ids:
+                    contact_ids.append(contact_id)
+
+        if not contact_ids:
+            return 0
+
+        users = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {
+                executor.submit(self.intercom.get_user, contact_id): contact_id
+                for contact_id in contact_ids
+            }
+
+            for future in as_completed(futures):
+                try:
+                    users.append(future.result())
+                except Exception as e:
+                    logger.error(f"Error syncing user {futures[future]}: {e}")
+                    self.stats['errors'].append(f"User {futures[future]}: {str(e)}")
+
+        result = self.supabase.upsert_users_batch(users)
+        for user_id, error in result['failed'].items():
+            self.stats['errors'].append(f"User {user_id}: {error}")
+
+        self.processed_users.update(result['synced'])
+        return len(result['synced'])
+
     def sync_conversations_batch(
         self,
         conversations: List[Dict],
@@ -201,7 +233,10 @@ class IntercomSyncOrchestrator:
         task_id: int = None
     ) -> int:
         """
-        Sync a batch of conversations in parallel
+        Sync a batch of conversations with bulk writes
+
+        Users, conversations, messages and tag links are each written in a few bulk
+        calls for the whole batch rather than a handful per conversation.
 
         Args:
             conversations: List of conversation data
@@ -211,22 +246,83 @@ class IntercomSyncOrchestrator:
         Returns:
             Number of conversations successfully synced
         """
-        success_count = 0
+        self.stats['users_synced'] += self.sync_users_batch(conversations)
 
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            futures = {
-                executor.submit(self.sync_conversation, conv): conv
-                for conv in conversations
-            }
+        result = self.supabase.upsert_conversations_batch(conversations)
+        for conv_id, error in result['failed'].items():
+            self.stats['errors'].append(f"Conversation {conv_id}: {error}")
 
-            for future in as_completed(futures):
-                if future.result():
-                    success_count += 1
+        self.stats['conversations_synced'] += len(result['synced'])
+        self.stats['messages_synced'] += result['messages']
+
+        if progress and task_id is not None:
+            progress.update(task_id, advance=len(conversations))
+
+        return len(result['synced'])
 
+    def fetch_conversations(self, make_pages: PageSource) -> Iterable[FetchResult]:
+        """
+        Fetch full conversations through the shared pipeline
+
+        Args:
+            make_pages: Takes an AsyncIntercomClient and returns pages of conversation IDs,
+                e.g. lambda client: list_pages(client, updated_after=since)
+
+        Returns:
+            (conversation ID, conversation, error) for each conversation, as they finish fetching
+        """
+        return fetch_conversations_in_thread(
+            lambda: AsyncIntercomClient(self.intercom.access_token),
+            make_pages
+        )
+
+    def sync_fetched_conversations(
+        self,
+        fetched: Iterable[FetchResult],
+        batch_size: int = 20,
+        progress: Progress = None,
+        task_id: int = None
+    ) -> Dict[str, int]:
+        """
+        Write conversations from the fetch pipeline in batches
+
+        The pipeline keeps fetching while each batch is written.
+
+        Args:
+            fetched: Results from fetch_conversations
+            batch_size: Conversations written together per batch
+            progress: Rich progress bar
+            task_id: Progress task ID
+
+        Returns:
+            Counts of conversations fetched, synced and failed
+        """
+        counts = {'fetched': 0, 'synced': 0, 'failed': 0}
+        batch = []
+
+        for conv_id, conversation, error in fetched:
+            counts['fetched'] += 1
+            if error:
+                logger.error(f"Error fetching conversation {conv_id}: {error}")
+                self.stats['errors'].append(f"Fetch {conv_id}: {str(error)}")
+                counts['failed'] += 1
                 if progress and task_id is not None:
                     progress.update(task_id, advance=1)
+                continue
 
-        return success_count
+            batch.append(conversation)
+            if len(batch) >= batch_size:
+                synced = self.sync_conversations_batch(batch, progress, task_id)
+                counts['synced'] += synced
+                counts['failed'] += len(batch) - synced
+                batch = []
+
+        if batch:
+            synced = self.sync_conversations_batch(batch, progress, task_id)
+            counts['synced'] += synced
+            counts['failed'] += len(batch) - synced
+
+        return counts
 
     def run_full_sync(
         self,
@@ -240,7 +336,7 @@ class IntercomSyncOrchestrator:
         Args:
             start_date: Start date for sync
             end_date: End date for sync
-            batch_size: Number of conversations to process in parallel
+            batch_size: Number of conversations written per batch
         """
         try:
             # Create sync log
@@ -271,36 +367,22 @@ class IntercomSyncOrchestrator:
                 console=console
             ) as progress:
 
-                # Fetch all conversations using bulk export (more reliable, includes full details)
+                # Fetch full conversations through the shared pipeline - a conversation that
+                # fails to fetch is recorded as an error instead of aborting the whole sync
                 sync_task = progress.add_task("[cyan]Syncing conversations...", total=None)
 
-                # Process conversations as they come from the API
-                batch = []
-                total_processed = 0
-
-                for full_conv in self.intercom.export_conversations_bulk(
-                    start_date=start_date,
-                    end_date=end_date,
-                    include_closed=True
-                ):
-                    batch.append(full_conv)
-                    total_processed += 1
-
-                    if len(batch) >= batch_size:
-                        self.sync_conversations_batch(batch, progress, sync_task)
-                        batch = []
-
-                        # Update progress display
-                        progress.update(
-                            sync_task,
-                            description=f"[cyan]Synced {total_processed} conversations..."
-                        )
-
-                # Process remaining batch
-                if batch:
-                    self.sync_conversations_batch(batch, progress, sync_task)
+                query = build_export_query(start_date, end_date, include_closed=True)
+                counts = self.sync_fetched_conversations(
+                    # Use search API for more control, or list everything without filters
+                    self.fetch_conversations(
+                        lambda client: search_pages(client, query) if query else list_pages(client)
+                    ),
+                    batch_size=batch_size,
+                    progress=progress,
+                    task_id=sync_task
+                )
 
-                console.print(f"[green]Completed sync of {total_processed} conversations[/green]")
+                console.print(f"[green]Processed {counts['fetched']} conversations[/green]")
 
             # Update sync log
             self.supabase.update_sync_log(
@@ -363,24 +445,9 @@ class IntercomSyncOrchestrator:
             self.stats['admins_synced'] = self.sync_admins()
             self.stats['tags_synced'] = self.sync_tags()
 
-            # Fetch updated conversations
+            # Fetch and sync updated conversations as they are listed
             console.print("[yellow]Fetching updated conversations...[/yellow]")
 
-            conversations_to_sync = []
-            for conv in self.intercom.list_all_conversations(updated_after=last_sync):
-                conversations_to_sync.append(conv['id'])
-
-            if not conversations_to_sync:
-                console.print("[green]No conversations to sync[/green]")
-                self.supabase.update_sync_log(
-                    self.sync_log['sync_id'],
-                    status='completed'
-                )
-                return
-
-            console.print(f"[green]Found {len(conversations_to_sync)} updated conversations[/green]")
-
-            # Sync conversations
             with Progress(
                 SpinnerColumn(),
                 TextColumn("[progress.description]{task.description}"),
@@ -389,29 +456,24 @@ class IntercomSyncOrchestrator:
                 console=console
             ) as progress:
 
-                sync_task = progress.add_task(
-                    "[cyan]Syncing updated conversations...",
-                    total=len(conversations_to_sync)
+                sync_task = progress.add_task("[cyan]Syncing updated conversations...", total=None)
+
+                counts = self.sync_fetched_conversations(
+                    self.fetch_conversations(lambda client: list_pages(client, updated_after=last_sync)),
+                    batch_size=20,
+                    progress=progress,
+                    task_id=sync_task
                 )
 
-                batch = []
-                for conv_id in conversations_to_sync:
-                    try:
-                        full_conv = self.intercom.get_conversation_with_parts(conv_id)
-                        batch.append(full_conv)
-
-                        if len(batch) >= 20:
-                            self.sync_conversations_batch(batch, progress, sync_task)
-                            batch = []
-
-                    except Exception as e:
-                        logger.error(f"Error fetching conversation {conv_id}: {e}")
-                        self.stats['errors'].append(f"Fetch {conv_id}: {str(e)}")
-                        progress.update(sync_task, advance=1)
-
-                # Process remaining batch
-                if batch:
-                    self.sync_conversations_batch(batch, progress, sync_task)
+            if not counts['fetched']:
+                console.print("[green]No conversations to sync[/green]")
+                self.supabase.update_sync_log(
+                    self.sync_log['sync_id'],
+                    status='completed'
+                )
+                return
+
+            console.print(f"[green]Processed {counts['fetched']} updated conversations[/green]")
 
             # Update sync log
             self.supabase.update_sync_log(
@@ -75,6 +75,12 @@ DROP FUNCTION IF EXISTS public.handle_new_user();
 DROP FUNCTION IF EXISTS public.is_admin();
 DROP FUNCTION IF EXISTS match_documents(vector, int, jsonb);
 DROP FUNCTION IF EXISTS execute_custom_sql(text);
+DROP FUNCTION IF EXISTS explain_custom_sql(text);
+DROP FUNCTION IF EXISTS refresh_dataset_table(text, jsonb);
+DROP FUNCTION IF EXISTS drop_dataset_table(text);
+DROP FUNCTION IF EXISTS dataset_try_numeric(text);
+DROP FUNCTION IF EXISTS dataset_try_date(text);
+DROP FUNCTION IF EXISTS dataset_try_timestamptz(text);
 DROP FUNCTION IF EXISTS update_rag_pipeline_state_updated_at();
 
 -- Drop tables (in reverse dependency order) - CASCADE will handle dependencies
@@ -133,6 +139,7 @@ CREATE TABLE messages (
     session_id VARCHAR NOT NULL,
     message JSONB NOT NULL,
     message_data TEXT,
+    idempotency_key UUID UNIQUE,  -- Client-generated, so replayed writes are skipped
     created_at TIMESTAMPTZ DEFAULT NOW(),
    
     FOREIGN KEY (session_id) REFERENCES conversations(session_id)
@@ -144,7 +151,10 @@ CREATE TABLE document_metadata (
     title TEXT,
     url TEXT,
     created_at TIMESTAMP DEFAULT NOW(),
-    schema TEXT
+    schema TEXT,
+    column_types JSONB,  -- column name -> Postgres type
+    column_stats JSONB,  -- null counts, min/max, distinct counts, top values
+    typed_table TEXT     -- name of the typed materialized view
 );
 
 -- 6. Document Rows Table
@@ -169,6 +179,7 @@ CREATE TABLE rag_pipeline_state (
     last_check_time TIMESTAMP,        -- Last successful check for changes
     known_files JSONB,                -- File metadata for change detection (file_id -> timestamp mapping)
     last_run TIMESTAMP,               -- Last successful run timestamp
+    last_ingest TIMESTAMP,            -- Last run that added, changed or deleted documents
     created_at TIMESTAMP DEFAULT NOW(),
     updated_at TIMESTAMP DEFAULT NOW()
 );
@@ -182,6 +193,9 @@ CREATE INDEX idx_conversations_user ON conversations(user_id);
 CREATE INDEX idx_messages_session ON messages(session_id);
 CREATE INDEX idx_messages_computed_session ON messages(computed_session_user_id);
 
+-- Tabular document indexes
+CREATE INDEX idx_document_rows_dataset_id ON document_rows(dataset_id);
+
 -- RAG pipeline state indexes
 CREATE INDEX idx_rag_pipeline_state_pipeline_type ON rag_pipeline_state(pipeline_type);
 CREATE INDEX idx_rag_pipeline_state_last_run ON rag_pipeline_state(last_run);
@@ -263,7 +277,30 @@ EXCEPTION
 END;
 $$;
 
--- 5. RAG Pipeline State Update Function
+-- 5. Explain Custom SQL Function (planner estimates for admission control)
+CREATE OR REPLACE FUNCTION explain_custom_sql(sql_query text)
+RETURNS JSONB
+LANGUAGE plpgsql
+SECURITY DEFINER -- This makes the function run with the privileges of the creator
+AS $$
+DECLARE
+  plan JSON;
+BEGIN
+  -- EXPLAIN without ANALYZE only plans the query, so this is cheap even for runaway SQL.
+  -- Plan the statement execute_custom_sql runs, wrapped the same way, so a string that
+  -- isn't a single query (utility commands, several statements) fails here too.
+  EXECUTE 'EXPLAIN (FORMAT JSON) SELECT jsonb_agg(t) FROM (' || sql_query || ') t' INTO plan;
+  RETURN plan::jsonb;
+EXCEPTION
+  WHEN OTHERS THEN
+    RETURN jsonb_build_object(
+      'error', SQLERRM,
+      'detail', SQLSTATE
+    );
+END;
+$$;
+
+-- 6. RAG Pipeline State Update Function
 CREATE OR REPLACE FUNCTION update_rag_pipeline_state_updated_at()
 RETURNS TRIGGER AS $$
 BEGIN
@@ -272,6 +309,110 @@ BEGIN
 END;
 $$ language 'plpgsql';
 
+-- 7. Safe Casts for Dataset Tables (NULL for values that don't cast)
+CREATE OR REPLACE FUNCTION dataset_try_numeric(value text)
+RETURNS NUMERIC
+LANGUAGE plpgsql
+IMMUTABLE
+AS $$
+BEGIN
+  RETURN value::numeric;
+EXCEPTION WHEN data_exception THEN
+  RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION dataset_try_date(value text)
+RETURNS DATE
+LANGUAGE plpgsql
+IMMUTABLE
+AS $$
+BEGIN
+  RETURN value::date;
+EXCEPTION WHEN data_exception THEN
+  RETURN NULL;
+END;
+$$;
+
+-- STABLE rather than IMMUTABLE: the result depends on the session TimeZone
+CREATE OR REPLACE FUNCTION dataset_try_timestamptz(value text)
+RETURNS TIMESTAMPTZ
+LANGUAGE plpgsql
+STABLE
+AS $$
+BEGIN
+  RETURN value::timestamptz;
+EXCEPTION WHEN data_exception THEN
+  RETURN NULL;
+END;
+$$;
+
+-- 8. Refresh Dataset Table Function (typed materialized view per tabular document)
+-- columns_param is an ordered array of {"name": ..., "type": ..., "index": true/false}
+-- where type is one of bigint, numeric, boolean, date, timestamptz or text
+CREATE OR REPLACE FUNCTION refresh_dataset_table(dataset_id_param text, columns_param jsonb)
+RETURNS TEXT
+LANGUAGE plpgsql
+SECURITY DEFINER -- This makes the function run with the privileges of the creator
+AS $$
+DECLARE
+  table_name TEXT := 'dataset_' || substr(md5(dataset_id_param), 1, 12);
+  select_list TEXT := '';
+  col JSONB;
+  raw_value TEXT;
+  typed_value TEXT;
+BEGIN
+  FOR col IN SELECT * FROM jsonb_array_elements(columns_param) LOOP
+    raw_value := format('NULLIF(btrim(row_data->>%L), '''')', col->>'name');
+
+    -- Values that don't match the inferred type become NULL instead of failing the whole view.
+    -- The regex skips obvious mismatches cheaply; the dataset_try_* casts catch values that
+    -- look right but still don't cast (2024-02-30, 1e999999).
+    typed_value := CASE col->>'type'
+      WHEN 'bigint' THEN format('CASE WHEN %s ~ ''^[-+]?\d{1,18}$'' THEN (%s)::bigint END', raw_value, raw_value)
+      WHEN 'numeric' THEN format('CASE WHEN %s ~ ''^[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?$'' THEN dataset_try_numeric(%s) END', raw_value, raw_value)
+      WHEN 'boolean' THEN format('CASE WHEN lower(%s) IN (''true'', ''t'', ''yes'', ''y'') THEN true WHEN lower(%s) IN (''false'', ''f'', ''no'', ''n'') THEN false END', raw_value, raw_value)
+      WHEN 'date' THEN format('CASE WHEN %s ~ ''^\d{4}-\d{2}-\d{2}$'' THEN dataset_try_date(%s) END', raw_value, raw_value)
+      WHEN 'timestamptz' THEN format('CASE WHEN %s ~ ''^\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}'' THEN dataset_try_timestamptz(%s) END', raw_value, raw_value)
+      ELSE raw_value
+    END;
+
+    select_list := select_list || format(', %s AS %I', typed_value, col->>'name');
+  END LOOP;
+
+  EXECUTE format('DROP MATERIALIZED VIEW IF EXISTS %I', table_name);
+  EXECUTE format(
+    'CREATE MATERIALIZED VIEW %I AS SELECT id AS _dataset_row_id%s FROM document_rows WHERE dataset_id = %L',
+    table_name, select_list, dataset_id_param
+  );
+
+  -- Index the columns the pipeline flagged as useful for filtering and grouping
+  FOR col IN SELECT * FROM jsonb_array_elements(columns_param) LOOP
+    IF (col->>'index')::boolean THEN
+      EXECUTE format('CREATE INDEX ON %I (%I)', table_name, col->>'name');
+    END IF;
+  END LOOP;
+
+  -- Same lock down as document_rows - only the backend can read it
+  EXECUTE format('REVOKE ALL ON %I FROM PUBLIC, anon, authenticated', table_name);
+  EXECUTE format('ANALYZE %I', table_name);
+
+  UPDATE document_metadata SET typed_table = table_name WHERE id = dataset_id_param;
+  RETURN table_name;
+END;
+$$;
+
+-- 9. Drop Dataset Table Function
+CREATE OR REPLACE FUNCTION drop_dataset_table(dataset_id_param text)
+RETURNS VOID
+LANGUAGE plpgsql
+SECURITY DEFINER -- This makes the function run with the privileges of the creator
+AS $$
+BEGIN
+  EXECUTE format('DROP MATERIALIZED VIEW IF EXISTS %I', 'dataset_' || substr(md5(dataset_id_param), 1, 12));
+END;
+$$;
+
 -- ==============================================================================
 -- CREATE TRIGGERS
 -- ==============================================================================
@@ -425,6 +566,9 @@ CREATE POLICY "Deny all access to documents" ON documents FOR ALL USING (false);
 
 -- By default, revoke execute permission from public and authenticated users for security-sensitive functions
 REVOKE EXECUTE ON FUNCTION execute_custom_sql(text) FROM PUBLIC, authenticated;
+REVOKE EXECUTE ON FUNCTION explain_custom_sql(text) FROM PUBLIC, authenticated;
+REVOKE EXECUTE ON FUNCTION refresh_dataset_table(text, jsonb) FROM PUBLIC, authenticated;
+REVOKE EXECUTE ON FUNCTION drop_dataset_table(text) FROM PUBLIC, authenticated;
 
 -- ==============================================================================
 -- SETUP COMPLETE
@@ -0,0 +1,117 @@
+-- Typed per-dataset tables for tabular documents
+-- The RAG pipeline infers column types and statistics at ingest time and stores them on
+-- document_metadata, then calls refresh_dataset_table to build a typed materialized view
+-- over document_rows so the agent can run typed SQL without casting jsonb on every row.
+
+ALTER TABLE document_metadata ADD COLUMN IF NOT EXISTS column_types JSONB;  -- column name -> Postgres type
+ALTER TABLE document_metadata ADD COLUMN IF NOT EXISTS column_stats JSONB;  -- null counts, min/max, distinct counts, top values
+ALTER TABLE document_metadata ADD COLUMN IF NOT EXISTS typed_table TEXT;    -- name of the typed materialized view
+
+CREATE INDEX IF NOT EXISTS idx_document_rows_dataset_id ON document_rows(dataset_id);
+
+-- Casts used by refresh_dataset_table that return NULL for values that don't cast
+CREATE OR REPLACE FUNCTION dataset_try_numeric(value text)
+RETURNS NUMERIC
+LANGUAGE plpgsql
+IMMUTABLE
+AS $$
+BEGIN
+  RETURN value::numeric;
+EXCEPTION WHEN data_exception THEN
+  RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION dataset_try_date(value text)
+RETURNS DATE
+LANGUAGE plpgsql
+IMMUTABLE
+AS $$
+BEGIN
+  RETURN value::date;
+EXCEPTION WHEN data_exception THEN
+  RETURN NULL;
+END;
+$$;
+
+-- STABLE rather than IMMUTABLE: the result depends on the session TimeZone
+CREATE OR REPLACE FUNCTION dataset_try_timestamptz(value text)
+RETURNS TIMESTAMPTZ
+LANGUAGE plpgsql
+STABLE
+AS $$
+BEGIN
+  RETURN value::timestamptz;
+EXCEPTION WHEN data_exception THEN
+  RETURN NULL;
+END;
+$$;
+
+-- Build (or rebuild) the typed materialized view for a dataset
+-- columns_param is an ordered array of {"name": ..., "type": ..., "index": true/false}
+-- where type is one of bigint, numeric, boolean, date, timestamptz or text
+CREATE OR REPLACE FUNCTION refresh_dataset_table(dataset_id_param text, columns_param jsonb)
+RETURNS TEXT
+LANGUAGE plpgsql
+SECURITY DEFINER -- This makes the function run with the privileges of the creator
+AS $$
+DECLARE
+  table_name TEXT := 'dataset_' || substr(md5(dataset_id_param), 1, 12);
+  select_list TEXT := '';
+  col JSONB;
+  raw_value TEXT;
+  typed_value TEXT;
+BEGIN
+  FOR col IN SELECT * FROM jsonb_array_elements(columns_param) LOOP
+    raw_value := format('NULLIF(btrim(row_data->>%L), '''')', col->>'name');
+
+    -- Values that don't match the inferred type become NULL instead of failing the whole view.
+    -- The regex skips obvious mismatches cheaply; the dataset_try_* casts catch values that
+    -- look right but still don't cast (2024-02-30, 1e999999).
+    typed_value := CASE col->>'type'
+      WHEN 'bigint' THEN format('CASE WHEN %s ~ ''^[-+]?\d{1,18}$'' THEN (%s)::bigint END', raw_value, raw_value)
+      WHEN 'numeric' THEN format('CASE WHEN %s ~ ''^[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?$'' THEN dataset_try_numeric(%s) END', raw_value, raw_value)
+      WHEN 'boolean' THEN format('CASE WHEN lower(%s) IN (''true'', ''t'', ''yes'', ''y'') THEN true WHEN lower(%s) IN (''false'', ''f'', ''no'', ''n'') THEN false END', raw_value, raw_value)
+      WHEN 'date' THEN format('CASE WHEN %s ~ ''^\d{4}-\d{2}-\d{2}$'' THEN dataset_try_date(%s) END', raw_value, raw_value)
+      WHEN 'timestamptz' THEN format('CASE WHEN %s ~ ''^\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}'' THEN dataset_try_timestamptz(%s) END', raw_value, raw_value)
+      ELSE raw_value
+    END;
+
+    select_list := select_list || format(', %s AS %I', typed_value, col->>'name');
+  END LOOP;
+
+  EXECUTE format('DROP MATERIALIZED VIEW IF EXISTS %I', table_name);
+  EXECUTE format(
+    'CREATE MATERIALIZED VIEW %I AS SELECT id AS _dataset_row_id%s FROM document_rows WHERE dataset_id = %L',
+    table_name, select_list, dataset_id_param
+  );
+
+  -- Index the columns the pipeline flagged as useful for filtering and grouping
+  FOR col IN SELECT * FROM jsonb_array_elements(columns_param) LOOP
+    IF (col->>'index')::boolean THEN
+      EXECUTE format('CREATE INDEX ON %I (%I)', table_name, col->>'name');
+    END IF;
+  END LOOP;
+
+  -- Same lock down as document_rows - only the backend can read it
+  EXECUTE format('REVOKE ALL ON %I FROM PUBLIC, anon, authenticated', table_name);
+  EXECUTE format('ANALYZE %I', table_name);
+
+  UPDATE document_metadata SET typed_table = table_name WHERE id = dataset_id_param;
+  RETURN table_name;
+END;
+$$;
+
+-- Drop the typed materialized view for a dataset when its document is deleted
+CREATE OR REPLACE FUNCTION drop_dataset_table(dataset_id_param text)
+RETURNS VOID
+LANGUAGE plpgsql
+SECURITY DEFINER -- This makes the function run with the privileges of the creator
+AS $$
+BEGIN
+  EXECUTE format('DROP MATERIALIZED VIEW IF EXISTS %I', 'dataset_' || substr(md5(dataset_id_param), 1, 12));
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION refresh_dataset_table(text, jsonb) FROM PUBLIC, authenticated;
+REVOKE EXECUTE ON FUNCTION drop_dataset_table(text) FROM PUBLIC, authenticated;
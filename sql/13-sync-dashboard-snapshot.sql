@@ -0,0 +1,94 @@
+-- ==============================================================================
+-- Sync Dashboard Snapshot
+-- ==============================================================================
+-- One RPC that returns everything the sync monitoring dashboard shows, so the
+-- API's /api/sync/snapshot endpoint needs a single database round trip instead
+-- of one per panel. Conflicts are summarised without their keap_data and
+-- supabase_data blobs - the full records come from /api/sync/conflicts.
+
+CREATE OR REPLACE FUNCTION get_sync_dashboard_snapshot(
+  activities_limit INTEGER DEFAULT 20,
+  conflicts_limit INTEGER DEFAULT 50
+)
+RETURNS JSONB
+LANGUAGE plpgsql
+STABLE
+SECURITY DEFINER
+AS $$
+DECLARE
+  total_entities INTEGER;
+  successful_syncs INTEGER;
+  pending_conflicts INTEGER;
+  last_sync_time TIMESTAMP;
+BEGIN
+  -- One pass over sync_status for all the counts both panels need
+  SELECT
+    COUNT(*),
+    COUNT(*) FILTER (WHERE last_error IS NULL),
+    MAX(last_synced_at)
+  FROM sync_status
+  INTO total_entities, successful_syncs, last_sync_time;
+
+  SELECT COUNT(*) FROM sync_conflicts WHERE resolved_at IS NULL INTO pending_conflicts;
+
+  RETURN jsonb_build_object(
+    'generated_at', NOW(),
+    'statistics', jsonb_build_object(
+      'total_contacts', (SELECT COUNT(*) FROM sync_contacts),
+      'total_orders', (SELECT COUNT(*) FROM sync_orders),
+      'total_tags', (SELECT COUNT(*) FROM sync_tags),
+      'total_subscriptions', (SELECT COUNT(*) FROM sync_subscriptions),
+      'last_sync_time', last_sync_time,
+      'pending_conflicts', pending_conflicts,
+      'total_sync_operations', total_entities,
+      'successful_syncs', successful_syncs,
+      'failed_syncs', total_entities - successful_syncs
+    ),
+    'health', jsonb_build_object(
+      'total_entities', total_entities,
+      'successful_syncs', successful_syncs,
+      'failed_syncs', total_entities - successful_syncs,
+      'pending_conflicts', pending_conflicts,
+      'health_score', CASE
+        WHEN total_entities > 0 THEN ROUND((successful_syncs::decimal / total_entities::decimal) * 100, 2)
+        ELSE 100
+      END
+    ),
+    'activities', COALESCE((
+      SELECT jsonb_agg(to_jsonb(a) ORDER BY a.last_synced_at DESC)
+      FROM (
+        SELECT
+          ss.entity_type,
+          ss.entity_id,
+          ss.keap_id,
+          ss.last_synced_at,
+          ss.sync_direction,
+          ss.conflict_status,
+          ss.last_error
+        FROM sync_status ss
+        ORDER BY ss.last_synced_at DESC
+        LIMIT activities_limit
+      ) a
+    ), '[]'::jsonb),
+    'conflicts', COALESCE((
+      SELECT jsonb_agg(to_jsonb(c) ORDER BY c.created_at DESC)
+      FROM (
+        SELECT
+          sc.id,
+          sc.entity_type,
+          sc.entity_id,
+          sc.conflict_fields,
+          sc.resolution_strategy,
+          sc.created_at,
+          sc.updated_at
+        FROM sync_conflicts sc
+        WHERE sc.resolved_at IS NULL
+        ORDER BY sc.created_at DESC
+        LIMIT conflicts_limit
+      ) c
+    ), '[]'::jsonb)
+  );
+END;
+$$;
+
+GRANT EXECUTE ON FUNCTION get_sync_dashboard_snapshot(INTEGER, INTEGER) TO service_role, authenticated;
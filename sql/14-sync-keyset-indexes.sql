@@ -0,0 +1,14 @@
+-- ==============================================================================
+-- Keyset Pagination Indexes for Sync Monitoring
+-- ==============================================================================
+-- /api/sync/conflicts and /api/sync/activities page newest first on
+-- (created_at, id) and (last_synced_at, id). These indexes match that order, so
+-- every page is an index range scan however deep the client has paged.
+
+-- Only unresolved conflicts are listed, so the index can skip resolved ones
+CREATE INDEX IF NOT EXISTS idx_sync_conflicts_pending_keyset
+    ON sync_conflicts (created_at DESC, id DESC)
+    WHERE resolved_at IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_sync_status_activity_keyset
+    ON sync_status (last_synced_at DESC, id DESC);
@@ -0,0 +1,218 @@
+-- ==============================================================================
+-- Sync Request Queue
+-- ==============================================================================
+-- Manual sync triggers from /api/sync/trigger are queued here and run by the
+-- agent API's sync worker. Triggers for a keap_account_id and sync_type that
+-- already has a pending or running request are folded into it (as is anything
+-- queued behind a pending or running 'all' sync for the account), so repeated
+-- clicks from several admins become one sync run. A request stays running until
+-- the coordinator reports the sync finished. Workers claim jobs under per-type
+-- concurrency limits.
+
+CREATE TABLE IF NOT EXISTS sync_requests (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    keap_account_id VARCHAR NOT NULL,
+    sync_type VARCHAR NOT NULL DEFAULT 'all'
+        CHECK (sync_type IN ('contacts', 'orders', 'tags', 'subscriptions', 'all')),
+    status VARCHAR NOT NULL DEFAULT 'pending'
+        CHECK (status IN ('pending', 'running', 'succeeded', 'failed')),
+    triggered_by UUID, -- User who first requested the sync
+    trigger_count INTEGER NOT NULL DEFAULT 1, -- Triggers coalesced into this request
+    attempts INTEGER NOT NULL DEFAULT 0,
+    not_before TIMESTAMPTZ, -- A failed request waits until then before it is retried
+    worker_id VARCHAR,
+    last_error TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    started_at TIMESTAMPTZ,
+    finished_at TIMESTAMPTZ,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Installs created before retry backoff existed
+ALTER TABLE sync_requests ADD COLUMN IF NOT EXISTS not_before TIMESTAMPTZ;
+
+-- At most one pending request per account and type - the coalescing point
+CREATE UNIQUE INDEX IF NOT EXISTS uq_sync_requests_pending
+    ON sync_requests (keap_account_id, sync_type)
+    WHERE status = 'pending';
+
+CREATE INDEX IF NOT EXISTS idx_sync_requests_status_created
+    ON sync_requests (status, created_at);
+
+ALTER TABLE sync_requests ENABLE ROW LEVEL SECURITY;
+
+-- Queue a sync, or fold it into a pending or running one for the same account and type
+CREATE OR REPLACE FUNCTION enqueue_sync_request(
+  keap_account_id_param VARCHAR,
+  sync_type_param VARCHAR DEFAULT 'all',
+  triggered_by_param UUID DEFAULT NULL
+)
+RETURNS JSONB
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  request_record sync_requests;
+BEGIN
+  -- A pending or running sync of the same type, or of 'all', already covers the trigger.
+  -- A pending request is preferred, since it will also see changes made from now on.
+  UPDATE sync_requests
+  SET trigger_count = trigger_count + 1, updated_at = NOW()
+  WHERE id = (
+    SELECT id FROM sync_requests
+    WHERE keap_account_id = keap_account_id_param
+      AND sync_type IN (sync_type_param, 'all')
+      AND status IN ('pending', 'running')
+    ORDER BY status = 'pending' DESC, created_at
+    LIMIT 1
+    FOR UPDATE
+  )
+  RETURNING * INTO request_record;
+
+  IF FOUND THEN
+    RETURN to_jsonb(request_record) || jsonb_build_object('coalesced', TRUE);
+  END IF;
+
+  INSERT INTO sync_requests (keap_account_id, sync_type, triggered_by)
+  VALUES (keap_account_id_param, sync_type_param, triggered_by_param)
+  ON CONFLICT (keap_account_id, sync_type) WHERE status = 'pending'
+  DO UPDATE SET trigger_count = sync_requests.trigger_count + 1, updated_at = NOW()
+  RETURNING * INTO request_record;
+
+  -- A fresh request starts at one trigger, one folded in by a concurrent insert has been bumped past it
+  RETURN to_jsonb(request_record) || jsonb_build_object('coalesced', request_record.trigger_count > 1);
+END;
+$$;
+
+-- Claim pending requests for a worker, respecting per-type concurrency limits.
+-- Requests stuck in 'running' longer than stale_after_seconds (a worker died) go back to pending.
+CREATE OR REPLACE FUNCTION claim_sync_requests(
+  worker_id_param VARCHAR,
+  type_limits JSONB DEFAULT '{}'::jsonb,
+  default_limit INTEGER DEFAULT 1,
+  max_claims INTEGER DEFAULT 10,
+  stale_after_seconds INTEGER DEFAULT 3600
+)
+RETURNS SETOF sync_requests
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  candidate sync_requests;
+  claimed sync_requests;
+  running_count INTEGER;
+  claimed_count INTEGER := 0;
+BEGIN
+  -- Claims are serialized so two workers can't both take the last free slot of a type
+  PERFORM pg_advisory_xact_lock(hashtext('claim_sync_requests'));
+
+  -- Recover stale runs, unless a newer pending request already covers them
+  UPDATE sync_requests stale
+  SET status = CASE
+        WHEN EXISTS (
+          SELECT 1 FROM sync_requests p
+          WHERE p.status = 'pending' AND p.keap_account_id = stale.keap_account_id AND p.sync_type = stale.sync_type
+        ) THEN 'failed'
+        ELSE 'pending'
+      END,
+      last_error = 'Worker stopped responding',
+      worker_id = NULL,
+      updated_at = NOW()
+  WHERE stale.status = 'running'
+    AND stale.started_at < NOW() - make_interval(secs => stale_after_seconds);
+
+  FOR candidate IN
+    SELECT * FROM sync_requests
+    WHERE status = 'pending' AND (not_before IS NULL OR not_before <= NOW())
+    ORDER BY created_at
+  LOOP
+    EXIT WHEN claimed_count >= max_claims;
+
+    SELECT COUNT(*) FROM sync_requests
+    WHERE status = 'running' AND sync_type = candidate.sync_type
+    INTO running_count;
+    CONTINUE WHEN running_count >= COALESCE((type_limits->>candidate.sync_type)::INTEGER, default_limit);
+
+    -- Never run the same account and type twice at once
+    CONTINUE WHEN EXISTS (
+      SELECT 1 FROM sync_requests
+      WHERE status = 'running' AND keap_account_id = candidate.keap_account_id AND sync_type = candidate.sync_type
+    );
+
+    UPDATE sync_requests
+    SET status = 'running',
+        worker_id = worker_id_param,
+        attempts = attempts + 1,
+        started_at = NOW(),
+        updated_at = NOW()
+    WHERE id = candidate.id AND status = 'pending'
+    RETURNING * INTO claimed;
+
+    IF FOUND THEN
+      claimed_count := claimed_count + 1;
+      RETURN NEXT claimed;
+    END IF;
+  END LOOP;
+END;
+$$;
+
+-- Record the outcome of a run. Failed runs are retried until max_attempts, unless a
+-- newer pending request for the same account and type will run anyway. Retries back
+-- off exponentially: retry_base_seconds after the first failure, doubling up to retry_max_seconds.
+DROP FUNCTION IF EXISTS finish_sync_request(UUID, BOOLEAN, TEXT, INTEGER);
+CREATE OR REPLACE FUNCTION finish_sync_request(
+  request_id_param UUID,
+  succeeded BOOLEAN,
+  error_param TEXT DEFAULT NULL,
+  max_attempts INTEGER DEFAULT 3,
+  retry_base_seconds INTEGER DEFAULT 30,
+  retry_max_seconds INTEGER DEFAULT 900
+)
+RETURNS sync_requests
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  request_record sync_requests;
+BEGIN
+  SELECT * FROM sync_requests WHERE id = request_id_param INTO request_record;
+  IF NOT FOUND THEN
+    RAISE EXCEPTION 'Sync request % not found', request_id_param;
+  END IF;
+
+  IF succeeded THEN
+    UPDATE sync_requests
+    SET status = 'succeeded', last_error = NULL, finished_at = NOW(), updated_at = NOW()
+    WHERE id = request_id_param
+    RETURNING * INTO request_record;
+  ELSIF request_record.attempts < max_attempts AND NOT EXISTS (
+    SELECT 1 FROM sync_requests
+    WHERE status = 'pending'
+      AND keap_account_id = request_record.keap_account_id
+      AND sync_type = request_record.sync_type
+  ) THEN
+    UPDATE sync_requests
+    SET status = 'pending',
+        last_error = error_param,
+        worker_id = NULL,
+        not_before = NOW() + make_interval(secs => LEAST(
+          retry_base_seconds * power(2, GREATEST(request_record.attempts - 1, 0)),
+          retry_max_seconds
+        )),
+        updated_at = NOW()
+    WHERE id = request_id_param
+    RETURNING * INTO request_record;
+  ELSE
+    UPDATE sync_requests
+    SET status = 'failed', last_error = error_param, finished_at = NOW(), updated_at = NOW()
+    WHERE id = request_id_param
+    RETURNING * INTO request_record;
+  END IF;
+
+  RETURN request_record;
+END;
+$$;
+
+GRANT EXECUTE ON FUNCTION enqueue_sync_request(VARCHAR, VARCHAR, UUID) TO service_role;
+GRANT EXECUTE ON FUNCTION claim_sync_requests(VARCHAR, JSONB, INTEGER, INTEGER, INTEGER) TO service_role;
+GRANT EXECUTE ON FUNCTION finish_sync_request(UUID, BOOLEAN, TEXT, INTEGER, INTEGER, INTEGER) TO service_role;
@@ -0,0 +1,99 @@
+-- ==============================================================================
+-- Sync Change Feed
+-- ==============================================================================
+-- Backs the /api/sync/events server-sent events stream. One poller per API
+-- process calls get_sync_changes with the timestamps it has seen so far and fans
+-- the result out to every connected dashboard, so the database sees one query
+-- per poll interval however many viewers there are.
+
+-- Changes are read in (timestamp, id) order - a bulk sync stamps thousands of
+-- sync_status rows with the same updated_at, so the timestamp alone can't page them
+CREATE INDEX IF NOT EXISTS idx_sync_status_updated_at_id ON sync_status (updated_at, id);
+CREATE INDEX IF NOT EXISTS idx_sync_conflicts_created_at_id ON sync_conflicts (created_at, id);
+
+-- Changes after the given positions: rows after (since, after_id), or after since
+-- when after_id is NULL. A NULL since returns no rows for that table - call with
+-- NULLs first and use 'now' as the starting point. The health counts scan both
+-- tables, so they are only computed (and 'health' is only non-null) when include_health is set.
+DROP FUNCTION IF EXISTS get_sync_changes(TIMESTAMP, UUID, TIMESTAMP, UUID, INTEGER);
+CREATE OR REPLACE FUNCTION get_sync_changes(
+  status_since TIMESTAMP DEFAULT NULL,
+  status_after_id UUID DEFAULT NULL,
+  conflicts_since TIMESTAMP DEFAULT NULL,
+  conflicts_after_id UUID DEFAULT NULL,
+  max_rows INTEGER DEFAULT 500,
+  include_health BOOLEAN DEFAULT TRUE
+)
+RETURNS JSONB
+LANGUAGE plpgsql
+STABLE
+SECURITY DEFINER
+AS $$
+DECLARE
+  total_entities INTEGER;
+  successful_syncs INTEGER;
+  pending_conflicts INTEGER;
+BEGIN
+  IF include_health THEN
+    SELECT COUNT(*), COUNT(*) FILTER (WHERE last_error IS NULL)
+    FROM sync_status
+    INTO total_entities, successful_syncs;
+
+    SELECT COUNT(*) FROM sync_conflicts WHERE resolved_at IS NULL INTO pending_conflicts;
+  END IF;
+
+  RETURN jsonb_build_object(
+    -- Same clock as the updated_at/created_at defaults
+    'now', NOW()::timestamp,
+    'status_changes', COALESCE((
+      SELECT jsonb_agg(to_jsonb(s) ORDER BY s.updated_at, s.id)
+      FROM (
+        SELECT
+          ss.id,
+          ss.entity_type,
+          ss.entity_id,
+          ss.keap_id,
+          ss.last_synced_at,
+          ss.sync_direction,
+          ss.conflict_status,
+          ss.last_error,
+          ss.updated_at
+        FROM sync_status ss
+        WHERE status_since IS NOT NULL
+          AND (ss.updated_at, ss.id) > (status_since, COALESCE(status_after_id, 'ffffffff-ffff-ffff-ffff-ffffffffffff'::uuid))
+        ORDER BY ss.updated_at, ss.id
+        LIMIT max_rows
+      ) s
+    ), '[]'::jsonb),
+    'new_conflicts', COALESCE((
+      SELECT jsonb_agg(to_jsonb(c) ORDER BY c.created_at, c.id)
+      FROM (
+        SELECT
+          sc.id,
+          sc.entity_type,
+          sc.entity_id,
+          sc.conflict_fields,
+          sc.resolution_strategy,
+          sc.created_at
+        FROM sync_conflicts sc
+        WHERE conflicts_since IS NOT NULL
+          AND (sc.created_at, sc.id) > (conflicts_since, COALESCE(conflicts_after_id, 'ffffffff-ffff-ffff-ffff-ffffffffffff'::uuid))
+        ORDER BY sc.created_at, sc.id
+        LIMIT max_rows
+      ) c
+    ), '[]'::jsonb),
+    'health', CASE WHEN include_health THEN jsonb_build_object(
+      'total_entities', total_entities,
+      'successful_syncs', successful_syncs,
+      'failed_syncs', total_entities - successful_syncs,
+      'pending_conflicts', pending_conflicts,
+      'health_score', CASE
+        WHEN total_entities > 0 THEN ROUND((successful_syncs::decimal / total_entities::decimal) * 100, 2)
+        ELSE 100
+      END
+    ) END
+  );
+END;
+$$;
+
+GRANT EXECUTE ON FUNCTION get_sync_changes(TIMESTAMP, UUID, TIMESTAMP, UUID, INTEGER, BOOLEAN) TO service_role;
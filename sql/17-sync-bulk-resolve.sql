@@ -0,0 +1,39 @@
+-- ==============================================================================
+-- Bulk Conflict Resolution
+-- ==============================================================================
+-- Backs POST /api/sync/conflicts/resolve, which clears many conflicts (e.g. after
+-- a Keap import) in batches. Each batch is one call and one transaction. Every
+-- conflict in it is resolved under its own savepoint, so one that fails (already
+-- resolved, or its entity can't be updated) doesn't roll back the rest.
+-- Requires sql/11-sync-functions.sql.
+
+CREATE OR REPLACE FUNCTION resolve_sync_conflicts_batch(
+  conflict_ids UUID[],
+  resolution_strategy_param VARCHAR,
+  resolved_by_param UUID DEFAULT NULL,
+  resolution_notes_param TEXT DEFAULT NULL
+)
+RETURNS JSONB
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  conflict_id UUID;
+  resolved UUID[] := '{}';
+  failed JSONB := '[]'::jsonb;
+BEGIN
+  FOREACH conflict_id IN ARRAY conflict_ids
+  LOOP
+    BEGIN
+      PERFORM resolve_sync_conflict(conflict_id, resolution_strategy_param, resolved_by_param, resolution_notes_param);
+      resolved := resolved || conflict_id;
+    EXCEPTION WHEN OTHERS THEN
+      failed := failed || jsonb_build_object('id', conflict_id, 'error', SQLERRM);
+    END;
+  END LOOP;
+
+  RETURN jsonb_build_object('resolved', to_jsonb(resolved), 'failed', failed);
+END;
+$$;
+
+GRANT EXECUTE ON FUNCTION resolve_sync_conflicts_batch(UUID[], VARCHAR, UUID, TEXT) TO service_role;
@@ -25,6 +25,7 @@ CREATE TABLE messages (
     session_id VARCHAR NOT NULL,
     message JSONB NOT NULL,
     message_data TEXT,
+    idempotency_key UUID UNIQUE,  -- Client-generated, so replayed writes are skipped
     created_at TIMESTAMPTZ DEFAULT NOW(),
    
     FOREIGN KEY (session_id) REFERENCES conversations(session_id)
@@ -33,4 +34,7 @@ CREATE TABLE messages (
 -- Create indexes
 CREATE INDEX idx_conversations_user ON conversations(user_id);
 CREATE INDEX idx_messages_session ON messages(session_id);
-CREATE INDEX idx_messages_computed_session ON messages(computed_session_user_id);
\ No newline at end of file
+CREATE INDEX idx_messages_computed_session ON messages(computed_session_user_id);
+
+-- Installs created before idempotency_key existed
+ALTER TABLE messages ADD COLUMN IF NOT EXISTS idempotency_key UUID UNIQUE;
\ No newline at end of file
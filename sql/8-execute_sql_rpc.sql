@@ -20,4 +20,29 @@ END;
 $$;
 
 -- By default, revoke execute permission from public and authenticated users
-REVOKE EXECUTE ON FUNCTION execute_custom_sql(text) FROM PUBLIC, authenticated;
\ No newline at end of file
+REVOKE EXECUTE ON FUNCTION execute_custom_sql(text) FROM PUBLIC, authenticated;
+
+-- Create a function that returns the planner estimate for a query without running it
+CREATE OR REPLACE FUNCTION explain_custom_sql(sql_query text)
+RETURNS JSONB
+LANGUAGE plpgsql
+SECURITY DEFINER -- This makes the function run with the privileges of the creator
+AS $$
+DECLARE
+  plan JSON;
+BEGIN
+  -- EXPLAIN without ANALYZE only plans the query, so this is cheap even for runaway SQL.
+  -- Plan the statement execute_custom_sql runs, wrapped the same way, so a string that
+  -- isn't a single query (utility commands, several statements) fails here too.
+  EXECUTE 'EXPLAIN (FORMAT JSON) SELECT jsonb_agg(t) FROM (' || sql_query || ') t' INTO plan;
+  RETURN plan::jsonb;
+EXCEPTION
+  WHEN OTHERS THEN
+    RETURN jsonb_build_object(
+      'error', SQLERRM,
+      'detail', SQLSTATE
+    );
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION explain_custom_sql(text) FROM PUBLIC, authenticated;
\ No newline at end of file
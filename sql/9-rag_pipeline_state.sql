@@ -7,10 +7,14 @@ CREATE TABLE IF NOT EXISTS rag_pipeline_state (
     last_check_time TIMESTAMP,        -- Last successful check for changes
     known_files JSONB,                -- File metadata for change detection (file_id -> timestamp mapping)
     last_run TIMESTAMP,               -- Last successful run timestamp
+    last_ingest TIMESTAMP,            -- Last run that added, changed or deleted documents
     created_at TIMESTAMP DEFAULT NOW(),
     updated_at TIMESTAMP DEFAULT NOW()
 );
 
+-- Installs created before last_ingest existed
+ALTER TABLE rag_pipeline_state ADD COLUMN IF NOT EXISTS last_ingest TIMESTAMP;
+
 -- Add indexes for performance
 CREATE INDEX IF NOT EXISTS idx_rag_pipeline_state_pipeline_type ON rag_pipeline_state(pipeline_type);
 CREATE INDEX IF NOT EXISTS idx_rag_pipeline_state_last_run ON rag_pipeline_state(last_run);